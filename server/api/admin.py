@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+运维 API
+对运行中的 API 进程和 worker 进程按需采样分析（需要 profiling.token）
+"""
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Optional
+import asyncio
+
+from utils import generate_id
+from utils.profiler import check_token, collect_process_profiles, request_process_profiles, speedscope
+from utils.settings import get_settings
+
+router = APIRouter()
+
+# 等待各进程写入采样结果的额外时间（秒）：进程每秒检查一次采样请求
+COLLECT_GRACE_SECONDS = 3.0
+
+
+@router.post("/profile")
+async def profile_processes(
+    seconds: float = Query(10.0, gt=0),
+    pid: Optional[int] = None,
+    output: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    x_profile_token: Optional[str] = Header(None),
+):
+    """
+    对本机的 API 进程和 worker 进程（pid 指定时只对该进程）采样 seconds 秒，返回火焰图
+
+    speedscope 格式中每个进程为一个 profile；collapsed 格式以 "pid <pid>" 为最外层帧合并。
+    """
+    if not check_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="需要有效的 X-Profile-Token（profiling.token）")
+    max_seconds = get_settings().profiling.max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds 不能超过 {max_seconds:g}")
+
+    request_id = generate_id()
+    await asyncio.to_thread(request_process_profiles, request_id, seconds, pid)
+    await asyncio.sleep(seconds + COLLECT_GRACE_SECONDS)
+    profiles = await asyncio.to_thread(collect_process_profiles, request_id)
+    if not profiles:
+        raise HTTPException(status_code=404, detail="没有进程响应采样请求（进程启动时需已配置 profiling.token）")
+
+    if output == "collapsed":
+        lines = []
+        for profile in profiles:
+            lines += [f"pid {profile.pid};{line}" for line in profile.to_collapsed().splitlines()]
+        return PlainTextResponse("\n".join(lines) + "\n")
+    return JSONResponse(speedscope(profiles, f"profile {request_id}"))
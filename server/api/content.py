@@ -16,6 +16,9 @@ from utils import (
     ensure_dir
 )
 from utils.image_process import download_video
+from utils.storage import path_exists, publish_async
+from utils.settings import get_settings
+from utils.prompt_registry import render_prompt
 
 router = APIRouter()
 
@@ -76,18 +79,14 @@ async def call_llm_generate_single_shot_storyboard(
     """
     from utils.query_llm import prepare_multimodal_messages_openai_format, query_openrouter
     
-    # 加载提示词模板
-    prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", "generation", "single_shot_storyboard.txt")
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        prompt_template = f.read()
-    
     # 准备素材列表字符串
     char_materials_str = "，".join(character_materials) if character_materials else "无"
     scene_materials_str = "，".join(scene_materials) if scene_materials else "无"
     prop_materials_str = "，".join(prop_materials) if prop_materials else "无"
     
-    # 替换模板变量
-    prompt = prompt_template.format(
+    # 渲染提示词模板
+    prompt = render_prompt(
+        "generation/single_shot_storyboard",
         script=script,
         expected_duration=expected_duration,
         shot_duration=shot_duration,
@@ -100,14 +99,9 @@ async def call_llm_generate_single_shot_storyboard(
     messages = prepare_multimodal_messages_openai_format(prompt_text=prompt)
     
     # 加载配置
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-    import yaml
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    llm_cfg = config.get("llm", {})
-    api_key = llm_cfg.get("openai_api_key")
-    model = llm_cfg.get("model", "gpt-4o")
+    llm_settings = get_settings().llm
+    api_key = llm_settings.openai_api_key
+    model = llm_settings.model or "gpt-4o"
     
     # 调用LLM
     response = query_openrouter(
@@ -154,11 +148,6 @@ async def call_llm_generate_shot_prompts(
     """
     from utils.query_llm import prepare_multimodal_messages_openai_format, query_openrouter
     
-    # 加载提示词模板
-    prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts", "generation", "shot_prompts.txt")
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        prompt_template = f.read()
-    
     # 准备素材列表字符串
     materials_str = "，".join(related_materials) if related_materials else "无"
     
@@ -174,8 +163,9 @@ async def call_llm_generate_shot_prompts(
     else:
         next_str = "无"
     
-    # 替换模板变量
-    prompt = prompt_template.format(
+    # 渲染提示词模板
+    prompt = render_prompt(
+        "generation/shot_prompts",
         related_materials=materials_str,
         shot_description=shot_description,
         duration=duration,
@@ -187,14 +177,9 @@ async def call_llm_generate_shot_prompts(
     messages = prepare_multimodal_messages_openai_format(prompt_text=prompt)
     
     # 加载配置
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-    import yaml
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    llm_cfg = config.get("llm", {})
-    api_key = llm_cfg.get("openai_api_key")
-    model = llm_cfg.get("model", "gpt-4o")
+    llm_settings = get_settings().llm
+    api_key = llm_settings.openai_api_key
+    model = llm_settings.model or "gpt-4o"
     
     # 调用LLM
     response = query_openrouter(
@@ -356,6 +341,7 @@ async def download_video_to_shot(
     download_result = download_video(video_url, video_path)
     if not download_result.get('success'):
         raise HTTPException(status_code=500, detail=f"视频下载失败: {download_result.get('error')}")
+    await publish_async(video_path)
     
     local_url = f"/data/works/{work_id}/episodes/{episode_id}/shots/{shot_id}/videos/{video_filename}"
     
@@ -466,7 +452,8 @@ async def update_shot(
     dialogue_prompt: str = Form(None),
     video_task_id: str = Form(None),
     current_video: str = Form(None),
-    video_history: str = Form(None)
+    video_history: str = Form(None),
+    dialogue_audio: str = Form(None)
 ):
     """更新分镜字段（描述和提示词）"""
     from fastapi import HTTPException
@@ -509,6 +496,8 @@ async def update_shot(
                     shot["video_history"] = json.loads(video_history)
                 except:
                     pass
+            if dialogue_audio is not None:
+                shot["dialogue_audio"] = dialogue_audio
             break
     
     if not shot_found:
@@ -519,8 +508,8 @@ async def update_shot(
     # 同时更新分镜的 meta.json（如果存在）
     shot_path = get_shot_path(work_id, episode_id, shot_id)
     meta_path = os.path.join(shot_path, "meta.json")
-    if os.path.exists(meta_path):
-        meta = load_json(meta_path) or {}
+    meta = load_json(meta_path)
+    if meta is not None:
         if description is not None:
             meta["description"] = description
         if image_prompt is not None:
@@ -642,7 +631,7 @@ async def confirm_storyboard(work_id: str, episode_id: str):
     episode_path = get_data_path("works", work_id, "episodes", episode_id)
     
     # 确保剧集目录存在
-    if not os.path.exists(episode_path):
+    if not path_exists(episode_path):
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Episode not found")
     
@@ -5,16 +5,23 @@
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from typing import Optional
+from datetime import datetime
 import os
 import shutil
+import asyncio
 
 from utils import (
     get_data_path, load_json, save_json, generate_id,
     list_dirs, delete_dir, ensure_dir
 )
+from utils.storage import fetch, path_exists, publish_async
 
 router = APIRouter()
 
+# 成片输出目录（相对剧集目录）
+RENDER_DIR = "render"
+RENDER_FILENAME = "episode.mp4"
+
 
 def get_episode_path(work_id: str, episode_id: str) -> str:
     """获取剧集路径"""
@@ -106,6 +113,7 @@ async def update_episode(
         cover_path = os.path.join(episode_path, "cover.jpg")
         with open(cover_path, "wb") as f:
             shutil.copyfileobj(cover_image.file, f)
+        await publish_async(cover_path)
         meta["cover_image"] = "cover.jpg"
     
     save_json(meta_path, meta)
@@ -120,7 +128,7 @@ async def delete_episode(work_id: str, episode_id: str):
     """删除剧集"""
     episode_path = get_episode_path(work_id, episode_id)
     
-    if not os.path.exists(episode_path):
+    if not path_exists(episode_path):
         raise HTTPException(status_code=404, detail="Episode not found")
     
     delete_dir(episode_path)
@@ -199,7 +207,7 @@ async def save_storyboard_text(
     episode_path = get_episode_path(work_id, episode_id)
     
     # 确保剧集目录存在
-    if not os.path.exists(episode_path):
+    if not path_exists(episode_path):
         raise HTTPException(status_code=404, detail="Episode not found")
     
     storyboard_path = os.path.join(episode_path, "storyboard.json")
@@ -219,3 +227,94 @@ async def save_storyboard_text(
         "confirmed": storyboard.get("confirmed", False)
     }
 
+
+
+def resolve_shot_video_path(video_url: Optional[str]) -> Optional[str]:
+    """将分镜媒体地址（/data/...）转换为本地文件路径，外部 URL 返回 None"""
+    if not video_url or video_url.startswith("http"):
+        return None
+    relative = video_url.split("?", 1)[0]
+    if relative.startswith("/data/"):
+        relative = relative[len("/data/"):]
+    local_path = get_data_path(*relative.strip("/").split("/"))
+    return local_path if fetch(local_path) else None
+
+
+def get_shot_current_video(shot: dict) -> Optional[str]:
+    """获取分镜当前选中的视频（与前端逻辑一致：无 current_video 且只有一个历史视频时使用该视频）"""
+    if shot.get("current_video"):
+        return shot["current_video"]
+    history = shot.get("video_history") or []
+    if len(history) == 1:
+        return history[0].get("video_path")
+    return None
+
+
+@router.post("/{work_id}/{episode_id}/render")
+async def render_episode(work_id: str, episode_id: str):
+    """
+    按分镜顺序拼接各分镜选中的视频，生成剧集成片
+
+    分镜片段按内容哈希缓存，只有视频或台词音频变化的分镜会重新生成，
+    其余分镜直接复用缓存，成片以流拷贝拼接，最后对整集音轨做一次响度归一化。
+    """
+    from utils.episode_render import render_episode as render_clips
+    from utils.ffmpeg_utils import FFmpegError
+
+    episode_path = get_episode_path(work_id, episode_id)
+    storyboard = load_json(os.path.join(episode_path, "storyboard.json"))
+    if not storyboard or not storyboard.get("shots"):
+        raise HTTPException(status_code=400, detail="分镜不存在，无法生成成片")
+
+    shots = sorted(storyboard["shots"], key=lambda s: s.get("order", 0))
+    clips = []
+    missing = []
+    for shot in shots:
+        local_path = resolve_shot_video_path(get_shot_current_video(shot))
+        if not local_path:
+            missing.append(shot.get("id"))
+            continue
+        # 分镜的台词音频（可选），在渲染时对齐并混入视频
+        audio_path = resolve_shot_video_path(shot.get("dialogue_audio"))
+        clips.append({"video_path": local_path, "audio_path": audio_path})
+
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "以下分镜没有已选中的本地视频", "shot_ids": missing}
+        )
+
+    render_dir = os.path.join(episode_path, RENDER_DIR)
+    ensure_dir(render_dir)
+    output_path = os.path.join(render_dir, RENDER_FILENAME)
+
+    try:
+        result = await asyncio.to_thread(render_clips, clips, output_path)
+    except (FFmpegError, FileNotFoundError) as e:
+        raise HTTPException(status_code=500, detail=f"成片渲染失败: {str(e)}")
+    await publish_async(output_path)
+
+    render_info = {
+        "rendered": True,
+        "url": f"/data/works/{work_id}/episodes/{episode_id}/{RENDER_DIR}/{RENDER_FILENAME}",
+        "shot_ids": [shot.get("id") for shot in shots],
+        "duration": result["duration"],
+        "clip_count": result["clip_count"],
+        "normalized_shot_ids": [shots[i].get("id") for i in result["normalized"]],
+        "rebuilt_shot_ids": [shots[i].get("id") for i in result["rebuilt"]],
+        "stream_copy": result["stream_copy"],
+        "loudness": result["loudness"],
+        "elapsed_time": result["elapsed_time"],
+        "rendered_at": datetime.now().isoformat()
+    }
+    save_json(os.path.join(render_dir, "render.json"), render_info)
+    return render_info
+
+
+@router.get("/{work_id}/{episode_id}/render")
+async def get_render(work_id: str, episode_id: str):
+    """获取剧集成片信息"""
+    render_info = load_json(os.path.join(get_episode_path(work_id, episode_id), RENDER_DIR, "render.json"))
+    if not render_info:
+        return {"rendered": False}
+    return render_info
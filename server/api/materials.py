@@ -8,12 +8,13 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.responses import FileResponse, Response, Response
 from typing import List, Optional
 import os
-import shutil
 
 from utils import (
     get_data_path, load_json, save_json, generate_id,
     list_dirs, delete_dir, ensure_dir
 )
+from utils.image_ingest import ImageIngestError, ingest_image
+from utils.storage import fetch_async, path_exists
 
 router = APIRouter()
 
@@ -70,7 +71,7 @@ async def get_material_image(material_type: str, material_id: str, filename: str
     material_path = get_material_path(material_type, material_id)
     image_path = os.path.join(material_path, filename)
     
-    if not os.path.exists(image_path):
+    if not await fetch_async(image_path):
         raise HTTPException(status_code=404, detail="Image not found")
     
     # 读取图片文件
@@ -110,19 +111,21 @@ async def create_material(
     material_path = get_material_path(material_type, material_id)
     ensure_dir(material_path)
     
-    # 保存主图
-    main_path = os.path.join(material_path, "main.jpg")
-    with open(main_path, "wb") as f:
-        shutil.copyfileobj(main_image.file, f)
-    
-    # 保存辅助图片
-    aux_images = []
-    for idx, aux_file in enumerate([aux1_image, aux2_image], 1):
-        if aux_file:
-            aux_path = os.path.join(material_path, f"aux{idx}.jpg")
-            with open(aux_path, "wb") as f:
-                shutil.copyfileobj(aux_file.file, f)
-            aux_images.append(f"aux{idx}.jpg")
+    try:
+        # 保存主图（校验并生成紧凑版本）
+        main_path = os.path.join(material_path, "main.jpg")
+        await ingest_image(main_image.file, main_path)
+        
+        # 保存辅助图片
+        aux_images = []
+        for idx, aux_file in enumerate([aux1_image, aux2_image], 1):
+            if aux_file:
+                aux_path = os.path.join(material_path, f"aux{idx}.jpg")
+                await ingest_image(aux_file.file, aux_path)
+                aux_images.append(f"aux{idx}.jpg")
+    except ImageIngestError as e:
+        delete_dir(material_path)
+        raise HTTPException(status_code=400, detail=str(e))
     
     # 保存元数据
     meta = {
@@ -168,19 +171,20 @@ async def update_material(
         meta["description"] = description
     
     # 更新图片
-    if main_image:
-        main_path = os.path.join(material_path, "main.jpg")
-        with open(main_path, "wb") as f:
-            shutil.copyfileobj(main_image.file, f)
-    
     aux_images = meta.get("aux_images", [])
-    for idx, aux_file in enumerate([aux1_image, aux2_image], 1):
-        if aux_file:
-            aux_path = os.path.join(material_path, f"aux{idx}.jpg")
-            with open(aux_path, "wb") as f:
-                shutil.copyfileobj(aux_file.file, f)
-            if f"aux{idx}.jpg" not in aux_images:
-                aux_images.append(f"aux{idx}.jpg")
+    try:
+        if main_image:
+            main_path = os.path.join(material_path, "main.jpg")
+            await ingest_image(main_image.file, main_path)
+        
+        for idx, aux_file in enumerate([aux1_image, aux2_image], 1):
+            if aux_file:
+                aux_path = os.path.join(material_path, f"aux{idx}.jpg")
+                await ingest_image(aux_file.file, aux_path)
+                if f"aux{idx}.jpg" not in aux_images:
+                    aux_images.append(f"aux{idx}.jpg")
+    except ImageIngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     meta["aux_images"] = aux_images
     save_json(meta_path, meta)
@@ -197,7 +201,7 @@ async def delete_material(material_type: str, material_id: str):
     
     material_path = get_material_path(material_type, material_id)
     
-    if not os.path.exists(material_path):
+    if not path_exists(material_path):
         raise HTTPException(status_code=404, detail="Material not found")
     
     delete_dir(material_path)
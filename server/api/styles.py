@@ -8,13 +8,14 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.responses import FileResponse
 from typing import Optional, List, Dict, Any
 import os
-import shutil
 import json
 
 from utils import (
     get_data_path, load_json, save_json, generate_id,
-    ensure_dir
+    ensure_dir, list_dirs, delete_dir
 )
+from utils.image_ingest import ImageIngestError, ingest_image
+from utils.storage import fetch_async, path_exists
 
 router = APIRouter()
 
@@ -33,21 +34,15 @@ def get_style_path(style_id: str) -> str:
 async def get_styles():
     """获取所有风格列表"""
     styles_path = get_styles_path()
-    if not os.path.exists(styles_path):
-        return []
     
     styles = []
-    for style_id in os.listdir(styles_path):
-        style_dir = os.path.join(styles_path, style_id)
-        if not os.path.isdir(style_dir):
-            continue
-        
-        meta_path = os.path.join(style_dir, "meta.json")
-        if not os.path.exists(meta_path):
+    for style_id in list_dirs(styles_path):
+        meta_path = os.path.join(styles_path, style_id, "meta.json")
+        meta = load_json(meta_path)
+        if not meta:
             continue
         
         try:
-            meta = load_json(meta_path)
             meta["id"] = style_id
             styles.append(meta)
         except Exception as e:
@@ -65,10 +60,10 @@ async def get_style(style_id: str):
     style_path = get_style_path(style_id)
     meta_path = os.path.join(style_path, "meta.json")
     
-    if not os.path.exists(meta_path):
+    meta = load_json(meta_path)
+    if not meta:
         raise HTTPException(status_code=404, detail="风格不存在")
     
-    meta = load_json(meta_path)
     meta["id"] = style_id
     return meta
 
@@ -79,7 +74,7 @@ async def get_style_image(style_id: str, filename: str):
     style_path = get_style_path(style_id)
     image_path = os.path.join(style_path, filename)
     
-    if not os.path.exists(image_path):
+    if not await fetch_async(image_path):
         raise HTTPException(status_code=404, detail="图片不存在")
     
     return FileResponse(
@@ -109,8 +104,11 @@ async def create_style(
     if reference_image:
         reference_image_filename = "reference.jpg"
         image_path = os.path.join(style_path, reference_image_filename)
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(reference_image.file, f)
+        try:
+            await ingest_image(reference_image.file, image_path)
+        except ImageIngestError as e:
+            delete_dir(style_path)
+            raise HTTPException(status_code=400, detail=str(e))
     
     # 保存元数据
     meta = {
@@ -137,10 +135,9 @@ async def update_style(
     style_path = get_style_path(style_id)
     meta_path = os.path.join(style_path, "meta.json")
     
-    if not os.path.exists(meta_path):
-        raise HTTPException(status_code=404, detail="风格不存在")
-    
     meta = load_json(meta_path)
+    if not meta:
+        raise HTTPException(status_code=404, detail="风格不存在")
     
     # 更新字段
     if name is not None:
@@ -152,8 +149,10 @@ async def update_style(
     if reference_image:
         reference_image_filename = "reference.jpg"
         image_path = os.path.join(style_path, reference_image_filename)
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(reference_image.file, f)
+        try:
+            await ingest_image(reference_image.file, image_path)
+        except ImageIngestError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         meta["reference_image"] = reference_image_filename
     
     save_json(meta_path, meta)
@@ -167,11 +166,11 @@ async def delete_style(style_id: str):
     """删除风格"""
     style_path = get_style_path(style_id)
     
-    if not os.path.exists(style_path):
+    if not path_exists(style_path):
         raise HTTPException(status_code=404, detail="风格不存在")
     
     # 删除整个风格目录
-    shutil.rmtree(style_path)
+    delete_dir(style_path)
     
     return {"success": True}
 
@@ -5,9 +5,13 @@
 """
 
 from fastapi import APIRouter, HTTPException
-from typing import Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional
 import os
 import asyncio
+import shutil
+import socket
+import threading
+import time
 from datetime import datetime
 from enum import Enum
 
@@ -15,9 +19,16 @@ from utils import (
     get_data_path, load_json, save_json, generate_id,
     ensure_dir
 )
+from utils.metrics import task_finished
+from utils.progress import estimate_progress
+from utils.tracing import current_span
+from utils.storage import list_entries, remove
 
 router = APIRouter()
 
+# 任务文件的读-改-写在本进程内串行执行（执行任务的线程也会写入 prediction 记录）
+_task_lock = threading.Lock()
+
 # 任务状态
 class TaskStatus(str, Enum):
     PENDING = "pending"  # 请求中
@@ -32,6 +43,40 @@ def get_task_path(task_id: str) -> str:
     return os.path.join(tasks_dir, f"{task_id}.json")
 
 
+def get_inflight_path(task_id: str) -> str:
+    """未结束任务的索引文件路径（任务结束时删除，启动时只需扫描该目录）"""
+    return get_data_path("tools", "tasks", "inflight", f"{task_id}.json")
+
+
+def get_claims_dir(task_id: str) -> str:
+    """接手中断任务时的占用标记目录（本机多个进程同时启动时只有一个进程接手）"""
+    return get_data_path("tools", "tasks", "claims", task_id)
+
+
+def _current_owner() -> Dict[str, Any]:
+    return {"host": socket.gethostname(), "pid": os.getpid()}
+
+
+def _owner_alive(owner: Optional[Dict[str, Any]]) -> bool:
+    """
+    任务所属进程是否仍在运行；其他机器上的进程无法判断，视为运行中
+
+    本机只能检查 PID 是否存在，而 PID 可能已被重启后的其他进程复用（容器中尤其常见），
+    因此返回 True 时仍需结合心跳超时判断。
+    """
+    if not owner:
+        return False
+    if owner.get("host") != socket.gethostname():
+        return True
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
 def create_task(tool_type: str, input_data: Dict[str, Any]) -> str:
     """创建任务"""
     task_id = generate_id()
@@ -43,12 +88,19 @@ def create_task(tool_type: str, input_data: Dict[str, Any]) -> str:
         "output": None,
         "error": None,
         "progress": 0,
+        "owner": _current_owner(),
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat()
     }
+    # 执行任务的进程以 traceparent 为父 span 继续同一条 trace
+    span = current_span()
+    if span is not None:
+        task["trace_id"] = span.trace_id
+        task["traceparent"] = span.traceparent
     
     task_path = get_task_path(task_id)
     save_json(task_path, task)
+    save_json(get_inflight_path(task_id), {"task_id": task_id, "created_at": task["created_at"]})
     
     return task_id
 
@@ -61,6 +113,11 @@ def get_task(task_id: str) -> Optional[Dict[str, Any]]:
 
 def update_task_status(task_id: str, status: TaskStatus, output: Any = None, error: str = None, progress: int = None, api_request: Dict[str, Any] = None, prompt: str = None):
     """更新任务状态"""
+    with _task_lock:
+        _update_task_status(task_id, status, output, error, progress, api_request, prompt)
+
+
+def _update_task_status(task_id, status, output, error, progress, api_request, prompt):
     task = get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -81,6 +138,102 @@ def update_task_status(task_id: str, status: TaskStatus, output: Any = None, err
     
     task_path = get_task_path(task_id)
     save_json(task_path, task)
+    if status != TaskStatus.PENDING:
+        remove(get_inflight_path(task_id))
+        shutil.rmtree(get_claims_dir(task_id), ignore_errors=True)
+        task_finished(status.value)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("task.status", status.value)
+            if status == TaskStatus.FAILED:
+                span.set_status("ERROR", error)
+
+
+def _modify_task(task_id: str, modify: Callable[[Dict[str, Any]], None]):
+    with _task_lock:
+        task = get_task(task_id)
+        if not task:
+            return
+        modify(task)
+        save_json(get_task_path(task_id), task)
+
+
+def add_task_prediction(task_id: str, prediction: Dict[str, Any]):
+    """记录任务已提交的上游 prediction（用于进程退出后取回结果，而不是重新提交）"""
+    def modify(task):
+        task.setdefault("predictions", []).append(prediction)
+        task["updated_at"] = datetime.now().isoformat()
+    _modify_task(task_id, modify)
+
+
+def set_task_phase(task_id: str, phase: str):
+    """记录任务进入的执行阶段（utils.progress.PHASES），用于估算进度和剩余时间"""
+    now = time.time()
+    def modify(task):
+        task["phase"] = phase
+        task["phase_at"] = now
+    _modify_task(task_id, modify)
+
+
+def heartbeat_task(task_id: str):
+    """标记任务正由当前进程执行"""
+    def modify(task):
+        task["owner"] = _current_owner()
+        task["heartbeat_at"] = time.time()
+        task["interrupted"] = False
+    _modify_task(task_id, modify)
+
+
+def mark_task_interrupted(task_id: str):
+    """标记任务因进程退出而中断，可立即由其他进程接手"""
+    def modify(task):
+        task["interrupted"] = True
+        task["handoffs"] = task.get("handoffs", 0) + 1
+    _modify_task(task_id, modify)
+
+
+def claim_orphaned_task(task: Dict[str, Any]) -> bool:
+    """
+    接手中断的任务，多个进程同时尝试时只有一个成功
+
+    Returns:
+        bool: 是否由当前进程接手
+    """
+    owner = task.get("owner") or {}
+    key = f"{owner.get('host')}-{owner.get('pid')}-{task.get('handoffs', 0)}"
+    claims_dir = get_claims_dir(task["task_id"])
+    ensure_dir(claims_dir)
+    try:
+        os.close(os.open(os.path.join(claims_dir, key), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    heartbeat_task(task["task_id"])
+    return True
+
+
+def list_orphaned_tasks(stale_seconds: float) -> List[Dict[str, Any]]:
+    """
+    列出需要接手的未结束任务：被标记为中断、所属进程已退出，
+    或超过 stale_seconds 没有心跳（本机进程同样适用：所属进程的 PID 可能已被复用）
+    """
+    inflight_dir = os.path.dirname(get_inflight_path("_"))
+    _, filenames = list_entries(inflight_dir)
+    now = time.time()
+    orphaned = []
+    for filename in filenames:
+        if not filename.endswith(".json"):
+            continue
+        task_id = filename[:-len(".json")]
+        task = get_task(task_id)
+        if not task or task.get("status") != TaskStatus.PENDING.value:
+            remove(get_inflight_path(task_id))
+            continue
+        last_seen = task.get("heartbeat_at")
+        if last_seen is None:
+            last_seen = datetime.fromisoformat(task["created_at"]).timestamp()
+        if task.get("interrupted") or not _owner_alive(task.get("owner")) or now - last_seen > stale_seconds:
+            orphaned.append(task)
+    return orphaned
 
 
 @router.get("/{task_id}/status")
@@ -89,11 +242,14 @@ async def get_task_status(task_id: str):
     task = get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
+    # 进度和剩余时间按当前阶段和同一模型的历史耗时估算
+    estimate = await asyncio.to_thread(estimate_progress, task)
     
     result = {
         "task_id": task_id,
         "status": task["status"],
-        "progress": task.get("progress", 0),
+        "progress": estimate["progress"],
+        "eta_seconds": estimate["eta_seconds"],
         "error": task.get("error")
     }
     
@@ -101,6 +257,7 @@ async def get_task_status(task_id: str):
     if task["status"] in [TaskStatus.FAILED.value, TaskStatus.PENDING.value]:
         result["input"] = task.get("input")
         result["tool_type"] = task.get("tool_type")
+        result["phase"] = estimate["phase"]
         # 如果任务中有保存的 API 请求信息，也返回
         if "api_request" in task:
             result["api_request"] = task.get("api_request")
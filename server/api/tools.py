@@ -9,8 +9,7 @@ from typing import List, Dict, Any, Optional
 from enum import Enum
 import os
 import asyncio
-import shutil
-import yaml
+import functools
 import requests
 import json
 import logging
@@ -22,7 +21,10 @@ from utils import (
     get_data_path, load_json, save_json, generate_id,
     ensure_dir
 )
-from api.tasks import create_task, update_task_status, TaskStatus
+from api.tasks import (
+    create_task, update_task_status, TaskStatus, get_task, add_task_prediction,
+    heartbeat_task, mark_task_interrupted, list_orphaned_tasks, claim_orphaned_task, set_task_phase
+)
 from utils.wavespeed_api import (
     calculate_image_size,
     seedream_v4_5_text_to_image,
@@ -39,6 +41,17 @@ from utils.image_api import (
     generate_image_to_image_nanopro,
 )
 from utils.image_process import download_image, download_video
+from utils.image_ingest import ImageIngestError, compact_reference, ingest_image
+from utils.settings import get_settings
+from utils.storage import fetch_async, list_entries, path_exists, publish_async, remove
+from utils.task_broker import BrokerError, TaskWorker, get_task_broker, make_job, submit_job
+from utils.metrics import track_task, upstream_session
+from utils.predictions import track_predictions, wait_for_prediction
+from utils.tracing import current_span, start_span, traced
+from utils.usage import record_task_usage
+from utils.progress import UPSTREAM_PHASES
+from utils.routing import run_with_policy
+from utils.prompt_registry import compile_template, get_prompt_registry, render_prompt
 
 router = APIRouter()
 
@@ -71,6 +84,14 @@ def get_output_path(tool_type: str, output_id: str) -> str:
     return get_data_path("tools", "outputs", tool_type, output_id)
 
 
+async def save_upload_image(upload: UploadFile, path: str):
+    """保存上传的图片（校验并生成紧凑版本），无效图片返回 400"""
+    try:
+        await ingest_image(upload.file, path)
+    except ImageIngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 def create_history_record(task_id: str, tool_type: str, input_data: Dict[str, Any], output_data: Any) -> str:
     """创建历史记录"""
     record_id = generate_id()
@@ -103,11 +124,7 @@ def load_prompt_template(template_path: str) -> str:
     Raises:
         FileNotFoundError: 文件不存在时抛出
     """
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"提示词模板文件不存在: {template_path}")
-    
-    with open(template_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    return get_prompt_registry().get_path(template_path).text
 
 
 def replace_prompt_variables(template: str, **kwargs) -> str:
@@ -121,10 +138,7 @@ def replace_prompt_variables(template: str, **kwargs) -> str:
     Returns:
         替换后的字符串
     """
-    result = template
-    for key, value in kwargs.items():
-        result = result.replace(f"{{{key}}}", str(value))
-    return result
+    return compile_template(template).render(strict=False, **kwargs)
 
 
 def load_llm_config() -> Dict[str, str]:
@@ -141,22 +155,15 @@ def load_llm_config() -> Dict[str, str]:
         FileNotFoundError: 配置文件不存在时抛出
         KeyError: 配置项缺失时抛出
     """
-    # 获取配置文件路径
-    server_dir = os.path.dirname(os.path.dirname(__file__))
-    config_path = os.path.join(server_dir, "config", "config.yaml")
+    settings = get_settings()
+    if not settings.exists:
+        raise FileNotFoundError(f"配置文件不存在: {settings.path}")
     
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"配置文件不存在: {config_path}")
-    
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    llm_config = config.get('llm', {})
-    if not llm_config:
+    if not settings.raw.get('llm'):
         raise KeyError("配置文件中缺少 'llm' 配置")
     
-    model = llm_config.get('model')
-    api_key = llm_config.get('openai_api_key')
+    model = settings.llm.model
+    api_key = settings.llm.openai_api_key
     
     if not model:
         raise KeyError("配置文件中缺少 'llm.model' 配置")
@@ -194,18 +201,12 @@ async def generate_script_with_llm(description: str) -> Dict[str, Any]:
     Raises:
         Exception: LLM 调用失败时抛出异常
     """
-    # 加载提示词模板
-    server_dir = os.path.dirname(os.path.dirname(__file__))
-    prompt_path = os.path.join(server_dir, "prompts", "generation", "script_generation.txt")
-    
+    # 加载系统提示词（提示词文件已经是完整的系统提示词）
     try:
-        template = load_prompt_template(prompt_path)
+        system_prompt = render_prompt("generation/script_generation").strip()
     except FileNotFoundError as e:
         raise Exception(f"无法加载提示词模板: {str(e)}")
     
-    # 获取系统提示词（提示词文件已经是完整的系统提示词）
-    system_prompt = template.strip()
-    
     # 加载 LLM 配置
     try:
         llm_config = load_llm_config()
@@ -228,6 +229,7 @@ async def generate_script_with_llm(description: str) -> Dict[str, Any]:
     try:
         # 添加 server 目录到 Python 路径，以便导入 utils 包
         import sys
+        server_dir = os.path.dirname(os.path.dirname(__file__))
         if server_dir not in sys.path:
             sys.path.insert(0, server_dir)
         
@@ -235,7 +237,7 @@ async def generate_script_with_llm(description: str) -> Dict[str, Any]:
         import requests
         import json
         
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        url = get_settings().upstreams.openrouter_url("chat/completions")
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {llm_config['api_key']}",
@@ -250,7 +252,7 @@ async def generate_script_with_llm(description: str) -> Dict[str, Any]:
             "temperature": 0.7
         }
         
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = upstream_session.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         
         data = resp.json()
@@ -323,26 +325,23 @@ async def generate_description_with_llm(
         Exception: LLM 调用失败时抛出异常
     """
     # 检查图片文件是否存在
-    if not os.path.exists(image_path):
+    if not await fetch_async(image_path):
         raise FileNotFoundError(f"图片文件不存在: {image_path}")
     
-    # 加载提示词模板
-    server_dir = os.path.dirname(os.path.dirname(__file__))
-    prompt_path = os.path.join(server_dir, "prompts", "generation", "image_to_description.txt")
+    # 优先使用入库时生成的紧凑版本
+    image_path = await compact_reference(image_path)
     
+    # 渲染提示词模板
+    user_desc_text = user_description if user_description else ""
     try:
-        template = load_prompt_template(prompt_path)
+        system_prompt = render_prompt(
+            "generation/image_to_description",
+            material_type=material_type,
+            user_description=user_desc_text
+        ).strip()
     except FileNotFoundError as e:
         raise Exception(f"无法加载提示词模板: {str(e)}")
     
-    # 替换模板中的变量
-    user_desc_text = user_description if user_description else ""
-    system_prompt = replace_prompt_variables(
-        template,
-        material_type=material_type,
-        user_description=user_desc_text
-    ).strip()
-    
     # 加载 LLM 配置
     try:
         llm_config = load_llm_config()
@@ -351,14 +350,15 @@ async def generate_description_with_llm(
     
     # 导入图片编码和多模态消息构建函数
     import sys
+    server_dir = os.path.dirname(os.path.dirname(__file__))
     if server_dir not in sys.path:
         sys.path.insert(0, server_dir)
     
     from utils.query_llm import _encode_image_to_base64, prepare_multimodal_messages_openai_format
     
-    # 编码图片
+    # 编码图片（结果按文件缓存；读取和编码在线程中执行，避免阻塞事件循环）
     try:
-        base64_image = _encode_image_to_base64(image_path)
+        base64_image = await asyncio.to_thread(_encode_image_to_base64, image_path)
     except Exception as e:
         raise Exception(f"图片编码失败: {str(e)}")
     
@@ -385,7 +385,7 @@ async def generate_description_with_llm(
     
     # 调用 OpenRouter API
     try:
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        url = get_settings().upstreams.openrouter_url("chat/completions")
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {llm_config['api_key']}",
@@ -400,7 +400,7 @@ async def generate_description_with_llm(
             "temperature": 0.7
         }
         
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = upstream_session.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         
         data = resp.json()
@@ -499,25 +499,22 @@ async def generate_style_description_with_llm(
         Exception: LLM 调用失败时抛出异常
     """
     # 检查图片文件是否存在
-    if not os.path.exists(image_path):
+    if not await fetch_async(image_path):
         raise FileNotFoundError(f"图片文件不存在: {image_path}")
     
-    # 加载提示词模板
-    server_dir = os.path.dirname(os.path.dirname(__file__))
-    prompt_path = os.path.join(server_dir, "prompts", "generation", "image_to_style_description.txt")
+    # 优先使用入库时生成的紧凑版本
+    image_path = await compact_reference(image_path)
     
+    # 渲染提示词模板
+    user_desc_text = user_description if user_description else ""
     try:
-        template = load_prompt_template(prompt_path)
+        system_prompt = render_prompt(
+            "generation/image_to_style_description",
+            user_description=user_desc_text
+        ).strip()
     except FileNotFoundError as e:
         raise Exception(f"无法加载提示词模板: {str(e)}")
     
-    # 替换模板中的变量
-    user_desc_text = user_description if user_description else ""
-    system_prompt = replace_prompt_variables(
-        template,
-        user_description=user_desc_text
-    ).strip()
-    
     # 加载 LLM 配置
     try:
         llm_config = load_llm_config()
@@ -526,14 +523,15 @@ async def generate_style_description_with_llm(
     
     # 导入图片编码和多模态消息构建函数
     import sys
+    server_dir = os.path.dirname(os.path.dirname(__file__))
     if server_dir not in sys.path:
         sys.path.insert(0, server_dir)
     
     from utils.query_llm import _encode_image_to_base64, prepare_multimodal_messages_openai_format
     
-    # 编码图片
+    # 编码图片（结果按文件缓存；读取和编码在线程中执行，避免阻塞事件循环）
     try:
-        base64_image = _encode_image_to_base64(image_path)
+        base64_image = await asyncio.to_thread(_encode_image_to_base64, image_path)
     except Exception as e:
         raise Exception(f"图片编码失败: {str(e)}")
     
@@ -560,7 +558,7 @@ async def generate_style_description_with_llm(
     
     # 调用 OpenRouter API
     try:
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        url = get_settings().upstreams.openrouter_url("chat/completions")
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {llm_config['api_key']}",
@@ -575,7 +573,7 @@ async def generate_style_description_with_llm(
             "temperature": 0.7
         }
         
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = upstream_session.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         
         data = resp.json()
@@ -666,14 +664,7 @@ async def generate_text_to_image(
     Returns:
         dict: 包含 success, output_path, url, error 的字典
     """
-    # 加载配置
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-    
-    api_key = config.get("image_gen", {}).get("wavespeed_api")
-    if not api_key:
-        api_key = config.get("video_gen", {}).get("wavespeed_api")
+    api_key = get_settings().wavespeed_api_key
     
     if not api_key:
         raise Exception("未找到 Wavespeed API 密钥配置")
@@ -716,6 +707,7 @@ async def generate_text_to_image(
         output_url = result.get('url') or result.get('output_path')
         if output_url and output_url.startswith('http'):
             download_image(output_url, image_path)
+        await publish_async(image_path)
         
         # 构建 API 请求信息（根据模型类型）
         api_request = {}
@@ -724,7 +716,7 @@ async def generate_text_to_image(
         if model == "seedream4.5":
             size = calculate_image_size(aspect_ratio, resolution)
             api_request = {
-                "url": "https://api.wavespeed.ai/api/v3/bytedance/seedream-v4.5",
+                "url": get_settings().upstreams.wavespeed_url("bytedance/seedream-v4.5"),
                 "method": "POST",
                 "headers": {
                     "Content-Type": "application/json",
@@ -740,7 +732,7 @@ async def generate_text_to_image(
             from utils.wavespeed_api import calculate_image_size_wan26
             size = calculate_image_size_wan26(aspect_ratio, resolution)
             api_request = {
-                "url": "https://api.wavespeed.ai/api/v3/alibaba/wan-2.6/text-to-image",
+                "url": get_settings().upstreams.wavespeed_url("alibaba/wan-2.6/text-to-image"),
                 "method": "POST",
                 "headers": {
                     "Content-Type": "application/json",
@@ -754,7 +746,7 @@ async def generate_text_to_image(
             }
         elif model == "nanopro":
             api_request = {
-                "url": "https://api.wavespeed.ai/api/v3/google/nano-banana-pro/text-to-image",
+                "url": get_settings().upstreams.wavespeed_url("google/nano-banana-pro/text-to-image"),
                 "method": "POST",
                 "headers": {
                     "Content-Type": "application/json",
@@ -805,14 +797,7 @@ async def generate_image_to_image(
     Returns:
         dict: 包含 success, output_path, url, error 的字典
     """
-    # 加载配置
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-    
-    api_key = config.get("image_gen", {}).get("wavespeed_api")
-    if not api_key:
-        api_key = config.get("video_gen", {}).get("wavespeed_api")
+    api_key = get_settings().wavespeed_api_key
     
     if not api_key:
         raise Exception("未找到 Wavespeed API 密钥配置")
@@ -823,6 +808,7 @@ async def generate_image_to_image(
     image_urls = []
     for idx, img_path in enumerate(image_paths):
         try:
+            img_path = await compact_reference(img_path)
             oss_result = upload_image_to_oss_with_config(local_image_path=img_path)
             if oss_result.get("success"):
                 image_urls.append(oss_result["url"])
@@ -866,6 +852,7 @@ async def generate_image_to_image(
         output_url = result.get('url') or result.get('output_path')
         if output_url and output_url.startswith('http'):
             download_image(output_url, image_path)
+        await publish_async(image_path)
         
         return {
             'success': True,
@@ -1052,7 +1039,12 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             model = input_data.get("model", "seedream4.5")
             aspect_ratio = input_data.get("aspect_ratio", "16:9")
             resolution = input_data.get("resolution", "1k")
-            result = await generate_text_to_image(prompt, model, aspect_ratio, resolution, material_type)
+            # 按路由策略执行，超过截止时间或失败时可提交到等价模型
+            result = await run_with_policy(
+                tool_type, model,
+                lambda route_model: generate_text_to_image(prompt, route_model, aspect_ratio, resolution, material_type),
+                input_data.get("priority"),
+            )
             if not result.get('success'):
                 raise Exception(result.get('error', '图片生成失败'))
             # 立即保存 API 请求信息到任务状态（用于正在处理时查看）
@@ -1077,7 +1069,11 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             if not image_paths:
                 raise ValueError("image_paths 参数必需且不能为空")
             # generate_image_to_image 会在内部将图片上传到 OSS 并获取 URL
-            result = await generate_image_to_image(prompt, image_paths, model, aspect_ratio, resolution)
+            result = await run_with_policy(
+                tool_type, model,
+                lambda route_model: generate_image_to_image(prompt, image_paths, route_model, aspect_ratio, resolution),
+                input_data.get("priority"),
+            )
             if not result.get('success'):
                 raise Exception(result.get('error', '图片生成失败'))
             # 立即保存 API 请求信息到任务状态（用于正在处理时查看）
@@ -1104,14 +1100,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             if not prompt or not image_paths:
                 raise ValueError("prompt 和 image_paths 参数必需")
             
-            # 加载配置
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            api_key = config.get("video_gen", {}).get("wavespeed_api")
-            if not api_key:
-                api_key = config.get("image_gen", {}).get("wavespeed_api")
+            api_key = get_settings().wavespeed_api_key
             
             if not api_key:
                 raise Exception("未找到 Wavespeed API 密钥配置")
@@ -1122,6 +1111,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             image_urls = []
             for idx, img_path in enumerate(image_paths):
                 try:
+                    img_path = await compact_reference(img_path)
                     oss_result = upload_image_to_oss_with_config(local_image_path=img_path)
                     if oss_result.get("success"):
                         image_urls.append(oss_result["url"])
@@ -1132,14 +1122,19 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                     logger.error(f"上传图片到 OSS 失败: {str(e)}")
                     raise Exception(f"上传图片到 OSS 失败: {str(e)}")
             
-            # 调用 vidu API
-            result = vidu_reference_to_video_q2(
-                api_key=api_key,
-                prompt=prompt,
-                image_urls=image_urls,
-                aspect_ratio=aspect_ratio,
-                resolution=resolution,
-                duration=duration
+            # 调用 vidu API（按路由策略执行，vidu 只有一个模型，对冲即重新提交一次）
+            result = await run_with_policy(
+                tool_type, "default",
+                lambda route_model: asyncio.to_thread(
+                    vidu_reference_to_video_q2,
+                    api_key=api_key,
+                    prompt=prompt,
+                    image_urls=image_urls,
+                    aspect_ratio=aspect_ratio,
+                    resolution=resolution,
+                    duration=duration
+                ),
+                input_data.get("priority"),
             )
             
             if not result.get('success'):
@@ -1158,6 +1153,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                 # 下载视频
                 download_result = download_video(output_url, video_path)
                 if download_result.get('success'):
+                    await publish_async(video_path)
                     video_url = f"/data/tools/outputs/{ToolType.VIDU_REF_IMAGE_TO_VIDEO.value}/{output_id}/video.mp4"
                     logger.info(f"视频下载成功: {output_url} -> {video_url}")
                 else:
@@ -1178,14 +1174,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             if not prompt or not image_path:
                 raise ValueError("prompt 和 image_path 参数必需")
             
-            # 加载配置
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            api_key = config.get("video_gen", {}).get("wavespeed_api")
-            if not api_key:
-                api_key = config.get("image_gen", {}).get("wavespeed_api")
+            api_key = get_settings().wavespeed_api_key
             
             if not api_key:
                 raise Exception("未找到 Wavespeed API 密钥配置")
@@ -1193,6 +1182,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             # 上传图片到 OSS，获取 URL
             from utils.oss_upload import upload_image_to_oss_with_config
             
+            await fetch_async(image_path)
             try:
                 oss_result = upload_image_to_oss_with_config(local_image_path=image_path)
                 if not oss_result.get("success"):
@@ -1203,12 +1193,17 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                 logger.error(f"上传图片到 OSS 失败: {str(e)}")
                 raise Exception(f"上传图片到 OSS 失败: {str(e)}")
             
-            # 调用 sora API
-            result = sora_2_image_to_video(
-                api_key=api_key,
-                prompt=prompt,
-                image_url=image_url,
-                duration=duration
+            # 调用 sora API（按路由策略执行，sora 只有一个模型，对冲即重新提交一次）
+            result = await run_with_policy(
+                tool_type, "default",
+                lambda route_model: asyncio.to_thread(
+                    sora_2_image_to_video,
+                    api_key=api_key,
+                    prompt=prompt,
+                    image_url=image_url,
+                    duration=duration
+                ),
+                input_data.get("priority"),
             )
             
             if not result.get('success'):
@@ -1227,6 +1222,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                 # 下载视频
                 download_result = download_video(output_url, video_path)
                 if download_result.get('success'):
+                    await publish_async(video_path)
                     video_url = f"/data/tools/outputs/{ToolType.SORA_IMAGE_TO_VIDEO.value}/{output_id}/video.mp4"
                     logger.info(f"视频下载成功: {output_url} -> {video_url}")
                 else:
@@ -1250,14 +1246,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             if not prompt or not image_path:
                 raise ValueError("prompt 和 image_path 参数必需")
             
-            # 加载配置
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml")
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            api_key = config.get("video_gen", {}).get("wavespeed_api")
-            if not api_key:
-                api_key = config.get("image_gen", {}).get("wavespeed_api")
+            api_key = get_settings().wavespeed_api_key
             
             if not api_key:
                 raise Exception("未找到 Wavespeed API 密钥配置")
@@ -1265,6 +1254,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
             # 上传图片到 OSS，获取 URL
             from utils.oss_upload import upload_image_to_oss_with_config
             
+            await fetch_async(image_path)
             try:
                 oss_result = upload_image_to_oss_with_config(local_image_path=image_path)
                 if not oss_result.get("success"):
@@ -1276,18 +1266,19 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                 raise Exception(f"上传图片到 OSS 失败: {str(e)}")
             
             # 根据模型版本调用不同的 API
-            if model == "wan2.5":
-                result = wan_2_5_image_to_video(
-                    api_key=api_key,
-                    prompt=prompt,
-                    image_url=image_url,
-                    resolution=resolution,
-                    duration=duration,
-                    enable_prompt_expansion=False
-                )
-            else:  # wan2.6
+            def generate_wan(route_model):
+                if route_model == "wan2.5":
+                    return wan_2_5_image_to_video(
+                        api_key=api_key,
+                        prompt=prompt,
+                        image_url=image_url,
+                        resolution=resolution,
+                        duration=duration,
+                        enable_prompt_expansion=False
+                    )
+                # wan2.6
                 shot_type = input_data.get("shot_type", "single")
-                result = wan_2_6_image_to_video(
+                return wan_2_6_image_to_video(
                     api_key=api_key,
                     prompt=prompt,
                     image_url=image_url,
@@ -1297,6 +1288,13 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                     enable_audio=enable_audio
                 )
             
+            # 按路由策略执行（例如 wan2.6 超过截止时间时提交到 wan2.5）
+            result = await run_with_policy(
+                tool_type, model,
+                lambda route_model: asyncio.to_thread(generate_wan, route_model),
+                input_data.get("priority"),
+            )
+            
             if not result.get('success'):
                 raise Exception(result.get('error', '视频生成失败'))
             
@@ -1313,6 +1311,7 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
                 # 下载视频
                 download_result = download_video(output_url, video_path)
                 if download_result.get('success'):
+                    await publish_async(video_path)
                     video_url = f"/data/tools/outputs/{ToolType.WAN_IMAGE_TO_VIDEO.value}/{output_id}/video.mp4"
                     logger.info(f"视频下载成功: {output_url} -> {video_url}")
                 else:
@@ -1346,8 +1345,147 @@ async def execute_task(task_id: str, tool_type: str, input_data: Dict[str, Any])
         update_task_status(task_id, TaskStatus.FAILED, error=str(e))
 
 
+# 可以从已提交的 prediction 直接取回结果的工具类型 -> 输出文件名
+RESUMABLE_OUTPUTS = {
+    ToolType.TEXT_TO_IMAGE.value: "image.jpg",
+    ToolType.IMAGE_TO_IMAGE.value: "image.jpg",
+    ToolType.VIDU_REF_IMAGE_TO_VIDEO.value: "video.mp4",
+    ToolType.SORA_IMAGE_TO_VIDEO.value: "video.mp4",
+    ToolType.WAN_IMAGE_TO_VIDEO.value: "video.mp4",
+}
+
+
+async def resume_task(task: Dict[str, Any]):
+    """
+    接手已提交上游 prediction 的任务：轮询该 prediction 并下载结果，不重新提交生成请求
+    """
+    task_id = task["task_id"]
+    tool_type = task["tool_type"]
+    prediction = task["predictions"][-1]
+    logger.info(f"任务 {task_id} 恢复轮询 prediction {prediction['id']}")
+    try:
+        data = await asyncio.to_thread(wait_for_prediction, prediction, get_settings().wavespeed_api_key)
+        output_url = data["outputs"][0]
+        filename = RESUMABLE_OUTPUTS[tool_type]
+        output_dir = get_output_path(tool_type, task_id)
+        ensure_dir(output_dir)
+        local_path = os.path.join(output_dir, filename)
+        local_url = f"/data/tools/outputs/{tool_type}/{task_id}/{filename}"
+
+        if filename == "image.jpg":
+            await asyncio.to_thread(download_image, output_url, local_path)
+            await publish_async(local_path)
+            output = {
+                "image_path": local_path,
+                "url": local_url,
+                "prompt": {"user_message": task["input"].get("prompt", "")},
+                "api_request": task.get("api_request", {}),
+                "api_response": data
+            }
+        else:
+            video_url = output_url
+            download_result = await asyncio.to_thread(download_video, output_url, local_path)
+            if download_result.get('success'):
+                await publish_async(local_path)
+                video_url = local_url
+            else:
+                logger.warning(f"视频下载失败，使用原始URL: {output_url}, 错误: {download_result.get('error')}")
+            output = {
+                "video_url": video_url,
+                "api_request": task.get("api_request", {}),
+                "api_response": data
+            }
+
+        update_task_status(task_id, TaskStatus.SUCCESS, output=output)
+        create_history_record(task_id, tool_type, task["input"], output)
+    except Exception as e:
+        update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+
+
+async def run_task_job(job: Dict[str, Any]):
+    """执行队列中的任务消息"""
+    task_id = job["task_id"]
+    task = get_task(task_id)
+    if task is None or task.get("status") != TaskStatus.PENDING.value:
+        # 任务已结束（例如重复投递），不再执行
+        return
+    resume = bool(task.get("predictions")) and job["tool_type"] in RESUMABLE_OUTPUTS
+    attributes = {
+        "task.id": task_id,
+        "tool_type": job["tool_type"],
+        "model": job["input"].get("model") or "default",
+        "task.attempt": job.get("attempts", 1),
+    }
+    # 与 create_tool_task 属于同一条 trace（任务记录中的 traceparent）
+    with track_task(job["tool_type"], job["input"].get("model")) as timer, \
+            start_span("resume_task" if resume else "execute_task", attributes, parent=task.get("traceparent")):
+        # 记录执行阶段，/api/tasks/{task_id}/status 据此估算进度和剩余时间
+        await asyncio.to_thread(set_task_phase, task_id, "preparing")
+        timer.on_upstream_stage = lambda stage: set_task_phase(task_id, UPSTREAM_PHASES[stage])
+        if resume:
+            await resume_task(task)
+        else:
+            with track_predictions(functools.partial(add_task_prediction, task_id)):
+                await execute_task(task_id, job["tool_type"], job["input"])
+    await asyncio.to_thread(record_usage, task_id, timer, resume)
+
+
+def record_usage(task_id: str, timer, resumed: bool):
+    """任务结束后写入用量台账（任务仍为 pending，例如交回队列时不记录）"""
+    task = get_task(task_id)
+    if task is None or task.get("status") == TaskStatus.PENDING.value:
+        return
+    record_task_usage(task, timer, get_output_path(task["tool_type"], task_id), resumed)
+
+
+async def abandon_task_job(job: Dict[str, Any]):
+    """任务多次因执行进程退出而中断，标记为失败"""
+    try:
+        update_task_status(job["task_id"], TaskStatus.FAILED, error="任务执行中断次数过多，已放弃")
+    except HTTPException:
+        pass
+
+
+def create_task_worker(concurrency: int) -> TaskWorker:
+    """创建从任务队列领取并执行工具任务的消费者"""
+    task_settings = get_settings().tasks
+    return TaskWorker(
+        get_task_broker(),
+        run_task_job,
+        concurrency=concurrency,
+        max_attempts=task_settings.max_attempts,
+        on_abandoned=abandon_task_job,
+        on_heartbeat=heartbeat_task,
+        on_interrupted=lambda job: mark_task_interrupted(job["task_id"]),
+    )
+
+
+async def reconcile_tasks(stale_seconds: float) -> int:
+    """
+    把中断的任务（所属进程已退出、被标记为中断或心跳超时）重新放入队列
+
+    只用于进程内队列：sqlite / redis 队列中的任务由租约过期机制重新投递。
+
+    Returns:
+        int: 重新放入队列的任务数
+    """
+    # 仍在本进程队列中等待的任务并未中断：刷新心跳，避免排队超过 stale_seconds 后被当作中断任务
+    for task_id in get_task_broker().queued():
+        await asyncio.to_thread(heartbeat_task, task_id)
+    orphaned = await asyncio.to_thread(list_orphaned_tasks, stale_seconds)
+    count = 0
+    for task in orphaned:
+        if not await asyncio.to_thread(claim_orphaned_task, task):
+            continue
+        await submit_job(make_job(task["task_id"], task["tool_type"], task["input"]))
+        count += 1
+        logger.info(f"接手中断的任务: {task['task_id']} ({task['tool_type']})")
+    return count
+
+
 # 工具创建接口
 @router.post("/{tool_type}/create")
+@traced("create_tool_task", kind="SERVER")
 async def create_tool_task(
     tool_type: str,
     description: Optional[str] = Form(None),
@@ -1360,6 +1498,7 @@ async def create_tool_task(
     model: Optional[str] = Form(None),
     duration: Optional[str] = Form(None),
     enable_audio: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None),
     expected_duration: Optional[str] = Form(None),
     shot_duration: Optional[str] = Form(None),
     character_materials: Optional[str] = Form(None),
@@ -1473,8 +1612,7 @@ async def create_tool_task(
         output_dir = get_output_path("uploads", output_id)
         ensure_dir(output_dir)
         image_path = os.path.join(output_dir, image.filename or "image.jpg")
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
+        await save_upload_image(image, image_path)
         input_data = {
             "image_path": image_path,
             "material_type": material_type,
@@ -1489,8 +1627,7 @@ async def create_tool_task(
         output_dir = get_output_path("uploads", output_id)
         ensure_dir(output_dir)
         image_path = os.path.join(output_dir, image.filename or "image.jpg")
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
+        await save_upload_image(image, image_path)
         input_data = {
             "image_path": image_path,
             "description": description  # 可选的用户描述
@@ -1520,8 +1657,7 @@ async def create_tool_task(
         ensure_dir(output_dir)
         for idx, img in enumerate(images):
             img_path = os.path.join(output_dir, f"image_{idx}.jpg")
-            with open(img_path, "wb") as f:
-                shutil.copyfileobj(img.file, f)
+            await save_upload_image(img, img_path)
             image_paths.append(img_path)
         input_data = {
             "prompt": prompt,
@@ -1549,8 +1685,7 @@ async def create_tool_task(
         ensure_dir(output_dir)
         for idx, img in enumerate(images):
             img_path = os.path.join(output_dir, f"image_{idx}.jpg")
-            with open(img_path, "wb") as f:
-                shutil.copyfileobj(img.file, f)
+            await save_upload_image(img, img_path)
             image_paths.append(img_path)
         input_data = {
             "image_paths": image_paths,
@@ -1573,8 +1708,7 @@ async def create_tool_task(
         output_dir = get_output_path("uploads", output_id)
         ensure_dir(output_dir)
         image_path = os.path.join(output_dir, image.filename or "image.jpg")
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
+        await save_upload_image(image, image_path)
         input_data = {
             "image_path": image_path,
             "prompt": prompt,
@@ -1594,8 +1728,7 @@ async def create_tool_task(
         output_dir = get_output_path("uploads", output_id)
         ensure_dir(output_dir)
         image_path = os.path.join(output_dir, image.filename or "image.jpg")
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
+        await save_upload_image(image, image_path)
         # 处理 enable_audio 参数（从 form 中获取，可能是字符串 "true"/"false"）
         enable_audio = False
         if "enable_audio" in locals() or "enable_audio" in globals():
@@ -1620,10 +1753,8 @@ async def create_tool_task(
         ensure_dir(output_dir)
         start_path = os.path.join(output_dir, "start_frame.jpg")
         end_path = os.path.join(output_dir, "end_frame.jpg")
-        with open(start_path, "wb") as f:
-            shutil.copyfileobj(start_frame.file, f)
-        with open(end_path, "wb") as f:
-            shutil.copyfileobj(end_frame.file, f)
+        await save_upload_image(start_frame, start_path)
+        await save_upload_image(end_frame, end_path)
         input_data = {
             "start_frame": start_path,
             "end_frame": end_path,
@@ -1637,11 +1768,22 @@ async def create_tool_task(
             raise HTTPException(status_code=400, detail="text 和 duration 参数必需")
         input_data = {"text": text, "duration": duration}
     
-    # 创建任务
+    # 任务优先级，选择模型路由策略（config.yaml 的 routing 段）
+    if priority:
+        input_data["priority"] = priority
+    
+    # 创建任务（任务记录保存当前 trace）
     task_id = create_task(tool_type, input_data)
+    span = current_span()
+    span.set_attribute("tool_type", tool_type)
+    span.set_attribute("task.id", task_id)
     
-    # 异步执行任务
-    asyncio.create_task(execute_task(task_id, tool_type, input_data))
+    # 放入任务队列，由 API 进程内或独立 worker 进程中的消费者执行
+    try:
+        await submit_job(make_job(task_id, tool_type, input_data))
+    except BrokerError as e:
+        update_task_status(task_id, TaskStatus.FAILED, error=str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     
     return {"task_id": task_id, "status": "pending"}
 
@@ -1655,12 +1797,13 @@ async def list_history(
 ):
     """获取历史记录列表"""
     history_dir = get_data_path("tools", "history")
-    if not os.path.exists(history_dir):
+    _, filenames = list_entries(history_dir)
+    if not filenames:
         return {"records": [], "total": 0, "page": page, "limit": limit}
     
     # 读取所有历史记录
     records = []
-    for filename in os.listdir(history_dir):
+    for filename in filenames:
         if filename.endswith(".json"):
             record_path = os.path.join(history_dir, filename)
             record = load_json(record_path)
@@ -1701,11 +1844,11 @@ async def get_history_detail(record_id: str):
 async def delete_history(record_id: str):
     """删除历史记录"""
     record_path = get_history_path(record_id)
-    if not os.path.exists(record_path):
+    if not path_exists(record_path):
         raise HTTPException(status_code=404, detail="历史记录不存在")
     
     # 删除记录文件
-    os.remove(record_path)
+    remove(record_path)
     
     return {"message": "删除成功"}
 
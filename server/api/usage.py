@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+用量统计 API
+按模型和时间窗口查询生成任务的耗时分位数、吞吐量和估算费用（数据来自 utils.usage 台账）
+"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+import time
+from datetime import datetime
+
+from utils.usage import parse_window, read_entries, summarize_models, timeseries
+
+router = APIRouter()
+
+# 时间序列最多返回的桶数
+MAX_BUCKETS = 500
+
+
+def _window(value: str) -> float:
+    try:
+        return parse_window(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/models")
+async def list_model_usage(
+    window: str = "24h",
+    tool_type: Optional[str] = None,
+    provider: Optional[str] = None,
+):
+    """模型排行：时间窗口内各模型的任务数、成功率、吞吐量、耗时 p50 / p95（按 p50 从快到慢）和费用"""
+    seconds = _window(window)
+    until = time.time()
+    since = until - seconds
+    entries = await asyncio.to_thread(read_entries, since, until)
+    return {
+        "window": window,
+        "since": datetime.fromtimestamp(since).isoformat(timespec="seconds"),
+        "until": datetime.fromtimestamp(until).isoformat(timespec="seconds"),
+        "models": summarize_models(entries, seconds, tool_type=tool_type, provider=provider),
+    }
+
+
+@router.get("/timeseries")
+async def get_usage_timeseries(
+    window: str = "24h",
+    bucket: str = "1h",
+    model: Optional[str] = None,
+    tool_type: Optional[str] = None,
+    provider: Optional[str] = None,
+):
+    """按时间分桶的任务数、吞吐量和耗时 p50 / p95，用于发现上游变慢"""
+    seconds = _window(window)
+    bucket_seconds = _window(bucket)
+    if seconds / bucket_seconds > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"分桶过多（最多 {MAX_BUCKETS} 个），请增大 bucket")
+    until = time.time()
+    since = until - seconds
+    entries = await asyncio.to_thread(read_entries, since, until)
+    return {
+        "window": window,
+        "bucket": bucket,
+        "series": timeseries(entries, since, until, bucket_seconds, model=model, tool_type=tool_type, provider=provider),
+    }
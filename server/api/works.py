@@ -13,6 +13,7 @@ from utils import (
     get_data_path, load_json, save_json, generate_id,
     list_dirs, delete_dir, ensure_dir
 )
+from utils.storage import path_exists, publish_async
 
 router = APIRouter()
 
@@ -150,6 +151,7 @@ async def update_work(
         cover_path = os.path.join(covers_dir, cover_filename)
         with open(cover_path, "wb") as f:
             shutil.copyfileobj(cover_images.file, f)
+        await publish_async(cover_path)
         cover_paths.append(f"covers/{cover_filename}")
         meta["cover_images"] = cover_paths
     
@@ -164,7 +166,7 @@ async def delete_work(work_id: str):
     """删除作品"""
     work_path = get_work_path(work_id)
     
-    if not os.path.exists(work_path):
+    if not path_exists(work_path):
         raise HTTPException(status_code=404, detail="Work not found")
     
     delete_dir(work_path)
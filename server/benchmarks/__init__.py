@@ -0,0 +1,11 @@
+"""
+性能基准测试
+
+- run.py：负载与吞吐量测试，按场景以指定并发请求 API（上游使用 scripts/mock_upstream.py 模拟服务）
+- scenarios.py：压测场景
+- dataset.py：合成大规模数据目录（作品、分镜及 video_history、历史记录、任务、占位媒体）
+- micro.py：数据规模微基准，逐步扩大数据规模并直接调用存储密集的接口函数计时
+- stats.py：延迟分位数统计和结果文件比较
+
+结果保存为 JSON（默认 benchmarks/results/），可用 python -m benchmarks.run --compare 比较两次提交的结果。
+"""
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+大规模测试数据生成
+
+向指定的数据目录（对应 COMICMAKER_DATA_ROOT）写入与线上格式一致的数据：
+- works/<id>/meta.json（含封面占位图）
+- works/<id>/episodes/<id>/meta.json、storyboard.json（分镜含 video_history 和占位视频）
+- tools/history/<id>.json、tools/outputs/<tool_type>/<id>/ 占位输出
+- tools/tasks/<id>.json（已结束的任务）
+
+大部分剧集分镜数量较少，另有若干个"大剧集"包含数百个分镜，用于暴露分镜读写随规模增长的问题。
+生成是增量的：目录中已有的数据会被计入，只补齐到目标数量，因此可以在同一目录上逐步扩大规模。
+
+用法（在 server 目录下）：
+    python -m benchmarks.dataset --root /tmp/comicmaker-data --preset medium
+    python -m benchmarks.run --data-root /tmp/comicmaker-data   # 在生成的数据上做负载测试
+"""
+
+import argparse
+import json
+import os
+import random
+import uuid
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from scripts.mock_upstream import generate_mp4, generate_png
+
+MANIFEST_NAME = "dataset.json"
+TOOL_TYPES = ["text_to_image", "image_to_image", "generate_script", "wan_image_to_video", "sora_image_to_video"]
+VIDEO_TOOL_TYPES = {"wan_image_to_video", "sora_image_to_video"}
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """
+    数据规模
+
+    Attributes:
+        works: 作品数
+        episodes_per_work: 每个作品的剧集数
+        shots_per_episode: 普通剧集的分镜数
+        large_episodes: 大剧集数（分布在前几个作品中）
+        large_episode_shots: 大剧集的分镜数
+        videos_per_shot: 每个分镜的历史视频数
+        history: 工具历史记录数
+        tasks: 任务记录数
+        media: 是否写入占位媒体文件
+    """
+    works: int = 200
+    episodes_per_work: int = 2
+    shots_per_episode: int = 12
+    large_episodes: int = 2
+    large_episode_shots: int = 200
+    videos_per_shot: int = 2
+    history: int = 2000
+    tasks: int = 2000
+    media: bool = True
+
+    def scaled(self, factor: float) -> "DatasetSpec":
+        """按比例放大（作品、历史、任务数量和大剧集分镜数）"""
+        return replace(
+            self,
+            works=int(self.works * factor),
+            history=int(self.history * factor),
+            tasks=int(self.tasks * factor),
+            large_episode_shots=int(self.large_episode_shots * factor),
+        )
+
+
+PRESETS: Dict[str, DatasetSpec] = {
+    "small": DatasetSpec(),
+    "medium": DatasetSpec(works=1000, episodes_per_work=3, shots_per_episode=16, large_episodes=5,
+                          large_episode_shots=400, history=10000, tasks=10000),
+    "large": DatasetSpec(works=3000, episodes_per_work=3, shots_per_episode=20, large_episodes=10,
+                         large_episode_shots=800, history=40000, tasks=40000),
+}
+
+
+def _write_json(path: str, data: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _write_bytes(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _count_entries(path: str, suffix: str = "") -> int:
+    try:
+        return sum(1 for name in os.listdir(path) if name.endswith(suffix))
+    except FileNotFoundError:
+        return 0
+
+
+class DatasetGenerator:
+    """在 root 下生成数据"""
+
+    def __init__(self, root: str, seed: int = 1):
+        self.root = root
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.now = datetime.now()
+        self._image = generate_png(64, 36, (90, 120, 160))
+        self._video: Optional[bytes] = None
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self, max_days: int = 90) -> str:
+        return (self.now - timedelta(seconds=self.rng.uniform(0, max_days * 86400))).isoformat()
+
+    @property
+    def video(self) -> bytes:
+        if self._video is None:
+            self._video = generate_mp4(64, 36, 0.5)
+        return self._video
+
+    # ==================== 作品 / 剧集 / 分镜 ====================
+
+    def storyboard(self, work_id: str, episode_id: str, shot_count: int, spec: DatasetSpec) -> Dict[str, Any]:
+        text_lines = ["剧本关联素材：少年，橘猫，灯塔"]
+        shots = []
+        for order in range(1, shot_count + 1):
+            description = f"少年在雨夜的街道上追逐橘猫，镜头{order}从低角度跟随，霓虹灯倒映在水洼中"
+            text_lines += [f"分镜{order}: {description}", "关联素材: 少年，橘猫", "时长: 5"]
+            shot_id = self.new_id()
+            history = []
+            for index in range(spec.videos_per_shot):
+                filename = f"reference_video_{order:04d}_{index}.mp4"
+                video_url = f"/data/works/{work_id}/episodes/{episode_id}/shots/{shot_id}/videos/{filename}"
+                history.append({"video_path": video_url, "generated_at": self.timestamp()})
+                if spec.media:
+                    _write_bytes(self.path("works", work_id, "episodes", episode_id, "shots", shot_id, "videos", filename),
+                                 self.video)
+            shots.append({
+                "id": shot_id,
+                "order": order,
+                "description": description,
+                "related_materials": ["少年", "橘猫"],
+                "duration": 5,
+                "image_prompt": f"电影感，雨夜，霓虹，少年与橘猫，镜头{order}",
+                "video_prompt": f"镜头缓慢推进，少年奔跑，橘猫跃过水洼，镜头{order}",
+                "audio_prompt": "雨声，远处的汽车鸣笛",
+                "reference_video_prompt": "",
+                "dialogue_prompt": "",
+                "current_video": history[-1]["video_path"] if history else None,
+                "video_history": history,
+            })
+        return {"text": "\n".join(text_lines), "confirmed": True, "related_materials": ["少年", "橘猫", "灯塔"],
+                "shots": shots}
+
+    def work(self, index: int, spec: DatasetSpec, large_episodes: int) -> Dict[str, Any]:
+        work_id = self.new_id()
+        cover_images = []
+        if spec.media:
+            _write_bytes(self.path("works", work_id, "covers", "cover_0_cover.png"), self._image)
+            cover_images.append("covers/cover_0_cover.png")
+        _write_json(self.path("works", work_id, "meta.json"), {
+            "name": f"压测作品 {index}",
+            "description": "由 benchmarks.dataset 生成的作品，用于规模测试",
+            "cover_images": cover_images,
+            "style_description": "赛博朋克，雨夜，电影感光影",
+            "default_aspect_ratio": "16:9",
+            "character_materials": [],
+            "scene_materials": [],
+            "prop_materials": [],
+        })
+        episodes = []
+        for episode_index in range(spec.episodes_per_work):
+            episode_id = self.new_id()
+            large = episode_index < large_episodes
+            shot_count = spec.large_episode_shots if large else spec.shots_per_episode
+            _write_json(self.path("works", work_id, "episodes", episode_id, "meta.json"), {
+                "name": f"第 {episode_index + 1} 集",
+                "description": "雨夜追猫",
+                "cover_image": None,
+            })
+            _write_json(self.path("works", work_id, "episodes", episode_id, "storyboard.json"),
+                        self.storyboard(work_id, episode_id, shot_count, spec))
+            episodes.append({"work_id": work_id, "episode_id": episode_id, "shots": shot_count, "large": large})
+        return {"work_id": work_id, "episodes": episodes}
+
+    # ==================== 历史记录 / 任务 ====================
+
+    def history_record(self, spec: DatasetSpec) -> str:
+        tool_type = self.rng.choice(TOOL_TYPES)
+        record_id, task_id, output_id = self.new_id(), self.new_id(), self.new_id()
+        created_at = self.timestamp()
+        prompt = "一只在雨夜霓虹街道上奔跑的橘猫，电影感光影"
+        if tool_type == "generate_script":
+            output = {"text": "第一幕：雨夜。\n少年在街角发现一只会说话的橘猫……" * 5,
+                      "prompt": {"user_message": prompt}}
+        elif tool_type in VIDEO_TOOL_TYPES:
+            output = {"video_url": f"/data/tools/outputs/{tool_type}/{output_id}/video.mp4",
+                      "api_request": {"payload": {"prompt": prompt, "duration": 5}}, "api_response": {}}
+            if spec.media:
+                _write_bytes(self.path("tools", "outputs", tool_type, output_id, "video.mp4"), self.video)
+        else:
+            image_path = self.path("tools", "outputs", tool_type, output_id, "image.jpg")
+            output = {"image_path": image_path, "url": f"/data/tools/outputs/{tool_type}/{output_id}/image.jpg",
+                      "prompt": {"user_message": prompt},
+                      "api_request": {"payload": {"prompt": prompt, "size": "1280*720"}}, "api_response": {}}
+            if spec.media:
+                _write_bytes(image_path, self._image)
+        _write_json(self.path("tools", "history", f"{record_id}.json"), {
+            "record_id": record_id,
+            "task_id": task_id,
+            "tool_type": tool_type,
+            "input": {"prompt": prompt, "model": "seedream4.5"},
+            "output": output,
+            "created_at": created_at,
+        })
+        return record_id
+
+    def task(self) -> str:
+        task_id = self.new_id()
+        created_at = self.timestamp()
+        failed = self.rng.random() < 0.05
+        _write_json(self.path("tools", "tasks", f"{task_id}.json"), {
+            "task_id": task_id,
+            "tool_type": self.rng.choice(TOOL_TYPES),
+            "status": "failed" if failed else "success",
+            "input": {"prompt": "一只在雨夜霓虹街道上奔跑的橘猫"},
+            "output": None if failed else {"url": f"/data/tools/outputs/text_to_image/{task_id}/image.jpg"},
+            "error": "Task failed: upstream error" if failed else None,
+            "progress": 100,
+            "owner": {"host": "benchmark", "pid": 0},
+            "predictions": [],
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        return task_id
+
+    # ==================== 生成 ====================
+
+    def generate(self, spec: DatasetSpec) -> Dict[str, Any]:
+        """
+        补齐到 spec 指定的规模
+
+        Returns:
+            清单（各类数据数量和大剧集列表），同时写入 root/dataset.json
+        """
+        manifest = self.manifest()
+        existing_works = _count_entries(self.path("works"))
+        existing_history = _count_entries(self.path("tools", "history"), ".json")
+        existing_tasks = _count_entries(self.path("tools", "tasks"), ".json")
+        # 按已有数量重新设定随机种子：结果可复现，增量生成时也不会与已有 ID 重复
+        self.rng.seed(f"{self.seed}-{existing_works}-{existing_history}-{existing_tasks}")
+        large_remaining = max(0, spec.large_episodes - len(manifest["large_episodes"]))
+        for index in range(existing_works, spec.works):
+            per_work = min(large_remaining, spec.episodes_per_work)
+            work = self.work(index, spec, per_work)
+            large_remaining -= per_work
+            manifest["large_episodes"] += [episode for episode in work["episodes"] if episode["large"]]
+            manifest["episodes"] += len(work["episodes"])
+        for _ in range(existing_history, spec.history):
+            self.history_record(spec)
+        for _ in range(existing_tasks, spec.tasks):
+            self.task()
+
+        manifest.update(
+            works=max(existing_works, spec.works),
+            history=max(_count_entries(self.path("tools", "history"), ".json"), spec.history),
+            tasks=max(_count_entries(self.path("tools", "tasks"), ".json"), spec.tasks),
+            spec=asdict(spec),
+            generated_at=datetime.now().isoformat(),
+        )
+        _write_json(self.path(MANIFEST_NAME), manifest)
+        return manifest
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.path(MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"works": 0, "episodes": 0, "history": 0, "tasks": 0, "large_episodes": []}
+
+    def add_episode(self, shot_count: int, spec: DatasetSpec, work_id: Optional[str] = None) -> Dict[str, Any]:
+        """新建一个指定分镜数的剧集（不计入清单），用于分镜读写基准"""
+        if work_id is None:
+            work_id = self.work(0, replace(spec, episodes_per_work=0), 0)["work_id"]
+        episode_id = self.new_id()
+        _write_json(self.path("works", work_id, "episodes", episode_id, "meta.json"),
+                    {"name": "基准剧集", "description": "", "cover_image": None})
+        _write_json(self.path("works", work_id, "episodes", episode_id, "storyboard.json"),
+                    self.storyboard(work_id, episode_id, shot_count, spec))
+        return {"work_id": work_id, "episode_id": episode_id, "shots": shot_count}
+
+
+def generate_dataset(root: str, spec: DatasetSpec, seed: int = 1) -> Dict[str, Any]:
+    return DatasetGenerator(root, seed).generate(spec)
+
+
+def _spec_from_args(args) -> DatasetSpec:
+    spec = PRESETS[args.preset]
+    overrides = {
+        name: getattr(args, name)
+        for name in ("works", "episodes_per_work", "shots_per_episode", "large_episodes",
+                     "large_episode_shots", "videos_per_shot", "history", "tasks")
+        if getattr(args, name) is not None
+    }
+    if args.no_media:
+        overrides["media"] = False
+    return replace(spec, **overrides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大规模测试数据生成")
+    parser.add_argument("--root", required=True, help="数据目录（作为 COMICMAKER_DATA_ROOT 使用）")
+    parser.add_argument("--preset", choices=list(PRESETS), default="small")
+    parser.add_argument("--works", type=int)
+    parser.add_argument("--episodes-per-work", type=int)
+    parser.add_argument("--shots-per-episode", type=int)
+    parser.add_argument("--large-episodes", type=int)
+    parser.add_argument("--large-episode-shots", type=int)
+    parser.add_argument("--videos-per-shot", type=int)
+    parser.add_argument("--history", type=int)
+    parser.add_argument("--tasks", type=int)
+    parser.add_argument("--no-media", action="store_true", help="不写入占位媒体文件")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    spec = _spec_from_args(args)
+    manifest = generate_dataset(args.root, spec, args.seed)
+    print(f"已生成: 作品 {manifest['works']}，剧集 {manifest['episodes']}，"
+          f"大剧集 {len(manifest['large_episodes'])}，历史记录 {manifest['history']}，任务 {manifest['tasks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+数据规模微基准
+
+在同一个数据目录中按倍数逐步扩大数据规模（benchmarks.dataset），每一步直接调用接口函数（不经过 HTTP）计时：
+- list_works：作品列表
+- list_history / list_history_filtered：历史记录第一页（不筛选 / 按工具类型筛选）
+- get_storyboard / update_shot：读取分镜、修改单个分镜（剧集分镜数随规模增长，分镜含 video_history）
+- confirm_storyboard：解析分镜脚本并重建分镜
+
+用法（在 server 目录下）：
+    python -m benchmarks.micro                                  # small 规模的 0.5、1、2、4 倍
+    python -m benchmarks.micro --preset medium --steps 0.25,0.5,1 --repeat 50
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import random
+import shutil
+import tempfile
+import time
+from dataclasses import replace
+from typing import Any, Dict, List
+
+import yaml
+
+from benchmarks.dataset import PRESETS, DatasetGenerator
+from benchmarks.stats import Recorder, git_revision, save_result
+
+BENCHMARKS = ["list_works", "list_history", "list_history_filtered", "get_storyboard", "update_shot", "confirm_storyboard"]
+
+
+async def call_endpoint(endpoint, *args, **kwargs):
+    """直接调用路由函数：未传入的 Form / Query 参数按 None 处理（与请求中缺省该字段一致）"""
+    for name, parameter in inspect.signature(endpoint).parameters.items():
+        if name not in kwargs and parameter.default is not inspect.Parameter.empty \
+                and type(parameter.default).__module__.startswith(("fastapi", "pydantic")):
+            kwargs[name] = None
+    return await endpoint(*args, **kwargs)
+
+
+async def _measure(recorder: Recorder, name: str, repeat: int, run):
+    await run()  # 预热（首次导入、缓存）
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        recorder.record(name, time.perf_counter() - start)
+
+
+async def run_step(generator: DatasetGenerator, spec, repeat: int, rng: random.Random) -> Dict[str, Any]:
+    from api import content, episodes, tools, works
+
+    manifest = generator.generate(spec)
+    # 分镜基准使用新建的剧集，分镜数为本步骤的大剧集分镜数
+    edit_episode = generator.add_episode(spec.large_episode_shots, spec)
+    confirm_episode = generator.add_episode(spec.large_episode_shots, spec, work_id=edit_episode["work_id"])
+    work_id = edit_episode["work_id"]
+    storyboard = await episodes.get_storyboard(work_id, edit_episode["episode_id"])
+    shot_ids = [shot["id"] for shot in storyboard["shots"]]
+
+    recorder = Recorder()
+    await _measure(recorder, "list_works", repeat, works.list_works)
+    await _measure(recorder, "list_history", repeat, lambda: tools.list_history(tool_type=None, page=1, limit=20))
+    await _measure(recorder, "list_history_filtered", repeat,
+                   lambda: tools.list_history(tool_type="text_to_image", page=1, limit=20))
+    await _measure(recorder, "get_storyboard", repeat,
+                   lambda: episodes.get_storyboard(work_id, edit_episode["episode_id"]))
+    await _measure(recorder, "update_shot", repeat, lambda: call_endpoint(
+        content.update_shot, work_id, edit_episode["episode_id"], rng.choice(shot_ids),
+        description=f"修改后的分镜描述 {rng.random():.6f}",
+    ))
+    await _measure(recorder, "confirm_storyboard", repeat,
+                   lambda: content.confirm_storyboard(work_id, confirm_episode["episode_id"]))
+
+    dataset = {key: manifest[key] for key in ("works", "episodes", "history", "tasks")}
+    dataset["storyboard_shots"] = spec.large_episode_shots
+    return {"dataset": dataset, "timings": recorder.summary(elapsed=0)}
+
+
+async def run_micro(root: str, preset: str, factors: List[float], repeat: int, media: bool, seed: int) -> Dict[str, Any]:
+    import utils.common
+
+    if os.path.abspath(utils.common.DATA_ROOT) != os.path.abspath(root):
+        raise RuntimeError(f"DATA_ROOT 为 {utils.common.DATA_ROOT}，需在导入 utils 之前设置 COMICMAKER_DATA_ROOT")
+
+    generator = DatasetGenerator(root, seed)
+    rng = random.Random(seed)
+    base = replace(PRESETS[preset], media=media)
+    result = {
+        "kind": "micro",
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"preset": preset, "steps": factors, "repeat": repeat, "media": media, "seed": seed},
+        "datasets": {},
+        "scenarios": {},
+    }
+    for factor in factors:
+        step = f"x{factor:g}"
+        spec = base.scaled(factor)
+        print(f"规模 {step}: 作品 {spec.works}，历史记录 {spec.history}，任务 {spec.tasks}，分镜 {spec.large_episode_shots}")
+        step_result = await run_step(generator, spec, repeat, rng)
+        result["datasets"][step] = step_result["dataset"]
+        for stats in step_result["timings"].values():
+            stats.pop("throughput_rps", None)
+        result["scenarios"][step] = step_result["timings"]
+    return result
+
+
+def _print_result(result: Dict[str, Any]):
+    steps = list(result["scenarios"])
+    print(f"\n{'p50 / p95 (ms)':<24}" + "".join(f"{step:>22}" for step in steps))
+    for name in BENCHMARKS:
+        cells = []
+        for step in steps:
+            stats = result["scenarios"][step].get(name)
+            cells.append(f"{stats['p50_ms']:.2f} / {stats['p95_ms']:.2f}" if stats else "-")
+        print(f"{name:<24}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据规模微基准")
+    parser.add_argument("--preset", choices=list(PRESETS), default="small", help="基准规模（见 benchmarks.dataset）")
+    parser.add_argument("--steps", default="0.5,1,2,4", help="逗号分隔的规模倍数，按顺序逐步扩大")
+    parser.add_argument("--repeat", type=int, default=20, help="每个函数每一步的计时次数")
+    parser.add_argument("--root", default=None, help="数据目录（默认临时目录，结束后删除）")
+    parser.add_argument("--media", action="store_true", help="同时写入占位媒体文件（不影响被测函数，只是更接近真实目录）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="结果文件路径（默认 benchmarks/results/）")
+    args = parser.parse_args()
+
+    factors = sorted(float(value) for value in args.steps.split(",") if value.strip())
+    root = args.root or tempfile.mkdtemp(prefix="comicmaker-micro-")
+    config_dir = tempfile.mkdtemp(prefix="comicmaker-micro-config-")
+    config_path = os.path.join(config_dir, "config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"storage": {"backend": "local"}}, f)
+    # utils 在导入时确定数据目录，必须先设置环境变量
+    os.environ["COMICMAKER_DATA_ROOT"] = root
+    os.environ["COMICMAKER_CONFIG"] = config_path
+    try:
+        result = asyncio.run(run_micro(root, args.preset, factors, args.repeat, args.media, args.seed))
+    finally:
+        shutil.rmtree(config_dir, ignore_errors=True)
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+    _print_result(result)
+    print(f"\n结果已保存: {save_result(result, args.output, 'micro')}")
+
+
+if __name__ == "__main__":
+    main()
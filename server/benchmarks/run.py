@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+负载与吞吐量测试
+
+默认在本机启动上游模拟服务（scripts/mock_upstream.py）和指向它的 API 服务（uvicorn，多 worker，
+使用独立的临时数据目录），然后逐个场景以指定并发持续请求，输出：
+- 每类请求的 p50 / p95 / p99 延迟、失败数和吞吐量
+- 事件循环延迟：压测期间持续请求 /api/health（不做任何工作），其响应时间反映事件循环被阻塞的程度；
+  同时给出空闲时的基线
+- 每个 API worker 进程（及其子进程，如媒体进程池）的内存（RSS，依赖 /proc，仅 Linux）
+
+结果保存为 JSON，用于不同提交之间比较。
+
+用法（在 server 目录下）：
+    python -m benchmarks.run --scenarios works,storyboard,tools,history --concurrency 32 --duration 30
+    python -m benchmarks.run --base-url http://127.0.0.1:8000   # 压测已启动的服务（不统计内存）
+    python -m benchmarks.run --compare results/baseline.json results/current.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from benchmarks.scenarios import SCENARIOS, ScenarioContext
+from benchmarks.stats import SERVER_DIR, Recorder, compare_results, git_revision, save_result, summarize
+from tests.utils import APITestClient
+
+# 事件循环延迟探测间隔（秒）
+LAG_PROBE_INTERVAL = 0.1
+# 内存采样间隔（秒）
+MEMORY_SAMPLE_INTERVAL = 1.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ==================== 进程内存 ====================
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _children(pid: int) -> List[int]:
+    if not os.path.isdir("/proc"):
+        return []
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # 进程名可能包含空格，ppid 位于最后一个 ')' 之后的第二个字段
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _descendants(pid: int) -> List[int]:
+    result, pending = [], _children(pid)
+    while pending:
+        child = pending.pop()
+        result.append(child)
+        pending.extend(_children(child))
+    return result
+
+
+class MemorySampler:
+    """定期采样 API worker 进程及其子进程的 RSS"""
+
+    def __init__(self, server_pid: int):
+        self.server_pid = server_pid
+        self.samples: Dict[int, List[float]] = {}
+        self.child_samples: Dict[int, List[float]] = {}
+
+    def workers(self) -> List[int]:
+        # uvicorn --workers > 1 时主进程只负责管理，请求由子进程处理
+        return _children(self.server_pid) or [self.server_pid]
+
+    def sample(self):
+        for pid in self.workers():
+            rss = _rss_mb(pid)
+            if rss is None:
+                continue
+            self.samples.setdefault(pid, []).append(rss)
+            self.child_samples.setdefault(pid, []).append(sum(_rss_mb(child) or 0 for child in _descendants(pid)))
+
+    async def run(self):
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            str(pid): {
+                "start_mb": round(values[0], 1),
+                "peak_mb": round(max(values), 1),
+                "end_mb": round(values[-1], 1),
+                "children_peak_mb": round(max(self.child_samples[pid]), 1),
+            }
+            for pid, values in self.samples.items()
+        }
+
+
+# ==================== 被测服务 ====================
+
+class BenchmarkServer:
+    """启动上游模拟服务和指向它的 API 服务"""
+
+    def __init__(self, args):
+        self.args = args
+        self.owns_data_root = not args.data_root
+        self.data_root = args.data_root or tempfile.mkdtemp(prefix="comicmaker-bench-")
+        self.work_dir = tempfile.mkdtemp(prefix="comicmaker-bench-config-")
+        self.mock_port = _free_port()
+        self.port = _free_port()
+        self.mock: Optional[subprocess.Popen] = None
+        self.server: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _config(self) -> Dict[str, Any]:
+        from utils.settings import CONFIG_PATH
+
+        config = {}
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+        mock_url = f"http://127.0.0.1:{self.mock_port}"
+        # 所有上游请求都发往模拟服务，不使用真实密钥
+        config["wavespeed_api_key"] = "benchmark"
+        config["llm"] = {**(config.get("llm") or {}), "openai_api_key": "benchmark"}
+        config["llm"].setdefault("model", "openai/gpt-4o")
+        config["oss"] = {"access_key_id": "benchmark", "access_key_secret": "benchmark",
+                         "endpoint": mock_url, "bucket_name": "benchmark"}
+        config["upstreams"] = {
+            "wavespeed_base_url": f"{mock_url}/api/v3",
+            "openrouter_base_url": f"{mock_url}/api/v1",
+            "oss_endpoint": mock_url,
+        }
+        config["storage"] = {"backend": "local"}
+        config["tasks"] = {**(config.get("tasks") or {}), "drain_seconds": 0}
+        return config
+
+    async def start(self):
+        args = self.args
+        mock_command = [
+            sys.executable, str(SERVER_DIR / "scripts" / "mock_upstream.py"),
+            "--port", str(self.mock_port),
+            "--latency", args.upstream_latency,
+            "--processing", args.upstream_processing,
+            "--throttle-rate", str(args.upstream_throttle_rate),
+            "--error-rate", str(args.upstream_error_rate),
+            "--failure-rate", str(args.upstream_failure_rate),
+            "--seed", str(args.seed),
+        ]
+        self.mock = subprocess.Popen(mock_command, cwd=SERVER_DIR, stdout=subprocess.DEVNULL)
+
+        config_path = os.path.join(self.work_dir, "config.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(self._config(), f, allow_unicode=True)
+        env = {**os.environ, "COMICMAKER_CONFIG": config_path, "COMICMAKER_DATA_ROOT": self.data_root}
+        server_command = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(args.workers), "--loop", "asyncio", "--log-level", "warning",
+        ]
+        self.server = subprocess.Popen(server_command, cwd=SERVER_DIR, env=env)
+        await self._wait_ready()
+
+    async def _wait_ready(self, timeout: float = 60.0):
+        client = APITestClient(self.base_url)
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                if self.server.poll() is not None:
+                    raise RuntimeError(f"API 服务启动失败，退出码 {self.server.returncode}")
+                try:
+                    if (await client.get("/api/health")).status_code == 200:
+                        return
+                except Exception:
+                    pass
+                await asyncio.sleep(0.2)
+        finally:
+            await client.close()
+        raise RuntimeError(f"API 服务在 {timeout} 秒内未就绪")
+
+    def stop(self):
+        for process in (self.server, self.mock):
+            if process is None or process.poll() is not None:
+                continue
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        if self.owns_data_root and not self.args.keep_data:
+            shutil.rmtree(self.data_root, ignore_errors=True)
+
+
+# ==================== 压测 ====================
+
+async def probe_loop_lag(base_url: str, recorder: Recorder, name: str = "event_loop_lag"):
+    """持续请求 /api/health，记录响应时间"""
+    client = APITestClient(base_url)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                ok = (await client.get("/api/health")).status_code == 200
+            except Exception:
+                ok = False
+            recorder.record(name, time.perf_counter() - start, ok=ok)
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+    finally:
+        await client.close()
+
+
+async def measure_idle_lag(base_url: str, seconds: float = 2.0) -> Dict[str, Any]:
+    recorder = Recorder()
+    probe = asyncio.create_task(probe_loop_lag(base_url, recorder))
+    await asyncio.sleep(seconds)
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+    return summarize(recorder.samples["event_loop_lag"])
+
+
+async def run_scenario(name: str, base_url: str, args, server_pid: Optional[int]) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    warmup_recorder = Recorder()
+    recorder = Recorder()
+    contexts = [
+        ScenarioContext(
+            client=APITestClient(base_url),
+            recorder=warmup_recorder,
+            user_index=index,
+            rng=random.Random(args.seed * 1000 + index),
+            poll_interval=args.poll_interval,
+        )
+        for index in range(args.concurrency)
+    ]
+    try:
+        if scenario.setup:
+            await asyncio.gather(*(scenario.setup(ctx) for ctx in contexts))
+
+        deadline = time.perf_counter() + args.warmup + args.duration
+
+        async def user(ctx: ScenarioContext):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    await scenario.step(ctx)
+                    ok = True
+                except Exception:
+                    ok = False
+                ctx.recorder.record("step", time.perf_counter() - start, ok=ok)
+
+        users = [asyncio.create_task(user(ctx)) for ctx in contexts]
+        await asyncio.sleep(args.warmup)
+        # 预热结束，开始计入统计
+        for ctx in contexts:
+            ctx.recorder = recorder
+        measure_start = time.perf_counter()
+        sampler = MemorySampler(server_pid) if server_pid else None
+        background = [asyncio.create_task(probe_loop_lag(base_url, recorder))]
+        if sampler:
+            background.append(asyncio.create_task(sampler.run()))
+
+        await asyncio.gather(*users)
+        elapsed = time.perf_counter() - measure_start
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+    finally:
+        await asyncio.gather(*(ctx.client.close() for ctx in contexts))
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": recorder.summary(elapsed),
+        "memory": sampler.summary() if sampler else None,
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in names:
+        if name not in SCENARIOS:
+            raise SystemExit(f"未知场景: {name}（可选: {', '.join(SCENARIOS)}）")
+
+    server = None if args.base_url else BenchmarkServer(args)
+    try:
+        if server:
+            await server.start()
+        base_url = args.base_url or server.base_url
+        server_pid = server.server.pid if server else None
+
+        result = {
+            "kind": "load",
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "scenarios": names,
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "workers": args.workers if server else None,
+                "base_url": args.base_url,
+                "upstream": {
+                    "latency": args.upstream_latency,
+                    "processing": args.upstream_processing,
+                    "throttle_rate": args.upstream_throttle_rate,
+                    "error_rate": args.upstream_error_rate,
+                    "failure_rate": args.upstream_failure_rate,
+                } if server else None,
+                "seed": args.seed,
+            },
+            "idle_event_loop_lag": await measure_idle_lag(base_url),
+            "scenarios": {},
+            "memory": {},
+        }
+        for name in names:
+            print(f"运行场景 {name}（{SCENARIOS[name].description}），并发 {args.concurrency}，{args.duration} 秒")
+            scenario_result = await run_scenario(name, base_url, args, server_pid)
+            result["scenarios"][name] = scenario_result["requests"]
+            result["memory"][name] = scenario_result["memory"]
+            _print_scenario(name, scenario_result)
+        return result
+    finally:
+        if server:
+            server.stop()
+
+
+def _print_scenario(name: str, scenario_result: Dict[str, Any]):
+    print(f"{'请求':<36}{'次数':>8}{'失败':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}")
+    for request_name, stats in scenario_result["requests"].items():
+        print(f"{request_name:<36}{stats['count']:>8}{stats['errors']:>6}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['throughput_rps']:>10.1f}")
+    for pid, memory in (scenario_result["memory"] or {}).items():
+        print(f"worker {pid}: RSS {memory['start_mb']} -> 峰值 {memory['peak_mb']} MB，子进程峰值 {memory['children_peak_mb']} MB")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="负载与吞吐量测试")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔的场景（{', '.join(SCENARIOS)}）")
+    parser.add_argument("--concurrency", type=int, default=16, help="虚拟用户数")
+    parser.add_argument("--duration", type=float, default=30.0, help="每个场景的统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3.0, help="每个场景开始统计前的预热时长（秒）")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="生成任务状态轮询间隔（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（场景选择和上游模拟服务）")
+    parser.add_argument("--base-url", default=None, help="压测已启动的 API 服务，不再自动启动")
+    parser.add_argument("--workers", type=int, default=4, help="自动启动的 API 服务 worker 进程数")
+    parser.add_argument("--data-root", default=None, help="自动启动的 API 服务的数据目录（默认临时目录，结束后删除）")
+    parser.add_argument("--keep-data", action="store_true", help="保留临时数据目录")
+    parser.add_argument("--upstream-latency", default="uniform:0.02,0.08", help="上游请求延迟分布")
+    parser.add_argument("--upstream-processing", default="lognormal:2,0.4", help="上游生成任务耗时分布")
+    parser.add_argument("--upstream-throttle-rate", type=float, default=0.0, help="上游返回 429 的概率")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0, help="上游返回 500 的概率")
+    parser.add_argument("--upstream-failure-rate", type=float, default=0.0, help="上游生成失败的概率")
+    parser.add_argument("--output", default=None, help="结果文件路径（默认 benchmarks/results/）")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="比较两个结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (json.loads(Path(path).read_text(encoding="utf-8")) for path in args.compare)
+        print(f"基线 {baseline.get('revision')}，当前 {current.get('revision')}")
+        print("\n".join(compare_results(baseline, current)))
+        return
+
+    result = asyncio.run(run_benchmark(args))
+    print(f"结果已保存: {save_result(result, args.output, 'load')}")
+
+
+if __name__ == "__main__":
+    main()
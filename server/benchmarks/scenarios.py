@@ -0,0 +1,162 @@
+"""
+压测场景
+
+每个场景由 setup（每个虚拟用户执行一次，准备数据，不计时）和 step（循环执行，逐个请求计时）组成。
+准备数据通过 API 创建（名称包含"测试"，tests/conftest.py 的 cleanup_all_test_data 可清理），
+因此同样适用于 --base-url 指定的已有服务。生成类请求的参数与 sample/ 中的调用示例一致。
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from benchmarks.stats import Recorder
+from tests.utils import APITestClient
+
+# 与 sample/seedream45text2image.py、sample/wan26text2image.py 使用的模型一致
+TOOL_REQUESTS = [
+    ("text_to_image", {"prompt": "一只在雨夜霓虹街道上奔跑的橘猫，电影感光影", "material_type": "characters",
+                       "model": "seedream4.5", "aspect_ratio": "16:9", "resolution": "1k"}),
+    ("text_to_image", {"prompt": "清晨薄雾中的江南小镇，石桥与乌篷船", "material_type": "scenes",
+                       "model": "wan2.6", "aspect_ratio": "16:9", "resolution": "1k"}),
+    ("generate_script", {"description": "一个少年在雨夜捡到一只会说话的猫，两人一起寻找失踪的灯塔守护人"}),
+]
+SHOTS_PER_EPISODE = 20
+
+
+@dataclass
+class ScenarioContext:
+    """单个虚拟用户的执行上下文"""
+    client: APITestClient
+    recorder: Recorder
+    user_index: int
+    rng: random.Random
+    poll_interval: float = 0.5
+    task_timeout: float = 300.0
+    state: Dict[str, Any] = field(default_factory=dict)
+
+    async def request(self, name: str, method: str, path: str, **kwargs):
+        """发送请求并按 name 记录延迟（状态码 >= 400 或连接错误记为失败）"""
+        start = time.perf_counter()
+        try:
+            response = await getattr(self.client, method)(path, **kwargs)
+        except Exception:
+            self.recorder.record(name, time.perf_counter() - start, ok=False)
+            return None
+        self.recorder.record(name, time.perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    description: str
+    step: Callable[[ScenarioContext], Awaitable[None]]
+    setup: Optional[Callable[[ScenarioContext], Awaitable[None]]] = None
+
+
+def _storyboard_text(shot_count: int) -> str:
+    lines = ["剧本关联素材：少年，橘猫，灯塔"]
+    for number in range(1, shot_count + 1):
+        lines.append(f"分镜{number}: 少年在雨夜的街道上追逐橘猫，镜头{number}从低角度跟随")
+        lines.append("关联素材: 少年，橘猫")
+        lines.append("时长: 5")
+    return "\n".join(lines)
+
+
+async def _create_work(ctx: ScenarioContext) -> str:
+    response = await ctx.client.post("/api/works", data={
+        "name": f"测试压测作品-{ctx.user_index}",
+        "description": "性能测试数据",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+# ==================== 作品 ====================
+
+async def setup_works(ctx: ScenarioContext):
+    ctx.state["work_id"] = await _create_work(ctx)
+
+
+async def step_works(ctx: ScenarioContext):
+    await ctx.request("list_works", "get", "/api/works")
+    await ctx.request("get_work", "get", f"/api/works/{ctx.state['work_id']}")
+
+
+# ==================== 历史记录 ====================
+
+async def step_history(ctx: ScenarioContext):
+    await ctx.request("list_history", "get", "/api/tools/history", params={"page": 1, "limit": 20})
+    await ctx.request("list_history_filtered", "get", "/api/tools/history",
+                      params={"tool_type": "text_to_image", "page": 1, "limit": 20})
+
+
+# ==================== 分镜 ====================
+
+async def _confirm_storyboard(ctx: ScenarioContext):
+    work_id, episode_id = ctx.state["work_id"], ctx.state["episode_id"]
+    await ctx.request("confirm_storyboard", "post", f"/api/content/{work_id}/{episode_id}/confirm-storyboard")
+    response = await ctx.client.get(f"/api/episodes/{work_id}/{episode_id}/storyboard")
+    response.raise_for_status()
+    ctx.state["shot_ids"] = [shot["id"] for shot in response.json().get("shots", [])]
+
+
+async def setup_storyboard(ctx: ScenarioContext):
+    work_id = await _create_work(ctx)
+    response = await ctx.client.post(f"/api/episodes/{work_id}", data={"name": f"测试压测剧集-{ctx.user_index}"})
+    response.raise_for_status()
+    episode_id = response.json()["id"]
+    response = await ctx.client.post(f"/api/episodes/{work_id}/{episode_id}/storyboard/text",
+                                     data={"text": _storyboard_text(SHOTS_PER_EPISODE)})
+    response.raise_for_status()
+    ctx.state.update(work_id=work_id, episode_id=episode_id, iterations=0)
+    await _confirm_storyboard(ctx)
+
+
+async def step_storyboard(ctx: ScenarioContext):
+    work_id, episode_id = ctx.state["work_id"], ctx.state["episode_id"]
+    await ctx.request("get_storyboard", "get", f"/api/episodes/{work_id}/{episode_id}/storyboard")
+    if ctx.state["shot_ids"]:
+        shot_id = ctx.rng.choice(ctx.state["shot_ids"])
+        await ctx.request("update_shot", "put", f"/api/content/{work_id}/{episode_id}/{shot_id}",
+                          data={"description": f"修改后的分镜描述 {ctx.rng.random():.6f}"})
+    ctx.state["iterations"] += 1
+    # 重新确认会重建全部分镜，间隔执行，模拟编辑脚本后重新生成分镜卡片
+    if ctx.state["iterations"] % 20 == 0:
+        await _confirm_storyboard(ctx)
+
+
+# ==================== 生成任务 ====================
+
+async def step_tools(ctx: ScenarioContext):
+    tool_type, form = ctx.rng.choice(TOOL_REQUESTS)
+    start = time.perf_counter()
+    response = await ctx.request("tools_create", "post", f"/api/tools/{tool_type}/create", data=form)
+    if response is None or response.status_code >= 400:
+        return
+    task_id = response.json()["task_id"]
+
+    status = "pending"
+    deadline = start + ctx.task_timeout
+    while status == "pending" and time.perf_counter() < deadline:
+        await asyncio.sleep(ctx.poll_interval)
+        response = await ctx.request("task_status", "get", f"/api/tasks/{task_id}/status")
+        if response is not None and response.status_code == 200:
+            status = response.json()["status"]
+    # 从提交到任务结束（包括上游模拟服务的处理时间）
+    ctx.recorder.record(f"task_complete.{tool_type}", time.perf_counter() - start, ok=status == "success")
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario("works", "作品列表和详情", step_works, setup_works),
+        Scenario("storyboard", "读取分镜、修改分镜、重新确认分镜", step_storyboard, setup_storyboard),
+        Scenario("tools", "创建生成任务并轮询状态直到完成", step_tools),
+        # 历史记录由 tools 场景产生，默认排在其后
+        Scenario("history", "工具历史记录列表", step_history),
+    ]
+}
@@ -0,0 +1,114 @@
+"""
+基准测试统计工具
+
+延迟统一以秒记录，输出时转换为毫秒。
+"""
+
+import json
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+SERVER_DIR = Path(__file__).parent.parent
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """线性插值分位数，sorted_values 须已排序且非空"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, Any]:
+    """延迟样本（秒）的统计摘要（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+class Recorder:
+    """按名称记录请求延迟和失败次数"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        self.samples[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        """各名称的延迟摘要、失败数和吞吐量（次/秒）"""
+        result = {}
+        for name in sorted(self.samples):
+            stats = summarize(self.samples[name])
+            stats["errors"] = self.errors.get(name, 0)
+            stats["throughput_rps"] = round(len(self.samples[name]) / elapsed, 3) if elapsed > 0 else 0.0
+            result[name] = stats
+        return result
+
+
+def git_revision() -> Optional[str]:
+    """当前提交（工作区有未提交修改时加 -dirty 后缀）"""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=SERVER_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if dirty else revision
+
+
+def save_result(result: Dict[str, Any], output: Optional[str], kind: str) -> Path:
+    """
+    保存结果文件
+
+    未指定 output 时保存到 benchmarks/results/<kind>-<时间>-<提交>.json
+    """
+    if output:
+        path = Path(output)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = SERVER_DIR / "benchmarks" / "results" / f"{kind}-{stamp}-{result.get('revision') or 'unknown'}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], metrics: Sequence[str] = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")) -> List[str]:
+    """
+    逐项比较两次结果中 scenarios.<场景>.<名称> 的指标
+
+    Returns:
+        可直接打印的表格行
+    """
+    lines = [f"{'场景/请求':<40}{'指标':<16}{'基线':>12}{'当前':>12}{'变化':>10}"]
+    for scenario, names in current.get("scenarios", {}).items():
+        baseline_names = baseline.get("scenarios", {}).get(scenario, {})
+        for name, stats in names.items():
+            if not isinstance(stats, dict) or name not in baseline_names:
+                continue
+            for metric in metrics:
+                old, new = baseline_names[name].get(metric), stats.get(metric)
+                if old is None or new is None:
+                    continue
+                change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+                lines.append(f"{scenario + '/' + name:<40}{metric:<16}{old:>12.2f}{new:>12.2f}{change:>10}")
+    return lines
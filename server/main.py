@@ -4,12 +4,30 @@ ComicMaker 主应用
 FastAPI 后端服务
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response
+import asyncio
+import logging
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import time
 
-from api import materials, works, episodes, content, test, tools, tasks, styles
+from api import materials, works, episodes, content, test, tools, tasks, styles, admin, usage
+from utils.loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from utils.media_pool import shutdown_media_pool
+from utils.metrics import (
+    HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, InstrumentedThreadPool, render_metrics, route_template, start_metrics,
+    stop_metrics,
+)
+from utils.profiler import (
+    SamplingProfiler, check_token, save_profile, speedscope, start_profile_watcher, stop_profile_watcher,
+)
+from utils import DATA_ROOT, get_data_path
+from utils.settings import get_settings, install_reload_signal, reload_settings
+from utils.storage import media_url
+from utils.task_broker import get_task_broker, inline_worker_count, stop_accepting
+from utils.prompt_registry import get_prompt_registry
 
 app = FastAPI(title="ComicMaker API", version="1.0.0")
 
@@ -22,6 +40,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# 请求指标（GET /metrics）
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        HTTP_REQUEST_SECONDS.labels(request.method, route_template(request.scope), status).observe(
+            time.perf_counter() - start)
+
+
+# 按需采样分析单个请求（profiling.token）
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    token = request.headers.get("x-profile-token") or request.query_params.get("_profile")
+    if token is None or not check_token(token):
+        return await call_next(request)
+    output = request.headers.get("x-profile-output") or request.query_params.get("_profile_output")
+    profiler = SamplingProfiler(get_settings().profiling.interval).start()
+    try:
+        response = await call_next(request)
+        # 读取完整响应体，流式响应的生成过程同样计入采样
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    finally:
+        label = f"{request.method} {route_template(request.scope)}"
+        profile = profiler.stop(label)
+    if output == "collapsed":
+        return PlainTextResponse(profile.to_collapsed())
+    if output == "speedscope":
+        return JSONResponse(speedscope([profile], label))
+    path = await asyncio.to_thread(save_profile, profile, label)
+    headers = {key: value for key, value in response.headers.items() if key.lower() != "content-length"}
+    headers["X-Profile-Path"] = path
+    return Response(body, status_code=response.status_code, headers=headers, media_type=response.media_type)
+
+
 # 注册路由
 app.include_router(materials.router, prefix="/api/materials", tags=["materials"])
 app.include_router(works.router, prefix="/api/works", tags=["works"])
@@ -31,11 +92,20 @@ app.include_router(test.router, prefix="/api/test", tags=["test"])
 app.include_router(tools.router, prefix="/api/tools", tags=["tools"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
 app.include_router(styles.router, prefix="/api/styles", tags=["styles"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(usage.router, prefix="/api/usage", tags=["usage"])
 
-# 静态文件服务（用于提供上传的媒体文件）
-data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-os.makedirs(data_dir, exist_ok=True)
-app.mount("/data", StaticFiles(directory=data_dir), name="data")
+# 媒体文件服务：本地存储后端直接提供静态文件，对象存储后端重定向到签名 URL
+if get_settings().storage.backend == "local":
+    os.makedirs(DATA_ROOT, exist_ok=True)
+    app.mount("/data", StaticFiles(directory=DATA_ROOT), name="data")
+else:
+    @app.get("/data/{path:path}")
+    async def data_file(path: str):
+        url = await asyncio.to_thread(media_url, get_data_path(*path.split("/")))
+        if not url:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return RedirectResponse(url, status_code=307)
 
 
 @app.get("/")
@@ -48,6 +118,68 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标（本机所有 API 进程和 worker 进程合并）"""
+    return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+async def startup():
+    # 加载并校验配置（格式错误时启动失败），之后按文件修改时间或 SIGHUP 热加载
+    settings = reload_settings()
+    for problem in settings.warnings():
+        logging.getLogger(__name__).warning(f"配置检查: {problem}")
+    install_reload_signal()
+    # asyncio.to_thread 使用的默认线程池（大小与默认值相同），记录线程池占用情况
+    asyncio.get_running_loop().set_default_executor(InstrumentedThreadPool("default"))
+    start_metrics()
+    # 记录事件循环延迟，阻塞超过阈值时记录调用栈
+    start_loop_watchdog()
+    # 响应 /api/admin/profile 的采样请求
+    start_profile_watcher("api")
+    # 预加载并解析全部提示词模板
+    count = get_prompt_registry().load_all()
+    logging.getLogger(__name__).info(f"已加载 {count} 个提示词模板")
+    # 按配置在 API 进程内执行队列中的任务（memory 队列默认启用，sqlite/redis 默认交给 python -m worker）
+    inline_workers = inline_worker_count(settings.tasks)
+    if inline_workers:
+        app.state.task_worker = tools.create_task_worker(inline_workers)
+        app.state.task_worker.start()
+        if get_task_broker().in_process:
+            # 进程内队列随进程退出而丢失，由存活的进程接手中断的任务
+            app.state.task_reconciler = asyncio.create_task(reconcile_tasks_periodically(settings.tasks.lease_seconds))
+
+
+async def reconcile_tasks_periodically(interval: float):
+    logger = logging.getLogger(__name__)
+    while True:
+        try:
+            count = await tools.reconcile_tasks(interval)
+            if count:
+                logger.info(f"已接手 {count} 个中断的任务")
+        except Exception as e:
+            logger.warning(f"接手中断任务失败: {e}")
+        await asyncio.sleep(interval)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 不再接收新任务；等待执行中的任务完成，超时的任务交回队列并记录已提交的 prediction，由其他进程接手
+    stop_accepting()
+    task_reconciler = getattr(app.state, "task_reconciler", None)
+    if task_reconciler is not None:
+        task_reconciler.cancel()
+    task_worker = getattr(app.state, "task_worker", None)
+    if task_worker is not None:
+        await task_worker.stop(timeout=get_settings().tasks.drain_seconds)
+    # 关闭媒体进程池，结束所有工作进程
+    shutdown_media_pool(wait=False)
+    stop_loop_watchdog()
+    stop_profile_watcher()
+    stop_metrics()
+
+
 if __name__ == "__main__":
     import uvicorn
     import multiprocessing
@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+本地上游模拟服务（WaveSpeed / OpenRouter / OSS）
+
+用于离线开发和压测：生成、LLM 和 OSS 上传全部指向本服务后，整条流水线可以在没有网络、
+不产生费用的情况下运行，结果可通过 --seed 复现。只依赖标准库。
+
+实现的接口：
+- WaveSpeed：POST /api/v3/<provider>/<model> 提交任务，GET /api/v3/predictions/<id>/result 轮询，
+  支持 enable_sync_mode / enable_base64_output；输出为生成的 PNG 图片或 MP4 视频
+- LLM：POST /api/v1/chat/completions 与 /api/v3/<provider>/<model>/chat/completions，
+  payload 中 stream: true 时以 SSE 逐段返回
+- OSS：PUT / GET /<bucket>/<key>（oss2 对 IP 地址的 endpoint 使用路径风格访问）
+- GET /__stats 返回各类请求计数，POST /__reset 清零
+
+延迟分布写法（秒）：0.05、fixed:0.05、uniform:0.02,0.2、normal:0.1,0.03、lognormal:0.1,0.5（中位数, sigma）、exp:0.1（均值）
+
+用法（在 server 目录下）：
+    python scripts/mock_upstream.py --port 8900 --latency uniform:0.02,0.1 --processing lognormal:3,0.4 \\
+        --throttle-rate 0.05 --failure-rate 0.02 --seed 1
+
+然后在 config.yaml 中设置：
+    upstreams:
+      wavespeed_base_url: "http://127.0.0.1:8900/api/v3"
+      openrouter_base_url: "http://127.0.0.1:8900/api/v1"
+      oss_endpoint: "http://127.0.0.1:8900"
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+# 模型路径中出现这些词时输出视频，否则输出图片
+VIDEO_MODEL_PATTERN = re.compile(
+    r"video|i2v|t2v|v2v|flf2v|runway|vace|hailuo|vidu|sora|seedance|veo|kling|mmaudio", re.IGNORECASE
+)
+DEFAULT_CHAT_REPLY = "这是本地模拟服务返回的回复内容，用于压测和离线开发。"
+
+
+class Distribution:
+    """延迟分布（秒），采样结果不小于 0"""
+
+    def __init__(self, kind: str, params: Tuple[float, ...]):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "Distribution":
+        """
+        解析分布写法
+
+        Raises:
+            ValueError: 写法无法识别或参数个数不对
+        """
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", spec
+        try:
+            params = tuple(float(value) for value in args.split(","))
+        except ValueError:
+            raise ValueError(f"延迟分布参数应为数字: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if kind not in expected:
+            raise ValueError(f"不支持的延迟分布: {kind}")
+        if len(params) != expected[kind]:
+            raise ValueError(f"延迟分布 {kind} 需要 {expected[kind]} 个参数: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        else:
+            value = rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(0.0, value)
+
+    def __repr__(self):
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+@dataclass
+class MockOptions:
+    """
+    模拟服务参数
+
+    Attributes:
+        latency: 每个请求的响应延迟
+        processing: 生成任务从提交到完成的时间
+        error_rate: 提交、LLM 和 OSS 上传请求返回 500 的概率
+        throttle_rate: 提交、LLM 和 OSS 上传请求返回 429 的概率
+        failure_rate: 生成任务最终失败（status: failed）的概率
+        image_size: 生成图片的宽高
+        video_seconds: 生成视频的时长（使用 ffmpeg 生成）
+        video_file: 使用指定的视频文件作为视频输出
+        chat_reply: LLM 回复内容
+        stream_chunk_interval: 流式回复每段之间的间隔（秒）
+        seed: 随机种子，相同种子下注入的延迟、错误和失败序列相同
+    """
+    latency: Distribution = field(default_factory=lambda: Distribution("fixed", (0.0,)))
+    processing: Distribution = field(default_factory=lambda: Distribution("fixed", (1.0,)))
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    failure_rate: float = 0.0
+    image_size: Tuple[int, int] = (512, 512)
+    video_seconds: float = 1.0
+    video_file: Optional[str] = None
+    chat_reply: str = DEFAULT_CHAT_REPLY
+    stream_chunk_interval: float = 0.01
+    seed: Optional[int] = None
+
+
+@lru_cache(maxsize=64)
+def generate_png(width: int, height: int, rgb: Tuple[int, int, int]) -> bytes:
+    """生成纯色 PNG 图片"""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(rgb) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(row * height, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def generate_mp4(width: int, height: int, seconds: float) -> bytes:
+    """
+    生成测试视频
+
+    有 ffmpeg 时生成可解码的 H.264 视频；没有时返回只包含 ftyp 头的占位数据（只能用于下载和存储压测）。
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mock.mp4")
+            result = subprocess.run(
+                [ffmpeg, "-loglevel", "error", "-f", "lavfi",
+                 "-i", f"testsrc=size={width}x{height}:rate=24:duration={seconds}",
+                 "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-y", path],
+                capture_output=True,
+            )
+            if result.returncode == 0:
+                with open(path, "rb") as f:
+                    return f.read()
+    ftyp = b"ftypisom\x00\x00\x02\x00isomiso2avc1mp41"
+    return struct.pack(">I", len(ftyp) + 4) + ftyp + struct.pack(">I", 8) + b"free"
+
+
+class MockUpstream:
+    """
+    模拟服务
+
+    可以在测试或压测脚本中直接使用：
+        mock = MockUpstream(MockOptions(seed=1)).start()
+        ... 使用 mock.wavespeed_base_url / mock.openrouter_base_url / mock.oss_endpoint ...
+        mock.stop()
+    """
+
+    def __init__(self, options: Optional[MockOptions] = None, host: str = "127.0.0.1", port: int = 0):
+        self.options = options or MockOptions()
+        self._rng = random.Random(self.options.seed)
+        self._lock = threading.Lock()
+        self._predictions: Dict[str, Dict[str, Any]] = {}
+        self._objects: Dict[str, bytes] = {}
+        self._video: Optional[bytes] = None
+        self.stats: Counter = Counter()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def wavespeed_base_url(self) -> str:
+        return f"{self.base_url}/api/v3"
+
+    @property
+    def openrouter_base_url(self) -> str:
+        return f"{self.base_url}/api/v1"
+
+    @property
+    def oss_endpoint(self) -> str:
+        return self.base_url
+
+    def start(self) -> "MockUpstream":
+        """在后台线程中启动"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ==================== 随机注入 ====================
+
+    def sample(self, distribution: Distribution) -> float:
+        with self._lock:
+            return distribution.sample(self._rng)
+
+    def chance(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < probability
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            pending = sum(1 for p in self._predictions.values() if p["ready_at"] > now)
+            return {"requests": dict(self.stats), "predictions": len(self._predictions), "pending": pending}
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self._predictions.clear()
+            self._objects.clear()
+
+    # ==================== 生成任务 ====================
+
+    def submit(self, model_path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        prediction_id = uuid.uuid4().hex
+        is_video = bool(VIDEO_MODEL_PATTERN.search(model_path))
+        count = max(1, int(payload.get("max_images") or 1)) if not is_video else 1
+        failed = self.chance(self.options.failure_rate)
+        prediction = {
+            "id": prediction_id,
+            "model": model_path,
+            "status": "created",
+            "final_status": "failed" if failed else "completed",
+            "ready_at": time.monotonic() + self.sample(self.options.processing),
+            "outputs": [f"{prediction_id}/{index}.{'mp4' if is_video else 'png'}" for index in range(count)],
+            "base64": bool(payload.get("enable_base64_output")),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._predictions[prediction_id] = prediction
+        if payload.get("enable_sync_mode"):
+            time.sleep(max(0.0, prediction["ready_at"] - time.monotonic()))
+        return prediction
+
+    def prediction(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            prediction = self._predictions.get(prediction_id)
+            if prediction is None:
+                return None
+            if time.monotonic() >= prediction["ready_at"]:
+                prediction["status"] = prediction["final_status"]
+            elif prediction["status"] == "created":
+                prediction["status"] = "processing"
+            return dict(prediction)
+
+    def media(self, name: str) -> Optional[Tuple[bytes, str]]:
+        prediction_id, _, file_name = name.partition("/")
+        if not file_name:
+            return None
+        if file_name.endswith(".mp4"):
+            with self._lock:
+                if self._video is None:
+                    if self.options.video_file:
+                        with open(self.options.video_file, "rb") as f:
+                            self._video = f.read()
+                    else:
+                        self._video = generate_mp4(*self.options.image_size, self.options.video_seconds)
+                return self._video, "video/mp4"
+        # 每个 prediction 的颜色不同但固定，便于肉眼区分输出
+        digest = hashlib.sha1(name.encode()).digest()
+        return generate_png(*self.options.image_size, (digest[0], digest[1], digest[2])), "image/png"
+
+    # ==================== OSS ====================
+
+    def put_object(self, key: str, data: bytes):
+        with self._lock:
+            self._objects[key] = data
+
+    def get_object(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._objects.get(key)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockUpstream/1.0"
+
+    @property
+    def mock(self) -> MockUpstream:
+        return self.server.mock
+
+    def log_message(self, format, *args):
+        # 压测时请求量很大，不输出访问日志
+        pass
+
+    # ==================== 响应 ====================
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _send_error(self, status: int, message: str, oss: bool = False):
+        headers = {"Retry-After": "1"} if status == 429 else None
+        if oss:
+            code = "TooManyRequests" if status == 429 else "InternalError"
+            body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code><Message>{message}</Message></Error>"
+            self._send(status, body.encode("utf-8"), "application/xml", headers)
+        else:
+            self._send_json(status, {"code": status, "message": message}, headers)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _base_url(self) -> str:
+        host = self.headers.get("Host")
+        return f"http://{host}" if host else self.mock.base_url
+
+    def _inject(self, kind: str, oss: bool = False) -> bool:
+        """对计费请求注入延迟、429 和 500；已返回错误时返回 True"""
+        options = self.mock.options
+        self.mock.count(kind)
+        if self.mock.chance(options.throttle_rate):
+            self.mock.count("throttled")
+            self._send_error(429, "Too Many Requests", oss)
+            return True
+        if self.mock.chance(options.error_rate):
+            self.mock.count("errors")
+            self._send_error(500, "Injected upstream error", oss)
+            return True
+        return False
+
+    def _delay(self):
+        delay = self.mock.sample(self.mock.options.latency)
+        if delay:
+            time.sleep(delay)
+
+    # ==================== 路由 ====================
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/__stats":
+            return self._send_json(200, self.mock.snapshot())
+        self._delay()
+        if path.startswith("/media/"):
+            self.mock.count("media")
+            media = self.mock.media(path[len("/media/"):])
+            if media is None:
+                return self._send_error(404, "Not Found")
+            return self._send(200, media[0], media[1])
+        match = re.fullmatch(r"/api/v3/predictions/([^/]+)/result", path)
+        if match:
+            self.mock.count("poll")
+            prediction = self.mock.prediction(match.group(1))
+            if prediction is None:
+                return self._send_error(404, "Prediction not found")
+            return self._send_json(200, {"code": 200, "message": "success", "data": self._prediction_data(prediction)})
+        data = self.mock.get_object(path.lstrip("/"))
+        if data is None:
+            return self._send_error(404, "NoSuchKey", oss=True)
+        self.mock.count("oss_get")
+        self._send(200, data, "application/octet-stream", {"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self._read_body()
+        if path == "/__reset":
+            self.mock.reset()
+            return self._send_json(200, {"ok": True})
+        self._delay()
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return self._send_error(400, "Invalid JSON body")
+        if path.endswith("/chat/completions"):
+            stream = bool(payload.get("stream"))
+            if self._inject("chat_stream" if stream else "chat"):
+                return
+            return self._chat(payload, stream)
+        if path.startswith("/api/v3/"):
+            if self._inject("submit"):
+                return
+            prediction = self.mock.submit(path[len("/api/v3/"):], payload)
+            if payload.get("enable_sync_mode"):
+                prediction = self.mock.prediction(prediction["id"])
+            return self._send_json(200, {"code": 200, "message": "success", "data": self._prediction_data(prediction)})
+        self._send_error(404, "Not Found")
+
+    def do_PUT(self):
+        path = self.path.split("?", 1)[0]
+        body = self._read_body()
+        self._delay()
+        if self._inject("oss_put", oss=True):
+            return
+        self.mock.put_object(path.lstrip("/"), body)
+        self._send(200, b"", "application/xml", {
+            "ETag": f'"{hashlib.md5(body).hexdigest().upper()}"',
+            "x-oss-request-id": uuid.uuid4().hex,
+        })
+
+    # ==================== 接口实现 ====================
+
+    def _prediction_data(self, prediction: Dict[str, Any]) -> Dict[str, Any]:
+        prediction_id = prediction["id"]
+        base_url = self._base_url()
+        data = {
+            "id": prediction_id,
+            "model": prediction["model"],
+            "status": prediction["status"],
+            "outputs": [],
+            "urls": {"get": f"{base_url}/api/v3/predictions/{prediction_id}/result"},
+            "has_nsfw_contents": [],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(prediction["created_at"])),
+            "error": "",
+        }
+        if prediction["status"] == "completed":
+            if prediction["base64"]:
+                outputs = []
+                for name in prediction["outputs"]:
+                    content, mime = self.mock.media(name)
+                    outputs.append(f"data:{mime};base64,{base64.b64encode(content).decode('ascii')}")
+                data["outputs"] = outputs
+            else:
+                data["outputs"] = [f"{base_url}/media/{name}" for name in prediction["outputs"]]
+            data["has_nsfw_contents"] = [False] * len(data["outputs"])
+        elif prediction["status"] == "failed":
+            data["error"] = "Injected generation failure"
+        return data
+
+    def _chat(self, payload: Dict[str, Any], stream: bool):
+        reply = self.mock.options.chat_reply
+        model = payload.get("model") or "mock"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        prompt_tokens = max(1, len(json.dumps(payload.get("messages") or [], ensure_ascii=False)) // 4)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply),
+            "total_tokens": prompt_tokens + len(reply),
+        }
+        if not stream:
+            return self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for start in range(0, len(reply), 8):
+            if self.mock.options.stream_chunk_interval:
+                time.sleep(self.mock.options.stream_chunk_interval)
+            event({"content": reply[start:start + 8]})
+        event({}, "stop", usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def _size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地上游模拟服务（WaveSpeed / OpenRouter / OSS）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=Distribution.parse, default="fixed:0", help="每个请求的响应延迟")
+    parser.add_argument("--processing", type=Distribution.parse, default="fixed:1", help="生成任务完成所需时间")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="计费请求返回 500 的概率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="计费请求返回 429 的概率")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="生成任务失败的概率")
+    parser.add_argument("--image-size", type=_size, default="512x512", help="生成图片尺寸，例如 1024x576")
+    parser.add_argument("--video-seconds", type=float, default=1.0, help="生成视频时长（需要 ffmpeg）")
+    parser.add_argument("--video-file", default=None, help="使用指定视频文件作为视频输出")
+    parser.add_argument("--chat-reply", default=None, help="LLM 回复内容文件（默认固定文本）")
+    parser.add_argument("--stream-interval", type=float, default=0.01, help="流式回复每段间隔（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    chat_reply = DEFAULT_CHAT_REPLY
+    if args.chat_reply:
+        with open(args.chat_reply, "r", encoding="utf-8") as f:
+            chat_reply = f.read()
+
+    mock = MockUpstream(MockOptions(
+        latency=args.latency,
+        processing=args.processing,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        failure_rate=args.failure_rate,
+        image_size=args.image_size,
+        video_seconds=args.video_seconds,
+        video_file=args.video_file,
+        chat_reply=chat_reply,
+        stream_chunk_interval=args.stream_interval,
+        seed=args.seed,
+    ), host=args.host, port=args.port)
+
+    print(f"模拟服务已启动: {mock.base_url}（latency={mock.options.latency}, processing={mock.options.processing}）")
+    print("在 config.yaml 中设置：")
+    print("upstreams:")
+    print(f'  wavespeed_base_url: "{mock.wavespeed_base_url}"')
+    print(f'  openrouter_base_url: "{mock.openrouter_base_url}"')
+    print(f'  oss_endpoint: "{mock.oss_endpoint}"')
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+启动耗时分析脚本
+
+在独立的 Python 进程中导入 main 并完成应用启动（startup 事件）、请求一次 /api/health，
+输出：
+- 导入 main 的总耗时、启动到 /api/health 返回的总耗时（不含关闭）
+- 基线：同样方式启动一个只有 /api/health 的空应用的耗时，用于对比机器本身的速度
+- 按累计导入耗时排序的模块列表（基于 python -X importtime）
+- 启动后已加载的重型媒体 / 模型依赖（理想情况下应为空）
+
+用法：
+    python scripts/startup_profile.py [--top 25]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+server_dir = Path(__file__).parent.parent
+
+# 这些依赖应在首次使用时才导入，不应出现在 API 进程启动阶段
+HEAVY_MODULES = ("numpy", "cv2", "PIL", "scipy", "librosa", "soundfile", "moviepy", "decord", "imageio", "oss2")
+
+BOOT_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    status = client.get("/api/health").status_code
+    ready = time.perf_counter()
+heavy = sorted(m for m in sys.modules if m.split(".")[0] in HEAVY_MODULES)
+print(json.dumps({
+    "import_seconds": imported - start,
+    "ready_seconds": ready - start,
+    "health_status": status,
+    "heavy_modules": sorted({m.split(".")[0] for m in heavy}),
+}))
+"""
+
+# 基线：导入 FastAPI、启动空应用并响应 /api/health
+BASELINE_SCRIPT = r"""
+import json, time
+start = time.perf_counter()
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+app = FastAPI()
+
+@app.get("/api/health")
+def health():
+    return {"status": "ok"}
+
+with TestClient(app) as client:
+    status = client.get("/api/health").status_code
+    ready = time.perf_counter()
+print(json.dumps({"ready_seconds": ready - start, "health_status": status}))
+"""
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _run_script(script: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    env = dict(os.environ, PYTHONPATH=str(server_dir))
+    return subprocess.run(cmd + ["-c", script], cwd=server_dir, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def run_boot(importtime: bool = False) -> subprocess.CompletedProcess:
+    """在子进程中启动应用"""
+    return _run_script(f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{BOOT_SCRIPT}", importtime)
+
+
+def run_baseline() -> subprocess.CompletedProcess:
+    """在子进程中启动只有 /api/health 的空应用"""
+    return _run_script(BASELINE_SCRIPT)
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 [(累计微秒, 自身微秒, 模块名)]，仅保留顶层导入"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) <= 1:
+            entries.append((int(match.group(2)), int(match.group(1)), match.group(4)))
+    return sorted(entries, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析 API 进程启动耗时")
+    parser.add_argument("--top", type=int, default=25, help="显示累计耗时最高的模块数")
+    args = parser.parse_args()
+
+    result = run_boot(importtime=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    baseline = run_baseline()
+    baseline_report = json.loads(baseline.stdout.strip().splitlines()[-1]) if baseline.returncode == 0 else None
+
+    print("=" * 60)
+    print(f"导入 main:           {report['import_seconds'] * 1000:8.1f} ms")
+    print(f"启动并响应 /api/health: {report['ready_seconds'] * 1000:8.1f} ms (HTTP {report['health_status']})")
+    if baseline_report:
+        print(f"基线（空应用）:        {baseline_report['ready_seconds'] * 1000:8.1f} ms")
+    print("=" * 60)
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for cumulative, own, name in parse_importtime(result.stderr)[:args.top]:
+        print(f"{cumulative / 1000:10.1f} {own / 1000:10.1f}  {name}")
+    print("=" * 60)
+    if report["heavy_modules"]:
+        print(f"启动阶段已加载重型依赖: {', '.join(report['heavy_modules'])}")
+    else:
+        print("启动阶段未加载重型依赖")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+单个任务的耗时分解
+
+从 tracing 的 file 导出器目录读取一条 trace，输出：
+- span 树（相邻的同名兄弟 span，例如多次轮询，合并为一行）
+- 按 span 名称汇总的次数、总耗时和自身耗时（扣除子 span 后的时间，例如轮询之间的等待）
+- 上游 prediction 状态首次出现的时间（区分上游排队和生成）
+
+用法（在 server 目录下）：
+    python scripts/trace_report.py <task_id 或 trace_id> [--dir logs/traces]
+"""
+
+import argparse
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+server_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(server_dir))
+
+from utils.tracing import read_trace  # noqa: E402
+
+# 树中显示的属性
+SHOWN_ATTRIBUTES = ("tool_type", "model", "task.id", "task.status", "http.status_code", "prediction.status",
+                    "oss.key", "file.size", "http.url")
+
+
+def _seconds(span: Dict[str, Any], key: str) -> float:
+    return (span.get(key) or span["start_time_unix_nano"]) / 1e9
+
+
+def _duration(span: Dict[str, Any]) -> float:
+    return _seconds(span, "end_time_unix_nano") - _seconds(span, "start_time_unix_nano")
+
+
+def _covered(intervals: List[Tuple[float, float]]) -> float:
+    """区间并集的总长度"""
+    total = 0.0
+    end = None
+    for start, stop in sorted(intervals):
+        if end is None or start > end:
+            total += stop - start
+            end = stop
+        elif stop > end:
+            total += stop - end
+            end = stop
+    return total
+
+
+def resolve_trace_id(value: str) -> str:
+    """参数为 32 位十六进制时视为 trace_id，否则按 task_id 读取任务记录中的 trace_id"""
+    if re.fullmatch(r"[0-9a-f]{32}", value):
+        return value
+    from api.tasks import get_task
+
+    task = get_task(value)
+    if task is None:
+        raise SystemExit(f"任务不存在: {value}")
+    if not task.get("trace_id"):
+        raise SystemExit(f"任务 {value} 没有 trace_id（在启用追踪之前创建）")
+    return task["trace_id"]
+
+
+def build_tree(spans: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """返回 (根 span 列表, span_id -> 子 span 列表)；父 span 缺失（例如仍在执行）的 span 视为根"""
+    ids = {span["span_id"] for span in spans}
+    children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    roots = []
+    for span in spans:
+        parent = span.get("parent_span_id")
+        if parent and parent in ids:
+            children[parent].append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+
+def self_times(spans: List[Dict[str, Any]], children: Dict[str, List[Dict[str, Any]]]) -> Dict[str, float]:
+    """每个 span 扣除子 span 覆盖时间后的自身耗时"""
+    result = {}
+    for span in spans:
+        intervals = [(_seconds(child, "start_time_unix_nano"), _seconds(child, "end_time_unix_nano"))
+                     for child in children.get(span["span_id"], [])]
+        result[span["span_id"]] = max(0.0, _duration(span) - _covered(intervals))
+    return result
+
+
+def _describe(span: Dict[str, Any]) -> str:
+    attributes = span.get("attributes", {})
+    parts = [f"{key}={attributes[key]}" for key in SHOWN_ATTRIBUTES if attributes.get(key) is not None]
+    if span.get("status", {}).get("code") == "ERROR":
+        parts.append(f"ERROR: {span['status'].get('message')}")
+    return "  ".join(parts)
+
+
+def print_tree(roots, children, origin: float):
+    print(f"{'开始(s)':>10}{'耗时(s)':>10}  span")
+
+    def walk(siblings, depth):
+        index = 0
+        while index < len(siblings):
+            span = siblings[index]
+            group = [span]
+            while index + len(group) < len(siblings) and siblings[index + len(group)]["name"] == span["name"]:
+                group.append(siblings[index + len(group)])
+            if len(group) > 2:
+                # 合并后不再展开子 span（见按名称汇总）
+                start = _seconds(group[0], "start_time_unix_nano") - origin
+                total = sum(_duration(item) for item in group)
+                statuses = []
+                for item in group:
+                    status = item.get("attributes", {}).get("prediction.status")
+                    if status and (not statuses or statuses[-1] != status):
+                        statuses.append(status)
+                detail = f"  prediction.status: {' -> '.join(statuses)}" if statuses else ""
+                print(f"{start:>10.3f}{total:>10.3f}  {'  ' * depth}{span['name']} ×{len(group)}（合计）{detail}")
+                index += len(group)
+                continue
+            start = _seconds(span, "start_time_unix_nano") - origin
+            print(f"{start:>10.3f}{_duration(span):>10.3f}  {'  ' * depth}{span['name']}  {_describe(span)}")
+            walk(children.get(span["span_id"], []), depth + 1)
+            index += 1
+
+    walk(roots, 0)
+
+
+def print_summary(spans, children, origin: float):
+    own = self_times(spans, children)
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    for span in spans:
+        entry = totals[span["name"]]
+        entry[0] += 1
+        entry[1] += _duration(span)
+        entry[2] += own[span["span_id"]]
+    print(f"\n{'span':<28}{'次数':>8}{'总耗时(s)':>12}{'自身耗时(s)':>14}")
+    for name, (count, total, self_time) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<28}{count:>8}{total:>12.3f}{self_time:>14.3f}")
+
+    first_seen = {}
+    for span in spans:
+        status = span.get("attributes", {}).get("prediction.status")
+        if status and status not in first_seen:
+            first_seen[status] = _seconds(span, "end_time_unix_nano") - origin
+    if first_seen:
+        print("\nprediction 状态首次出现（秒）：" + "，".join(f"{status} {at:.3f}" for status, at in first_seen.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单个任务的耗时分解")
+    parser.add_argument("id", help="task_id 或 trace_id")
+    parser.add_argument("--dir", default=None, help="span 文件目录（默认 tracing.dir）")
+    args = parser.parse_args()
+
+    trace_id = resolve_trace_id(args.id)
+    spans = read_trace(trace_id, args.dir)
+    if not spans:
+        raise SystemExit(f"没有找到 trace {trace_id} 的 span（检查 tracing.exporter 是否为 file、--dir 是否正确）")
+    origin = min(_seconds(span, "start_time_unix_nano") for span in spans)
+    end = max(_seconds(span, "end_time_unix_nano") for span in spans)
+    print(f"trace {trace_id}：{len(spans)} 个 span，共 {end - origin:.3f} 秒\n")
+    roots, children = build_tree(spans)
+    print_tree(roots, children, origin)
+    print_summary(spans, children, origin)
+
+
+if __name__ == "__main__":
+    main()
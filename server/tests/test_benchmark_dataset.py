@@ -0,0 +1,51 @@
+"""
+合成数据生成测试
+不依赖测试服务器
+"""
+
+import json
+import os
+
+from benchmarks.dataset import DatasetGenerator, DatasetSpec
+
+SPEC = DatasetSpec(works=5, episodes_per_work=2, shots_per_episode=3, large_episodes=1, large_episode_shots=20,
+                   videos_per_shot=2, history=30, tasks=10)
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_generate_layout(tmp_path):
+    """测试作品、分镜（含 video_history）、历史记录和任务的目录结构"""
+    root = str(tmp_path)
+    manifest = DatasetGenerator(root, seed=3).generate(SPEC)
+    assert manifest["works"] == 5
+    assert manifest["history"] == 30
+    assert manifest["tasks"] == 10
+    assert len(os.listdir(os.path.join(root, "works"))) == 5
+    assert len(os.listdir(os.path.join(root, "tools", "history"))) == 30
+    assert len(os.listdir(os.path.join(root, "tools", "tasks"))) == 10
+
+    large = manifest["large_episodes"][0]
+    storyboard = _load(os.path.join(root, "works", large["work_id"], "episodes", large["episode_id"], "storyboard.json"))
+    assert len(storyboard["shots"]) == 20
+    assert storyboard["text"].count("分镜") >= 20
+    shot = storyboard["shots"][0]
+    assert len(shot["video_history"]) == 2
+    assert shot["current_video"] in [video["video_path"] for video in shot["video_history"]]
+
+
+def test_generate_is_incremental(tmp_path):
+    """测试对已有目录放大规模时只补齐差额，且新 ID 不与已有数据冲突"""
+    root = str(tmp_path)
+    generator = DatasetGenerator(root, seed=3)
+    generator.generate(SPEC)
+    first_history = set(os.listdir(os.path.join(root, "tools", "history")))
+    manifest = generator.generate(SPEC.scaled(2))
+    history = set(os.listdir(os.path.join(root, "tools", "history")))
+    assert manifest["works"] == 10
+    assert len(history) == 60
+    assert first_history <= history
+    assert _load(os.path.join(root, "dataset.json"))["works"] == 10
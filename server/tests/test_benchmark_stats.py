@@ -0,0 +1,40 @@
+"""
+基准测试统计工具测试
+不依赖测试服务器
+"""
+
+import pytest
+
+from benchmarks.stats import Recorder, compare_results, percentile, summarize
+
+
+def test_percentile_interpolates():
+    """测试分位数线性插值"""
+    values = [0.01 * n for n in range(1, 101)]
+    assert percentile(values, 0.5) == pytest.approx(0.505)
+    assert percentile(values, 0.99) == pytest.approx(0.9901)
+    assert percentile([0.2], 0.95) == 0.2
+
+
+def test_recorder_summary():
+    """测试延迟摘要（毫秒）、失败数和吞吐量"""
+    recorder = Recorder()
+    for ms in (10, 20, 30, 40):
+        recorder.record("list_works", ms / 1000)
+    recorder.record("list_works", 0.05, ok=False)
+    stats = recorder.summary(elapsed=2.0)["list_works"]
+    assert stats["count"] == 5
+    assert stats["errors"] == 1
+    assert stats["p50_ms"] == 30.0
+    assert stats["max_ms"] == 50.0
+    assert stats["throughput_rps"] == 2.5
+    assert summarize([]) == {"count": 0}
+
+
+def test_compare_results():
+    """测试两次结果的逐项比较"""
+    baseline = {"scenarios": {"works": {"list_works": {"p50_ms": 10.0, "throughput_rps": 100.0}}}}
+    current = {"scenarios": {"works": {"list_works": {"p50_ms": 5.0, "throughput_rps": 200.0}}}}
+    lines = compare_results(baseline, current)
+    assert any("p50_ms" in line and "-50.0%" in line for line in lines)
+    assert any("throughput_rps" in line and "+100.0%" in line for line in lines)
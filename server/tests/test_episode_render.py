@@ -0,0 +1,187 @@
+"""
+剧集成片渲染测试
+不依赖测试服务器：ffprobe、转码、台词合成和拼接替换为本地模拟，只验证缓存和目标参数选择逻辑。
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from utils import episode_render
+from utils.episode_render import (
+    FileIndex, _escape_concat_path, choose_target_info, render_episode, segment_cache_key, stream_signature,
+)
+
+
+def _info(width=1280, height=720, fps="24/1", has_audio=True, codec="h264"):
+    return {
+        "video_codec": codec, "width": width, "height": height, "pix_fmt": "yuv420p", "fps": fps,
+        "has_audio": has_audio, "audio_codec": "aac" if has_audio else None,
+        "sample_rate": 44100 if has_audio else None, "channels": 2 if has_audio else None, "duration": 5.0,
+    }
+
+
+def test_segment_cache_key():
+    """测试缓存键由视频哈希、音频哈希和参数决定，与参数顺序无关"""
+    key = segment_cache_key("v1", "a1", {"stage": "dialogue", "backend": "ffmpeg"})
+    assert key == segment_cache_key("v1", "a1", {"backend": "ffmpeg", "stage": "dialogue"})
+    assert len(key) == 32
+    assert key != segment_cache_key("v2", "a1", {"stage": "dialogue", "backend": "ffmpeg"})
+    assert key != segment_cache_key("v1", None, {"stage": "dialogue", "backend": "ffmpeg"})
+    assert key != segment_cache_key("v1", "a1", {"stage": "dialogue", "backend": "moviepy"})
+
+
+def test_choose_target_info():
+    """测试目标参数取出现最多的组合，任一片段带音轨时目标必须带音轨"""
+    hd, sd = _info(), _info(width=640, height=360)
+    assert stream_signature(hd) != stream_signature(sd)
+    assert stream_signature(hd) == stream_signature(dict(hd, duration=9.0))
+    assert choose_target_info([sd, hd, hd]) is hd
+
+    silent = _info(has_audio=False)
+    target = choose_target_info([silent, silent, sd])
+    assert target is sd
+    assert choose_target_info([silent, _info(width=640, height=360, has_audio=False)]) is silent
+
+
+def test_escape_concat_path(tmp_path):
+    """测试 concat 列表中的路径为绝对路径并转义单引号"""
+    path = os.path.join(tmp_path, "it's.mp4")
+    assert _escape_concat_path(path) == os.path.join(tmp_path, "it'\\''s.mp4")
+    assert os.path.isabs(_escape_concat_path("clip.mp4"))
+
+
+def test_file_index(tmp_path, monkeypatch):
+    """测试哈希和探测结果按 (大小, 修改时间) 缓存，文件变化后失效，可保存和重新加载"""
+    probes = []
+    monkeypatch.setattr(episode_render, "probe_video", lambda path: probes.append(path) or _info())
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"first")
+    index = FileIndex(str(tmp_path / "cache" / "hashes.json"))
+
+    digest = index.sha256(str(clip))
+    index.probe(str(clip))
+    index.probe(str(clip))
+    assert probes == [str(clip)]
+
+    clip.write_bytes(b"second!")
+    assert index.sha256(str(clip)) != digest
+    index.probe(str(clip))
+    assert len(probes) == 2
+
+    index.save()
+    reloaded = FileIndex(index.index_path)
+    assert reloaded.sha256(str(clip)) == index.sha256(str(clip))
+    clip.unlink()
+    reloaded.prune()
+    assert reloaded.entries == {}
+
+    with open(index.index_path, "w") as f:
+        f.write("{broken")
+    assert FileIndex(index.index_path).entries == {}
+
+
+@pytest.fixture
+def renderer(tmp_path, monkeypatch):
+    """模拟探测、台词合成、归一化和拼接，记录每次渲染实际执行的任务"""
+    infos = {}
+    runs = []
+
+    def probe(path):
+        return infos.get(os.path.basename(path), _info())
+
+    def run_jobs(jobs, max_workers):
+        runs.append({i: fn.__name__ for i, (fn, *_) in jobs.items()})
+        for fn, *args in jobs.values():
+            dst = args[2] if fn is episode_render.merge_dialogue_segment else args[1]
+            with open(dst, "wb") as f:
+                f.write(b"segment")
+
+    def concat(paths, output_path):
+        with open(output_path, "wb") as f:
+            f.write(b"".join(open(path, "rb").read() for path in paths))
+        return output_path
+
+    monkeypatch.setattr(episode_render, "probe_video", probe)
+    monkeypatch.setattr(episode_render, "_run_jobs", run_jobs)
+    monkeypatch.setattr(episode_render, "concat_clips", concat)
+    for name in ("a.mp4", "b.mp4", "c.mp4", "a.wav"):
+        (tmp_path / name).write_bytes(name.encode())
+    infos["c.mp4"] = _info(width=640, height=360)
+    return tmp_path, runs
+
+
+def test_render_episode_incremental(renderer):
+    """测试只重新生成变化分镜的片段，参数不一致的片段被归一化，未用到的旧片段被清理"""
+    tmp_path, runs = renderer
+    cache_dir = tmp_path / "segments"
+    clips = [
+        {"video_path": str(tmp_path / "a.mp4"), "audio_path": str(tmp_path / "a.wav")},
+        str(tmp_path / "b.mp4"),
+        str(tmp_path / "c.mp4"),
+    ]
+
+    def render():
+        runs.clear()
+        return render_episode(clips, str(tmp_path / "episode.mp4"), cache_dir=str(cache_dir), loudness_target=None)
+
+    first = render()
+    assert runs == [{0: "merge_dialogue_segment"}, {2: "_normalize_segment"}]
+    assert first["normalized"] == [2] and first["rebuilt"] == [0, 2] and not first["stream_copy"]
+    assert first["target"]["width"] == 1280
+    segments = sorted(name for name in os.listdir(cache_dir) if name.endswith(".mp4"))
+    assert len(segments) == 2
+
+    # 没有变化时全部使用缓存
+    second = render()
+    assert runs == [{}, {}] and second["rebuilt"] == []
+
+    # 台词变化：只重新合成该分镜，旧的台词片段被清理
+    (tmp_path / "a.wav").write_bytes(b"new dialogue")
+    third = render()
+    assert runs == [{0: "merge_dialogue_segment"}, {}] and third["rebuilt"] == [0]
+    current = sorted(name for name in os.listdir(cache_dir) if name.endswith(".mp4"))
+    assert len(current) == 2 and len(set(current) & set(segments)) == 1
+
+
+def test_concurrent_renders_serialized(renderer, monkeypatch):
+    """测试同一缓存目录的并发渲染依次执行，不会删除对方正在使用的片段"""
+    tmp_path, runs = renderer
+    clips = [{"video_path": str(tmp_path / "a.mp4"), "audio_path": str(tmp_path / "a.wav")}, str(tmp_path / "c.mp4")]
+    concat = episode_render.concat_clips
+    active = []
+    overlapped = threading.Event()
+
+    def slow_concat(paths, output_path):
+        active.append(output_path)
+        if len(active) > 1:
+            overlapped.set()
+        time.sleep(0.2)
+        try:
+            # 拼接时所有片段都必须仍然存在
+            return concat(paths, output_path)
+        finally:
+            active.remove(output_path)
+
+    monkeypatch.setattr(episode_render, "concat_clips", slow_concat)
+    results, errors = [], []
+
+    def render(name, dialogue):
+        try:
+            results.append(render_episode(
+                [dict(clips[0], audio_path=str(tmp_path / dialogue)), clips[1]], str(tmp_path / name),
+                cache_dir=str(tmp_path / "segments"), loudness_target=None,
+            ))
+        except Exception as e:
+            errors.append(e)
+
+    (tmp_path / "b.wav").write_bytes(b"other dialogue")
+    threads = [threading.Thread(target=render, args=(f"episode{i}.mp4", wav)) for i, wav in enumerate(["a.wav", "b.wav"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(results) == 2
+    assert not overlapped.is_set()
@@ -130,3 +130,24 @@ async def test_get_storyboard(client: APITestClient):
     data = response.json()
     assert "shots" in data
 
+
+
+@pytest.mark.asyncio
+async def test_get_render_not_rendered(client: APITestClient):
+    """测试获取未渲染剧集的成片信息"""
+    work_id, _ = create_test_work()
+    episode_id, _ = create_test_episode(work_id)
+    
+    response = await client.get(f"/api/episodes/{work_id}/{episode_id}/render")
+    assert response.status_code == 200
+    assert response.json()["rendered"] is False
+
+
+@pytest.mark.asyncio
+async def test_render_without_storyboard(client: APITestClient):
+    """测试没有分镜时渲染成片"""
+    work_id, _ = create_test_work()
+    episode_id, _ = create_test_episode(work_id)
+    
+    response = await client.post(f"/api/episodes/{work_id}/{episode_id}/render")
+    assert response.status_code == 400
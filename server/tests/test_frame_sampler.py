@@ -0,0 +1,181 @@
+"""
+视频抽帧测试
+不依赖测试服务器：用 OpenCV 在临时目录生成 MJPG 测试视频（每帧亮度不同）。
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pytest
+
+from utils import frame_sampler
+from utils.frame_sampler import (
+    _disk_get, _disk_put, decode_frames, frame_signature, prune_disk_cache, sample_in_pool, sample_scene_frames,
+    sample_video_frames, select_scene_frames,
+)
+from utils.media_pool import MediaWorkerPool
+
+
+def _write_video(path, frames=60, step=4):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 24, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * step % 256, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_sampler, "_memory_cache", OrderedDict())
+    monkeypatch.setattr(frame_sampler, "_memory_cache_bytes", 0)
+    monkeypatch.setattr(frame_sampler, "_last_disk_prune", None)
+    return _write_video(tmp_path / "clip.avi")
+
+
+def test_decode_modes(video, monkeypatch):
+    """测试顺序解码与逐帧跳转取到同一组帧，auto 按抽帧间隔选择，keyframe 只走关键帧解码"""
+    sequential = decode_frames(video, 5, mode="sequential")
+    seek = decode_frames(video, 5, mode="seek")
+    # 均匀选取 0, 14, 29, 44, 59 帧（MJPG 有损，亮度允许少量误差）
+    assert [frame.mean() for frame in sequential] == pytest.approx([0, 56, 116, 176, 236], abs=2)
+    assert all(np.array_equal(a, b) for a, b in zip(sequential, seek))
+    assert decode_frames(video, 3, target_resolution=24)[0].shape == (24, 32, 3)
+
+    used = []
+    for name in ("_decode_sequential", "_decode_seek"):
+        original = getattr(frame_sampler, name)
+        monkeypatch.setattr(frame_sampler, name,
+                            lambda *args, _name=name, _fn=original: used.append(_name) or _fn(*args))
+    monkeypatch.setattr(frame_sampler, "_decode_keyframes",
+                        lambda path, count, transform: used.append("_decode_keyframes") or [])
+    monkeypatch.setattr(frame_sampler, "SEEK_GAP_THRESHOLD", 10)
+    decode_frames(video, 4)
+    decode_frames(video, 30)
+    decode_frames(video, 4, mode="keyframe")
+    assert used == ["_decode_seek", "_decode_sequential", "_decode_keyframes"]
+
+
+def test_cache_key(video, tmp_path, monkeypatch):
+    """测试缓存按视频内容哈希和参数区分：auto / seek 共享缓存，内容变化后失效，仅修改时间变化时仍命中"""
+    cache_dir = str(tmp_path / "frames")
+    decodes = []
+    original = frame_sampler.decode_frames
+    monkeypatch.setattr(frame_sampler, "decode_frames", lambda *args: decodes.append(args[4]) or original(*args))
+
+    def sample(mode="auto"):
+        return sample_video_frames(video, 4, target_resolution=24, mode=mode, cache_dir=cache_dir)
+
+    first = sample()
+    assert len(first) == 4 and sample("seek") == first
+    monkeypatch.setattr(frame_sampler, "_memory_cache", OrderedDict())
+    assert sample() == first
+    assert decodes == ["auto"]
+
+    monkeypatch.setattr(frame_sampler, "_decode_keyframes", lambda path, count, transform: [])
+    sample("keyframe")
+    assert decodes == ["auto", "keyframe"]
+
+    # 只修改时间变化：重新计算哈希，内容相同仍命中
+    stat = os.stat(video)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert sample() == first and len(decodes) == 2
+
+    # 内容变化：缓存失效，重新解码
+    _write_video(video, frames=60, step=2)
+    assert sample() != first and decodes[-1] == "auto" and len(decodes) == 3
+
+
+def test_sample_in_pool(video, tmp_path, monkeypatch):
+    """测试抽帧在媒体进程池的工作进程中执行，只传回 JPEG 字节，结果写入共享的磁盘缓存"""
+    pool = MediaWorkerPool(max_workers=1, max_tasks_per_child=None, warm_modules=())
+    monkeypatch.setattr(frame_sampler, "get_media_pool", lambda: pool)
+    cache_dir = str(tmp_path / "frames")
+    try:
+        frames = sample_in_pool(sample_video_frames, video, count=4, target_resolution=24, cache_dir=cache_dir)
+        assert len(frames) == 4 and all(isinstance(frame, bytes) for frame in frames)
+        assert sample_in_pool(sample_scene_frames, video, max_frames=3, cache_dir=cache_dir)
+    finally:
+        pool.shutdown()
+    # 解码发生在工作进程中：本进程的内存缓存为空，磁盘缓存命中
+    assert not frame_sampler._memory_cache
+    monkeypatch.setattr(frame_sampler, "decode_frames", None)
+    assert sample_video_frames(video, 4, target_resolution=24, cache_dir=cache_dir) == frames
+
+
+def test_disk_cache_eviction(tmp_path):
+    """测试磁盘缓存先删除超过保留天数的条目，再按最近使用时间删除到总大小上限以内"""
+    cache_dir = str(tmp_path / "frames")
+    now = time.time()
+    for index, key in enumerate(["old", "a", "b", "c"]):
+        _disk_put(cache_dir, key, [b"x" * 1000])
+        used_at = now - 30 * 86400 if key == "old" else now - 100 + index
+        os.utime(os.path.join(cache_dir, key, "frames.json"), (used_at, used_at))
+    # 命中的条目更新最近使用时间
+    assert _disk_get(cache_dir, "a") == [b"x" * 1000]
+
+    assert prune_disk_cache(cache_dir, max_bytes=0, max_days=14) == 1
+    assert sorted(os.listdir(cache_dir)) == ["a", "b", "c"]
+    entry_bytes = sum(entry.stat().st_size for entry in os.scandir(os.path.join(cache_dir, "a")))
+    assert prune_disk_cache(cache_dir, max_bytes=2 * entry_bytes, max_days=0) == 1
+    assert sorted(os.listdir(cache_dir)) == ["a", "c"]
+    assert prune_disk_cache(cache_dir, max_bytes=0, max_days=0) == 0
+
+
+def _signatures(frames):
+    signatures = [frame_signature(frame) for frame in frames]
+    return np.stack([gray for gray, _ in signatures]), np.stack([histogram for _, histogram in signatures])
+
+
+def _solid(bgr):
+    return np.full((64, 64, 3), bgr, dtype=np.uint8)
+
+
+def test_select_scene_frames():
+    """测试按差异度阈值去掉近似重复帧，保留镜头切换和明显运动的帧"""
+    red, blue = _solid((0, 0, 200)), _solid((200, 0, 0))
+    moved = blue.copy()
+    moved[:32, :32] = 255
+    noisy = red.copy()
+    noisy[0, 0] = 0
+    grays, histograms = _signatures([red, red, noisy, blue, blue, moved])
+    sizes = [100] * 6
+
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10) == [0, 3, 5]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, threshold=0.0) == [0, 1, 2, 3, 4, 5]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, threshold=1.01) == [0]
+    assert select_scene_frames(grays[:0], histograms[:0], [], max_frames=10) == []
+
+    # 缓慢移动：每帧变化都低于阈值，与最近一次选中帧（而不是前一帧）比较，累计变化超过阈值才再选一帧
+    moving = []
+    for x in range(40):
+        frame = _solid((0, 0, 0))
+        frame[:, x:x + 8] = 255
+        moving.append(frame)
+    grays, histograms = _signatures(moving)
+    chosen = select_scene_frames(grays, histograms, [100] * len(moving), max_frames=100)
+    assert 5 < len(chosen) < len(moving) // 2
+    assert min(b - a for a, b in zip(chosen, chosen[1:])) > 1
+
+
+def test_select_scene_frames_spacing_and_budget():
+    """测试最小间隔抑制连续闪烁，超出帧数或字节预算时保留差异最大的帧且首帧始终保留"""
+    dark, flash, green = _solid((10, 10, 10)), _solid((255, 255, 255)), _solid((0, 200, 0))
+    grays, histograms = _signatures([dark, flash, dark, flash, dark, green])
+    sizes = [100] * 6
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10) == [0, 1, 2, 3, 4, 5]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, min_spacing=2) == [0, 3, 5]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, min_spacing=3) == [0, 3]
+
+    red, blue, white = _solid((0, 0, 200)), _solid((200, 0, 0)), _solid((255, 255, 255))
+    half_blue = blue.copy()
+    half_blue[:, :32] = (0, 0, 200)
+    grays, histograms = _signatures([red, half_blue, blue, white])
+    sizes = [100, 100, 100, 500]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10) == [0, 1, 2, 3]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=2) == [0, 3]
+    # 字节预算内按差异度保留：最大的白帧超出预算被跳过，其后较小的帧仍可加入
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, max_bytes=300) == [0, 1, 2]
+    assert select_scene_frames(grays, histograms, sizes, max_frames=10, max_bytes=50) == [0]
@@ -0,0 +1,65 @@
+"""
+事件循环阻塞监控测试
+不依赖测试服务器。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import traceback
+
+from utils.loop_watchdog import LoopWatchdog, blocking_location
+from utils.metrics import LOOP_BLOCKED, LOOP_BLOCKED_SECONDS, LOOP_LAG
+from utils.settings import SERVER_DIR
+
+
+def _value(metric, *labels):
+    return metric.samples().get(json.dumps([str(label) for label in labels]))
+
+
+def test_blocking_location():
+    """测试归类优先取最内层的 api/ 函数，跳过依赖库"""
+    def frame(path, name):
+        return traceback.FrameSummary(path, 1, name)
+
+    stack = [
+        frame("/usr/lib/python3/asyncio/events.py", "_run"),
+        frame(os.path.join(SERVER_DIR, "api", "content.py"), "update_shot"),
+        frame(os.path.join(SERVER_DIR, "utils", "common.py"), "save_json"),
+        frame("/usr/lib/python3/json/__init__.py", "dump"),
+    ]
+    assert blocking_location(stack) == os.path.join("api", "content.py") + ":update_shot"
+    assert blocking_location(stack[2:]) == os.path.join("utils", "common.py") + ":save_json"
+    assert blocking_location(stack[:1]) == "unknown"
+
+
+def test_blocked_loop_reported(caplog):
+    """测试阻塞事件循环的同步调用被记录调用栈、归类和时长"""
+    location = os.path.join("tests", "test_loop_watchdog.py") + ":blocking_handler"
+
+    async def blocking_handler():
+        time.sleep(0.4)
+
+    async def run():
+        watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.1)
+            await blocking_handler()
+            await asyncio.sleep(0.1)
+        finally:
+            watchdog.stop()
+
+    before = _value(LOOP_BLOCKED, location) or 0
+    lag_count = (_value(LOOP_LAG) or {"count": 0})["count"]
+    with caplog.at_level(logging.WARNING, logger="utils.loop_watchdog"):
+        asyncio.run(run())
+
+    assert _value(LOOP_BLOCKED, location) == before + 1
+    assert _value(LOOP_BLOCKED_SECONDS, location)["sum"] >= 0.3
+    assert _value(LOOP_LAG)["count"] > lag_count
+    stacks = [record.getMessage() for record in caplog.records if "已阻塞" in record.getMessage()]
+    assert len(stacks) == 1
+    assert location in stacks[0] and "time.sleep(0.4)" in stacks[0]
@@ -0,0 +1,76 @@
+"""
+响度分析测试
+不依赖测试服务器：使用合成信号，不经过 ffmpeg。
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from utils.loudness import (
+    ANALYSIS_SAMPLE_RATE, LoudnessAccumulator, balance_gains, combined_integrated_loudness, integrated_loudness,
+)
+
+
+def _lufs_to_power(lufs):
+    return 10 ** ((lufs + 0.691) / 10)
+
+
+def test_sine_reference_level():
+    """测试 BS.1770 参考信号：单声道 997Hz 0dBFS 正弦波（另一声道静音）积分响度约为 -3.01 LUFS"""
+    seconds = 5
+    t = np.arange(seconds * ANALYSIS_SAMPLE_RATE) / ANALYSIS_SAMPLE_RATE
+    signal = np.zeros((t.size, 2), dtype=np.float32)
+    signal[:, 0] = np.sin(2 * np.pi * 997 * t)
+
+    accumulator = LoudnessAccumulator(2)
+    # 分块送入，验证滤波器状态和 100ms 步长跨块保持
+    for chunk in np.array_split(signal, 7):
+        accumulator.feed(chunk)
+    result = accumulator.result()
+
+    assert result["integrated_lufs"] == pytest.approx(-3.01, abs=0.05)
+    assert result["duration"] == pytest.approx(seconds)
+    assert result["peak"] == pytest.approx(1.0, abs=1e-3)
+    # RMS 按单声道混音计算：0.5 幅度正弦
+    assert result["rms"] == pytest.approx(0.5 / math.sqrt(2), rel=1e-3)
+    assert len(result["block_powers"]) == seconds * 10 - 3
+
+
+def test_gating():
+    """测试绝对门限丢弃静音块，相对门限丢弃低于平均响度 10 LU 的块"""
+    loud = [_lufs_to_power(-20.0)] * 10
+    quiet = [_lufs_to_power(-35.0)] * 10
+    silent = [_lufs_to_power(-80.0)] * 10 + [0.0]
+
+    assert integrated_loudness(loud + silent) == pytest.approx(-20.0)
+    # -35 LUFS 的块在相对门限（约 -32.9 LUFS）之下，不拉低整体响度
+    assert integrated_loudness(loud + quiet) == pytest.approx(-20.0)
+    # 只比平均低 5 LU 的块保留
+    assert integrated_loudness(loud + [_lufs_to_power(-25.0)] * 10) < -21.0
+    assert integrated_loudness(silent) is None
+    assert integrated_loudness([]) is None
+
+    # 合并片段的门限块等价于对拼接后的音频测量
+    parts = [{"block_powers": loud}, {"block_powers": quiet}, {"block_powers": []}]
+    assert combined_integrated_loudness(parts) == integrated_loudness(loud + quiet)
+
+
+def test_balance_gains():
+    """测试容差内不调整，超出容差时只压低较响的一轨，无法测出积分响度时退回 RMS"""
+    assert balance_gains({"integrated_lufs": -20.0}, {"integrated_lufs": -21.0}) == {"new": 1.0, "original": 1.0}
+
+    gains = balance_gains({"integrated_lufs": -14.0}, {"integrated_lufs": -20.0})
+    assert gains["original"] == 1.0 and gains["new"] == pytest.approx(10 ** (-6 / 20))
+    gains = balance_gains({"integrated_lufs": -30.0}, {"integrated_lufs": -18.0})
+    assert gains["new"] == 1.0 and gains["original"] == pytest.approx(10 ** (-12 / 20))
+
+    gains = balance_gains({"integrated_lufs": None, "rms_db": -10.0}, {"integrated_lufs": -30.0, "rms_db": -20.0})
+    assert gains["new"] == pytest.approx(10 ** (-10 / 20)) and gains["original"] == 1.0
+    assert balance_gains({"rms_db": None}, {"rms_db": -20.0}) == {"new": 1.0, "original": 1.0}
+
+    # 增益只衰减不提升
+    for new_level in (-60.0, -25.0, 0.0):
+        gains = balance_gains({"integrated_lufs": new_level}, {"integrated_lufs": -20.0})
+        assert 0 < gains["new"] <= 1.0 and 0 < gains["original"] <= 1.0
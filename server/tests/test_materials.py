@@ -56,6 +56,19 @@ async def test_create_character(client: APITestClient):
     assert "id" in result
 
 
+@pytest.mark.asyncio
+async def test_create_character_invalid_image(client: APITestClient):
+    """测试上传无效图片创建人物角色"""
+    files = {"main_image": ("test.jpg", b"not an image", "image/jpeg")}
+    data = {
+        "name": "测试角色",
+        "description": "这是一个测试角色"
+    }
+    response = await client.post("/api/materials/characters", files=files, data=data)
+
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_get_character(client: APITestClient):
     """测试获取人物角色"""
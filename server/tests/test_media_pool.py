@@ -0,0 +1,70 @@
+"""
+媒体计算进程池测试
+不依赖测试服务器：任务为本地函数，在真实的工作进程中执行。
+"""
+
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from utils import media_pool
+from utils.media_pool import MediaJobTimeout, MediaWorkerPool
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _stuck(seconds):
+    # 模拟卡在原生代码中：屏蔽 SIGALRM 后进程内的超时无法中断
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(seconds)
+    return os.getpid()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(media_pool, "TIMEOUT_GRACE", 0.3)
+    monkeypatch.setattr(media_pool, "WATCH_INTERVAL", 0.05)
+    pool = MediaWorkerPool(max_workers=2, max_tasks_per_child=None, warm_modules=())
+    yield pool
+    pool.shutdown()
+
+
+def test_queue_wait_not_counted(pool):
+    """测试排队等待的时间不计入任务超时：超时从工作进程开始执行时计算"""
+    # 2 个工作进程执行 6 个 0.4 秒的任务，最后两个排队 0.8 秒，超过超时 + TIMEOUT_GRACE
+    calls = [(_sleep, (0.4,), {})] * 6
+    started = time.monotonic()
+    results = pool.run_many(calls, timeout=0.5)
+    assert len(results) == 6 and time.monotonic() - started >= 1.2
+
+
+def test_in_worker_timeout_keeps_pool(pool):
+    """测试进程内可中断的超时只让该任务失败，进程池不回收"""
+    pool.run(_sleep, 0)
+    executor = pool._executor
+    with pytest.raises(MediaJobTimeout):
+        pool.run(_sleep, 5, timeout=0.2)
+    assert pool._executor is executor
+    assert pool.run(_sleep, 0)
+
+
+def test_stuck_worker_replaced(pool):
+    """测试进程内无法中断的任务超时后只结束该工作进程，被连带中断的任务重新提交后完成"""
+    async def run():
+        stuck = asyncio.ensure_future(pool.submit(_stuck, 30, timeout=0.3))
+        other = asyncio.ensure_future(pool.submit(_sleep, 1.0, timeout=5))
+        await asyncio.sleep(0.2)
+        return await asyncio.gather(stuck, other, return_exceptions=True)
+
+    started = time.monotonic()
+    stuck, other = asyncio.run(run())
+    assert isinstance(stuck, MediaJobTimeout)
+    assert isinstance(other, int)
+    assert time.monotonic() - started < 5
+    assert pool.run(_sleep, 0) != other
@@ -0,0 +1,143 @@
+"""
+运行指标测试
+不依赖测试服务器：上游请求发往后台线程中的 scripts/mock_upstream.py 模拟服务。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from scripts.mock_upstream import Distribution, MockOptions, MockUpstream
+from utils import metrics
+from utils.metrics import (
+    TASK_SECONDS, TASK_STAGE_SECONDS, THREAD_POOL_ACTIVE, THREAD_POOL_QUEUED, UPSTREAM_THROTTLED,
+    Counter, Gauge, Histogram, InstrumentedThreadPool, MetricsExporter, render, route_template, task_finished,
+    track_task, upstream_session,
+)
+from utils.settings import parse_settings
+
+
+def _value(metric, *labels):
+    return metric.samples().get(json.dumps([str(label) for label in labels]))
+
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    def start(**options):
+        mock = MockUpstream(MockOptions(seed=1, **options)).start()
+        mocks.append(mock)
+        settings = parse_settings({"upstreams": {"wavespeed_base_url": mock.wavespeed_base_url}})
+        monkeypatch.setattr(metrics, "get_settings", lambda: settings)
+        return mock
+
+    mocks = []
+    yield start
+    for mock in mocks:
+        mock.stop()
+
+
+def test_render_histogram():
+    """测试直方图输出累计桶、+Inf、sum 和 count，标签值转义"""
+    histogram = Histogram("test_render_seconds", "测试", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.labels('/a"b').observe(value)
+    text = render({"test_render_seconds": {
+        "type": "histogram", "help": "测试", "labels": ["route"], "buckets": [0.1, 1.0],
+        "samples": histogram.samples(),
+    }})
+    assert "# TYPE test_render_seconds histogram" in text
+    assert 'test_render_seconds_bucket{route="/a\\"b",le="0.1"} 1' in text
+    assert 'test_render_seconds_bucket{route="/a\\"b",le="1"} 2' in text
+    assert 'test_render_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in text
+    assert 'test_render_seconds_count{route="/a\\"b"} 3' in text
+
+
+def test_route_template():
+    """测试按路径参数还原路由模板"""
+    route = object()
+    assert route_template({"path": "/api/works", "route": route, "path_params": {}}) == "/api/works"
+    assert route_template({"path": "/api/episodes/w1/e1/storyboard", "route": route,
+                           "path_params": {"work_id": "w1", "episode_id": "e1"}}) == "/api/episodes/{work_id}/{episode_id}/storyboard"
+    assert route_template({"path": "/api/works/missing/x", "path_params": {}}) == "unmatched"
+    assert route_template({"path": "/data/works/a/cover.png"}) == "/data"
+
+
+def test_exporter_merges_processes(tmp_path, monkeypatch):
+    """测试多进程合并：计数器累加并在进程退出后保留，已退出进程的仪表不计入"""
+    counter = Counter("test_merge_total", "测试")
+    gauge = Gauge("test_merge_in_flight", "测试")
+    monkeypatch.setattr(metrics, "_registry", {counter.name: counter, gauge.name: gauge})
+    counter.labels().inc(2)
+    gauge.labels().set(3)
+
+    # 已退出进程留下的指标文件
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    with open(tmp_path / f"{exited.pid}.json", "w", encoding="utf-8") as f:
+        json.dump({"pid": exited.pid, "metrics": metrics.snapshot()}, f)
+
+    exporter = MetricsExporter(str(tmp_path), flush_seconds=60)
+    exporter.start()
+    try:
+        assert not os.path.exists(tmp_path / f"{exited.pid}.json")
+        assert os.path.exists(tmp_path / metrics.ARCHIVE_NAME)
+        counter.labels().inc()
+        merged = exporter.collect()
+        assert merged["test_merge_total"]["samples"]["[]"] == 5
+        assert merged["test_merge_in_flight"]["samples"]["[]"] == 3
+    finally:
+        exporter.stop()
+
+
+def test_task_stages_from_upstream_requests(mock_upstream):
+    """测试提交、上游排队 / 生成和下载阶段按任务记录"""
+    mock = mock_upstream(processing=Distribution.parse("0.3"))
+    with track_task("metrics_test_tool", "seedream4.5"):
+        response = upstream_session.post(f"{mock.wavespeed_base_url}/bytedance/seedream-v4.5", json={"prompt": "a cat"})
+        poll_url = f"{mock.wavespeed_base_url}/predictions/{response.json()['data']['id']}/result"
+        status = None
+        while status != "completed":
+            time.sleep(0.05)
+            data = upstream_session.get(poll_url).json()["data"]
+            status = data["status"]
+        with metrics.task_stage("download"):
+            upstream_session.get(data["outputs"][0]).raise_for_status()
+        task_finished("success")
+
+    assert _value(TASK_SECONDS, "metrics_test_tool", "seedream4.5", "success")["count"] == 1
+    stages = {stage: _value(TASK_STAGE_SECONDS, "metrics_test_tool", "seedream4.5", stage)
+              for stage in ("submit", "queue", "run", "download")}
+    assert all(stage["count"] == 1 for stage in stages.values())
+    assert stages["run"]["sum"] >= 0.2
+
+
+def test_upstream_throttled_counter(mock_upstream):
+    """测试上游 429 计数"""
+    mock = mock_upstream(throttle_rate=1.0)
+    before = _value(UPSTREAM_THROTTLED, "wavespeed") or 0
+    response = upstream_session.post(f"{mock.wavespeed_base_url}/bytedance/seedream-v4.5", json={"prompt": "a cat"})
+    assert response.status_code == 429
+    assert _value(UPSTREAM_THROTTLED, "wavespeed") == before + 1
+
+
+def test_thread_pool_saturation():
+    """测试线程池执行中和排队的任务数"""
+    release = threading.Event()
+    pool = InstrumentedThreadPool("metrics-test", max_workers=1)
+    try:
+        futures = [pool.submit(release.wait) for _ in range(3)]
+        time.sleep(0.1)
+        assert _value(THREAD_POOL_ACTIVE, "metrics-test") == 1
+        assert _value(THREAD_POOL_QUEUED, "metrics-test") == 2
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        assert _value(THREAD_POOL_ACTIVE, "metrics-test") == 0
+        assert _value(THREAD_POOL_QUEUED, "metrics-test") == 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,121 @@
+"""
+上游模拟服务测试
+不依赖测试服务器：在后台线程启动 scripts/mock_upstream.py 中的模拟服务并直接请求。
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from scripts.mock_upstream import Distribution, MockOptions, MockUpstream
+from utils.settings import parse_settings
+
+
+@pytest.fixture
+def mock_upstream():
+    mock = MockUpstream(MockOptions(processing=Distribution.parse("0.2"), seed=1)).start()
+    yield mock
+    mock.stop()
+
+
+def _request(url, payload=None, method=None, data=None):
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status, response.headers, response.read()
+
+
+def test_submit_and_poll_prediction(mock_upstream):
+    """测试提交生成任务、轮询到完成并下载输出图片"""
+    _, _, body = _request(f"{mock_upstream.wavespeed_base_url}/bytedance/seedream-v4.5", {"prompt": "a cat"})
+    prediction_id = json.loads(body)["data"]["id"]
+    poll_url = f"{mock_upstream.wavespeed_base_url}/predictions/{prediction_id}/result"
+
+    data = json.loads(_request(poll_url)[2])["data"]
+    assert data["status"] == "processing"
+    time.sleep(0.3)
+    data = json.loads(_request(poll_url)[2])["data"]
+    assert data["status"] == "completed"
+
+    _, headers, image = _request(data["outputs"][0])
+    assert headers["Content-Type"] == "image/png"
+    assert image.startswith(b"\x89PNG")
+    assert mock_upstream.snapshot()["requests"]["submit"] == 1
+
+
+def test_chat_completion_stream(mock_upstream):
+    """测试流式 LLM 回复拼接后与非流式回复一致"""
+    url = f"{mock_upstream.openrouter_base_url}/chat/completions"
+    messages = [{"role": "user", "content": "hello"}]
+    reply = json.loads(_request(url, {"model": "openai/gpt-4o", "messages": messages})[2])
+    content = reply["choices"][0]["message"]["content"]
+
+    _, headers, body = _request(url, {"model": "openai/gpt-4o", "messages": messages, "stream": True})
+    assert headers["Content-Type"] == "text/event-stream"
+    events = [line[len("data: "):] for line in body.decode("utf-8").splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks) == content
+    assert chunks[-1]["usage"] == reply["usage"]
+
+
+def test_oss_put_and_get(mock_upstream):
+    """测试 OSS 路径风格上传和读取"""
+    url = f"{mock_upstream.oss_endpoint}/bucket/aisrc/2025/01/27/image.jpg"
+    status, headers, _ = _request(url, method="PUT", data=b"jpeg")
+    assert status == 200
+    assert headers["ETag"]
+    assert _request(url)[2] == b"jpeg"
+
+
+def test_throttle_and_failure_injection():
+    """测试 429 注入和生成失败注入"""
+    mock = MockUpstream(MockOptions(throttle_rate=1.0)).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _request(f"{mock.wavespeed_base_url}/bytedance/seedream-v4.5", {"prompt": "a cat"})
+        assert error.value.code == 429
+        assert error.value.headers["Retry-After"]
+    finally:
+        mock.stop()
+
+    mock = MockUpstream(MockOptions(processing=Distribution.parse("0"), failure_rate=1.0)).start()
+    try:
+        _, _, body = _request(f"{mock.wavespeed_base_url}/minimax/hailuo-02/i2v-standard",
+                              {"prompt": "a dog", "enable_sync_mode": True})
+        data = json.loads(body)["data"]
+        assert data["status"] == "failed"
+        assert data["error"]
+    finally:
+        mock.stop()
+
+
+def test_distribution_parse():
+    """测试延迟分布写法"""
+    assert Distribution.parse("0.05").sample(None) == 0.05
+    with pytest.raises(ValueError):
+        Distribution.parse("uniform:1")
+    with pytest.raises(ValueError):
+        Distribution.parse("poisson:1")
+
+
+def test_upstream_settings():
+    """测试上游地址配置，oss_endpoint 覆盖 oss.endpoint"""
+    settings = parse_settings({})
+    assert settings.upstreams.wavespeed_url("predictions/x/result") == "https://api.wavespeed.ai/api/v3/predictions/x/result"
+
+    settings = parse_settings({
+        "oss": {"endpoint": "oss-cn-hangzhou.aliyuncs.com"},
+        "upstreams": {
+            "wavespeed_base_url": "http://127.0.0.1:8900/api/v3/",
+            "openrouter_base_url": "http://127.0.0.1:8900/api/v1",
+            "oss_endpoint": "http://127.0.0.1:8900",
+        },
+    })
+    assert settings.upstreams.wavespeed_url("bytedance/seedream-v4.5") == "http://127.0.0.1:8900/api/v3/bytedance/seedream-v4.5"
+    assert settings.upstreams.openrouter_url("chat/completions") == "http://127.0.0.1:8900/api/v1/chat/completions"
+    assert settings.oss.endpoint == "http://127.0.0.1:8900"
@@ -0,0 +1,32 @@
+"""
+上游 prediction 记录测试
+不依赖测试服务器
+"""
+
+import asyncio
+
+from utils.predictions import prediction_result_url, record_prediction, track_predictions
+
+
+def test_record_prediction_without_listener_is_noop():
+    """测试未登记回调时记录不做任何事"""
+    record_prediction("abc")
+
+
+def test_record_prediction_reaches_listener_from_thread():
+    """测试在 asyncio.to_thread 中提交的 prediction 也能记录到当前任务"""
+    recorded = []
+
+    def submit():
+        record_prediction("abc")
+
+    async def scenario():
+        with track_predictions(recorded.append):
+            await asyncio.to_thread(submit)
+        # 离开上下文后不再记录
+        await asyncio.to_thread(submit)
+
+    asyncio.run(scenario())
+    assert len(recorded) == 1
+    assert recorded[0]["id"] == "abc"
+    assert recorded[0]["poll_url"] == prediction_result_url("abc")
@@ -0,0 +1,91 @@
+"""
+按需采样分析测试
+不依赖测试服务器：请求通过 TestClient 直接发给应用（不触发启动事件）。
+"""
+
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import profiler
+from utils.profiler import (
+    Profile, ProfileWatcher, SamplingProfiler, collect_process_profiles, request_process_profiles, speedscope,
+)
+from utils.settings import parse_settings
+
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch):
+    settings = parse_settings({"profiling": {"token": "secret", "dir": str(tmp_path), "interval": 0.002}})
+    monkeypatch.setattr(profiler, "get_settings", lambda: settings)
+    return tmp_path
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_sampling_profiler_formats():
+    """测试采样到执行中的函数、空闲线程不计入，以及 collapsed / speedscope 输出"""
+    idle = threading.Event()
+    waiter = threading.Thread(target=idle.wait, name="idle-waiter", daemon=True)
+    waiter.start()
+    sampler = SamplingProfiler(interval=0.002).start()
+    busy_loop(0.2)
+    profile = sampler.stop("busy")
+    idle.set()
+
+    assert profile.samples > 10
+    collapsed = profile.to_collapsed()
+    assert "busy_loop (tests/test_profiler.py:" in collapsed
+    assert "idle-waiter" not in collapsed
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+
+    document = speedscope([profile, Profile.from_dict(profile.to_dict())], "test")
+    frames = document["shared"]["frames"]
+    assert len(document["profiles"]) == 2
+    first = document["profiles"][0]
+    assert len(first["samples"]) == len(first["weights"])
+    assert all(0 <= index < len(frames) for sample in first["samples"] for index in sample)
+    assert any(frame["name"] == "busy_loop" for frame in frames)
+
+
+def test_profile_request_middleware(profiling):
+    """测试带令牌的请求返回或保存火焰图，令牌错误时正常处理"""
+    import main
+
+    client = TestClient(main.app)
+    plain = client.get("/api/health", headers={"X-Profile-Token": "wrong"})
+    assert plain.json() == {"status": "ok"} and "x-profile-path" not in plain.headers
+
+    saved = client.get("/api/health?_profile=secret")
+    assert saved.json() == {"status": "ok"}
+    assert os.path.dirname(saved.headers["x-profile-path"]) == str(profiling)
+    assert saved.headers["x-profile-path"].endswith(".speedscope.json")
+
+    returned = client.get("/api/health", headers={"X-Profile-Token": "secret", "X-Profile-Output": "speedscope"})
+    assert returned.json()["$schema"] == profiler.SPEEDSCOPE_SCHEMA
+    assert returned.json()["name"] == "GET /api/health"
+
+
+def test_process_profile_request(profiling):
+    """测试进程采样请求：监听的进程采样后写入结果，请求方读取后清理"""
+    watcher = ProfileWatcher("worker")
+    busy = threading.Thread(target=busy_loop, args=(0.5,), name="busy-task")
+    busy.start()
+    request_process_profiles("req1", 0.3)
+    request_process_profiles("other-pid", 0.3, pid=os.getpid() + 1)
+    watcher.check()
+    busy.join()
+
+    profiles = collect_process_profiles("req1")
+    assert [p.pid for p in profiles] == [os.getpid()]
+    assert "busy-task;" in profiles[0].to_collapsed()
+    assert not os.path.exists(profiling / "requests" / "req1.json")
+    assert not os.path.exists(profiling / "results" / "req1")
+    assert collect_process_profiles("other-pid") == []
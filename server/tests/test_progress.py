@@ -0,0 +1,74 @@
+"""
+任务进度和剩余时间估算测试
+不依赖测试服务器：历史记录写入临时目录的用量台账。
+"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from utils import progress, usage
+from utils.metrics import TaskTimer
+from utils.progress import estimate_progress
+from utils.settings import parse_settings
+from utils.usage import append_entry
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    settings = parse_settings({"usage": {"eta_min_samples": 3}})
+    monkeypatch.setattr(usage, "get_settings", lambda: settings)
+    monkeypatch.setattr(progress, "get_settings", lambda: settings)
+    monkeypatch.setattr(usage, "get_data_path", lambda *parts: os.path.join(tmp_path, *parts))
+    monkeypatch.setattr(progress, "_history_loaded_at", None)
+    now = time.time()
+    for index, run in enumerate([50.0, 60.0, 70.0]):
+        append_entry({"ts": now - 600 + index, "tool_type": "wan_image_to_video", "model": "wan2.6",
+                      "status": "success", "resumed": False, "elapsed_seconds": 20.0 + run, "wait_seconds": 2.0,
+                      "queue_seconds": 10.0, "run_seconds": run, "stages": {"download": 5.0}})
+    return now
+
+
+def _task(now, phase=None, phase_seconds=0.0, model="wan2.6", tool_type="wan_image_to_video"):
+    task = {"task_id": "t1", "tool_type": tool_type, "status": "pending", "input": {"model": model},
+            "created_at": datetime.fromtimestamp(now - 50).isoformat()}
+    if phase:
+        task["phase"] = phase
+        task["phase_at"] = now - phase_seconds
+    return task
+
+
+def test_estimate_progress(history):
+    """测试按当前阶段已耗时和历史耗时分布估算剩余时间，超过历史耗时后不停在 99%"""
+    now = history
+    # 生成中 30 秒：历史生成耗时超过 30 秒的剩余中位数 30 秒 + 下载 5 秒
+    on_track = estimate_progress(_task(now, "processing", 30), now)
+    assert on_track == {"phase": "processing", "progress": 58, "eta_seconds": 35}
+
+    # 已等待 50 秒，超过历史等待时间：等待剩余 5 秒 + 准备 5 + 排队 10 + 生成 60 + 下载 5
+    waiting = estimate_progress(_task(now), now)
+    assert waiting["phase"] == "waiting" and waiting["eta_seconds"] == 5 + 5 + 10 + 60 + 5
+
+    slow = estimate_progress(_task(now, "processing", 100), now)
+    assert slow["eta_seconds"] == 15 and slow["progress"] < 99
+
+    # 模型没有记录时使用同一工具类型的全部模型，工具类型也没有记录时只按阶段给出进度
+    assert estimate_progress(_task(now, "queued", 5, model="other"), now)["eta_seconds"] is not None
+    assert estimate_progress(_task(now, "queued", 5, tool_type="text_to_image"), now) == {
+        "phase": "queued", "progress": 10, "eta_seconds": None}
+    assert estimate_progress({"status": "success"}, now)["progress"] == 100
+
+
+def test_upstream_stage_changes():
+    """测试上游 prediction 状态变化时通知阶段切换，重复状态不重复通知"""
+    stages = []
+    timer = TaskTimer("text_to_image", "seedream4.5")
+    timer.on_upstream_stage = stages.append
+    timer.prediction_submitted()
+    timer.prediction_status("queued")
+    timer.prediction_status("processing")
+    timer.prediction_status("processing")
+    timer.prediction_status("completed")
+    assert stages == ["queue", "run", None]
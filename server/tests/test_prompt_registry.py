@@ -0,0 +1,59 @@
+"""
+提示词模板注册表测试
+不依赖测试服务器：模板写入临时目录。
+"""
+
+import os
+
+import pytest
+
+from utils import prompt_registry
+from utils.prompt_registry import PromptRegistry, PromptTemplate, compile_template
+
+
+def test_render_escapes_and_literal_braces():
+    """测试 {{ }} 渲染为字面量花括号，JSON 示例等其他花括号原样保留"""
+    template = PromptTemplate('角色 {name} 用 {{name}} 表示，输出 {"shots": [{"id": 1}]}，{ 空格 }')
+    assert template.variables == frozenset({"name"})
+    assert template.render(name="小明") == '角色 小明 用 {name} 表示，输出 {"shots": [{"id": 1}]}，{ 空格 }'
+    # 变量值中的花括号不再被解析
+    assert template.render(name="{other}") == '角色 {other} 用 {name} 表示，输出 {"shots": [{"id": 1}]}，{ 空格 }'
+    assert compile_template("{a}{{b}}") is compile_template("{a}{{b}}")
+    assert compile_template("{a}{{b}}").render(a=1) == "1{b}"
+
+
+def test_render_missing_variables():
+    """测试 strict 模式缺少变量时报错，非 strict 模式保留占位符，多余的变量被忽略"""
+    template = PromptTemplate("{story} / {style}", name="generation/demo")
+    with pytest.raises(KeyError, match="generation/demo.*style"):
+        template.render(story="故事")
+    assert template.render(strict=False, story="故事") == "故事 / {style}"
+    assert template.render(story="故事", style="水彩", unused=1) == "故事 / 水彩"
+
+
+def test_registry_reload_and_stats(tmp_path, monkeypatch):
+    """测试按名称和路径加载、文件修改后重新加载、删除后继续使用已加载版本，以及渲染统计"""
+    monkeypatch.setattr(prompt_registry, "RELOAD_CHECK_INTERVAL", 0.0)
+    (tmp_path / "generation").mkdir()
+    path = tmp_path / "generation" / "demo.txt"
+    path.write_text("第一版 {story}", encoding="utf-8")
+    (tmp_path / "notes.md").write_text("不是模板", encoding="utf-8")
+
+    registry = PromptRegistry(str(tmp_path))
+    assert registry.load_all() == 1
+    assert registry.names() == ["generation/demo"]
+    assert registry.render("generation/demo", story="故事") == "第一版 故事"
+    assert registry.get_path(str(path)) is registry.get("generation/demo")
+
+    path.write_text("第二版 {story} {style}", encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert registry.render("generation/demo", story="故事", style="水彩") == "第二版 故事 水彩"
+
+    path.unlink()
+    assert registry.get("generation/demo").text == "第二版 {story} {style}"
+    with pytest.raises(FileNotFoundError):
+        registry.get("generation/missing")
+
+    stats = registry.stats()["generation/demo"]
+    assert stats["renders"] == 2 and stats["max_tokens"] >= stats["last_tokens"] > 0
@@ -0,0 +1,71 @@
+"""
+多模态查询消息构建测试
+不依赖测试服务器：抽帧和 LLM 客户端替换为本地模拟。
+"""
+
+import pytest
+
+from utils import frame_sampler, query_llm
+from utils.query_llm import (
+    ADAPTIVE_FRAMES_MAX_BYTES, _extract_adaptive_video_frames, _extract_and_encode_video_frames, multimodal_query,
+    prepare_multimodal_messages_openai_format,
+)
+from utils.settings import parse_settings
+
+
+@pytest.fixture
+def extractors(monkeypatch):
+    calls = []
+    monkeypatch.setattr(query_llm, "_extract_adaptive_video_frames",
+                        lambda path, max_frames, max_bytes, resolution: calls.append(
+                            ("adaptive", max_frames, max_bytes)) or ["data:image/jpeg;base64,a"])
+    monkeypatch.setattr(query_llm, "_extract_and_encode_video_frames",
+                        lambda path, count, resolution: calls.append(("uniform", count, None)) or
+                        ["data:image/jpeg;base64,u"] * count)
+    return calls
+
+
+def test_multimodal_query_defaults_to_adaptive(extractors, monkeypatch):
+    """测试 multimodal_query 默认按场景自适应选帧：256 为帧数上限，并带字节预算"""
+    sent = []
+
+    class Client:
+        def chat_completion(self, messages, model, max_tokens):
+            sent.append(messages)
+            return {"content": "ok"}
+
+    settings = parse_settings({"wavespeed_api_key": "key", "llm": {"model": "openai/gpt-4o"}})
+    monkeypatch.setattr(query_llm, "get_settings", lambda: settings)
+    monkeypatch.setattr(query_llm, "_get_client", lambda api_key=None: Client())
+
+    assert multimodal_query("描述视频", video_path="clip.mp4") == "ok"
+    assert extractors == [("adaptive", 256, ADAPTIVE_FRAMES_MAX_BYTES)]
+    content = sent[0][-1]["content"]
+    assert content[0] == {"type": "text", "text": "描述视频"}
+    assert [part["image_url"]["url"] for part in content[1:]] == ["data:image/jpeg;base64,a"]
+
+    multimodal_query("描述视频", video_path="clip.mp4", video_frames_to_extract=3, video_frame_selection="uniform")
+    assert extractors[-1] == ("uniform", 3, None)
+
+
+def test_prepare_messages_uniform_by_default(extractors):
+    """测试直接构建消息时仍默认均匀抽帧，保持原有调用方的行为"""
+    messages = prepare_multimodal_messages_openai_format("提示", video_paths=["clip.mp4"], video_frames_to_extract=2)
+    assert extractors == [("uniform", 2, None)]
+    assert len(messages[-1]["content"]) == 3
+
+
+def test_frames_extracted_in_media_pool(monkeypatch):
+    """测试均匀抽帧和自适应抽帧都交给媒体进程池，传回的 JPEG 字节在本进程转为 data URI"""
+    calls = []
+    monkeypatch.setattr(frame_sampler, "sample_in_pool",
+                        lambda sampler, path, **kwargs: calls.append((sampler, path, kwargs)) or [b"jpeg"])
+
+    assert _extract_and_encode_video_frames("clip.mp4", 3, (360, 420)) == ["data:image/jpeg;base64,anBlZw=="]
+    assert _extract_adaptive_video_frames("clip.mp4", 8, 1024, 240) == ["data:image/jpeg;base64,anBlZw=="]
+    assert [(sampler, path) for sampler, path, _ in calls] == [
+        (frame_sampler.sample_video_frames, "clip.mp4"),
+        (frame_sampler.sample_scene_frames, "clip.mp4"),
+    ]
+    assert calls[0][2]["count"] == 3
+    assert calls[1][2]["max_frames"] == 8 and calls[1][2]["max_bytes"] == 1024
@@ -0,0 +1,110 @@
+"""
+模型路由（截止时间、对冲请求和故障转移）测试
+不依赖测试服务器：生成函数为本地模拟，落败一方的取消通过真实的 upstream_session 检查。
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+from utils import routing
+from utils.metrics import TaskTimer, UpstreamCancelled, track_task, upstream_session
+from utils.routing import deadline_seconds, get_policy, run_with_policy
+from utils.settings import parse_settings
+
+
+@pytest.fixture
+def policies(monkeypatch):
+    settings = parse_settings({"routing": {"wan_image_to_video": {
+        "normal": {"hedge": {"wan2.6": "wan2.5", "wan2.5": "wan2.6"}, "max_deadline": 1},
+        "low": {"timeout": 1},
+    }}})
+    monkeypatch.setattr(routing, "get_settings", lambda: settings)
+    monkeypatch.setattr(routing, "get_history", lambda tool_type, model: None)
+    return settings
+
+
+def test_policy_and_deadline(policies, monkeypatch):
+    """测试按优先级选择策略，以及截止时间按历史 p95 计算并限制在上下限之间"""
+    assert get_policy("wan_image_to_video", "high").hedge == {"wan2.6": "wan2.5", "wan2.5": "wan2.6"}
+    assert get_policy("wan_image_to_video", "low").timeout == 1
+    assert get_policy("sora_image_to_video") is None
+
+    class History:
+        def __init__(self, p95):
+            self.p95 = p95
+
+        def percentile(self, name, q):
+            return self.p95
+
+    policy = parse_settings({"routing": {"t": {"normal": {"min_deadline": 30, "max_deadline": 600}}}}).routing["t"]["normal"]
+    for p95, expected in [(100.0, 150.0), (10.0, 30.0), (1000.0, 600.0)]:
+        monkeypatch.setattr(routing, "get_history", lambda tool_type, model: History(p95))
+        assert deadline_seconds(policy, "t", "m") == expected
+    monkeypatch.setattr(routing, "get_history", lambda tool_type, model: None)
+    assert deadline_seconds(policy, "t", "m") == 600.0
+
+
+def test_hedge_after_deadline(policies):
+    """测试超过截止时间后提交到等价模型，先成功的结果生效，落败一方的上游请求被取消"""
+    cancelled = threading.Event()
+
+    def stalled():
+        # 模拟一直轮询的上游：取消后下一次请求抛出 UpstreamCancelled
+        while True:
+            time.sleep(0.05)
+            try:
+                upstream_session.get("http://127.0.0.1:1/predictions/stalled/result", timeout=1)
+            except UpstreamCancelled:
+                cancelled.set()
+                raise
+            except requests.exceptions.RequestException:
+                pass
+
+    async def attempt(model):
+        if model == "wan2.6":
+            return await asyncio.to_thread(stalled)
+        return {"success": True, "output_url": f"https://example.com/{model}.mp4"}
+
+    async def run():
+        with track_task("wan_image_to_video", "wan2.6") as timer:
+            result = await run_with_policy("wan_image_to_video", "wan2.6", attempt)
+        return result, timer
+
+    started = time.monotonic()
+    result, timer = asyncio.run(run())
+    assert 1.0 <= time.monotonic() - started < 3.0
+    assert result["output_url"].endswith("wan2.5.mp4")
+    assert result["routing"] == {"model": "wan2.5", "hedged": True, "deadline": 1.0}
+    assert isinstance(timer, TaskTimer) and timer.hedged
+    assert cancelled.wait(2)
+
+
+def test_failover_and_timeout(policies):
+    """测试截止时间之前失败时立即转移到等价模型，以及超过总时间上限时失败"""
+    calls = []
+
+    async def attempt(model):
+        calls.append(model)
+        if model == "wan2.5":
+            raise RuntimeError("upstream 500")
+        return {"success": True, "model": model}
+
+    result = asyncio.run(run_with_policy("wan_image_to_video", "wan2.5", attempt))
+    assert calls == ["wan2.5", "wan2.6"]
+    assert result["model"] == "wan2.6" and result["routing"]["hedged"]
+
+    async def slow(model):
+        await asyncio.sleep(5)
+        return {"success": True}
+
+    started = time.monotonic()
+    result = asyncio.run(run_with_policy("wan_image_to_video", "wan2.6", slow, "low"))
+    assert not result["success"] and "1 秒" in result["error"]
+    assert time.monotonic() - started < 2.0
+
+    # 未配置策略的工具直接执行
+    assert asyncio.run(run_with_policy("sora_image_to_video", "default", attempt)) == {"success": True, "model": "default"}
@@ -0,0 +1,202 @@
+"""
+统一配置服务测试
+不依赖测试服务器：配置文件写入临时目录，加载器的缓存状态在每个测试中重置。
+"""
+
+import logging
+import os
+import signal
+import time
+
+import pytest
+
+from utils.settings import (
+    DEFAULT_WAVESPEED_BASE_URL,
+    SettingsError,
+    add_reload_listener,
+    get_settings,
+    install_reload_signal,
+    parse_settings,
+    reload_settings,
+)
+from utils.settings import loader
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """指向临时配置文件，并清空已加载的配置和回调"""
+    path = tmp_path / "config.yaml"
+    monkeypatch.setattr(loader, "CONFIG_PATH", str(path))
+    monkeypatch.setattr(loader, "RELOAD_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(loader, "_settings", None)
+    monkeypatch.setattr(loader, "_last_check", 0.0)
+    monkeypatch.setattr(loader, "_failed_mtime_ns", None)
+    monkeypatch.setattr(loader, "_listeners", [])
+    return path
+
+
+def write_config(path, text):
+    """写入配置并把修改时间推后，避免同一时间粒度内的两次写入被当作未修改"""
+    previous = os.stat(path).st_mtime_ns if path.exists() else 0
+    path.write_text(text, encoding="utf-8")
+    mtime_ns = max(os.stat(path).st_mtime_ns, previous + 1_000_000_000)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_parse_defaults_and_types():
+    """测试未设置的配置段使用默认值，数字按声明的类型转换，兼容旧位置的 API Key"""
+    settings = parse_settings(None)
+    assert settings.storage.backend == "local"
+    assert settings.tasks.broker == "memory"
+    assert settings.tracing.exporter == "file"
+    assert settings.upstreams.wavespeed_base_url == DEFAULT_WAVESPEED_BASE_URL
+    assert settings.performance.media_pool_workers is None
+    assert settings.routing == {}
+    assert settings.wavespeed_api_key is None
+
+    settings = parse_settings({
+        "image_gen": {"wavespeed_api": "legacy-key"},
+        "upstreams": {"wavespeed_base_url": "http://127.0.0.1:8900/api/v3/", "oss_endpoint": "http://127.0.0.1:8900"},
+        "oss": {"endpoint": "https://oss.example.com"},
+        "storage": {"backend": "s3", "bucket": "media", "prefix": "/comics/", "url_expires": 60.0},
+        "tasks": {"broker": "sqlite", "lease_seconds": 30, "drain_seconds": 0},
+        "profiling": {"token": 123},
+        "performance": {"media_pool_workers": 2, "media_job_timeout": 30, "rate_limits": {"wavespeed": 60}},
+        "routing": {"t": {"normal": {"hedge": {"a": "b"}, "max_deadline": 120}}},
+    })
+    assert settings.wavespeed_api_key == "legacy-key"
+    assert parse_settings({"wavespeed_api_key": "key", "video_gen": {"wavespeed_api": "legacy-key"}}).wavespeed_api_key == "key"
+    assert parse_settings({"llm": {"openai_api_key": "llm-key"}}).wavespeed_api_key == "llm-key"
+    assert settings.upstreams.wavespeed_url("/bytedance/seedream") == "http://127.0.0.1:8900/api/v3/bytedance/seedream"
+    assert settings.oss.endpoint == "http://127.0.0.1:8900"
+    assert settings.storage.prefix == "comics"
+    assert settings.storage.url_expires == 60 and isinstance(settings.storage.url_expires, int)
+    assert settings.tasks.lease_seconds == 30.0 and isinstance(settings.tasks.lease_seconds, float)
+    # 0 是有效值，不回退到默认值
+    assert settings.tasks.drain_seconds == 0.0
+    assert settings.profiling.token == "123"
+    assert settings.performance.media_job_timeout == 30.0
+    assert settings.performance.rate_limits == {"wavespeed": 60.0}
+    policy = settings.routing["t"]["normal"]
+    assert policy.hedge == {"a": "b"}
+    assert policy.max_deadline == 120.0
+    assert policy.min_deadline == 60.0
+
+
+@pytest.mark.parametrize("raw, message", [
+    ([], "顶层应为字典"),
+    ({"metrics": ["dir"]}, "'metrics' 应为字典"),
+    ({"storage": {"backend": "ftp"}}, "'storage.backend'"),
+    ({"storage": {"backend": "s3"}}, "'storage.bucket'"),
+    ({"tasks": {"broker": "redis"}}, "'tasks.url'"),
+    ({"tracing": {"exporter": "otlp"}}, "'tracing.exporter'"),
+    ({"usage": {"enabled": "yes"}}, "'usage.enabled' 应为 true 或 false"),
+    ({"tasks": {"lease_seconds": "30"}}, "'tasks.lease_seconds' 应为数字"),
+    ({"tasks": {"worker_concurrency": True}}, "'tasks.worker_concurrency' 应为数字"),
+    ({"performance": {"media_pool_workers": 0}}, "'performance.media_pool_workers' 不能小于 1"),
+    ({"usage": {"prices": {"m": {"per_second": {"720p": "cheap"}}}}}, "'usage.prices.m.per_second.720p'"),
+    ({"routing": {"t": {"normal": {"hedge": {"a": 1}}}}}, "'routing.t.normal.hedge.a' 应为模型名"),
+])
+def test_parse_errors(raw, message):
+    """测试结构、枚举值、类型和下限错误时抛出 SettingsError 并指出配置项"""
+    with pytest.raises(SettingsError, match=message):
+        parse_settings(raw)
+
+
+def test_invalid_reload_keeps_previous(config, caplog):
+    """测试首次加载失败时抛出异常，之后 YAML 或类型错误时保留上一份有效配置，修正后恢复加载"""
+    write_config(config, "tasks: [")
+    with pytest.raises(SettingsError, match="解析失败"):
+        reload_settings()
+
+    write_config(config, "llm:\n  model: first\n")
+    assert reload_settings().llm.model == "first"
+
+    write_config(config, "llm:\n  model: [")
+    with caplog.at_level(logging.ERROR, logger=loader.__name__):
+        assert get_settings().llm.model == "first"
+    assert "继续使用当前配置" in caplog.text
+    # 同一份错误配置不再重试
+    caplog.clear()
+    with caplog.at_level(logging.ERROR, logger=loader.__name__):
+        assert get_settings().llm.model == "first"
+    assert caplog.text == ""
+
+    write_config(config, "tasks:\n  worker_concurrency: many\n")
+    assert get_settings().tasks.worker_concurrency == 4
+
+    write_config(config, "llm:\n  model: second\n")
+    assert get_settings().llm.model == "second"
+
+
+def test_mtime_hot_reload(config, monkeypatch):
+    """测试文件修改时间变化后 get_settings 重新加载，检查间隔内返回缓存的配置"""
+    write_config(config, "performance:\n  frame_cache_mb: 64\n")
+    first = get_settings()
+    assert first.performance.frame_cache_mb == 64
+    assert get_settings() is first
+
+    write_config(config, "performance:\n  frame_cache_mb: 128\n")
+    monkeypatch.setattr(loader, "RELOAD_CHECK_INTERVAL", 3600.0)
+    assert get_settings() is first
+
+    monkeypatch.setattr(loader, "RELOAD_CHECK_INTERVAL", 0.0)
+    assert get_settings().performance.frame_cache_mb == 128
+
+    # 文件被删除时按空配置加载
+    config.unlink()
+    settings = get_settings()
+    assert not settings.exists
+    assert settings.performance.frame_cache_mb is None
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="平台不支持 SIGHUP")
+def test_sighup_reload(config, monkeypatch):
+    """测试收到 SIGHUP 后在后台线程立即重新加载，不等待检查间隔"""
+    monkeypatch.setattr(loader, "RELOAD_CHECK_INTERVAL", 3600.0)
+    write_config(config, "llm:\n  model: before\n")
+    assert get_settings().llm.model == "before"
+    write_config(config, "llm:\n  model: after\n")
+
+    previous = signal.getsignal(signal.SIGHUP)
+    try:
+        install_reload_signal()
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 5
+        while loader._settings.llm.model != "after" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+    assert get_settings().llm.model == "after"
+
+
+def test_reload_listeners(config, caplog):
+    """测试回调在注册时以当前配置调用一次并在每次重新加载后调用，回调异常只记录日志"""
+    write_config(config, "performance:\n  encoding_cache_mb: 16\n")
+    early = []
+    add_reload_listener(lambda settings: early.append(settings.performance.encoding_cache_mb))
+    assert early == []
+
+    get_settings()
+    assert early == [16]
+
+    def broken(settings):
+        raise RuntimeError("boom")
+
+    seen = []
+    with caplog.at_level(logging.ERROR, logger=loader.__name__):
+        add_reload_listener(broken)
+        add_reload_listener(lambda settings: seen.append(settings.performance.encoding_cache_mb))
+    assert seen == [16]
+    assert "boom" in caplog.text
+
+    write_config(config, "performance:\n  encoding_cache_mb: 32\n")
+    with caplog.at_level(logging.ERROR, logger=loader.__name__):
+        assert get_settings().performance.encoding_cache_mb == 32
+    assert early == [16, 32]
+    assert seen == [16, 32]
+
+    # 加载失败时不调用回调
+    write_config(config, "performance: [")
+    get_settings()
+    assert seen == [16, 32]
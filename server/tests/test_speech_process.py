@@ -0,0 +1,63 @@
+"""
+音频对齐合并（ffmpeg 后端）滤镜图测试
+不依赖测试服务器：只检查生成的 filter_complex 字符串，不调用 ffmpeg。
+"""
+
+import math
+
+import pytest
+
+from utils.speech_process import LOUDNORM_FILTER, _atempo_chain, build_merge_filter_graph
+
+
+def atempo_factors(chain):
+    names, factors = zip(*(item.split("=") for item in chain.split(",")))
+    assert set(names) == {"atempo"}
+    return [float(factor) for factor in factors]
+
+
+@pytest.mark.parametrize("rate", [0.05, 0.3, 0.5, 0.8, 1.0, 1.37, 2.0, 3.0, 4.5, 17.0])
+def test_atempo_chain_factors_in_range(rate):
+    """测试超出 [0.5, 2.0] 的倍率拆成多级 atempo，每级都在范围内且乘积等于原倍率"""
+    factors = atempo_factors(_atempo_chain(rate))
+    assert all(0.5 <= factor <= 2.0 for factor in factors)
+    assert math.prod(factors) == pytest.approx(rate, rel=1e-5)
+
+
+def test_atempo_chain_strings():
+    """测试范围内的倍率只用一级，范围外的先用满 2.0 / 0.5 再接余数"""
+    assert _atempo_chain(1.25) == "atempo=1.250000"
+    assert _atempo_chain(2.0) == "atempo=2.000000"
+    assert _atempo_chain(0.5) == "atempo=0.500000"
+    assert _atempo_chain(5.0) == "atempo=2.0,atempo=2.0,atempo=1.250000"
+    assert _atempo_chain(0.2) == "atempo=0.5,atempo=0.5,atempo=0.800000"
+
+
+def test_filter_graph_without_original_audio():
+    """测试视频没有音轨时只拉伸新音频，auto 模式下不做响度归一"""
+    assert build_merge_filter_graph(1.5, has_original_audio=False) == "[1:a]atempo=1.500000[aout]"
+    assert build_merge_filter_graph(
+        3.0, has_original_audio=False, volume_balance_mode="manual", new_audio_volume=0.8
+    ) == "[1:a]atempo=2.0,atempo=1.500000,volume=0.8[aout]"
+
+
+def test_filter_graph_mix_modes():
+    """测试有原音轨时按模式处理两条音轨并以求和方式混合为 [aout]"""
+    mix = "[new][orig]amix=inputs=2:duration=longest:dropout_transition=0:normalize=0[aout]"
+    assert build_merge_filter_graph(0.8, has_original_audio=True) == (
+        f"[1:a]atempo=0.800000,{LOUDNORM_FILTER}[new];[0:a]{LOUDNORM_FILTER}[orig];{mix}"
+    )
+    assert build_merge_filter_graph(
+        1.0, has_original_audio=True, volume_balance_mode="manual",
+        new_audio_volume=0.8, original_audio_volume=0.5,
+    ) == f"[1:a]atempo=1.000000,volume=0.8[new];[0:a]volume=0.5[orig];{mix}"
+    assert build_merge_filter_graph(1.0, has_original_audio=True, volume_balance_mode="none") == (
+        f"[1:a]atempo=1.000000[new];[0:a]anull[orig];{mix}"
+    )
+
+
+def test_filter_graph_rubberband():
+    """测试 rubberband 拉伸不受 atempo 的倍率范围限制，只用一级滤镜"""
+    assert build_merge_filter_graph(
+        3.0, has_original_audio=False, stretch_filter="rubberband"
+    ) == "[1:a]rubberband=tempo=3.000000[aout]"
@@ -0,0 +1,33 @@
+"""
+API 进程启动耗时测试
+不依赖测试服务器：在独立进程中导入 main 并完成启动
+"""
+
+from scripts.startup_profile import run_baseline, run_boot
+import json
+
+# 导入 main、完成启动并响应 /api/health 的耗时上限（秒）
+STARTUP_BUDGET_SECONDS = 1.0
+# 机器繁忙时按同一次运行中空应用的启动耗时放宽：不超过基线的倍数
+STARTUP_BASELINE_RATIO = 4.0
+
+
+def _report(result):
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_startup_does_not_import_heavy_modules():
+    """测试启动阶段不加载媒体和模型相关的重型依赖"""
+    report = _report(run_boot())
+    assert report["health_status"] == 200
+    assert report["heavy_modules"] == []
+
+
+def test_startup_time_budget():
+    """测试启动并响应 /api/health 的耗时（不含关闭）在预算之内"""
+    baseline = _report(run_baseline())
+    report = _report(run_boot())
+    budget = max(STARTUP_BUDGET_SECONDS, baseline["ready_seconds"] * STARTUP_BASELINE_RATIO)
+    assert report["ready_seconds"] < budget, (
+        f"启动耗时 {report['ready_seconds']:.2f} 秒，基线 {baseline['ready_seconds']:.2f} 秒，预算 {budget:.2f} 秒")
@@ -0,0 +1,199 @@
+"""
+数据存储后端测试
+不依赖测试服务器：直接读写存储后端；读穿缓存逻辑用临时目录中的 LocalStorage 模拟对象存储。
+设置 COMICMAKER_TEST_S3_ENDPOINT（例如本地 MinIO 的 http://127.0.0.1:9000）时同时测试 s3 后端，
+访问凭证和 bucket 通过 COMICMAKER_TEST_S3_ACCESS_KEY / COMICMAKER_TEST_S3_SECRET_KEY /
+COMICMAKER_TEST_S3_BUCKET 指定（bucket 需已存在）。
+"""
+
+import json
+import os
+
+import pytest
+
+from utils import storage
+from utils.settings import StorageSettings, parse_settings
+from utils.storage import (
+    LocalStorage, create_storage, fetch, list_entries, path_exists, publish, read_json, remove, write_json,
+)
+
+
+def _backends(tmp_path):
+    backends = [LocalStorage(str(tmp_path))]
+    endpoint = os.environ.get("COMICMAKER_TEST_S3_ENDPOINT")
+    if endpoint:
+        backends.append(create_storage(StorageSettings(
+            backend="s3",
+            bucket=os.environ.get("COMICMAKER_TEST_S3_BUCKET", "comicmaker-test"),
+            endpoint_url=endpoint,
+            region="us-east-1",
+            access_key_id=os.environ.get("COMICMAKER_TEST_S3_ACCESS_KEY", "minioadmin"),
+            access_key_secret=os.environ.get("COMICMAKER_TEST_S3_SECRET_KEY", "minioadmin"),
+            prefix=f"test-{os.getpid()}",
+        )))
+    return backends
+
+
+def test_storage_round_trip(tmp_path):
+    """测试写入、读取、列目录和删除"""
+    for backend in _backends(tmp_path):
+        backend.write("works/w1/meta.json", b'{"name": "test"}')
+        backend.write("works/w1/covers/cover_0.jpg", b"jpeg")
+        backend.write("works/w2/meta.json", b"{}")
+
+        assert backend.read("works/w1/meta.json") == b'{"name": "test"}'
+        assert backend.read("works/missing/meta.json") is None
+        assert backend.stat("works/w1/meta.json") is not None
+        assert backend.exists("works/w1")
+
+        dirs, files = backend.listdir("works/w1")
+        assert dirs == ["covers"]
+        assert files == ["meta.json"]
+        assert sorted(backend.listdir("works")[0]) == ["w1", "w2"]
+
+        download_path = tmp_path / "cache" / "cover_0.jpg"
+        assert backend.download("works/w1/covers/cover_0.jpg", str(download_path))
+        assert download_path.read_bytes() == b"jpeg"
+
+        backend.delete_tree("works")
+        assert not backend.exists("works/w1")
+        assert backend.listdir("works") == ([], [])
+
+
+def test_storage_version_changes_on_write(tmp_path):
+    """测试对象更新后版本标识变化（本地读穿缓存据此判断是否重新下载）"""
+    for backend in _backends(tmp_path):
+        backend.write("styles/s1/reference.jpg", b"v1")
+        first = backend.stat("styles/s1/reference.jpg")
+        backend.write("styles/s1/reference.jpg", b"version 2")
+        assert backend.stat("styles/s1/reference.jpg") != first
+        backend.delete_tree("styles")
+
+
+class RemoteStorage(LocalStorage):
+    """以另一个临时目录模拟对象存储，记录版本查询和下载次数"""
+
+    is_local = False
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.stats = []
+        self.downloads = []
+
+    def stat(self, key):
+        self.stats.append(key)
+        return super().stat(key)
+
+    def download(self, key, local_path):
+        self.downloads.append(key)
+        return super().download(key, local_path)
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """DATA_ROOT 指向临时的本地缓存目录，后端为模拟对象存储；返回 (后端, 缓存目录, 设置比对间隔的函数)"""
+    cache_root = str(tmp_path / "cache")
+    backend = RemoteStorage(str(tmp_path / "remote"))
+    monkeypatch.setattr(storage, "DATA_ROOT", cache_root)
+    monkeypatch.setattr(storage, "_backend", backend)
+    monkeypatch.setattr(storage, "_validated", {})
+    settings = {}
+
+    def set_ttl(seconds):
+        settings["current"] = parse_settings({"storage": {"cache_validate_seconds": seconds}})
+
+    set_ttl(60)
+    monkeypatch.setattr(storage, "get_settings", lambda: settings["current"])
+    return backend, cache_root, set_ttl
+
+
+def _write_version(backend, key, data):
+    # 版本标识包含修改时间，内容长度不同保证同一时间粒度内也能区分
+    backend.write(key, data)
+    return backend.stat(key)
+
+
+def test_fetch_validates_version_within_ttl(remote, tmp_path):
+    """测试 fetch 首次下载，有效期内不再比对，过期后按版本标识决定是否重新下载，不存在的对象同样缓存比对结果"""
+    backend, cache_root, set_ttl = remote
+    path = os.path.join(cache_root, "works", "w1", "cover.jpg")
+    _write_version(backend, "works/w1/cover.jpg", b"v1")
+
+    assert fetch(path)
+    assert open(path, "rb").read() == b"v1" and backend.downloads == ["works/w1/cover.jpg"]
+    backend.stats.clear()
+    assert fetch(path) and backend.stats == []
+
+    # 有效期内后端更新不会被发现
+    _write_version(backend, "works/w1/cover.jpg", b"version 2")
+    assert fetch(path) and open(path, "rb").read() == b"v1"
+
+    set_ttl(0)
+    assert fetch(path)
+    assert open(path, "rb").read() == b"version 2" and len(backend.downloads) == 2
+    # 版本未变化时只比对不下载
+    assert fetch(path) and len(backend.downloads) == 2
+
+    # 本地缓存文件被删除时即使版本相同也重新下载
+    os.remove(path)
+    assert fetch(path) and len(backend.downloads) == 3
+
+    set_ttl(60)
+    missing = os.path.join(cache_root, "works", "w1", "missing.jpg")
+    backend.stats.clear()
+    assert not fetch(missing) and not fetch(missing)
+    assert backend.stats == ["works/w1/missing.jpg"]
+
+    # DATA_ROOT 之外的路径只检查本地文件
+    outside = tmp_path / "outside.jpg"
+    outside.write_bytes(b"x")
+    assert fetch(str(outside)) and not fetch(str(tmp_path / "absent.jpg"))
+
+
+def test_publish_and_remove(remote):
+    """测试 publish 上传文件和目录并记录版本（之后的 fetch 不再下载），remove 同时删除后端和比对记录"""
+    backend, cache_root, _ = remote
+    shot_dir = os.path.join(cache_root, "works", "w1", "shots", "s1")
+    os.makedirs(os.path.join(shot_dir, "frames"))
+    for name, data in (("video.mp4", b"video"), ("frames/0.jpg", b"frame")):
+        with open(os.path.join(shot_dir, name), "wb") as f:
+            f.write(data)
+
+    publish(os.path.join(shot_dir, "video.mp4"))
+    assert backend.read("works/w1/shots/s1/video.mp4") == b"video"
+    # 上传返回的版本已记录，之后的 fetch 既不比对也不下载
+    backend.stats.clear()
+    assert fetch(os.path.join(shot_dir, "video.mp4")) and backend.stats == [] and backend.downloads == []
+
+    publish(shot_dir)
+    assert backend.read("works/w1/shots/s1/frames/0.jpg") == b"frame"
+    assert set(storage._validated) == {"works/w1/shots/s1/video.mp4", "works/w1/shots/s1/frames/0.jpg"}
+    # 不存在的本地文件不上传
+    publish(os.path.join(shot_dir, "absent.mp4"))
+    assert not backend.exists("works/w1/shots/s1/absent.mp4")
+
+    storage._validated["works/w1/shots/s10/video.mp4"] = (0.0, None)
+    remove(shot_dir)
+    assert not os.path.exists(shot_dir)
+    assert not backend.exists("works/w1/shots/s1")
+    # 只清除该目录下的比对记录，前缀相同的其他目录不受影响
+    assert set(storage._validated) == {"works/w1/shots/s10/video.mp4"}
+
+
+def test_json_and_listing_on_remote(remote):
+    """测试对象存储后端下 JSON 直接读写后端，列目录和存在性检查以后端为准"""
+    backend, cache_root, _ = remote
+    meta_path = os.path.join(cache_root, "works", "w1", "meta.json")
+    write_json(meta_path, {"name": "作品"})
+    assert json.loads(backend.read("works/w1/meta.json")) == {"name": "作品"}
+    assert json.load(open(meta_path, encoding="utf-8")) == {"name": "作品"}
+
+    # 其他节点更新了后端，读取时不使用本地副本
+    backend.write("works/w1/meta.json", json.dumps({"name": "新名字"}).encode("utf-8"))
+    assert read_json(meta_path) == {"name": "新名字"}
+    assert read_json(os.path.join(cache_root, "works", "w2", "meta.json")) is None
+
+    backend.write("works/w2/meta.json", b"{}")
+    assert path_exists(os.path.join(cache_root, "works", "w2"))
+    assert not path_exists(os.path.join(cache_root, "works", "w3"))
+    assert sorted(list_entries(os.path.join(cache_root, "works"))[0]) == ["w1", "w2"]
@@ -0,0 +1,240 @@
+"""
+任务队列测试
+不依赖测试服务器：直接使用队列后端和 TaskWorker。
+设置 COMICMAKER_TEST_REDIS_URL（例如 redis://127.0.0.1:6379/15）时同时测试 redis 队列。
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from utils.task_broker import MemoryBroker, RedisBroker, SQLiteBroker, TaskWorker, make_job
+
+
+def _brokers(tmp_path, lease_seconds=300.0):
+    brokers = [
+        MemoryBroker(lease_seconds=lease_seconds),
+        SQLiteBroker(str(tmp_path / "queue.db"), lease_seconds=lease_seconds),
+    ]
+    redis_url = os.environ.get("COMICMAKER_TEST_REDIS_URL")
+    if redis_url:
+        brokers.append(RedisBroker(redis_url, queue=f"test:{uuid.uuid4()}", lease_seconds=lease_seconds))
+    return brokers
+
+
+def test_broker_fifo_and_ack(tmp_path):
+    """测试任务按提交顺序领取，ack 后不再出现"""
+    for broker in _brokers(tmp_path):
+        broker.enqueue(make_job("t1", "generate_script", {"description": "a"}))
+        broker.enqueue(make_job("t2", "generate_script", {"description": "b"}))
+        assert broker.pending() == 2
+
+        first = broker.claim(timeout=1)
+        assert first["task_id"] == "t1"
+        assert first["input"] == {"description": "a"}
+        assert first["attempts"] == 1
+        broker.ack("t1")
+
+        second = broker.claim(timeout=1)
+        assert second["task_id"] == "t2"
+        broker.ack("t2")
+        assert broker.claim(timeout=0.1) is None
+        broker.close()
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    """测试执行者未续约时任务在租约过期后重新被领取"""
+    broker = SQLiteBroker(str(tmp_path / "queue.db"), lease_seconds=0.2)
+    broker.enqueue(make_job("t1", "generate_script", {}))
+    assert broker.claim(timeout=1)["attempts"] == 1
+    assert broker.claim(timeout=0) is None
+    time.sleep(0.3)
+    job = broker.claim(timeout=1)
+    assert job["task_id"] == "t1"
+    assert job["attempts"] == 2
+
+
+def test_worker_runs_jobs_with_bounded_concurrency(tmp_path):
+    """测试 TaskWorker 并发执行任务且不超过并发数"""
+    for broker in _brokers(tmp_path):
+        running = []
+        peak = []
+        done = []
+
+        async def handler(job):
+            running.append(job["task_id"])
+            peak.append(len(running))
+            await asyncio.sleep(0.05)
+            running.remove(job["task_id"])
+            done.append(job["task_id"])
+
+        async def scenario():
+            worker = TaskWorker(broker, handler, concurrency=2)
+            worker.start()
+            for index in range(6):
+                broker.enqueue(make_job(f"t{index}", "generate_script", {}))
+            for _ in range(100):
+                if len(done) == 6:
+                    break
+                await asyncio.sleep(0.05)
+            await worker.stop()
+
+        asyncio.run(scenario())
+        assert sorted(done) == [f"t{index}" for index in range(6)]
+        assert max(peak) <= 2
+        assert broker.pending() == 0
+        broker.close()
+
+
+def test_worker_abandons_job_after_max_attempts(tmp_path):
+    """测试超过最大领取次数的任务不再执行"""
+    broker = SQLiteBroker(str(tmp_path / "queue.db"), lease_seconds=0.1)
+    broker.enqueue(make_job("t1", "generate_script", {}))
+    # 模拟执行进程两次崩溃（领取后未 ack）
+    broker.claim(timeout=1)
+    time.sleep(0.15)
+    broker.claim(timeout=1)
+    time.sleep(0.15)
+
+    executed = []
+    abandoned = []
+
+    async def handler(job):
+        executed.append(job["task_id"])
+
+    async def on_abandoned(job):
+        abandoned.append(job["task_id"])
+
+    async def scenario():
+        worker = TaskWorker(broker, handler, concurrency=1, max_attempts=2, on_abandoned=on_abandoned)
+        worker.start()
+        for _ in range(40):
+            if abandoned:
+                break
+            await asyncio.sleep(0.05)
+        await worker.stop()
+
+    asyncio.run(scenario())
+    assert executed == []
+    assert abandoned == ["t1"]
+    assert broker.pending() == 0
+
+
+def test_stop_timeout_releases_unfinished_job(tmp_path):
+    """测试停止时超过等待时间的任务交回队列，且本次领取不计入次数"""
+    broker = SQLiteBroker(str(tmp_path / "queue.db"))
+    broker.enqueue(make_job("t1", "text_to_image", {}))
+    interrupted = []
+
+    async def handler(job):
+        await asyncio.sleep(30)
+
+    async def scenario():
+        worker = TaskWorker(broker, handler, concurrency=1,
+                            on_interrupted=lambda job: interrupted.append(job["task_id"]))
+        worker.start()
+        for _ in range(40):
+            if worker.active:
+                break
+            await asyncio.sleep(0.05)
+        await worker.stop(timeout=0.1)
+
+    asyncio.run(scenario())
+    assert interrupted == ["t1"]
+    job = broker.claim(timeout=1)
+    assert job["task_id"] == "t1"
+    assert job["attempts"] == 1
+
+
+def test_stop_hands_off_queued_in_process_jobs():
+    """测试进程内队列停止时尚未领取的任务交给 on_interrupted"""
+    broker = MemoryBroker()
+    interrupted = []
+
+    async def handler(job):
+        await asyncio.sleep(30)
+
+    async def scenario():
+        worker = TaskWorker(broker, handler, concurrency=1,
+                            on_interrupted=lambda job: interrupted.append(job["task_id"]))
+        worker.start()
+        broker.enqueue(make_job("t1", "text_to_image", {}))
+        broker.enqueue(make_job("t2", "text_to_image", {}))
+        for _ in range(40):
+            if worker.active:
+                break
+            await asyncio.sleep(0.05)
+        await worker.stop(timeout=0)
+
+    asyncio.run(scenario())
+    assert sorted(interrupted) == ["t1", "t2"]
+
+
+def test_stop_does_not_wait_for_idle_claims(tmp_path):
+    """测试空闲的消费者在停止时立即退出，不等待领取超时"""
+    for broker in _brokers(tmp_path):
+        async def handler(job):
+            pass
+
+        async def scenario():
+            worker = TaskWorker(broker, handler, concurrency=4)
+            worker.start()
+            await asyncio.sleep(0.1)
+            started = time.monotonic()
+            await worker.stop(timeout=5)
+            return time.monotonic() - started
+
+        assert asyncio.run(scenario()) < 0.3
+        broker.close()
+
+
+class SlowClaimBroker(SQLiteBroker):
+    """领取在 proceed 设置后才返回，模拟停止时仍在领取线程中的领取"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.claiming = threading.Event()
+        self.proceed = threading.Event()
+        self.finished = threading.Event()
+
+    def claim(self, timeout=1.0):
+        self.claiming.set()
+        self.proceed.wait(5)
+        try:
+            return super().claim(timeout)
+        finally:
+            self.finished.set()
+
+
+def test_stop_releases_claim_in_flight(tmp_path):
+    """测试停止时领取线程中取到的任务交回队列，而不是一直占用租约"""
+    broker = SlowClaimBroker(str(tmp_path / "queue.db"))
+    broker.enqueue(make_job("t1", "text_to_image", {}))
+    executed = []
+
+    async def handler(job):
+        executed.append(job["task_id"])
+
+    async def scenario():
+        worker = TaskWorker(broker, handler, concurrency=1)
+        worker.start()
+        await asyncio.to_thread(broker.claiming.wait, 5)
+        started = time.monotonic()
+        await worker.stop(timeout=5)
+        elapsed = time.monotonic() - started
+        broker.proceed.set()
+        await asyncio.to_thread(broker.finished.wait, 5)
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.3
+    assert executed == []
+    # 领取线程在停止后取到任务并立即交回：仍在等待队列中，本次领取不计入次数
+    for _ in range(20):
+        if broker.pending() == 1:
+            break
+        time.sleep(0.05)
+    assert broker.pending() == 1
+    job = SQLiteBroker.claim(broker, timeout=1)
+    assert job["task_id"] == "t1" and job["attempts"] == 1
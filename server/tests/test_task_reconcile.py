@@ -0,0 +1,141 @@
+"""
+中断任务接手测试（进程内队列）
+不依赖测试服务器：数据写入临时目录，上游为 scripts/mock_upstream.py 的模拟服务，
+接手的任务通过真实的 run_task_job 轮询已提交的 prediction 并下载结果。
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from api import tools
+from api.tasks import TaskStatus, _modify_task, add_task_prediction, create_task, get_task, list_orphaned_tasks
+from scripts.mock_upstream import Distribution, MockOptions, MockUpstream
+from utils import common, predictions, storage, tracing
+from utils.predictions import prediction_result_url
+from utils.settings import loader, parse_settings
+from utils.storage import LocalStorage
+from utils.task_broker import MemoryBroker
+
+STALE_SECONDS = 300
+
+
+@pytest.fixture
+def mock_upstream():
+    mock = MockUpstream(MockOptions(processing=Distribution.parse("0.2"), seed=1)).start()
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch, mock_upstream):
+    """临时数据目录、指向模拟服务的配置，以及代替进程级队列的 MemoryBroker"""
+    root = str(tmp_path / "data")
+    monkeypatch.setattr(common, "DATA_ROOT", root)
+    monkeypatch.setattr(storage, "DATA_ROOT", root)
+    monkeypatch.setattr(storage, "_backend", LocalStorage(root))
+    settings = parse_settings({
+        "wavespeed_api_key": "key",
+        "upstreams": {"wavespeed_base_url": mock_upstream.wavespeed_base_url},
+        "tracing": {"exporter": "none"},
+    })
+    monkeypatch.setattr(loader, "_settings", settings)
+    monkeypatch.setattr(loader, "RELOAD_CHECK_INTERVAL", float("inf"))
+    monkeypatch.setattr(tracing, "_exporter", None)
+
+    broker = MemoryBroker()
+    monkeypatch.setattr(tools, "get_task_broker", lambda: broker)
+
+    async def submit_job(job):
+        broker.enqueue(job)
+
+    monkeypatch.setattr(tools, "submit_job", submit_job)
+    return broker
+
+
+def _pending_task(owner, heartbeat_at, prediction_id=None):
+    """创建属于 owner、最后心跳为 heartbeat_at 的未结束任务，可附带已提交的 prediction"""
+    task_id = create_task(tools.ToolType.TEXT_TO_IMAGE.value, {"prompt": "a cat"})
+    if prediction_id is not None:
+        add_task_prediction(task_id, {"id": prediction_id, "poll_url": prediction_result_url(prediction_id),
+                                      "submitted_at": "2025-01-27T00:00:00"})
+
+    def modify(task):
+        task["owner"] = owner
+        task["heartbeat_at"] = heartbeat_at
+    _modify_task(task_id, modify)
+    return task_id
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_stale_task_reclaimed_once_and_resumed(broker, mock_upstream, monkeypatch):
+    """
+    测试所属进程 PID 已被复用（本进程）但心跳超时的任务只被一个调用方接手，
+    接手后轮询已提交的 prediction 并下载结果，不重新提交生成请求
+    """
+    response = requests.post(f"{mock_upstream.wavespeed_base_url}/bytedance/seedream-v4.5", json={"prompt": "a cat"})
+    prediction_id = response.json()["data"]["id"]
+    owner = {"host": socket.gethostname(), "pid": os.getpid()}
+    task_id = _pending_task(owner, time.time() - 2 * STALE_SECONDS, prediction_id)
+
+    async def reconcile_concurrently():
+        return await asyncio.gather(*(tools.reconcile_tasks(STALE_SECONDS) for _ in range(3)))
+
+    assert sum(asyncio.run(reconcile_concurrently())) == 1
+    # 接手后心跳已刷新，不再被当作中断任务
+    assert asyncio.run(tools.reconcile_tasks(STALE_SECONDS)) == 0
+    jobs = broker.drain()
+    assert [job["task_id"] for job in jobs] == [task_id]
+
+    polled = []
+
+    def wait_for_prediction(prediction, api_key):
+        polled.append((prediction["id"], api_key))
+        return predictions.wait_for_prediction(prediction, api_key, poll_interval=0.05, max_wait=10)
+
+    monkeypatch.setattr(tools, "wait_for_prediction", wait_for_prediction)
+    asyncio.run(tools.run_task_job(jobs[0]))
+
+    task = get_task(task_id)
+    assert task["status"] == TaskStatus.SUCCESS.value
+    assert polled == [(prediction_id, "key")]
+    with open(task["output"]["image_path"], "rb") as f:
+        assert f.read().startswith(b"\x89PNG")
+    assert task["output"]["url"].endswith(f"/{task_id}/image.jpg")
+    counts = mock_upstream.snapshot()["requests"]
+    assert counts["submit"] == 1
+    assert list_orphaned_tasks(STALE_SECONDS) == []
+
+
+def test_orphan_detection(broker):
+    """
+    测试本机进程已退出的任务立即接手，本机和其他机器的任务都按心跳超时判断，
+    仍在本进程队列中等待的任务刷新心跳后不被接手
+    """
+    now = time.time()
+    here = socket.gethostname()
+    alive = _pending_task({"host": here, "pid": os.getpid()}, now)
+    dead = _pending_task({"host": here, "pid": _dead_pid()}, now)
+    remote = _pending_task({"host": f"{here}-other", "pid": 1}, now)
+    remote_stale = _pending_task({"host": f"{here}-other", "pid": 1}, now - 2 * STALE_SECONDS)
+    queued = _pending_task({"host": here, "pid": os.getpid()}, now - 2 * STALE_SECONDS)
+    broker.enqueue(tools.make_job(queued, tools.ToolType.TEXT_TO_IMAGE.value, {"prompt": "a cat"}))
+
+    orphaned = {task["task_id"] for task in list_orphaned_tasks(STALE_SECONDS)}
+    assert orphaned == {dead, remote_stale, queued}
+    assert alive not in orphaned and remote not in orphaned
+
+    assert asyncio.run(tools.reconcile_tasks(STALE_SECONDS)) == 2
+    assert sorted(job["task_id"] for job in broker.drain()) == sorted([queued, dead, remote_stale])
+    assert get_task(queued)["heartbeat_at"] > now
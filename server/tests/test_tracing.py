@@ -0,0 +1,80 @@
+"""
+任务追踪测试
+不依赖测试服务器：上游请求发往后台线程中的 scripts/mock_upstream.py 模拟服务。
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from scripts.mock_upstream import Distribution, MockOptions, MockUpstream
+from scripts.trace_report import build_tree, self_times
+from utils import metrics, tracing
+from utils.metrics import upstream_session
+from utils.settings import parse_settings
+from utils.tracing import FileExporter, parse_traceparent, read_trace, start_span
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    exporter = FileExporter(str(tmp_path))
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+def test_traceparent_continues_trace(exporter):
+    """测试以任务记录中的 traceparent 为父 span 继续同一条 trace，异常记录为 ERROR"""
+    with start_span("create_tool_task", kind="SERVER") as root:
+        traceparent = root.traceparent
+    assert parse_traceparent(traceparent) == (root.trace_id, root.span_id)
+    assert parse_traceparent("00-" + "0" * 32 + "-" + "1" * 16 + "-01") is None
+
+    with pytest.raises(RuntimeError):
+        with start_span("execute_task", parent=traceparent):
+            with start_span("oss.upload"):
+                raise RuntimeError("upload failed")
+
+    spans = {span["name"]: span for span in read_trace(root.trace_id, exporter.directory)}
+    assert set(spans) == {"create_tool_task", "execute_task", "oss.upload"}
+    assert spans["execute_task"]["parent_span_id"] == root.span_id
+    assert spans["oss.upload"]["parent_span_id"] == spans["execute_task"]["span_id"]
+    assert spans["oss.upload"]["status"] == {"code": "ERROR", "message": "upload failed"}
+    assert spans["oss.upload"]["events"][0]["attributes"]["exception.type"] == "RuntimeError"
+
+
+def test_upstream_spans_in_threads(exporter, monkeypatch):
+    """测试 asyncio.to_thread 中的上游请求成为任务 span 的子 span，轮询 span 记录 prediction 状态"""
+    mock = MockUpstream(MockOptions(seed=1, processing=Distribution.parse("0.2"))).start()
+    settings = parse_settings({"upstreams": {"wavespeed_base_url": mock.wavespeed_base_url}})
+    monkeypatch.setattr(metrics, "get_settings", lambda: settings)
+
+    def generate():
+        response = upstream_session.post(f"{mock.wavespeed_base_url}/bytedance/seedream-v4.5", json={"prompt": "a cat"})
+        poll_url = f"{mock.wavespeed_base_url}/predictions/{response.json()['data']['id']}/result?token=secret"
+        while upstream_session.get(poll_url).json()["data"]["status"] != "completed":
+            time.sleep(0.05)
+
+    async def run():
+        with start_span("execute_task") as span:
+            await asyncio.to_thread(generate)
+        return span
+
+    try:
+        task_span = asyncio.run(run())
+    finally:
+        mock.stop()
+
+    spans = read_trace(task_span.trace_id, exporter.directory)
+    requests = [span for span in spans if span["kind"] == "CLIENT"]
+    assert requests[0]["name"] == "wavespeed POST"
+    assert all(span["parent_span_id"] == task_span.span_id for span in requests)
+    polls = [span for span in requests if span["name"] == "wavespeed GET"]
+    assert polls[-1]["attributes"]["prediction.status"] == "completed"
+    assert all("?" not in span["attributes"]["http.url"] for span in polls)
+
+    # 轮询之间的等待计入任务 span 的自身耗时
+    roots, children = build_tree(spans)
+    assert [root["name"] for root in roots] == ["execute_task"]
+    assert self_times(spans, children)[task_span.span_id] >= 0.05 * (len(polls) - 1)
@@ -0,0 +1,91 @@
+"""
+用量台账测试
+不依赖测试服务器：台账写入临时目录。
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import usage
+from utils.metrics import TaskTimer
+from utils.settings import parse_settings
+from utils.usage import (
+    append_entry, build_entry, estimate_cost, parse_window, read_entries, summarize_models, timeseries,
+)
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    settings = parse_settings({"usage": {"prices": {
+        "seedream4.5": {"per_request": 0.03},
+        "wan2.6": {"per_second": {"720p": 0.1, "default": 0.2}},
+    }}})
+    monkeypatch.setattr(usage, "get_settings", lambda: settings)
+    monkeypatch.setattr(usage, "get_data_path", lambda *parts: os.path.join(tmp_path, *parts))
+    return tmp_path
+
+
+def _entry(ts, model, elapsed, status="success"):
+    return {"ts": ts, "model": model, "provider": "bytedance", "tool_type": "text_to_image", "status": status,
+            "elapsed_seconds": elapsed, "queue_seconds": 1.0, "run_seconds": elapsed - 1, "output_bytes": 10,
+            "cost": 0.03 if status == "success" else None}
+
+
+def test_build_entry(ledger, tmp_path):
+    """测试由任务记录和任务计时构造记录：上游接口、阶段耗时、输出大小和费用"""
+    output_dir = tmp_path / "outputs"
+    output_dir.mkdir()
+    (output_dir / "video.mp4").write_bytes(b"x" * 1234)
+    timer = TaskTimer("wan_image_to_video", "wan2.6")
+    timer.endpoints.append("alibaba/wan-2.6/image-to-video")
+    timer.add("queue", 30.0)
+    timer.add("run", 200.0)
+    timer.elapsed = 240.0
+    created = (datetime.now() - timedelta(seconds=250)).isoformat()
+    task = {"task_id": "t1", "tool_type": "wan_image_to_video", "status": "success", "created_at": created,
+            "input": {"model": "wan2.6", "resolution": "720p", "duration": "5"}}
+
+    entry = build_entry(task, timer, str(output_dir))
+    assert entry["provider"] == "alibaba" and entry["endpoint"] == "alibaba/wan-2.6/image-to-video"
+    assert entry["queue_seconds"] == 30.0 and entry["run_seconds"] == 200.0
+    assert entry["duration"] == 5.0 and entry["output_bytes"] == 1234
+    assert entry["cost"] == pytest.approx(0.5)
+    assert 5 <= entry["wait_seconds"] <= 15
+
+    assert estimate_cost("wan2.6", "1080p", 5) == pytest.approx(1.0)
+    assert estimate_cost("seedream4.5", None, None) == pytest.approx(0.03)
+    assert estimate_cost("unknown", None, None) is None
+
+
+def test_append_and_query(ledger):
+    """测试按小时分段追加、按窗口读取，以及模型排行和时间序列"""
+    now = time.time()
+    for offset, model, elapsed, status in [
+        (7200, "seedream4.5", 10.0, "success"),
+        (3000, "seedream4.5", 12.0, "success"),
+        (2000, "flux-kontext-pro", 5.0, "success"),
+        (1000, "flux-kontext-pro", 7.0, "failed"),
+        (500, "seedream4.5", 30.0, "success"),
+    ]:
+        append_entry(_entry(now - offset, model, elapsed, status))
+
+    entries = read_entries(now - parse_window("1h"), now + 1)
+    assert [entry["elapsed_seconds"] for entry in entries] == [12.0, 5.0, 7.0, 30.0]
+
+    models = summarize_models(entries, 3600)
+    assert [stats["model"] for stats in models] == ["flux-kontext-pro", "seedream4.5"]
+    flux, seedream = models
+    assert flux["tasks"] == 2 and flux["success_rate"] == 0.5
+    assert flux["elapsed_seconds"] == {"p50": 5.0, "p95": 5.0}
+    assert seedream["elapsed_seconds"]["p50"] == 21.0
+    assert seedream["throughput_per_hour"] == 2.0 and seedream["cost"] == pytest.approx(0.06)
+
+    series = timeseries(entries, now - 3600, now, 1800, model="seedream4.5")
+    assert [bucket["tasks"] for bucket in series] == [1, 1]
+    assert series[1]["elapsed_seconds"]["p95"] == 30.0
+
+    with pytest.raises(ValueError):
+        parse_window("yesterday")
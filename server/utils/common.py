@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+通用工具函数（数据路径、JSON 读写、ID 生成等）
+"""
+
+import os
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+
+# 数据根目录（项目根目录下的 data/），可通过环境变量 COMICMAKER_DATA_ROOT 覆盖（压测时使用独立目录）
+DATA_ROOT = os.environ.get("COMICMAKER_DATA_ROOT") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data"
+)
+
+
+def ensure_dir(path: str):
+    """确保目录存在"""
+    os.makedirs(path, exist_ok=True)
+
+
+def get_data_path(*parts: str) -> str:
+    """获取数据路径"""
+    return os.path.join(DATA_ROOT, *parts)
+
+
+def load_json(file_path: str) -> Optional[Dict[str, Any]]:
+    """加载 JSON 文件（经由数据存储后端）"""
+    from .storage import read_json
+    try:
+        return read_json(file_path)
+    except Exception:
+        return None
+
+
+def save_json(file_path: str, data: Dict[str, Any]):
+    """保存 JSON 文件（经由数据存储后端）"""
+    from .storage import write_json
+    write_json(file_path, data)
+
+
+def generate_id() -> str:
+    """生成唯一 ID"""
+    return str(uuid.uuid4())
+
+
+def list_dirs(base_path: str) -> list:
+    """列出目录下的所有子目录"""
+    from .storage import list_entries
+    dirs, _ = list_entries(base_path)
+    return dirs
+
+
+def delete_dir(dir_path: str):
+    """删除目录及其所有内容"""
+    from .storage import remove
+    remove(dir_path)
+
@@ -0,0 +1,540 @@
+"""
+剧集成片渲染工具
+
+按分镜顺序拼接各分镜选中的视频，生成剧集成片：
+- 使用 ffprobe 探测每个片段的编码参数
+- 参数一致的片段直接通过 ffmpeg concat demuxer 流拷贝（-c copy）拼接，不重新编码
+- 只有参数不一致的片段会在媒体进程池中并行转码归一化，然后再参与拼接
+- 台词合成和归一化得到的片段按内容哈希缓存，分镜变化时只重新生成对应片段
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .ffmpeg_utils import FFMPEG_BIN, FFmpegError, ffprobe_json, run_ffmpeg
+from .file_hash import file_sha256
+from .loudness import amplitude_to_db, analyze_loudness, combined_integrated_loudness
+from .media_pool import MediaWorkerPool, get_media_pool
+
+try:
+    import fcntl
+except ImportError:  # Windows：不加锁，同一剧集的并发渲染需由调用方避免
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 归一化转码参数（只作用于不匹配的片段）
+NORMALIZE_VIDEO_CODEC = "libx264"
+NORMALIZE_PRESET = "veryfast"
+NORMALIZE_CRF = "18"
+NORMALIZE_AUDIO_CODEC = "aac"
+NORMALIZE_AUDIO_BITRATE = "192k"
+
+# 整集响度归一化：目标积分响度、峰值上限，以及小于该差值时不做处理
+DEFAULT_LOUDNESS_TARGET = -16.0
+LOUDNESS_PEAK_CEILING_DB = -1.0
+LOUDNESS_TOLERANCE_DB = 0.5
+
+# 台词合成默认参数（传给 align_and_merge_audio）
+DEFAULT_MERGE_OPTIONS = {
+    "volume_balance_mode": "auto",
+    "backend": "ffmpeg",
+}
+
+# 片段缓存目录中的渲染锁文件
+RENDER_LOCK_NAME = ".render.lock"
+
+# ffprobe 编码名 -> ffmpeg 编码器
+_VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+}
+
+
+class EpisodeRenderError(FFmpegError):
+    """剧集渲染失败"""
+    pass
+
+
+def probe_video(video_path: str) -> Dict[str, Any]:
+    """
+    使用 ffprobe 探测视频的编码参数
+
+    Args:
+        video_path: 本地视频路径
+
+    Returns:
+        dict: 包含 video_codec, width, height, pix_fmt, fps, has_audio,
+              audio_codec, sample_rate, channels, duration
+    """
+    data = ffprobe_json(video_path)
+    streams = data.get("streams", [])
+
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise EpisodeRenderError(f"视频没有视频流: {video_path}")
+
+    duration = data.get("format", {}).get("duration") or video.get("duration") or 0
+
+    return {
+        "video_codec": video.get("codec_name"),
+        "width": int(video.get("width") or 0),
+        "height": int(video.get("height") or 0),
+        "pix_fmt": video.get("pix_fmt"),
+        "fps": video.get("r_frame_rate") or video.get("avg_frame_rate"),
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": int(audio.get("sample_rate") or 0) if audio else None,
+        "channels": int(audio.get("channels") or 0) if audio else None,
+        "duration": float(duration),
+    }
+
+
+def stream_signature(info: Dict[str, Any]) -> Tuple:
+    """
+    返回决定能否流拷贝拼接的参数组合
+
+    concat demuxer 要求所有片段的编码、分辨率、像素格式、帧率以及音轨参数一致。
+    """
+    return (
+        info["video_codec"], info["width"], info["height"], info["pix_fmt"], info["fps"],
+        info["has_audio"], info["audio_codec"], info["sample_rate"], info["channels"],
+    )
+
+
+def choose_target_info(infos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    选择拼接的目标参数：出现次数最多的参数组合，使需要转码的片段最少
+
+    如果任意片段带音轨，目标必须带音轨（无音轨片段会补静音轨）。
+    """
+    counts = Counter(stream_signature(info) for info in infos)
+    any_audio = any(info["has_audio"] for info in infos)
+
+    for signature, _ in counts.most_common():
+        if signature[5] or not any_audio:
+            return next(info for info in infos if stream_signature(info) == signature)
+
+    # 理论上不会到达：any_audio 为真时一定存在带音轨的组合
+    return infos[0]
+
+
+def normalize_clip(
+    src_path: str,
+    dst_path: str,
+    target: Dict[str, Any],
+    src_has_audio: Optional[bool] = None
+) -> str:
+    """
+    将片段转码为目标参数（在进程池中执行）
+
+    视频按比例缩放并补边到目标分辨率，统一帧率和像素格式；
+    目标带音轨而源没有时补一条等长静音轨，保证拼接时流结构一致。
+    """
+    width, height = target["width"], target["height"]
+    vf = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+    encoder = _VIDEO_ENCODERS.get(target["video_codec"], NORMALIZE_VIDEO_CODEC)
+
+    cmd = [FFMPEG_BIN, "-v", "error", "-y", "-i", src_path]
+    if src_has_audio is None:
+        src_has_audio = probe_video(src_path)["has_audio"]
+    if target["has_audio"] and not src_has_audio:
+        channel_layout = "stereo" if (target["channels"] or 2) >= 2 else "mono"
+        cmd += ["-f", "lavfi", "-i", f"anullsrc=channel_layout={channel_layout}:sample_rate={target['sample_rate'] or 44100}"]
+
+    cmd += [
+        "-map", "0:v:0",
+        "-vf", vf,
+        "-r", str(target["fps"]),
+        "-pix_fmt", target["pix_fmt"] or "yuv420p",
+        "-c:v", encoder,
+        "-preset", NORMALIZE_PRESET,
+        "-crf", NORMALIZE_CRF,
+    ]
+    if target["has_audio"]:
+        cmd += [
+            "-map", "0:a:0" if src_has_audio else "1:a:0",
+            "-c:a", NORMALIZE_AUDIO_CODEC,
+            "-b:a", NORMALIZE_AUDIO_BITRATE,
+            "-ar", str(target["sample_rate"]),
+            "-ac", str(target["channels"]),
+            "-shortest",
+        ]
+    else:
+        cmd += ["-an"]
+    cmd += ["-movflags", "+faststart", dst_path]
+
+    run_ffmpeg(cmd)
+    return dst_path
+
+
+def _escape_concat_path(path: str) -> str:
+    """concat 列表文件中的路径需要转义单引号"""
+    return os.path.abspath(path).replace("'", "'\\''")
+
+
+def concat_clips(clip_paths: List[str], output_path: str, list_path: Optional[str] = None) -> str:
+    """
+    使用 concat demuxer 流拷贝拼接片段（所有片段参数必须一致）
+
+    Args:
+        clip_paths: 片段路径列表（按播放顺序）
+        output_path: 输出文件路径
+        list_path: concat 列表文件路径，默认放在输出文件旁
+
+    Returns:
+        str: 输出文件路径
+    """
+    if not clip_paths:
+        raise EpisodeRenderError("没有可拼接的片段")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    list_path = list_path or f"{output_path}.concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in clip_paths:
+            f.write(f"file '{_escape_concat_path(path)}'\n")
+
+    # 先写临时文件再替换，避免渲染失败时覆盖上一次的成片
+    tmp_output = f"{output_path}.tmp{os.path.splitext(output_path)[1]}"
+    try:
+        run_ffmpeg([
+            FFMPEG_BIN, "-v", "error", "-y",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            "-movflags", "+faststart",
+            tmp_output
+        ])
+        os.replace(tmp_output, output_path)
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+    return output_path
+
+
+class FileIndex:
+    """
+    片段缓存目录中的文件索引（hashes.json）
+
+    以 (路径, 大小, 修改时间) 记忆文件哈希和 ffprobe 结果，
+    未变化的文件在再次渲染时无需重新读取内容或探测。
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def _entry(self, path: str) -> Dict[str, Any]:
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        entry = self.entries.get(abs_path)
+        if not entry or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            self.entries[abs_path] = entry
+        return entry
+
+    def sha256(self, path: str) -> str:
+        entry = self._entry(path)
+        if "sha256" not in entry:
+            entry["sha256"] = file_sha256(path)
+        return entry["sha256"]
+
+    def probe(self, path: str) -> Dict[str, Any]:
+        entry = self._entry(path)
+        if "probe" not in entry:
+            entry["probe"] = probe_video(path)
+        return entry["probe"]
+
+    def prune(self):
+        """移除已不存在的文件"""
+        self.entries = {p: e for p, e in self.entries.items() if os.path.exists(p)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+
+def segment_cache_key(video_hash: str, audio_hash: Optional[str], params: Dict[str, Any]) -> str:
+    """由源视频哈希、台词音频哈希和渲染参数生成片段缓存键"""
+    material = json.dumps(
+        {"video": video_hash, "audio": audio_hash, "params": params},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def merge_dialogue_segment(video_path: str, audio_path: str, dst_path: str, options: Dict[str, Any]) -> str:
+    """将台词音频对齐并混入分镜视频（在进程池中执行），原子写入缓存"""
+    from utils.speech_process import align_and_merge_audio
+
+    tmp_path = f"{dst_path}.tmp.mp4"
+    try:
+        align_and_merge_audio(
+            audio_path=audio_path,
+            video_path=video_path,
+            output_path=tmp_path,
+            **options
+        )
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return dst_path
+
+
+def _normalize_segment(src_path: str, dst_path: str, target: Dict[str, Any], src_has_audio: bool) -> str:
+    """归一化片段并原子写入缓存"""
+    tmp_path = f"{dst_path}.tmp.mp4"
+    try:
+        normalize_clip(src_path, tmp_path, target, src_has_audio)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return dst_path
+
+
+def apply_audio_gain(video_path: str, gain_db: float) -> str:
+    """对成片音轨施加固定增益（视频流拷贝，只重编码音频），原地替换"""
+    tmp_path = f"{video_path}.gain.tmp.mp4"
+    try:
+        run_ffmpeg([
+            FFMPEG_BIN, "-v", "error", "-y",
+            "-i", video_path,
+            "-map", "0:v:0", "-map", "0:a:0",
+            "-c:v", "copy",
+            "-af", f"volume={gain_db:.2f}dB",
+            "-c:a", NORMALIZE_AUDIO_CODEC, "-b:a", NORMALIZE_AUDIO_BITRATE,
+            "-movflags", "+faststart",
+            tmp_path
+        ])
+        os.replace(tmp_path, video_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return video_path
+
+
+def episode_loudness_gain(segment_paths: List[str], target_lufs: float, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    计算整集响度归一化所需增益
+
+    各片段的门限块按内容哈希缓存，合并后计算整集积分响度，
+    增益受峰值上限约束，避免提升音量后削波。
+    """
+    results = [analyze_loudness(path, cache_dir=cache_dir) for path in segment_paths]
+    measured = combined_integrated_loudness(results)
+    peak_db = amplitude_to_db(max((r["peak"] for r in results), default=0.0))
+    if measured is None:
+        return {"measured_lufs": None, "gain_db": 0.0, "sha256": [r["sha256"] for r in results]}
+
+    gain_db = target_lufs - measured
+    if peak_db is not None:
+        gain_db = min(gain_db, LOUDNESS_PEAK_CEILING_DB - peak_db)
+    return {"measured_lufs": measured, "gain_db": gain_db, "sha256": [r["sha256"] for r in results]}
+
+
+def _run_jobs(jobs: Dict[int, tuple], max_workers: Optional[int]):
+    """在媒体进程池中并行执行 {序号: (函数, *参数)}"""
+    if not jobs:
+        return
+    calls = [(fn, args, {}) for fn, *args in jobs.values()]
+    if max_workers:
+        pool = MediaWorkerPool(max_workers=max_workers)
+        try:
+            pool.run_many(calls)
+        finally:
+            pool.shutdown()
+    else:
+        get_media_pool().run_many(calls)
+
+
+def _as_clip_spec(clip: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if isinstance(clip, str):
+        return {"video_path": clip, "audio_path": None}
+    return {"video_path": clip["video_path"], "audio_path": clip.get("audio_path")}
+
+
+@contextmanager
+def _render_lock(cache_dir: str):
+    """
+    同一片段缓存目录的渲染串行执行（文件锁，跨进程有效）
+
+    并发渲染会删除对方即将拼接的片段，并对同一成片重复施加响度增益。
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(cache_dir, RENDER_LOCK_NAME), "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info(f"等待同一剧集的渲染完成: {cache_dir}")
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def render_episode(
+    clips: List[Union[str, Dict[str, Any]]],
+    output_path: str,
+    cache_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    merge_options: Optional[Dict[str, Any]] = None,
+    loudness_target: Optional[float] = DEFAULT_LOUDNESS_TARGET
+) -> Dict[str, Any]:
+    """
+    按顺序拼接剧集成片（增量渲染）
+
+    每个分镜的中间片段缓存在 cache_dir 中，缓存键由源视频哈希、台词音频哈希和渲染参数组成。
+    某个分镜的视频或台词变化后，只有该分镜的片段会重新生成，最终成片始终以流拷贝拼接。
+    使用同一 cache_dir 的渲染（例如同一剧集被重复点击渲染，或由不同 worker 进程处理）依次执行。
+
+    Args:
+        clips: 各分镜的片段（按分镜顺序），可以是视频路径，
+               也可以是 {"video_path": ..., "audio_path": 台词音频路径（可选）}
+        output_path: 成片输出路径
+        cache_dir: 片段缓存目录，默认为输出目录下的 segments/
+        max_workers: 为本次渲染单独创建的进程池大小，默认使用共享媒体进程池
+        merge_options: 传给 align_and_merge_audio 的音量参数
+        loudness_target: 整集目标积分响度（LUFS），为 None 时不做整集响度归一化
+
+    Returns:
+        dict: 包含 output_path, duration, clip_count, normalized（被转码的片段序号）,
+              rebuilt（本次重新生成的片段序号）, stream_copy（是否全部流拷贝）, target,
+              loudness（整集响度测量结果）, elapsed_time
+    """
+    if not clips:
+        raise EpisodeRenderError("没有可拼接的片段")
+
+    begin = time.time()
+    specs = [_as_clip_spec(clip) for clip in clips]
+    cache_dir = cache_dir or os.path.join(os.path.dirname(output_path) or ".", "segments")
+    os.makedirs(cache_dir, exist_ok=True)
+    with _render_lock(cache_dir):
+        index = FileIndex(os.path.join(cache_dir, "hashes.json"))
+        merge_options = {**DEFAULT_MERGE_OPTIONS, **(merge_options or {})}
+
+        for spec in specs:
+            spec["video_hash"] = index.sha256(spec["video_path"])
+            spec["audio_hash"] = index.sha256(spec["audio_path"]) if spec["audio_path"] else None
+
+        used_segments = set()
+        rebuilt = set()
+
+        # 阶段一：合成台词音频（只处理有台词的分镜）
+        merged_paths = []
+        jobs = {}
+        for i, spec in enumerate(specs):
+            if not spec["audio_path"]:
+                merged_paths.append(spec["video_path"])
+                continue
+            key = segment_cache_key(spec["video_hash"], spec["audio_hash"], {"stage": "dialogue", **merge_options})
+            segment_path = os.path.join(cache_dir, f"{key}.mp4")
+            used_segments.add(segment_path)
+            merged_paths.append(segment_path)
+            if not os.path.exists(segment_path):
+                jobs[i] = (merge_dialogue_segment, spec["video_path"], spec["audio_path"], segment_path, merge_options)
+        if jobs:
+            logger.info(f"{len(jobs)}/{len(specs)} 个分镜的台词片段需要重新合成")
+        _run_jobs(jobs, max_workers)
+        rebuilt.update(jobs)
+
+        # 阶段二：归一化参数不一致的片段
+        infos = [index.probe(path) for path in merged_paths]
+        target = choose_target_info(infos)
+        target_signature = stream_signature(target)
+        mismatched = [i for i, info in enumerate(infos) if stream_signature(info) != target_signature]
+
+        final_paths = list(merged_paths)
+        jobs = {}
+        for i in mismatched:
+            spec = specs[i]
+            params = {"stage": "normalize", "target": list(target_signature)}
+            if spec["audio_path"]:
+                params["dialogue"] = merge_options
+            key = segment_cache_key(spec["video_hash"], spec["audio_hash"], params)
+            segment_path = os.path.join(cache_dir, f"{key}.mp4")
+            used_segments.add(segment_path)
+            final_paths[i] = segment_path
+            if not os.path.exists(segment_path):
+                jobs[i] = (_normalize_segment, merged_paths[i], segment_path, target, infos[i]["has_audio"])
+        if jobs:
+            logger.info(f"{len(jobs)}/{len(specs)} 个片段参数不一致，开始并行归一化")
+        _run_jobs(jobs, max_workers)
+        rebuilt.update(jobs)
+
+        concat_clips(final_paths, output_path)
+
+        # 整集响度归一化：片段响度按哈希缓存，只对成片音轨施加一次固定增益
+        loudness = None
+        loudness_dir = os.path.join(cache_dir, "loudness")
+        used_loudness = set()
+        if loudness_target is not None and target["has_audio"]:
+            loudness = episode_loudness_gain(final_paths, loudness_target, cache_dir=loudness_dir)
+            used_loudness.update(f"{digest}.json" for digest in loudness.pop("sha256"))
+            loudness["target_lufs"] = loudness_target
+            loudness["applied"] = abs(loudness["gain_db"]) >= LOUDNESS_TOLERANCE_DB
+            if loudness["applied"]:
+                apply_audio_gain(output_path, loudness["gain_db"])
+
+        # 清理本次未用到的旧片段和响度缓存，避免缓存无限增长
+        for filename in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, filename)
+            if filename.endswith(".mp4") and path not in used_segments:
+                os.remove(path)
+        if os.path.isdir(loudness_dir):
+            for filename in os.listdir(loudness_dir):
+                if filename not in used_loudness:
+                    os.remove(os.path.join(loudness_dir, filename))
+        index.prune()
+        index.save()
+
+        elapsed = time.time() - begin
+        logger.info(
+            f"剧集成片渲染完成: {output_path}，{len(specs)} 个片段，"
+            f"重新生成 {len(rebuilt)} 个，耗时 {elapsed:.2f}s"
+        )
+
+        return {
+            "output_path": output_path,
+            "duration": sum(info["duration"] for info in infos),
+            "clip_count": len(specs),
+            "normalized": mismatched,
+            "rebuilt": sorted(rebuilt),
+            "stream_copy": not mismatched,
+            "target": {
+                "video_codec": target["video_codec"],
+                "width": target["width"],
+                "height": target["height"],
+                "fps": target["fps"],
+                "has_audio": target["has_audio"],
+            },
+            "loudness": loudness,
+            "elapsed_time": elapsed,
+        }
@@ -0,0 +1,58 @@
+"""
+ffmpeg / ffprobe 调用工具
+
+统一可执行文件路径（可通过 FFMPEG_BIN / FFPROBE_BIN 环境变量覆盖）和错误处理。
+"""
+
+import json
+import os
+import subprocess
+from typing import Any, Dict, List
+
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.environ.get("FFPROBE_BIN", "ffprobe")
+
+
+class FFmpegError(Exception):
+    """ffmpeg / ffprobe 执行失败"""
+    pass
+
+
+def run_ffmpeg(cmd: List[str]) -> subprocess.CompletedProcess:
+    """执行 ffmpeg/ffprobe 命令，失败时抛出 FFmpegError"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise FFmpegError(f"未找到可执行文件: {cmd[0]}，请先安装 ffmpeg")
+    if result.returncode != 0:
+        raise FFmpegError(f"命令执行失败: {' '.join(cmd[:3])} ... {result.stderr.strip()[-500:]}")
+    return result
+
+
+def ffprobe_json(path: str) -> Dict[str, Any]:
+    """返回 ffprobe 的流和容器信息（JSON）"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"媒体文件不存在: {path}")
+    result = run_ffmpeg([
+        FFPROBE_BIN, "-v", "error",
+        "-show_streams", "-show_format",
+        "-of", "json",
+        path
+    ])
+    return json.loads(result.stdout or "{}")
+
+
+def probe_duration(path: str) -> float:
+    """获取媒体时长（秒）"""
+    data = ffprobe_json(path)
+    duration = data.get("format", {}).get("duration")
+    if duration is None:
+        durations = [float(s["duration"]) for s in data.get("streams", []) if s.get("duration")]
+        duration = max(durations) if durations else 0
+    return float(duration)
+
+
+def has_audio_stream(path: str) -> bool:
+    """判断媒体文件是否包含音轨"""
+    data = ffprobe_json(path)
+    return any(s.get("codec_type") == "audio" for s in data.get("streams", []))
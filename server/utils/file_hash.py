@@ -0,0 +1,49 @@
+"""
+文件内容哈希工具
+
+供各类媒体缓存使用：缓存键基于文件内容的 SHA-256，
+同一进程内按 (路径, 大小, 修改时间) 记忆哈希结果，未变化的文件不会重复读取。
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+_MEMO_SIZE = 4096
+_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_identity(path: str) -> Tuple[str, int, int]:
+    """返回 (绝对路径, 大小, 修改时间纳秒)，用于判断文件是否变化"""
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    return abs_path, stat.st_size, stat.st_mtime_ns
+
+
+def cached_file_sha256(path: str) -> str:
+    """带进程内记忆的文件哈希"""
+    identity = file_identity(path)
+    with _memo_lock:
+        digest = _memo.get(identity)
+        if digest is not None:
+            _memo.move_to_end(identity)
+            return digest
+
+    digest = file_sha256(path)
+    with _memo_lock:
+        _memo[identity] = digest
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return digest
@@ -0,0 +1,568 @@
+"""
+视频抽帧服务（多模态 LLM 输入）
+
+- 顺序解码：按帧序 grab()，只在需要的帧上 retrieve()，避免每帧一次 CAP_PROP_POS_FRAMES 跳转
+  （每次跳转都要从上一个关键帧重新解码）；抽帧间隔很大时自动退回按帧跳转
+- 关键帧模式：只解码关键帧（ffmpeg -skip_frame nokey），适合长视频的快速预览
+- 帧在取出时立即缩放，内存占用只与抽帧数量有关
+- 场景自适应模式：按颜色直方图和灰度缩略图差异选出变化明显的帧，在帧数和字节预算内去掉近似重复帧
+- 编码后的 JPEG 按 (视频内容哈希, 帧数, 分辨率, 模式) 缓存在进程内 LRU 和磁盘上，
+  同一视频的重复分析不再解码；磁盘缓存按最近使用时间淘汰，总大小和保留天数有上限
+- 服务中通过 sample_in_pool() 在媒体进程池中解码，工作进程只传回 JPEG 字节
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from . import get_data_path
+from .ffmpeg_utils import FFMPEG_BIN, FFmpegError, ffprobe_json
+from .file_hash import cached_file_sha256
+from .media_pool import get_media_pool
+from .settings import add_reload_listener
+
+logger = logging.getLogger(__name__)
+
+Resolution = Optional[Union[Tuple[int, int], int]]
+
+DEFAULT_CACHE_DIR = get_data_path("cache", "frames")
+# 与 cv2.imencode 默认值一致
+DEFAULT_JPEG_QUALITY = 95
+# 相邻抽帧平均间隔超过该帧数时，顺序解码不如逐帧跳转划算
+SEEK_GAP_THRESHOLD = 300
+# 场景自适应抽帧：候选帧数量、差异度阈值、签名缩略图尺寸和直方图分箱数
+SCENE_CANDIDATE_FRAMES = 256
+SCENE_CHANGE_THRESHOLD = 0.12
+SIGNATURE_SIZE = 32
+HISTOGRAM_BINS = 16
+# 进程内缓存的 JPEG 总字节数上限（默认值，可由配置 performance.frame_cache_mb 覆盖）
+MEMORY_CACHE_BYTES = 128 * 1024 * 1024
+# 磁盘缓存总字节数上限和保留天数（默认值，可由配置 performance.frame_disk_cache_mb /
+# frame_disk_cache_days 覆盖，0 表示不限制）
+DISK_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+DISK_CACHE_DAYS = 14
+# 写入磁盘缓存后两次淘汰检查的最小间隔（秒）
+DISK_PRUNE_INTERVAL = 300.0
+
+_memory_cache: "OrderedDict[str, List[bytes]]" = OrderedDict()
+_memory_cache_bytes = 0
+_memory_cache_limit = MEMORY_CACHE_BYTES
+_disk_cache_limit = DISK_CACHE_BYTES
+_disk_cache_days = DISK_CACHE_DAYS
+_last_disk_prune: Optional[float] = None
+_cache_lock = threading.Lock()
+
+
+def _apply_settings(settings):
+    global _memory_cache_limit, _disk_cache_limit, _disk_cache_days
+    performance = settings.performance
+    cache_mb = performance.frame_cache_mb
+    _memory_cache_limit = MEMORY_CACHE_BYTES if cache_mb is None else cache_mb * 1024 * 1024
+    disk_mb = performance.frame_disk_cache_mb
+    _disk_cache_limit = DISK_CACHE_BYTES if disk_mb is None else disk_mb * 1024 * 1024
+    disk_days = performance.frame_disk_cache_days
+    _disk_cache_days = DISK_CACHE_DAYS if disk_days is None else disk_days
+
+
+add_reload_listener(_apply_settings)
+
+
+def sample_frame_indices(total_frames: int, count: int) -> List[int]:
+    """在 [0, total_frames) 中均匀选取 count 个帧序号"""
+    count = min(count, total_frames)
+    if count <= 0:
+        return []
+    if count == 1:
+        return [0]
+    return np.linspace(0, total_frames - 1, count, dtype=int).tolist()
+
+
+def resize_frame(frame: np.ndarray,
+                 target_resolution: Union[Tuple[int, int], int],
+                 maintain_aspect_ratio: bool = True) -> np.ndarray:
+    """
+    缩放单帧
+
+    Args:
+        target_resolution: int 表示短边长度（保持宽高比）；(width, height) 表示目标尺寸
+        maintain_aspect_ratio: 目标为 (width, height) 时是否保持宽高比（不足部分补黑边）
+    """
+    h, w = frame.shape[:2]
+    if isinstance(target_resolution, int):
+        if w < h:
+            new_w, new_h = target_resolution, int(h * target_resolution / w)
+        else:
+            new_w, new_h = int(w * target_resolution / h), target_resolution
+        return _resize(frame, new_w, new_h)
+
+    target_w, target_h = target_resolution
+    if not maintain_aspect_ratio:
+        return _resize(frame, target_w, target_h)
+
+    scale = min(target_w / w, target_h / h)
+    new_w, new_h = int(w * scale), int(h * scale)
+    result = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+    y_offset = (target_h - new_h) // 2
+    x_offset = (target_w - new_w) // 2
+    result[y_offset:y_offset + new_h, x_offset:x_offset + new_w] = _resize(frame, new_w, new_h)
+    return result
+
+
+def _resize(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    # 缩小用 INTER_AREA（更快且无混叠），放大用 LANCZOS4
+    shrinking = width * height < frame.shape[0] * frame.shape[1]
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+    return cv2.resize(frame, (width, height), interpolation=interpolation)
+
+
+def _decode_sequential(cap, indices: List[int], transform) -> List[np.ndarray]:
+    """单次顺序解码：grab 每一帧，只 retrieve 需要的帧"""
+    wanted = set(indices)
+    last = indices[-1]
+    frames = []
+    position = 0
+    while position <= last:
+        if not cap.grab():
+            break
+        if position in wanted:
+            ok, frame = cap.retrieve()
+            if ok:
+                frames.append(transform(frame))
+        position += 1
+    return frames
+
+
+def _decode_seek(cap, indices: List[int], transform) -> List[np.ndarray]:
+    """逐帧跳转解码（抽帧非常稀疏时使用）"""
+    frames = []
+    for idx in indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ok, frame = cap.read()
+        if ok:
+            frames.append(transform(frame))
+    return frames
+
+
+def _decode_keyframes(video_path: str, count: int, transform) -> List[np.ndarray]:
+    """只解码关键帧，再从中均匀选取 count 帧"""
+    stream = next(
+        (s for s in ffprobe_json(video_path).get("streams", []) if s.get("codec_type") == "video"),
+        None
+    )
+    if stream is None:
+        raise ValueError("Video has no video stream")
+    width, height = int(stream["width"]), int(stream["height"])
+    frame_bytes = width * height * 3
+
+    cmd = [
+        FFMPEG_BIN, "-v", "error", "-nostdin",
+        "-skip_frame", "nokey",
+        "-i", video_path,
+        "-map", "0:v:0",
+        "-vsync", "vfr",
+        "-f", "rawvideo", "-pix_fmt", "bgr24",
+        "pipe:1"
+    ]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        raise FFmpegError(f"未找到可执行文件: {FFMPEG_BIN}，请先安装 ffmpeg")
+
+    keyframes = []
+    try:
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            keyframes.append(transform(frame))
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+    return [keyframes[i] for i in sample_frame_indices(len(keyframes), count)]
+
+
+def decode_frames(video_path: str,
+                  count: int,
+                  target_resolution: Resolution = None,
+                  maintain_aspect_ratio: bool = True,
+                  mode: str = "auto") -> List[np.ndarray]:
+    """
+    解码并缩放均匀分布的 count 帧（BGR）
+
+    Args:
+        mode: "sequential" 顺序解码，"seek" 逐帧跳转，"keyframe" 只解码关键帧，
+              "auto" 根据抽帧密度在 sequential / seek 之间选择
+    """
+    def transform(frame):
+        if target_resolution is None:
+            return frame.copy()
+        return resize_frame(frame, target_resolution, maintain_aspect_ratio)
+
+    return _decode_uniform(video_path, count, transform, mode)
+
+
+def _decode_uniform(video_path: str, count: int, transform, mode: str = "auto") -> list:
+    """均匀选取 count 帧，对每帧调用 transform 并返回结果列表"""
+    if mode == "keyframe":
+        return _decode_keyframes(video_path, count, transform)
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video: {video_path}")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames <= 0:
+            raise ValueError("Video has no frames")
+        indices = sample_frame_indices(total_frames, count)
+        if mode == "auto":
+            average_gap = total_frames / max(len(indices), 1)
+            mode = "seek" if average_gap > SEEK_GAP_THRESHOLD else "sequential"
+        if mode == "seek":
+            return _decode_seek(cap, indices, transform)
+        return _decode_sequential(cap, indices, transform)
+    finally:
+        cap.release()
+
+
+def _cache_key(video_hash: str, params: list) -> str:
+    material = json.dumps([video_hash, params], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def _memory_get(key: str) -> Optional[List[bytes]]:
+    with _cache_lock:
+        frames = _memory_cache.get(key)
+        if frames is not None:
+            _memory_cache.move_to_end(key)
+        return frames
+
+
+def _memory_put(key: str, frames: List[bytes]):
+    global _memory_cache_bytes
+    size = sum(len(f) for f in frames)
+    if size > _memory_cache_limit:
+        return
+    with _cache_lock:
+        if key in _memory_cache:
+            return
+        _memory_cache[key] = frames
+        _memory_cache_bytes += size
+        while _memory_cache_bytes > _memory_cache_limit:
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_cache_bytes -= sum(len(f) for f in evicted)
+
+
+def _disk_get(cache_dir: str, key: str) -> Optional[List[bytes]]:
+    entry_dir = os.path.join(cache_dir, key)
+    manifest_path = os.path.join(entry_dir, "frames.json")
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            names = json.load(f)["frames"]
+        frames = []
+        for name in names:
+            with open(os.path.join(entry_dir, name), "rb") as f:
+                frames.append(f.read())
+        # 清单的修改时间记录最近使用时间，淘汰时据此排序
+        os.utime(manifest_path)
+        return frames
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _disk_put(cache_dir: str, key: str, frames: List[bytes]):
+    entry_dir = os.path.join(cache_dir, key)
+    os.makedirs(entry_dir, exist_ok=True)
+    names = []
+    for i, data in enumerate(frames):
+        name = f"{i:04d}.jpg"
+        with open(os.path.join(entry_dir, name), "wb") as f:
+            f.write(data)
+        names.append(name)
+    # 清单最后写入，存在清单即表示缓存完整
+    tmp_path = os.path.join(entry_dir, "frames.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"frames": names}, f)
+    os.replace(tmp_path, os.path.join(entry_dir, "frames.json"))
+
+
+def prune_disk_cache(cache_dir: str,
+                     max_bytes: Optional[int] = None,
+                     max_days: Optional[float] = None) -> int:
+    """
+    淘汰磁盘缓存：先删除超过保留天数未使用的条目，总大小仍超过上限时按最近使用时间从旧到新删除
+
+    Args:
+        max_bytes: 总字节数上限，默认使用当前配置，0 表示不限制
+        max_days: 保留天数，默认使用当前配置，0 表示不限制
+
+    Returns:
+        删除的条目数
+    """
+    max_bytes = _disk_cache_limit if max_bytes is None else max_bytes
+    max_days = _disk_cache_days if max_days is None else max_days
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    # (最近使用时间, 字节数, 目录)；没有清单的条目（写入中或已损坏）按目录修改时间计
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, key)
+        try:
+            manifest_path = os.path.join(entry_dir, "frames.json")
+            used_at = os.path.getmtime(manifest_path if os.path.exists(manifest_path) else entry_dir)
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+        except (NotADirectoryError, FileNotFoundError):
+            continue
+        entries.append((used_at, size, entry_dir))
+    entries.sort()
+
+    cutoff = time.time() - max_days * 86400 if max_days else None
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for used_at, size, entry_dir in entries:
+        expired = cutoff is not None and used_at < cutoff
+        if not expired and (not max_bytes or total <= max_bytes):
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"抽帧磁盘缓存淘汰 {removed} 个条目，剩余 {total / 1024 / 1024:.1f} MB")
+    return removed
+
+
+def _maybe_prune_disk_cache(cache_dir: str):
+    """写入磁盘缓存后按 DISK_PRUNE_INTERVAL 间隔检查一次淘汰"""
+    global _last_disk_prune
+    now = time.monotonic()
+    with _cache_lock:
+        if _last_disk_prune is not None and now - _last_disk_prune < DISK_PRUNE_INTERVAL:
+            return
+        _last_disk_prune = now
+    try:
+        prune_disk_cache(cache_dir)
+    except OSError as e:
+        logger.warning(f"淘汰抽帧磁盘缓存失败: {e}")
+
+
+def sample_video_frames(video_path: str,
+                        count: int = 10,
+                        target_resolution: Resolution = None,
+                        maintain_aspect_ratio: bool = True,
+                        mode: str = "auto",
+                        quality: int = DEFAULT_JPEG_QUALITY,
+                        cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> List[bytes]:
+    """
+    均匀抽取视频帧并编码为 JPEG（带缓存）
+
+    Args:
+        video_path: 视频路径
+        count: 抽帧数量
+        target_resolution: None 保持原分辨率；int 为短边长度；(width, height) 为目标尺寸
+        maintain_aspect_ratio: 目标为 (width, height) 时是否保持宽高比
+        mode: 解码模式，见 decode_frames
+        quality: JPEG 质量
+        cache_dir: 磁盘缓存目录，为 None 时只使用进程内缓存
+
+    Returns:
+        JPEG 字节串列表
+    """
+    if isinstance(target_resolution, list):
+        target_resolution = tuple(target_resolution)
+    # auto / sequential / seek 得到的是同一组帧，共享缓存
+    decode_kind = "keyframe" if mode == "keyframe" else "uniform"
+    key = _cache_key(cached_file_sha256(video_path),
+                     [decode_kind, count, target_resolution, maintain_aspect_ratio, quality])
+
+    def produce():
+        decoded = decode_frames(video_path, count, target_resolution, maintain_aspect_ratio, mode)
+        return [data for data in (_encode_jpeg(frame, quality) for frame in decoded) if data]
+
+    return _cached_frames(key, cache_dir, produce)
+
+
+def _encode_jpeg(frame: np.ndarray, quality: int) -> Optional[bytes]:
+    ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes() if ok else None
+
+
+def _cached_frames(key: str, cache_dir: Optional[str], produce) -> List[bytes]:
+    """依次查进程内缓存、磁盘缓存，未命中时调用 produce() 生成并写回"""
+    frames = _memory_get(key)
+    if frames is not None:
+        return frames
+    if cache_dir:
+        frames = _disk_get(cache_dir, key)
+        if frames is not None:
+            _memory_put(key, frames)
+            return frames
+
+    frames = produce()
+    if frames:
+        _memory_put(key, frames)
+        if cache_dir:
+            try:
+                _disk_put(cache_dir, key, frames)
+            except OSError as e:
+                logger.warning(f"写入抽帧缓存失败: {e}")
+            _maybe_prune_disk_cache(cache_dir)
+    return frames
+
+
+def to_data_uri(jpeg_bytes: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg_bytes).decode('utf-8')}"
+
+
+def sample_in_pool(sampler: Callable[..., List[bytes]], video_path: str, **kwargs) -> List[bytes]:
+    """
+    在共享媒体进程池中执行 sample_video_frames / sample_scene_frames（同步等待，供线程中调用）
+
+    解码和 JPEG 编码都在工作进程中完成，只传回 JPEG 字节，base64 由调用方按需生成；
+    磁盘缓存在各进程间共享，进程内缓存属于各工作进程。
+    """
+    return get_media_pool().run(sampler, video_path, **kwargs)
+
+
+def frame_signature(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    帧签名：缩小后的灰度图（用于运动差异）和归一化的 BGR 颜色直方图（用于场景差异）
+    """
+    thumb = cv2.resize(frame, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
+    quantized = (thumb.reshape(-1, 3).astype(np.int32) * HISTOGRAM_BINS) // 256
+    histogram = np.stack([
+        np.bincount(quantized[:, c], minlength=HISTOGRAM_BINS) for c in range(3)
+    ]).astype(np.float32)
+    histogram /= histogram.sum(axis=1, keepdims=True)
+    return gray.ravel(), histogram.ravel()
+
+
+def signature_distance(grays: np.ndarray, histograms: np.ndarray,
+                       gray: np.ndarray, histogram: np.ndarray) -> np.ndarray:
+    """
+    批量计算若干帧与一帧之间的差异度（0~1）
+
+    取颜色直方图差异（总变差距离，三个通道平均）与灰度缩略图平均绝对差中的较大者，
+    前者对应镜头/场景切换，后者对应同一场景内的运动。
+    """
+    histogram_distance = np.abs(histograms - histogram).sum(axis=-1) / 6.0
+    motion = np.abs(grays - gray).mean(axis=-1)
+    return np.maximum(histogram_distance, motion)
+
+
+def select_scene_frames(grays: np.ndarray,
+                        histograms: np.ndarray,
+                        sizes: Sequence[int],
+                        max_frames: int,
+                        max_bytes: Optional[int] = None,
+                        threshold: float = SCENE_CHANGE_THRESHOLD,
+                        min_spacing: int = 1) -> List[int]:
+    """
+    按场景变化选帧
+
+    1. 顺序扫描候选帧，与最近一次选中帧的差异度不低于 threshold 且间隔至少 min_spacing 个候选帧
+       才选中（去掉近似重复帧，闪烁等连续突变只保留一帧）
+    2. 超出帧数 / 字节预算时按差异度从高到低保留，首帧始终保留
+    3. 返回的序号保持时间顺序
+
+    Args:
+        grays / histograms: 候选帧签名（frame_signature 的结果按行堆叠）
+        sizes: 各候选帧编码后的字节数
+        min_spacing: 相邻选中帧之间的最小候选帧间隔
+    """
+    count = len(sizes)
+    if count == 0:
+        return []
+
+    selected = [0]
+    scores = {0: float("inf")}
+    for i in range(1, count):
+        last = selected[-1]
+        if i - last < min_spacing:
+            continue
+        distance = float(signature_distance(grays[i], histograms[i], grays[last], histograms[last]))
+        if distance >= threshold:
+            selected.append(i)
+            scores[i] = distance
+
+    ranked = sorted(selected, key=lambda i: scores[i], reverse=True)[:max(1, max_frames)]
+    if max_bytes:
+        kept = []
+        total = 0
+        for i in ranked:
+            if kept and total + sizes[i] > max_bytes:
+                continue
+            kept.append(i)
+            total += sizes[i]
+        ranked = kept
+    return sorted(ranked)
+
+
+def sample_scene_frames(video_path: str,
+                        max_frames: int = 32,
+                        max_bytes: Optional[int] = None,
+                        target_resolution: Resolution = None,
+                        maintain_aspect_ratio: bool = True,
+                        threshold: float = SCENE_CHANGE_THRESHOLD,
+                        min_spacing: int = 1,
+                        candidate_frames: int = SCENE_CANDIDATE_FRAMES,
+                        quality: int = DEFAULT_JPEG_QUALITY,
+                        cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> List[bytes]:
+    """
+    场景自适应抽帧（带缓存）
+
+    一次顺序解码均匀分布的 candidate_frames 个候选帧，每帧在取出时同时缩放编码为 JPEG
+    并计算签名，再由 select_scene_frames 在帧数和字节预算内选出变化最大的帧。
+    静态画面只会返回很少的帧。
+
+    Args:
+        max_frames: 最多返回的帧数
+        max_bytes: 返回帧的 JPEG 总字节数上限（base64 前），None 表示不限制
+        threshold: 判定为新画面的最小差异度（0~1）
+        min_spacing: 相邻选中帧之间的最小候选帧间隔
+
+    Returns:
+        按时间顺序排列的 JPEG 字节串列表
+    """
+    if isinstance(target_resolution, list):
+        target_resolution = tuple(target_resolution)
+    candidate_frames = max(candidate_frames, max_frames)
+    key = _cache_key(cached_file_sha256(video_path), [
+        "scene", max_frames, max_bytes, target_resolution, maintain_aspect_ratio,
+        threshold, min_spacing, candidate_frames, quality
+    ])
+
+    def transform(frame):
+        signature = frame_signature(frame)
+        if target_resolution is not None:
+            frame = resize_frame(frame, target_resolution, maintain_aspect_ratio)
+        return _encode_jpeg(frame, quality), signature
+
+    def produce():
+        candidates = [c for c in _decode_uniform(video_path, candidate_frames, transform) if c[0]]
+        if not candidates:
+            return []
+        grays = np.stack([signature[0] for _, signature in candidates])
+        histograms = np.stack([signature[1] for _, signature in candidates])
+        sizes = [len(data) for data, _ in candidates]
+        chosen = select_scene_frames(grays, histograms, sizes, max_frames, max_bytes, threshold, min_spacing)
+        logger.info(f"场景自适应抽帧: {len(candidates)} 个候选帧中选出 {len(chosen)} 帧")
+        return [candidates[i][0] for i in chosen]
+
+    return _cached_frames(key, cache_dir, produce)
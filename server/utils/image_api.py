@@ -6,10 +6,14 @@
 """
 
 import logging
-import os
 from typing import List, Optional, Dict, Any
 
-from .wavespeed_client import WavespeedClient, create_client_from_config
+from .wavespeed_client import WavespeedClient, create_client_from_config, wavespeed_url
+from .settings import get_settings
+from .metrics import task_stage, upstream_session
+from .predictions import prediction_result_url, record_prediction
+from .tracing import start_span
+from .media_encoding import json_body, media_ref
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -23,11 +27,22 @@ def _get_client(api_key: Optional[str] = None) -> WavespeedClient:
     global _client
     if api_key:
         return WavespeedClient(api_key=api_key)
-    if _client is None:
+    # 配置中的 API key 变化（热加载）时重新创建客户端
+    if _client is None or _client.api_key != get_settings().wavespeed_api_key:
         _client = create_client_from_config()
     return _client
 
 
+def _save_output(url: str, save_path: str):
+    """下载生成结果到 save_path（计入任务的 download 阶段）"""
+    with task_stage("download"), start_span("download", {"http.url": url.split("?", 1)[0]}):
+        resp = upstream_session.get(url, stream=True)
+        resp.raise_for_status()
+        with open(save_path, "wb") as f:
+            for chunk in resp.iter_content(8192):
+                f.write(chunk)
+
+
 def text_to_image_generate(
     api_key: str,
     prompt: str,
@@ -100,12 +115,7 @@ def seedream_v4_5_text_to_image(
             size=size
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -129,12 +139,7 @@ def wan_2_6_text_to_image(
             size=size
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -160,12 +165,7 @@ def nano_banana_pro_text_to_image(
             resolution=resolution
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -193,12 +193,7 @@ def seedream_v4_edit(
             size=size
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -224,12 +219,7 @@ def wan_2_6_image_edit(
             size=size
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -257,12 +247,7 @@ def nano_banana_pro_edit(
             resolution=resolution
         )
         if result.get('success') and save_path:
-            import requests
-            resp = requests.get(result['url'], stream=True)
-            resp.raise_for_status()
-            with open(save_path, "wb") as f:
-                for chunk in resp.iter_content(8192):
-                    f.write(chunk)
+            _save_output(result['url'], save_path)
             result['output_path'] = save_path
         return result
     except Exception as e:
@@ -388,38 +373,21 @@ def seedream_v4_sequential_edit(
     Generate a series of magazine photoshoots using ByteDance seedream-v4 edit-sequential API.
     注：sequential edit 是特殊端点，直接使用底层 API
     """
-    import json
     import time
-    import requests
     from datetime import datetime
 
     client = _get_client(api_key)
 
-    # 编码图片
+    # 编码图片：本地文件转为 MediaRef，发送时分块编码写入请求体
     def encode_images(image_list):
-        encoded = []
-        for img in image_list:
-            if img.startswith("http://") or img.startswith("https://"):
-                encoded.append(img)
-            elif img.startswith("data:image/"):
-                encoded.append(img)
-            elif os.path.exists(img):
-                import base64
-                ext = os.path.splitext(img)[1].lower()
-                mime = "image/jpeg" if ext in [".jpg", ".jpeg"] else "image/png"
-                with open(img, "rb") as f:
-                    b64 = base64.b64encode(f.read()).decode("utf-8")
-                encoded.append(f"data:{mime};base64,{b64}")
-            elif img:
-                encoded.append(img)
-        return encoded
+        return [media_ref(img, default_mime="image/png") for img in image_list if img]
 
     b64_list = encode_images(images)
     padded_images = b64_list[:10]
     while len(padded_images) < 10:
         padded_images.append("")
 
-    url = "https://api.wavespeed.ai/api/v3/bytedance/seedream-v4/edit-sequential"
+    url = wavespeed_url("bytedance/seedream-v4/edit-sequential")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -434,18 +402,19 @@ def seedream_v4_sequential_edit(
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json_body(payload))
     if response.status_code != 200:
         return {'success': False, 'error': f"Error: {response.status_code}, {response.text}"}
 
     result = response.json()["data"]
     request_id = result["id"]
+    record_prediction(request_id)
     logger.info(f"Task submitted. Request ID: {request_id}")
 
     # 轮询结果
-    poll_url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    poll_url = prediction_result_url(request_id)
     while True:
-        poll_response = requests.get(poll_url, headers={"Authorization": f"Bearer {api_key}"})
+        poll_response = upstream_session.get(poll_url, headers={"Authorization": f"Bearer {api_key}"})
         if poll_response.status_code == 200:
             data = poll_response.json()["data"]
             status = data.get("status")
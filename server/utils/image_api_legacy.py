@@ -8,6 +8,8 @@ from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 from .wavespeed_client import WavespeedClient, create_client_from_config
+from .settings import get_settings
+from .media_encoding import encode_data_uri
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger()
@@ -20,7 +22,8 @@ def _get_client(api_key: Optional[str] = None) -> WavespeedClient:
     global _client
     if api_key:
         return WavespeedClient(api_key=api_key)
-    if _client is None:
+    # 配置中的 API key 变化（热加载）时重新创建客户端
+    if _client is None or _client.api_key != get_settings().wavespeed_api_key:
         _client = create_client_from_config()
     return _client
 
@@ -697,7 +700,7 @@ def nano_banana_pro_text_to_image(api_key: str, prompt: str, aspect_ratio: str =
 
 def _encode_single_image_to_base64(image_path: str) -> str:
     """
-    将单个图片文件编码为 base64 data URI（参考 query_llm.py 的实现）
+    将单个图片文件编码为 base64 data URI（使用 utils.media_encoding，分块编码并按路径/修改时间/大小缓存）
     
     Args:
         image_path: 图片文件路径
@@ -711,23 +714,11 @@ def _encode_single_image_to_base64(image_path: str) -> str:
         RuntimeError: 编码失败
     """
     try:
-        ext = os.path.splitext(image_path)[1].lower()
-        mime_types = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-        }
-        mime_type = mime_types.get(ext)
-        if not mime_type:
-            raise ValueError(f"不支持的图片格式: {ext}")
-
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        return f"data:{mime_type};base64,{encoded_string}"
+        return encode_data_uri(image_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"图片文件不存在: {image_path}")
+    except ValueError:
+        raise ValueError(f"不支持的图片格式: {os.path.splitext(image_path)[1].lower()}")
     except Exception as e:
         raise RuntimeError(f"图片编码失败 {image_path}: {e}")
 
@@ -0,0 +1,180 @@
+"""
+参考图片入库处理
+
+用户上传的素材图、风格参考图和工具任务图片在保存时：
+- 校验是否为可解码的图片（格式、像素数、文件大小）
+- 按 EXIF 方向信息摆正
+- 在原图旁生成一份规范化的紧凑版本（最长边不超过 COMPACT_MAX_SIDE，不含元数据）：
+  不透明图片存为 JPEG，带透明通道的图片存为 WebP 以保留透明度
+
+原图保持不变；图生图、图片描述、参考图生视频等生成路径通过 compact_reference()
+自动使用紧凑版本，避免每次把大尺寸原图编码上传。
+"""
+
+import logging
+import os
+import shutil
+from typing import Any, BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 紧凑版本最长边，主流图像编辑模型和多模态 LLM 的输入上限都在 2048 左右
+COMPACT_MAX_SIDE = 2048
+COMPACT_JPEG_QUALITY = 90
+COMPACT_WEBP_QUALITY = 90
+COMPACT_TAG = ".compact"
+# 上传限制
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_IMAGE_PIXELS = 80_000_000
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "MPO", "TIFF"}
+
+
+class ImageIngestError(ValueError):
+    """上传的文件不是有效图片"""
+    pass
+
+
+def compact_candidates(path: str):
+    root, _ = os.path.splitext(path)
+    return [f"{root}{COMPACT_TAG}.jpg", f"{root}{COMPACT_TAG}.webp"]
+
+
+def find_compact_variant(path: str) -> Optional[str]:
+    """返回与原图同样新的紧凑版本路径，不存在或已过期时返回 None"""
+    if not os.path.exists(path):
+        return None
+    source_mtime = os.path.getmtime(path)
+    for candidate in compact_candidates(path):
+        if os.path.exists(candidate) and os.path.getmtime(candidate) >= source_mtime:
+            return candidate
+    return None
+
+
+def _has_alpha(image) -> bool:
+    if image.mode in ("RGBA", "LA"):
+        return image.getextrema()[-1][0] < 255
+    if image.mode == "P":
+        return "transparency" in image.info
+    return False
+
+
+def build_compact_variant(path: str, compact_for: Optional[str] = None) -> Dict[str, Any]:
+    """
+    校验图片并生成紧凑版本（CPU 密集，请在媒体进程池中执行）
+
+    Args:
+        path: 原图路径
+        compact_for: 紧凑版本按该路径命名（原图尚在临时文件中时使用），默认为 path
+
+    Returns:
+        dict: path, compact_path, width, height（摆正后的原图尺寸）, format
+
+    Raises:
+        ImageIngestError: 文件不是有效图片或超出限制
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    candidates = compact_candidates(compact_for or path)
+    if os.path.getsize(path) > MAX_UPLOAD_BYTES:
+        raise ImageIngestError(f"图片文件过大（超过 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB）")
+
+    try:
+        with Image.open(path) as probe:
+            image_format = probe.format
+            if image_format not in ALLOWED_FORMATS:
+                raise ImageIngestError(f"不支持的图片格式: {image_format}")
+            if probe.width * probe.height > MAX_IMAGE_PIXELS:
+                raise ImageIngestError(f"图片分辨率过大: {probe.width}x{probe.height}")
+            probe.verify()
+
+        with Image.open(path) as source:
+            width, height = source.size
+            if source.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                width, height = height, width
+            # JPEG 在解码时直接按 1/2、1/4、1/8 缩小（不小于目标尺寸），大图解码更快
+            source.draft(None, (COMPACT_MAX_SIDE, COMPACT_MAX_SIDE))
+            image = ImageOps.exif_transpose(source)
+            image.thumbnail((COMPACT_MAX_SIDE, COMPACT_MAX_SIDE), Image.LANCZOS)
+
+            if _has_alpha(image):
+                compact_path = candidates[1]
+                image = image.convert("RGBA")
+                save_kwargs = {"format": "WEBP", "quality": COMPACT_WEBP_QUALITY, "method": 4}
+            else:
+                compact_path = candidates[0]
+                image = image.convert("RGB")
+                save_kwargs = {"format": "JPEG", "quality": COMPACT_JPEG_QUALITY, "optimize": True}
+
+            tmp_path = f"{compact_path}.tmp"
+            image.save(tmp_path, **save_kwargs)
+            os.replace(tmp_path, compact_path)
+    except ImageIngestError:
+        raise
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageIngestError(f"无效的图片文件: {e}")
+
+    # 删除另一种格式的旧紧凑版本（例如图片从透明变为不透明）
+    for candidate in candidates:
+        if candidate != compact_path and os.path.exists(candidate):
+            os.remove(candidate)
+
+    return {
+        "path": compact_for or path,
+        "compact_path": compact_path,
+        "width": width,
+        "height": height,
+        "format": image_format,
+    }
+
+
+async def ingest_image(src: BinaryIO, dst_path: str) -> Dict[str, Any]:
+    """
+    保存上传的图片并生成紧凑版本
+
+    Args:
+        src: 上传文件对象（UploadFile.file）
+        dst_path: 原图保存路径
+
+    Raises:
+        ImageIngestError: 文件不是有效图片，此时 dst_path 保持不变
+    """
+    from utils.media_pool import run_media_job
+    from utils.storage import publish_async
+
+    # 先写入临时文件，校验通过后再替换，更新素材时无效上传不会覆盖原有图片
+    tmp_path = f"{dst_path}.upload"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(src, f)
+    try:
+        result = await run_media_job(build_compact_variant, tmp_path, compact_for=dst_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dst_path)
+    await publish_async(dst_path, result["compact_path"])
+    return result
+
+
+async def compact_reference(path: str) -> str:
+    """
+    返回用于生成请求的参考图路径：优先使用紧凑版本，缺失时现场生成，失败则退回原图
+    """
+    from utils.media_pool import run_media_job
+    from utils.storage import fetch_async, publish_async
+
+    # 先取原图再取紧凑版本，保证缓存文件的修改时间先后与后端一致
+    if not await fetch_async(path):
+        return path
+    for candidate in compact_candidates(path):
+        await fetch_async(candidate)
+    variant = find_compact_variant(path)
+    if variant:
+        return variant
+
+    try:
+        result = await run_media_job(build_compact_variant, path)
+        await publish_async(result["compact_path"])
+        return result["compact_path"]
+    except Exception as e:
+        logger.warning(f"生成紧凑参考图失败，使用原图: {path}, {e}")
+        return path
@@ -1,10 +1,9 @@
-import numpy as np
-from PIL import Image
-import cv2
 import os
-import requests
 import shutil
 
+from .metrics import task_stage, upstream_session
+from .tracing import start_span
+
 def download_image(image_url, save_path="temp.jpg"):
     """
     Downloads an image from a specified URL and saves it to a local file path.
@@ -16,16 +15,17 @@ def download_image(image_url, save_path="temp.jpg"):
                          Example: 'images/downloaded_image.jpg'
     """
 
-    # Send an HTTP GET request to the URL, stream=True avoids loading the whole file in memory
-    response = requests.get(image_url, stream=True)
+    with task_stage("download"), start_span("download", {"http.url": image_url.split("?", 1)[0]}):
+        # Send an HTTP GET request to the URL, stream=True avoids loading the whole file in memory
+        response = upstream_session.get(image_url, stream=True)
 
-    # Check if the request was successful (status code 200)
-    response.raise_for_status() # This will raise an HTTPError for bad responses (4xx or 5xx)
+        # Check if the request was successful (status code 200)
+        response.raise_for_status() # This will raise an HTTPError for bad responses (4xx or 5xx)
 
-    # Open the local file in binary write mode ('wb') and save the content
-    with open(save_path, 'wb') as out_file:
-        # Use shutil.copyfileobj for efficient streaming download
-        shutil.copyfileobj(response.raw, out_file)
+        # Open the local file in binary write mode ('wb') and save the content
+        with open(save_path, 'wb') as out_file:
+            # Use shutil.copyfileobj for efficient streaming download
+            shutil.copyfileobj(response.raw, out_file)
 
 
 def download_video(video_url: str, save_path: str) -> dict:
@@ -46,16 +46,17 @@ def download_video(video_url: str, save_path: str) -> dict:
         # 确保目录存在
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         
-        # 发送 HTTP GET 请求，stream=True 避免将整个文件加载到内存
-        response = requests.get(video_url, stream=True, timeout=300)
-        
-        # 检查请求是否成功（状态码 200）
-        response.raise_for_status()
-        
-        # 以二进制写入模式打开本地文件并保存内容
-        with open(save_path, 'wb') as out_file:
-            # 使用 shutil.copyfileobj 进行高效的流式下载
-            shutil.copyfileobj(response.raw, out_file)
+        with task_stage("download"), start_span("download", {"http.url": video_url.split("?", 1)[0]}):
+            # 发送 HTTP GET 请求，stream=True 避免将整个文件加载到内存
+            response = upstream_session.get(video_url, stream=True, timeout=300)
+            
+            # 检查请求是否成功（状态码 200）
+            response.raise_for_status()
+            
+            # 以二进制写入模式打开本地文件并保存内容
+            with open(save_path, 'wb') as out_file:
+                # 使用 shutil.copyfileobj 进行高效的流式下载
+                shutil.copyfileobj(response.raw, out_file)
         
         logger.info(f"视频下载成功: {video_url} -> {save_path}")
         return {
@@ -71,7 +72,15 @@ def download_video(video_url: str, save_path: str) -> dict:
 
 
 
-def character_concatetion(image_list: list[str]):
+def character_concatetion(image_list: list[str], output_path: str = "stitched_image.png") -> str:
+    """
+    横向拼接角色图片（CPU 密集，请通过 utils.media_pool.run_media_job 在媒体进程池中调用）
+
+    Returns:
+        str: 拼接结果的保存路径
+    """
+    from PIL import Image
+
     cropped_pil_images = [Image.open(img_path).convert('RGBA') for img_path in image_list]
 
     max_height = max(img.height for img in cropped_pil_images)
@@ -85,7 +94,8 @@ def character_concatetion(image_list: list[str]):
         canvas.paste(img, (x_offset, y_offset))
         x_offset += img.width
 
-    canvas.save("stitched_image.png")
+    canvas.save(output_path)
+    return output_path
 
 
 def visualize_masks_on_images(images, masks, alpha=0.5, color=(0, 255, 0), save_dir=None, grey=False):
@@ -106,6 +116,9 @@ def visualize_masks_on_images(images, masks, alpha=0.5, color=(0, 255, 0), save_
     Returns:
         List of PIL Images with masks visualized
     """
+    import cv2
+    import numpy as np
+    from PIL import Image
     
     # Process masks based on their structure
     masks_list = []
@@ -0,0 +1,124 @@
+"""
+事件循环阻塞监控
+
+async 接口中的同步文件读写、同步 HTTP 请求会阻塞整个事件循环，期间同一进程的所有请求都无法处理。
+LoopWatchdog 在 API 进程和 worker 进程中持续运行：
+- 心跳协程每隔 interval 秒醒来一次，实际醒来时间比预期晚的部分即事件循环延迟，
+  记录到 comicmaker_event_loop_lag_seconds
+- 监控线程发现心跳超过 threshold 秒没有更新时，抓取事件循环线程当前的调用栈并写入日志，
+  按调用栈中最内层的 api/ 接口函数（没有时为最内层的本项目代码）归类，例如 api/content.py:update_shot；
+  阻塞结束后按归类记录次数和时长（comicmaker_event_loop_blocked_total / comicmaker_event_loop_blocked_seconds）
+
+只在超过阈值时抓取一次调用栈，平时的开销是每 interval 秒一次协程唤醒，可以在生产环境常开。
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import List, Optional
+
+from .metrics import LOOP_BLOCKED, LOOP_BLOCKED_SECONDS, LOOP_LAG
+from .settings import SERVER_DIR, get_settings
+
+logger = logging.getLogger(__name__)
+
+API_DIR = os.path.join(SERVER_DIR, "api")
+
+
+def blocking_location(stack: List[traceback.FrameSummary]) -> str:
+    """调用栈的归类：最内层的 api/ 函数，其次为最内层的本项目代码（不含依赖库），都没有时为 unknown"""
+    own = None
+    for frame in reversed(stack):
+        path = os.path.abspath(frame.filename)
+        if not path.startswith(SERVER_DIR + os.sep) or f"{os.sep}site-packages{os.sep}" in path:
+            continue
+        location = f"{os.path.relpath(path, SERVER_DIR)}:{frame.name}"
+        if path.startswith(API_DIR + os.sep):
+            return location
+        if own is None:
+            own = location
+    return own or "unknown"
+
+
+class LoopWatchdog:
+    """监控一个事件循环的延迟和阻塞"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.5):
+        self.interval = interval
+        self.threshold = threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = 0.0
+        # 本次阻塞的归类，阻塞结束时由心跳协程记录
+        self._blocked_at: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """在事件循环中调用"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG.labels().observe(lag)
+            with self._lock:
+                self._last_tick = now
+                location, self._blocked_at = self._blocked_at, None
+            if location is not None:
+                LOOP_BLOCKED.labels(location).inc()
+                LOOP_BLOCKED_SECONDS.labels(location).observe(lag)
+                logger.warning(f"事件循环阻塞 {lag:.3f} 秒后恢复: {location}")
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                stalled = time.monotonic() - self._last_tick - self.interval
+                if stalled < self.threshold or self._blocked_at is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.extract_stack(frame) if frame is not None else []
+                self._blocked_at = blocking_location(stack)
+            logger.warning(
+                f"事件循环已阻塞 {stalled:.3f} 秒: {self._blocked_at}\n" + "".join(traceback.format_list(stack))
+            )
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog() -> Optional[LoopWatchdog]:
+    """在当前事件循环上启动监控（API 进程和 worker 进程启动时调用，loop_watchdog.enabled 为 false 时不启动）"""
+    global _watchdog
+    settings = get_settings().loop_watchdog
+    if _watchdog is None and settings.enabled:
+        _watchdog = LoopWatchdog(settings.interval, settings.threshold)
+        _watchdog.start()
+    return _watchdog
+
+
+def stop_loop_watchdog():
+    global _watchdog
+    if _watchdog is not None:
+        _watchdog.stop()
+        _watchdog = None
@@ -0,0 +1,324 @@
+"""
+响度分析工具
+
+通过 ffmpeg 管道把音频直接解码为 float32 PCM 读入 NumPy（不落临时文件），
+按固定大小分块向量化计算 RMS、峰值和 EBU R128 (ITU-R BS.1770) 积分响度，内存占用与音频时长无关。
+
+分析结果按文件内容哈希缓存（进程内 LRU + 可选磁盘 JSON），
+除单文件响度外还保留 400ms 门限块的功率序列，以便对整集多个片段合并计算积分响度。
+"""
+
+import json
+import math
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .ffmpeg_utils import FFMPEG_BIN, FFmpegError, ffprobe_json
+from .file_hash import cached_file_sha256
+
+# 分析统一重采样到 48kHz，K 加权滤波器系数即按此采样率给出
+ANALYSIS_SAMPLE_RATE = 48000
+# 每次从管道读取的时长（秒），决定单块内存上限
+CHUNK_SECONDS = 10
+# 门限块 400ms，步长 100ms（75% 重叠）
+BLOCK_STEPS = 4
+STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+# 缓存格式版本，分析算法变化时递增以失效旧缓存
+ANALYSIS_VERSION = 1
+
+# BS.1770-4 K 加权滤波器（48kHz）：高频搁架 + RLB 高通
+_SHELF_B = np.array([1.53512485958697, -2.69169618940638, 1.19839281085285])
+_SHELF_A = np.array([1.0, -1.69065929318241, 0.73248077421585])
+_HIGHPASS_B = np.array([1.0, -2.0, 1.0])
+_HIGHPASS_A = np.array([1.0, -1.99004745483398, 0.99007225036621])
+
+_MEMORY_CACHE_SIZE = 512
+_memory_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def probe_audio_channels(path: str) -> int:
+    """返回第一条音轨的声道数，没有音轨时返回 0"""
+    for stream in ffprobe_json(path).get("streams", []):
+        if stream.get("codec_type") == "audio":
+            return int(stream.get("channels") or 1)
+    return 0
+
+
+def iter_pcm_chunks(path: str,
+                    channels: int,
+                    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+                    chunk_seconds: float = CHUNK_SECONDS) -> Iterator[np.ndarray]:
+    """
+    通过 ffmpeg 管道逐块读取 float32 PCM
+
+    Yields:
+        形状为 (frames, channels) 的 float32 数组
+    """
+    frame_bytes = 4 * channels
+    chunk_bytes = int(sample_rate * chunk_seconds) * frame_bytes
+    cmd = [
+        FFMPEG_BIN, "-v", "error", "-nostdin",
+        "-i", path,
+        "-map", "0:a:0", "-vn",
+        "-ac", str(channels),
+        "-ar", str(sample_rate),
+        "-f", "f32le", "-acodec", "pcm_f32le",
+        "pipe:1"
+    ]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise FFmpegError(f"未找到可执行文件: {FFMPEG_BIN}，请先安装 ffmpeg")
+
+    try:
+        remainder = b""
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % frame_bytes
+            remainder = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, channels)
+        stderr = proc.stderr.read().decode("utf-8", errors="replace")
+        if proc.wait() != 0:
+            raise FFmpegError(f"音频解码失败: {path} {stderr.strip()[-500:]}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+class LoudnessAccumulator:
+    """
+    分块累积响度统计
+
+    每次 feed 一块 PCM：累加单声道混音的平方和（RMS）与峰值，
+    经 K 加权滤波（滤波器状态跨块保持）后按 100ms 步长累加各声道能量，
+    最终由步长能量拼出 400ms 门限块。
+    """
+
+    def __init__(self, channels: int, sample_rate: int = ANALYSIS_SAMPLE_RATE):
+        from scipy.signal import lfilter
+
+        self._lfilter = lfilter
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.step_frames = int(round(sample_rate * STEP_SECONDS))
+        self.frames = 0
+        self.sum_squares = 0.0
+        self.peak = 0.0
+        self._shelf_zi = np.zeros((len(_SHELF_A) - 1, channels))
+        self._highpass_zi = np.zeros((len(_HIGHPASS_A) - 1, channels))
+        self._pending = np.zeros((0, channels))
+        self._step_energies: List[np.ndarray] = []
+
+    def feed(self, chunk: np.ndarray):
+        if chunk.size == 0:
+            return
+        samples = chunk.astype(np.float64, copy=False)
+        self.frames += samples.shape[0]
+
+        mono = samples.mean(axis=1)
+        self.sum_squares += float(np.dot(mono, mono))
+        self.peak = max(self.peak, float(np.abs(samples).max()))
+
+        weighted, self._shelf_zi = self._lfilter(_SHELF_B, _SHELF_A, samples, axis=0, zi=self._shelf_zi)
+        weighted, self._highpass_zi = self._lfilter(_HIGHPASS_B, _HIGHPASS_A, weighted, axis=0, zi=self._highpass_zi)
+
+        squared = np.concatenate([self._pending, weighted * weighted])
+        steps = squared.shape[0] // self.step_frames
+        if steps:
+            usable = steps * self.step_frames
+            self._step_energies.append(
+                squared[:usable].reshape(steps, self.step_frames, self.channels).sum(axis=1)
+            )
+        self._pending = squared[steps * self.step_frames:]
+
+    def block_powers(self) -> np.ndarray:
+        """400ms 门限块的加权均方功率（各声道权重均为 1，最多双声道）"""
+        if self._step_energies:
+            steps = np.concatenate(self._step_energies)
+        else:
+            steps = np.zeros((0, self.channels))
+        if steps.shape[0] < BLOCK_STEPS:
+            # 不足一个门限块时用全部样本估算
+            total = steps.sum(axis=0) + self._pending.sum(axis=0)
+            if self.frames == 0:
+                return np.zeros(0)
+            return np.array([float(total.sum()) / self.frames])
+
+        cumulative = np.vstack([np.zeros((1, self.channels)), np.cumsum(steps, axis=0)])
+        block_energy = cumulative[BLOCK_STEPS:] - cumulative[:-BLOCK_STEPS]
+        return block_energy.sum(axis=1) / (BLOCK_STEPS * self.step_frames)
+
+    def result(self) -> Dict[str, Any]:
+        rms = math.sqrt(self.sum_squares / self.frames) if self.frames else 0.0
+        powers = self.block_powers()
+        return {
+            "duration": self.frames / self.sample_rate,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "rms": rms,
+            "rms_db": amplitude_to_db(rms),
+            "peak": self.peak,
+            "integrated_lufs": integrated_loudness(powers),
+            "block_powers": [float(p) for p in powers]
+        }
+
+
+def amplitude_to_db(value: float) -> Optional[float]:
+    """线性幅度转 dBFS，静音返回 None"""
+    if value <= 0:
+        return None
+    return 20 * math.log10(value)
+
+
+def _power_to_lufs(power):
+    return -0.691 + 10 * np.log10(power)
+
+
+def integrated_loudness(block_powers: Sequence[float]) -> Optional[float]:
+    """
+    按 BS.1770 双重门限计算积分响度（LUFS）
+
+    先丢弃低于 -70 LUFS 的块，再丢弃低于（剩余块平均响度 - 10 LU）的块。
+    全部被门限时（静音）返回 None。
+    """
+    powers = np.asarray(block_powers, dtype=np.float64)
+    powers = powers[powers > 0]
+    if powers.size == 0:
+        return None
+    gated = powers[_power_to_lufs(powers) > ABSOLUTE_GATE_LUFS]
+    if gated.size == 0:
+        return None
+    relative_gate = _power_to_lufs(gated.mean()) + RELATIVE_GATE_LU
+    gated = gated[_power_to_lufs(gated) > relative_gate]
+    if gated.size == 0:
+        return None
+    return float(_power_to_lufs(gated.mean()))
+
+
+def _silent_result() -> Dict[str, Any]:
+    return {
+        "duration": 0.0,
+        "sample_rate": ANALYSIS_SAMPLE_RATE,
+        "channels": 0,
+        "rms": 0.0,
+        "rms_db": None,
+        "peak": 0.0,
+        "integrated_lufs": None,
+        "block_powers": []
+    }
+
+
+def measure_loudness(path: str, chunk_seconds: float = CHUNK_SECONDS) -> Dict[str, Any]:
+    """不经缓存直接分析文件响度；没有音轨的文件按静音处理"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"媒体文件不存在: {path}")
+    channels = probe_audio_channels(path)
+    if channels == 0:
+        return _silent_result()
+    # BS.1770 中左右声道权重相同，多声道统一下混为立体声
+    channels = min(channels, 2)
+
+    accumulator = LoudnessAccumulator(channels)
+    for chunk in iter_pcm_chunks(path, channels, chunk_seconds=chunk_seconds):
+        accumulator.feed(chunk)
+    return accumulator.result()
+
+
+def _cache_file(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def analyze_loudness(path: str, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    分析文件响度（带缓存）
+
+    Args:
+        path: 音频或视频文件路径
+        cache_dir: 磁盘缓存目录，为 None 时仅使用进程内缓存
+
+    Returns:
+        包含 duration, rms, rms_db, peak, integrated_lufs, block_powers, sha256 的字典
+    """
+    digest = cached_file_sha256(path)
+    with _cache_lock:
+        cached = _memory_cache.get(digest)
+        if cached is not None:
+            _memory_cache.move_to_end(digest)
+            return cached
+
+    result = None
+    if cache_dir:
+        cache_path = _cache_file(cache_dir, digest)
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                if stored.get("version") == ANALYSIS_VERSION:
+                    result = stored["result"]
+            except (OSError, ValueError, KeyError):
+                result = None
+
+    if result is None:
+        result = measure_loudness(path)
+        result["sha256"] = digest
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = _cache_file(cache_dir, digest) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": ANALYSIS_VERSION, "result": result}, f)
+            os.replace(tmp_path, _cache_file(cache_dir, digest))
+
+    with _cache_lock:
+        _memory_cache[digest] = result
+        while len(_memory_cache) > _MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return result
+
+
+def combined_integrated_loudness(results: Sequence[Dict[str, Any]]) -> Optional[float]:
+    """把多个片段的门限块合并后计算整体积分响度（等价于对拼接后的音频做一次测量）"""
+    powers: List[float] = []
+    for result in results:
+        powers.extend(result.get("block_powers") or [])
+    return integrated_loudness(powers)
+
+
+def balance_gains(new_stats: Dict[str, Any],
+                  original_stats: Dict[str, Any],
+                  tolerance_db: float = 20 * math.log10(1.2)) -> Dict[str, float]:
+    """
+    计算新音轨与原音轨的平衡增益（线性倍数）
+
+    与 align_and_merge_audio 原有规则一致：响度差超过容差（默认 20%）时把较响的一轨压低到较轻的一轨，
+    优先比较积分响度，任一轨无法测出时退回到 RMS。
+    """
+    gains = {"new": 1.0, "original": 1.0}
+    new_level = new_stats.get("integrated_lufs")
+    original_level = original_stats.get("integrated_lufs")
+    if new_level is None or original_level is None:
+        new_level = new_stats.get("rms_db")
+        original_level = original_stats.get("rms_db")
+    if new_level is None or original_level is None:
+        return gains
+
+    difference = new_level - original_level
+    if difference > tolerance_db:
+        gains["new"] = 10 ** (-difference / 20)
+    elif difference < -tolerance_db:
+        gains["original"] = 10 ** (difference / 20)
+    return gains
@@ -0,0 +1,280 @@
+"""
+参考媒体 base64 编码服务
+
+- 分块 base64：按 3 的整数倍分块读取文件并编码，不再一次性读入整个文件再整体编码
+- 流式请求体：payload 中的 MediaRef 在发送时才分块编码，直接写入 JSON 请求体，
+  请求体以带 Content-Length 的文件对象交给 requests，大视频不会在内存中形成完整的 base64 字符串
+- 编码结果按 (路径, 修改时间, 大小) 缓存在进程内 LRU 中，
+  多个分镜反复引用的素材图片只编码一次
+"""
+
+import base64
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .settings import add_reload_listener
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".mp4": "video/mp4",
+    ".mov": "video/mp4",
+    ".avi": "video/mp4",
+    ".mkv": "video/mp4",
+}
+
+# 每次读取的原始字节数（3 的整数倍，保证分块编码结果可直接拼接）
+CHUNK_SIZE = 3 * 256 * 1024
+# 编码缓存的总字符数上限（默认值，可由配置 performance.encoding_cache_mb 覆盖），以及可进入缓存的单个文件大小上限
+CACHE_MAX_CHARS = 128 * 1024 * 1024
+CACHE_ITEM_MAX_BYTES = 16 * 1024 * 1024
+
+_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_cache_chars = 0
+_cache_max_chars = CACHE_MAX_CHARS
+_cache_lock = threading.Lock()
+
+
+def _apply_settings(settings):
+    global _cache_max_chars
+    cache_mb = settings.performance.encoding_cache_mb
+    _cache_max_chars = CACHE_MAX_CHARS if cache_mb is None else cache_mb * 1024 * 1024
+
+
+add_reload_listener(_apply_settings)
+
+
+def guess_mime_type(path: str, default: Optional[str] = None) -> str:
+    """根据扩展名推断 MIME 类型，无法识别且未提供默认值时抛出 ValueError"""
+    ext = os.path.splitext(path)[1].lower()
+    mime_type = MIME_TYPES.get(ext, default)
+    if not mime_type:
+        raise ValueError(f"not support: {ext}")
+    return mime_type
+
+
+def base64_length(size: int) -> int:
+    """size 字节数据 base64 编码后的长度（含填充）"""
+    return 4 * ((size + 2) // 3)
+
+
+def iter_base64_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """分块读取文件并逐块产出 base64 编码（ASCII 字节）"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+
+
+def _file_key(path: str) -> Tuple[str, int, int]:
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    return abs_path, stat.st_mtime_ns, stat.st_size
+
+
+def encode_data_uri(path: str, mime_type: Optional[str] = None, default_mime: Optional[str] = None) -> str:
+    """
+    将文件编码为 data URI（带缓存）
+
+    Args:
+        path: 本地文件路径
+        mime_type: 指定 MIME 类型，为 None 时按扩展名推断
+        default_mime: 扩展名无法识别时使用的 MIME 类型，为 None 时抛出 ValueError
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 不支持的文件类型
+    """
+    global _cache_chars
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"file not found: {path}")
+    mime_type = mime_type or guess_mime_type(path, default_mime)
+    key = _file_key(path)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached.startswith(f"data:{mime_type};"):
+            _cache.move_to_end(key)
+            return cached
+
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    buffer = bytearray(len(prefix) + base64_length(key[2]))
+    buffer[:len(prefix)] = prefix
+    offset = len(prefix)
+    for encoded in iter_base64_chunks(path):
+        buffer[offset:offset + len(encoded)] = encoded
+        offset += len(encoded)
+    data_uri = buffer[:offset].decode("ascii")
+
+    if key[2] <= CACHE_ITEM_MAX_BYTES:
+        with _cache_lock:
+            previous = _cache.pop(key, None)
+            if previous is not None:
+                _cache_chars -= len(previous)
+            _cache[key] = data_uri
+            _cache_chars += len(data_uri)
+            while _cache_chars > _cache_max_chars and _cache:
+                _, evicted = _cache.popitem(last=False)
+                _cache_chars -= len(evicted)
+    return data_uri
+
+
+def clear_cache():
+    """清空编码缓存"""
+    global _cache_chars
+    with _cache_lock:
+        _cache.clear()
+        _cache_chars = 0
+
+
+class MediaRef:
+    """
+    payload 中的本地媒体引用，序列化为 data URI 字符串
+
+    通过 json_body() 发送时按需分块编码；小文件复用编码缓存。
+    """
+
+    def __init__(self, path: str, mime_type: Optional[str] = None, default_mime: Optional[str] = None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"file not found: {path}")
+        self.path = path
+        self.mime_type = mime_type or guess_mime_type(path, default_mime)
+        self.size = os.path.getsize(path)
+
+    @property
+    def prefix(self) -> bytes:
+        return f"data:{self.mime_type};base64,".encode("ascii")
+
+    def encoded_length(self) -> int:
+        return len(self.prefix) + base64_length(self.size)
+
+    def iter_encoded(self) -> Iterator[bytes]:
+        if self.size <= CACHE_ITEM_MAX_BYTES:
+            yield encode_data_uri(self.path, self.mime_type).encode("ascii")
+            return
+        yield self.prefix
+        yield from iter_base64_chunks(self.path)
+
+    def to_data_uri(self) -> str:
+        return encode_data_uri(self.path, self.mime_type)
+
+    def __repr__(self):
+        return f"MediaRef({self.path!r}, {self.size} bytes)"
+
+
+def media_ref(value: str, default_mime: Optional[str] = None) -> Union[str, MediaRef]:
+    """本地文件路径转换为 MediaRef，URL / data URI / 其他字符串原样返回"""
+    if value and not value.startswith(("http://", "https://", "data:")) and os.path.exists(value):
+        return MediaRef(value, default_mime=default_mime)
+    return value
+
+
+def resolve_media_refs(value: Any) -> Any:
+    """把 payload 中的 MediaRef 展开为 data URI 字符串（用于不支持流式请求体的场景）"""
+    if isinstance(value, MediaRef):
+        return value.to_data_uri()
+    if isinstance(value, dict):
+        return {k: resolve_media_refs(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [resolve_media_refs(v) for v in value]
+    return value
+
+
+def summarize_media_refs(value: Any) -> Any:
+    """把 payload 中的 MediaRef 替换为简短描述（用于日志和任务记录）"""
+    if isinstance(value, MediaRef):
+        return f"data:{value.mime_type};base64,...({value.size} bytes from {os.path.basename(value.path)})"
+    if isinstance(value, dict):
+        return {k: summarize_media_refs(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [summarize_media_refs(v) for v in value]
+    return value
+
+
+class StreamingJSONBody:
+    """
+    流式 JSON 请求体
+
+    payload 先以占位符序列化，发送时依次输出 JSON 片段和各 MediaRef 的分块 base64，
+    总长度预先算出，requests 会据此设置 Content-Length 并边读边发。
+    （不实现 tell()，否则 requests 会把长度算成 0 而改用 chunked 编码）
+    """
+
+    def __init__(self, payload: Any):
+        refs: Dict[str, MediaRef] = {}
+
+        def default(obj):
+            if isinstance(obj, MediaRef):
+                token = f"\x00media:{uuid.uuid4().hex}\x00"
+                refs[token] = obj
+                return token
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+        text = json.dumps(payload, default=default)
+        self._parts: List[Union[bytes, MediaRef]] = []
+        # json.dumps 会把 \x00 转义为 \u0000，按转义后的形式切分
+        escaped = {json.dumps(token)[1:-1]: ref for token, ref in refs.items()}
+        position = 0
+        while escaped:
+            hits = [(text.find(token, position), token) for token in escaped]
+            hits = [hit for hit in hits if hit[0] >= 0]
+            if not hits:
+                break
+            index, token = min(hits)
+            self._parts.append(text[position:index].encode("utf-8"))
+            self._parts.append(escaped.pop(token))
+            position = index + len(token)
+        self._parts.append(text[position:].encode("utf-8"))
+
+        self.length = sum(
+            part.encoded_length() if isinstance(part, MediaRef) else len(part)
+            for part in self._parts
+        )
+        self._chunks = self._iter_chunks()
+        self._pending = b""
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        for part in self._parts:
+            if isinstance(part, MediaRef):
+                yield from part.iter_encoded()
+            elif part:
+                yield part
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._pending:
+            yield self._pending
+            self._pending = b""
+        yield from self._chunks
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._pending + b"".join(self._chunks)
+            self._pending = b""
+            return data
+        while len(self._pending) < size:
+            try:
+                self._pending += next(self._chunks)
+            except StopIteration:
+                break
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def json_body(payload: Any) -> Union[bytes, StreamingJSONBody]:
+    """生成 requests 的 data 参数：不含 MediaRef 时直接返回 JSON 字节，否则返回流式请求体"""
+    body = StreamingJSONBody(payload)
+    if not any(isinstance(part, MediaRef) for part in body._parts):
+        return b"".join(body._parts)
+    return body
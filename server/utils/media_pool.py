@@ -0,0 +1,369 @@
+"""
+媒体计算进程池
+
+librosa 变速、moviepy 编码、视频抽帧、Pillow 拼图等 CPU 密集任务如果在请求处理协程
+或 asyncio.to_thread 中执行，会与事件循环争抢 GIL，拖慢整个服务。
+这里提供一个托管的独立进程池：
+- 工作进程启动时预先导入 cv2 / librosa / decord 等重型模块（warm import）
+- 每个工作进程执行一定数量的任务后自动替换（max_tasks_per_child），避免原生库内存泄漏累积
+- 任务超时：工作进程开始执行时计时，先用定时信号在进程内中断；卡在原生代码中无法中断时，
+  父进程侧的监视线程在超时 + TIMEOUT_GRACE 后只结束执行该任务的工作进程。
+  ProcessPoolExecutor 中任一工作进程退出都会使整个进程池失效，其他工作进程上被连带中断的任务
+  （以及排队中的任务）会自动重新提交到新的进程池，而不是一起失败
+- 提供 awaitable 的 submit()，以及供线程中同步调用的 run() / run_many()
+
+提交的函数和参数必须可被 pickle（模块级函数）。
+"""
+
+import asyncio
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+# 工作进程启动时预先导入的模块（不可用的模块会被忽略）
+DEFAULT_WARM_MODULES = ("numpy", "cv2", "PIL.Image", "librosa", "decord")
+# 默认每个 API 进程的媒体工作进程数；uvicorn 本身是多进程，这里不宜按 CPU 核心数铺满
+DEFAULT_MAX_WORKERS = int(os.environ.get("MEDIA_POOL_WORKERS", max(1, min(4, (os.cpu_count() or 2) // 2))))
+DEFAULT_MAX_TASKS_PER_CHILD = int(os.environ.get("MEDIA_POOL_MAX_TASKS_PER_CHILD", 50))
+# 默认任务超时（秒）
+DEFAULT_TIMEOUT = float(os.environ.get("MEDIA_POOL_TIMEOUT", 900))
+# 父进程侧在工作进程内超时之外额外等待的时间（秒）
+TIMEOUT_GRACE = 10.0
+# 父进程侧检查超时任务的间隔（秒）
+WATCH_INTERVAL = 0.5
+# 进程池失效时被连带中断的任务重新提交的次数
+BROKEN_POOL_RETRIES = 1
+
+
+class MediaJobTimeout(Exception):
+    """媒体任务执行超时"""
+    pass
+
+
+# 工作进程中：通知父进程任务开始执行的队列
+_started_queue = None
+
+
+def _warm_imports(modules: Sequence[str], started_queue=None):
+    """工作进程初始化：预先导入重型模块"""
+    global _started_queue
+    # 工作进程不处理 Ctrl+C，由父进程统一关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _started_queue = started_queue
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _raise_timeout(signum, frame):
+    raise MediaJobTimeout("媒体任务执行超时")
+
+
+def _call_with_deadline(job_id: int, fn: Callable, args: Tuple, kwargs: Dict[str, Any], timeout: Optional[float]):
+    """在工作进程中执行任务，超时后通过 SIGALRM 中断"""
+    if _started_queue is not None:
+        _started_queue.put((job_id, os.getpid()))
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class _Job:
+    """父进程侧记录的一次提交"""
+
+    def __init__(self, job_id: int, fn: Callable, args: Tuple, kwargs: Dict[str, Any], timeout: Optional[float]):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.future: Optional[Future] = None
+        # 工作进程开始执行的时间（父进程 monotonic）和进程号
+        self.started_at: Optional[float] = None
+        self.pid: Optional[int] = None
+        self.timed_out = False
+        self.retries = 0
+
+    @property
+    def name(self) -> str:
+        return getattr(self.fn, "__name__", str(self.fn))
+
+
+class MediaWorkerPool:
+    """
+    媒体计算进程池
+
+    Args:
+        max_workers: 工作进程数
+        max_tasks_per_child: 每个工作进程最多执行的任务数（Python 3.11+ 生效）
+        warm_modules: 工作进程启动时预先导入的模块
+        default_timeout: 默认任务超时（秒），None 表示不限制
+    """
+
+    def __init__(self,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_tasks_per_child: Optional[int] = DEFAULT_MAX_TASKS_PER_CHILD,
+                 warm_modules: Sequence[str] = DEFAULT_WARM_MODULES,
+                 default_timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.warm_modules = tuple(warm_modules)
+        self.default_timeout = default_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 未完成的提交：序号 -> _Job
+        self._jobs: Dict[int, _Job] = {}
+        self._job_ids = itertools.count(1)
+        self._started_queue = None
+        self._watcher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                kwargs = {"max_workers": self.max_workers, "initializer": _warm_imports}
+                if self.max_tasks_per_child and sys.version_info >= (3, 11):
+                    # max_tasks_per_child 不支持 fork
+                    kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+                    context = multiprocessing.get_context("spawn")
+                else:
+                    context = multiprocessing.get_context()
+                if self._started_queue is None:
+                    self._started_queue = context.Queue()
+                kwargs["mp_context"] = context
+                kwargs["initargs"] = (self.warm_modules, self._started_queue)
+                self._executor = ProcessPoolExecutor(**kwargs)
+                logger.info(f"媒体进程池已启动: {self.max_workers} 个工作进程")
+                self._closed.clear()
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch, name="media-pool-watch", daemon=True)
+                    self._watcher.start()
+            return self._executor
+
+    def _watch(self):
+        """记录任务开始执行的时间，结束执行超时且未能在进程内中断的工作进程"""
+        while True:
+            with self._lock:
+                # 关闭后等到剩余任务完成再退出
+                if self._closed.is_set() and not self._jobs:
+                    self._watcher = None
+                    return
+            try:
+                job_id, pid = self._started_queue.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                pass
+            except (EOFError, OSError, ValueError):
+                with self._lock:
+                    self._watcher = None
+                return
+            else:
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                    if job is not None:
+                        job.started_at = time.monotonic()
+                        job.pid = pid
+            self._kill_overdue()
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        with self._lock:
+            overdue = [
+                job for job in self._jobs.values()
+                if job.timeout and job.started_at is not None and not job.timed_out
+                and now - job.started_at > job.timeout + TIMEOUT_GRACE
+            ]
+            for job in overdue:
+                job.timed_out = True
+        for job in overdue:
+            if job.future.done():
+                continue
+            logger.warning(f"媒体任务 {job.name} 超时未能在工作进程内中断，结束工作进程 {job.pid}")
+            try:
+                os.kill(job.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """终止并丢弃进程池（任务卡死或进程池损坏时使用），下次提交时重新创建"""
+        with self._lock:
+            current = self._executor is executor
+            if current:
+                self._executor = None
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if current:
+            logger.warning("媒体进程池已回收")
+
+    def _submit(self, job: _Job) -> _Job:
+        executor = self._get_executor()
+        call = (_call_with_deadline, job.job_id, job.fn, job.args, job.kwargs, job.timeout)
+        try:
+            future = executor.submit(*call)
+        except BrokenProcessPool:
+            self._recycle(executor)
+            executor = self._get_executor()
+            future = executor.submit(*call)
+        with self._lock:
+            job.executor, job.future = executor, future
+            job.started_at = job.pid = None
+            self._jobs[job.job_id] = job
+        future.add_done_callback(lambda done: self._forget(job, done))
+        return job
+
+    def _forget(self, job: _Job, future: Future):
+        with self._lock:
+            if job.future is future:
+                self._jobs.pop(job.job_id, None)
+
+    def _new_job(self, fn: Callable, args: Tuple, kwargs: Dict[str, Any], timeout: Optional[float]) -> _Job:
+        return self._submit(_Job(next(self._job_ids), fn, args, kwargs, timeout))
+
+    def _retry_broken(self, job: _Job) -> _Job:
+        """
+        进程池失效后处理一次提交：超时被结束的任务抛出超时，被连带中断的任务重新提交
+
+        Raises:
+            MediaJobTimeout: 该任务超时，工作进程已被结束
+            BrokenProcessPool: 重新提交的次数已用完（例如任务本身导致工作进程崩溃）
+        """
+        self._recycle(job.executor)
+        if job.timed_out:
+            raise MediaJobTimeout(f"媒体任务执行超时: {job.name}")
+        if job.retries >= BROKEN_POOL_RETRIES:
+            raise BrokenProcessPool(f"媒体进程池失效: {job.name}")
+        job.retries += 1
+        logger.info(f"媒体进程池失效，重新提交任务 {job.name}")
+        return self._submit(job)
+
+    def _resolve_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        return self.default_timeout if timeout is None else timeout
+
+    async def submit(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        在进程池中执行 fn(*args, **kwargs) 并等待结果
+
+        Raises:
+            MediaJobTimeout: 任务超时
+        """
+        job = self._new_job(fn, args, kwargs, self._resolve_timeout(timeout))
+        try:
+            while True:
+                try:
+                    return await asyncio.wrap_future(job.future)
+                except BrokenProcessPool:
+                    job = self._retry_broken(job)
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """同步执行（供已在线程中运行的代码使用）"""
+        return self.run_many([(fn, args, kwargs)], timeout=timeout)[0]
+
+    def run_many(self, calls: Iterable[Tuple[Callable, Tuple, Dict[str, Any]]],
+                 timeout: Optional[float] = None) -> List[Any]:
+        """同步并行执行一组 (函数, 参数, 关键字参数)，按顺序返回结果，任一失败即抛出"""
+        timeout = self._resolve_timeout(timeout)
+        jobs = [self._new_job(fn, tuple(args), dict(kwargs), timeout) for fn, args, kwargs in calls]
+        results = []
+        try:
+            for job in jobs:
+                while True:
+                    try:
+                        results.append(job.future.result())
+                        break
+                    except BrokenProcessPool:
+                        job = self._retry_broken(job)
+        finally:
+            for job in jobs:
+                job.future.cancel()
+        return results
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._closed.set()
+
+
+_pool: Optional[MediaWorkerPool] = None
+_pool_options: Optional[Tuple] = None
+_pool_lock = threading.Lock()
+
+
+def _options_from_settings(settings: Settings) -> Tuple:
+    """配置 performance 段中的进程池参数，未设置的项使用默认值"""
+    performance = settings.performance
+    return (
+        performance.media_pool_workers or DEFAULT_MAX_WORKERS,
+        DEFAULT_MAX_TASKS_PER_CHILD if performance.media_pool_max_tasks_per_child is None
+        else performance.media_pool_max_tasks_per_child,
+        DEFAULT_TIMEOUT if performance.media_job_timeout is None else performance.media_job_timeout or None,
+    )
+
+
+def get_media_pool() -> MediaWorkerPool:
+    """
+    获取进程级共享的媒体进程池（首次使用时创建）
+
+    配置中的进程池参数变化时创建新的进程池，旧进程池在已提交的任务完成后退出。
+    """
+    global _pool, _pool_options
+    options = _options_from_settings(get_settings())
+    retired = None
+    with _pool_lock:
+        if _pool is None or _pool_options != options:
+            max_workers, max_tasks_per_child, default_timeout = options
+            retired, _pool = _pool, MediaWorkerPool(
+                max_workers=max_workers,
+                max_tasks_per_child=max_tasks_per_child,
+                default_timeout=default_timeout,
+            )
+            _pool_options = options
+        pool = _pool
+    if retired is not None:
+        logger.info(f"媒体进程池配置已变化: {options}")
+        retired.shutdown(wait=False, cancel_futures=False)
+    return pool
+
+
+def shutdown_media_pool(wait: bool = True):
+    """关闭共享媒体进程池（应用退出时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+async def run_media_job(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """在共享媒体进程池中执行任务的便捷函数"""
+    return await get_media_pool().submit(fn, *args, timeout=timeout, **kwargs)
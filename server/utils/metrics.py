@@ -0,0 +1,712 @@
+"""
+运行指标（Prometheus 文本格式）
+
+指标在进程内聚合，由 GET /metrics 输出：
+- HTTP 请求延迟（按路由模板）、执行中的请求数
+- 生成任务耗时（按 tool_type、模型和结果），以及各阶段耗时：
+  upload（参考图上传 OSS）、submit（提交生成请求）、queue（上游排队）、run（上游生成 / LLM 调用）、download（下载结果）
+- 上游请求延迟、错误和 429 限流次数
+- 执行中的任务数、线程池容量 / 执行中 / 排队的任务数
+- 事件循环延迟和阻塞（utils.loop_watchdog）
+
+uvicorn 以多个 worker 进程运行，任务也可能由 python -m worker 执行，因此每个进程定期（metrics.flush_seconds）
+把自己的指标写入同一台机器上的指标目录（metrics.dir），/metrics 合并目录中所有进程的指标：
+计数器和直方图累加（已退出进程的值保留，启动时合并到 archive.json），仪表只累加仍在运行的进程。
+
+任务阶段通过 ContextVar 记录（与 utils.predictions 相同），asyncio.to_thread 中的同步代码同样可以记录。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .common import DATA_ROOT
+from .settings import get_settings
+from .tracing import start_span
+
+try:
+    import fcntl
+except ImportError:  # Windows：不加锁，合并已退出进程的文件时可能短暂重复计数
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TASK_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0)
+LOOP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+ARCHIVE_NAME = "archive.json"
+LOCK_NAME = ".lock"
+
+
+# ==================== 指标类型 ====================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> "_Child":
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要 {len(self.labelnames)} 个标签值，实际为 {len(values)}")
+        return _Child(self, tuple(str(value) for value in values))
+
+    def samples(self) -> Dict[str, Any]:
+        with self._lock:
+            return {json.dumps(key, ensure_ascii=False): self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+
+class _Child:
+    """绑定了标签值的指标"""
+
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: _Metric, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1.0):
+        self._metric._add(self._key, amount)
+
+    def dec(self, amount: float = 1.0):
+        self._metric._add(self._key, -amount)
+
+    def set(self, value: float):
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float):
+        self._metric._observe(self._key, value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _add(self, key, amount):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _add(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _observe(self, key, value):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _copy(self, value):
+        return {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+
+
+_registry: Dict[str, _Metric] = {}
+
+
+def _register(metric: _Metric) -> Any:
+    _registry[metric.name] = metric
+    return metric
+
+
+HTTP_REQUEST_SECONDS = _register(Histogram(
+    "comicmaker_http_request_duration_seconds", "HTTP 请求处理时间", ("method", "route", "status")))
+HTTP_REQUESTS_IN_FLIGHT = _register(Gauge(
+    "comicmaker_http_requests_in_flight", "正在处理的 HTTP 请求数"))
+TASK_SECONDS = _register(Histogram(
+    "comicmaker_task_duration_seconds", "生成任务从开始执行到结束的时间", ("tool_type", "model", "status"), TASK_BUCKETS))
+TASK_STAGE_SECONDS = _register(Histogram(
+    "comicmaker_task_stage_duration_seconds", "生成任务各阶段耗时（upload / submit / queue / run / download）",
+    ("tool_type", "model", "stage"), TASK_BUCKETS))
+TASKS_IN_FLIGHT = _register(Gauge(
+    "comicmaker_tasks_in_flight", "正在执行的生成任务数", ("tool_type",)))
+UPSTREAM_REQUEST_SECONDS = _register(Histogram(
+    "comicmaker_upstream_request_duration_seconds", "上游 HTTP 请求时间（到收到响应头）", ("upstream", "method"),
+    UPSTREAM_BUCKETS))
+UPSTREAM_ERRORS = _register(Counter(
+    "comicmaker_upstream_errors_total", "上游请求失败次数（HTTP 状态码，或 timeout / connection）", ("upstream", "code")))
+UPSTREAM_THROTTLED = _register(Counter(
+    "comicmaker_upstream_throttled_total", "上游返回 429 的次数", ("upstream",)))
+THREAD_POOL_WORKERS = _register(Gauge(
+    "comicmaker_thread_pool_workers", "线程池最大线程数", ("pool",)))
+THREAD_POOL_ACTIVE = _register(Gauge(
+    "comicmaker_thread_pool_active", "线程池中正在执行的任务数", ("pool",)))
+THREAD_POOL_QUEUED = _register(Gauge(
+    "comicmaker_thread_pool_queued", "线程池中等待空闲线程的任务数", ("pool",)))
+TASK_HEDGES = _register(Counter(
+    "comicmaker_task_hedges_total", "超过截止时间（deadline）或失败（failover）后提交到等价模型的次数（按先成功的一方）",
+    ("tool_type", "model", "reason", "winner")))
+LOOP_LAG = _register(Histogram(
+    "comicmaker_event_loop_lag_seconds", "事件循环延迟（定时唤醒比预期晚的时间）", (), LOOP_BUCKETS))
+LOOP_BLOCKED = _register(Counter(
+    "comicmaker_event_loop_blocked_total", "事件循环阻塞超过阈值的次数（按阻塞时所在的接口函数）", ("location",)))
+LOOP_BLOCKED_SECONDS = _register(Histogram(
+    "comicmaker_event_loop_blocked_seconds", "超过阈值的事件循环阻塞时长", ("location",), LOOP_BUCKETS))
+
+
+def snapshot() -> Dict[str, Any]:
+    """当前进程的全部指标"""
+    return {
+        name: {
+            "type": metric.kind,
+            "help": metric.documentation,
+            "labels": list(metric.labelnames),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "samples": metric.samples(),
+        }
+        for name, metric in _registry.items()
+    }
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """
+    请求对应的路由模板，例如 /api/works/{work_id}，避免每个 ID 一条时间序列
+
+    由请求路径和路径参数还原（include_router 的前缀在不同 FastAPI 版本中不一定体现在 scope["route"] 上）。
+    """
+    path = scope.get("path", "")
+    if path.startswith("/data/"):
+        return "/data"
+    params = scope.get("path_params")
+    if scope.get("route") is None and not params:
+        return "unmatched"
+    if not params:
+        return path
+    segments = path.split("/")
+    for name, value in params.items():
+        value = str(value)
+        if "/" in value:
+            # {path:path} 形式的参数位于路径末尾
+            joined = "/".join(segments)
+            if joined.endswith(value):
+                segments = (joined[:-len(value)] + "{" + name + "}").split("/")
+            continue
+        segments = ["{" + name + "}" if segment == value else segment for segment in segments]
+    return "/".join(segments)
+
+
+# ==================== 任务阶段 ====================
+
+# 上游 prediction 状态 -> 阶段
+_QUEUED_STATUSES = {"created", "pending", "queued", "starting"}
+_FINAL_STATUSES = {"completed", "failed", "canceled", "cancelled"}
+
+
+class TaskTimer:
+    """单个任务的阶段耗时（同一阶段多次出现时累加）"""
+
+    def __init__(self, tool_type: str, model: str):
+        self.tool_type = tool_type
+        self.model = model
+        self.status = "unknown"
+        self.stages: Dict[str, float] = {}
+        # 提交生成请求的上游接口（WaveSpeed 为 base URL 之后的 <provider>/<model>，LLM 为 openrouter）
+        self.endpoints: List[str] = []
+        self.elapsed: Optional[float] = None
+        # 是否提交过等价模型（utils.routing 的对冲 / 故障转移）
+        self.hedged = False
+        # 上游阶段变化时调用，参数为 queue / run，prediction 结束时为 None（用于记录任务进度）
+        self.on_upstream_stage: Optional[Callable[[Optional[str]], None]] = None
+        self._lock = threading.Lock()
+        self._upstream_stage: Optional[str] = None
+        self._upstream_mark: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def prediction_submitted(self):
+        """生成请求已提交，之后的时间计入上游排队，直到轮询看到 processing"""
+        with self._lock:
+            self._upstream_stage = "queue"
+            self._upstream_mark = time.perf_counter()
+        self._stage_changed("queue")
+
+    def prediction_status(self, status: Optional[str]):
+        """轮询到 prediction 状态：上一次轮询到本次之间的时间计入上一次状态对应的阶段"""
+        now = time.perf_counter()
+        status = (status or "").lower()
+        with self._lock:
+            previous = self._upstream_stage
+            if self._upstream_mark is not None and self._upstream_stage is not None:
+                self.stages[self._upstream_stage] = self.stages.get(self._upstream_stage, 0.0) + now - self._upstream_mark
+            if status in _FINAL_STATUSES:
+                self._upstream_stage = self._upstream_mark = None
+            else:
+                # 接手任务时没有提交记录，从第一次轮询开始计时
+                self._upstream_stage = "queue" if status in _QUEUED_STATUSES else "run"
+                self._upstream_mark = now
+            stage = self._upstream_stage
+        if stage != previous or status in _FINAL_STATUSES:
+            self._stage_changed(stage)
+
+    def _stage_changed(self, stage: Optional[str]):
+        if self.on_upstream_stage is None:
+            return
+        try:
+            self.on_upstream_stage(stage)
+        except Exception as e:
+            # 记录失败不影响任务本身
+            logger.warning(f"记录上游阶段失败: {e}")
+
+
+_current_task: ContextVar[Optional[TaskTimer]] = ContextVar("metrics_task", default=None)
+
+
+def current_task() -> Optional[TaskTimer]:
+    return _current_task.get()
+
+
+@contextmanager
+def track_task(tool_type: str, model: Optional[str] = None) -> Iterator[TaskTimer]:
+    """
+    统计一个任务的总耗时和阶段耗时
+
+    任务结果由 task_finished() 设置（tasks.update_task_status 在任务结束时调用），未设置时为 unknown。
+    """
+    timer = TaskTimer(tool_type, model or "default")
+    token = _current_task.set(timer)
+    TASKS_IN_FLIGHT.labels(tool_type).inc()
+    start = time.perf_counter()
+    try:
+        yield timer
+    except asyncio.CancelledError:
+        timer.status = "interrupted"
+        raise
+    except BaseException:
+        timer.status = "error"
+        raise
+    finally:
+        _current_task.reset(token)
+        TASKS_IN_FLIGHT.labels(tool_type).dec()
+        timer.elapsed = time.perf_counter() - start
+        TASK_SECONDS.labels(timer.tool_type, timer.model, timer.status).observe(timer.elapsed)
+        for stage, seconds in timer.stages.items():
+            TASK_STAGE_SECONDS.labels(timer.tool_type, timer.model, stage).observe(seconds)
+
+
+def task_finished(status: str):
+    """记录当前任务的结果（success / failed）"""
+    timer = _current_task.get()
+    if timer is not None:
+        timer.status = status
+
+
+@contextmanager
+def task_stage(stage: str):
+    """把代码块的执行时间计入当前任务的 stage 阶段（不在任务中时不记录）"""
+    timer = _current_task.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(stage, time.perf_counter() - start)
+
+
+# ==================== 上游请求 ====================
+
+def upstream_name(url: str) -> str:
+    """按配置的上游地址判断请求属于哪个上游（其他地址视为下载生成结果的 media）"""
+    upstreams = get_settings().upstreams
+    if url.startswith(upstreams.wavespeed_base_url):
+        return "wavespeed"
+    if url.startswith(upstreams.openrouter_base_url):
+        return "openrouter"
+    return "media"
+
+
+def count_upstream_error(upstream: str, code: Any):
+    """记录一次上游失败（code 为 HTTP 状态码或 timeout / connection）"""
+    UPSTREAM_ERRORS.labels(upstream, code).inc()
+    if str(code) == "429":
+        UPSTREAM_THROTTLED.labels(upstream).inc()
+
+
+def _prediction_status(response: requests.Response) -> Optional[str]:
+    try:
+        return response.json().get("data", {}).get("status")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _observe_response(upstream: str, method: str, url: str, response: requests.Response, elapsed: float,
+                      prediction_status: Optional[str] = None):
+    UPSTREAM_REQUEST_SECONDS.labels(upstream, method).observe(elapsed)
+    if response.status_code >= 400:
+        count_upstream_error(upstream, response.status_code)
+    timer = _current_task.get()
+    if timer is None or response.status_code >= 400:
+        return
+    if upstream == "wavespeed":
+        if "/predictions/" in url:
+            if prediction_status is not None:
+                timer.prediction_status(prediction_status)
+        elif method == "POST":
+            timer.add("submit", elapsed)
+            timer.prediction_submitted()
+            base_url = get_settings().upstreams.wavespeed_base_url
+            timer.endpoints.append(url[len(base_url):].split("?", 1)[0].strip("/"))
+    elif upstream == "openrouter" and method == "POST":
+        timer.add("run", elapsed)
+        timer.endpoints.append("openrouter")
+
+
+class UpstreamCancelled(Exception):
+    """所属的生成尝试已取消（例如对冲请求中落败的一方），不再发出上游请求"""
+    pass
+
+
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("upstream_cancel", default=None)
+
+
+def bind_cancel_event(event: threading.Event):
+    """当前上下文（包括其中 asyncio.to_thread 的线程）在 event 设置后发出上游请求时抛出 UpstreamCancelled"""
+    _cancel_event.set(event)
+
+
+class UpstreamSession(requests.Session):
+    """
+    记录上游请求指标和 span（utils.tracing）的 requests.Session
+
+    同时复用连接（每个上游主机最多保持 pool_size 个连接），进程内共享一个实例即可。
+    """
+
+    def __init__(self, pool_size: int = 32):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        method = method.upper()
+        cancel = _cancel_event.get()
+        if cancel is not None and cancel.is_set():
+            raise UpstreamCancelled(f"已取消: {method} {url.split('?', 1)[0]}")
+        upstream = upstream_name(url)
+        # 查询参数可能包含签名，不写入 span
+        attributes = {"upstream": upstream, "http.method": method, "http.url": url.split("?", 1)[0]}
+        with start_span(f"{upstream} {method}", attributes, kind="CLIENT") as span:
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.exceptions.Timeout:
+                count_upstream_error(upstream, "timeout")
+                raise
+            except requests.exceptions.RequestException:
+                count_upstream_error(upstream, "connection")
+                raise
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 400:
+                span.set_status("ERROR", f"HTTP {response.status_code}")
+            status = None
+            if upstream == "wavespeed" and "/predictions/" in url and response.status_code < 400:
+                status = _prediction_status(response)
+                span.set_attribute("prediction.status", status)
+            _observe_response(upstream, method, url, response, time.perf_counter() - start, status)
+            return response
+
+
+# 直接调用上游的模块共用（替代 requests.get / requests.post）
+upstream_session = UpstreamSession()
+
+
+# ==================== 线程池 ====================
+
+class InstrumentedThreadPool(ThreadPoolExecutor):
+    """记录容量、执行中和排队任务数的线程池"""
+
+    def __init__(self, name: str, max_workers: Optional[int] = None):
+        # 与 ThreadPoolExecutor 的默认值相同
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        THREAD_POOL_WORKERS.labels(name).inc(max_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        queued = THREAD_POOL_QUEUED.labels(self.name)
+        active = THREAD_POOL_ACTIVE.labels(self.name)
+
+        def run():
+            queued.dec()
+            active.inc()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                active.dec()
+
+        queued.inc()
+        try:
+            return super().submit(run)
+        except BaseException:
+            queued.dec()
+            raise
+
+    def shutdown(self, wait: bool = True, **kwargs):
+        if self.max_workers:
+            THREAD_POOL_WORKERS.labels(self.name).dec(self.max_workers)
+            self.max_workers = 0
+        super().shutdown(wait=wait, **kwargs)
+
+
+# ==================== 多进程聚合 ====================
+
+def metrics_dir() -> str:
+    """指标目录：metrics.dir，默认为临时目录下按数据目录区分的子目录（同一部署的进程共享）"""
+    configured = get_settings().metrics.dir
+    if configured:
+        return configured
+    digest = hashlib.sha1(os.path.abspath(DATA_ROOT).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(tempfile.gettempdir(), f"comicmaker-metrics-{digest}")
+
+
+@contextmanager
+def _locked(directory: str, exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_NAME), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]], include_gauges: bool = True) -> Dict[str, Any]:
+    """合并多个进程的指标：计数器和直方图累加，仪表（include_gauges 时）累加"""
+    merged: Dict[str, Any] = {}
+    for metrics in snapshots:
+        for name, metric in metrics.items():
+            if metric["type"] == "gauge" and not include_gauges:
+                continue
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            samples = target["samples"]
+            for key, value in metric["samples"].items():
+                if metric["type"] != "histogram":
+                    samples[key] = samples.get(key, 0.0) + value
+                elif key not in samples:
+                    samples[key] = {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                elif len(samples[key]["buckets"]) == len(value["buckets"]):
+                    state = samples[key]
+                    state["buckets"] = [a + b for a, b in zip(state["buckets"], value["buckets"])]
+                    state["sum"] += value["sum"]
+                    state["count"] += value["count"]
+    return merged
+
+
+def _process_files(directory: str) -> List[Tuple[int, str]]:
+    files = []
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        if ext == ".json" and stem.isdigit():
+            files.append((int(stem), os.path.join(directory, filename)))
+    return files
+
+
+def compact(directory: str):
+    """把已退出进程（以及与当前进程 pid 相同的旧文件）的计数器和直方图合并到 archive.json 并删除原文件"""
+    with _locked(directory, exclusive=True):
+        dead = [path for pid, path in _process_files(directory) if pid == os.getpid() or not _process_alive(pid)]
+        if not dead:
+            return
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        snapshots = [(_read(archive_path) or {}).get("metrics", {})]
+        snapshots += [(_read(path) or {}).get("metrics", {}) for path in dead]
+        _write(archive_path, {"metrics": merge_snapshots(snapshots, include_gauges=False)})
+        for path in dead:
+            os.remove(path)
+
+
+class MetricsExporter:
+    """定期把当前进程的指标写入指标目录"""
+
+    def __init__(self, directory: str, flush_seconds: float):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        compact(self.directory)
+        self.flush()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"写入指标失败: {e}")
+
+    def flush(self):
+        _write(self.path, {"pid": os.getpid(), "updated_at": time.time(), "metrics": snapshot()})
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning(f"写入指标失败: {e}")
+
+    def collect(self) -> Dict[str, Any]:
+        """合并指标目录中所有进程的指标（当前进程使用内存中的最新值）"""
+        self.flush()
+        snapshots = []
+        with _locked(self.directory, exclusive=False):
+            archive = _read(os.path.join(self.directory, ARCHIVE_NAME))
+            if archive:
+                snapshots.append(archive.get("metrics", {}))
+            for pid, path in _process_files(self.directory):
+                data = _read(path)
+                if not data:
+                    continue
+                metrics = data.get("metrics", {})
+                if pid != os.getpid() and not _process_alive(pid):
+                    metrics = {name: metric for name, metric in metrics.items() if metric["type"] != "gauge"}
+                snapshots.append(metrics)
+        return merge_snapshots(snapshots)
+
+
+_exporter: Optional[MetricsExporter] = None
+
+
+def start_metrics() -> MetricsExporter:
+    """启动当前进程的指标导出（API 进程和 worker 进程启动时调用，重复调用无副作用）"""
+    global _exporter
+    if _exporter is None:
+        settings = get_settings().metrics
+        _exporter = MetricsExporter(metrics_dir(), settings.flush_seconds)
+        _exporter.start()
+    return _exporter
+
+
+def stop_metrics():
+    """进程退出前写入最终值"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
+
+
+# ==================== 文本格式 ====================
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(metrics: Dict[str, Any]) -> str:
+    """输出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labels"]
+        for key in sorted(metric["samples"]):
+            values = json.loads(key)
+            value = metric["samples"][key]
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, values)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"], value["buckets"]):
+                cumulative += count
+                le = _format_number(bound)
+                lines.append(f"{name}_bucket{_format_labels(labelnames, values, ('le', le))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, ('le', '+Inf'))} {value['count']}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, values)} {repr(float(value['sum']))}")
+            lines.append(f"{name}_count{_format_labels(labelnames, values)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics() -> str:
+    """本机所有进程合并后的指标；未启动导出时只包含当前进程"""
+    if _exporter is None:
+        return render(snapshot())
+    return render(_exporter.collect())
@@ -7,7 +7,10 @@ import os
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
-import yaml
+from .settings import get_settings
+from .metrics import count_upstream_error, task_stage
+from .rate_limit import acquire as acquire_rate_limit
+from .tracing import start_span
 
 try:
     import oss2
@@ -34,25 +37,19 @@ def load_oss_config() -> Dict[str, str]:
         FileNotFoundError: 配置文件不存在时抛出
         KeyError: 配置项缺失时抛出
     """
-    # 获取配置文件路径
-    server_dir = os.path.dirname(os.path.dirname(__file__))
-    config_path = os.path.join(server_dir, "config", "config.yaml")
+    settings = get_settings()
+    if not settings.exists:
+        raise FileNotFoundError(f"配置文件不存在: {settings.path}")
     
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"配置文件不存在: {config_path}")
+    oss_config = settings.oss
+    access_key_id = oss_config.access_key_id
+    access_key_secret = oss_config.access_key_secret
+    endpoint = oss_config.endpoint
+    bucket_name = oss_config.bucket_name
     
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    oss_config = config.get('oss', {})
-    if not oss_config:
+    if not any([access_key_id, access_key_secret, endpoint, bucket_name]):
         raise KeyError("配置文件中缺少 'oss' 配置")
     
-    access_key_id = oss_config.get('access_key_id')
-    access_key_secret = oss_config.get('access_key_secret')
-    endpoint = oss_config.get('endpoint')
-    bucket_name = oss_config.get('bucket_name')
-    
     if not access_key_id:
         raise KeyError("配置文件中缺少 'oss.access_key_id' 配置")
     if not access_key_secret:
@@ -146,7 +143,11 @@ def upload_image_to_oss(
         
         # 上传文件
         logger.info(f"开始上传图片到 OSS: {local_image_path} -> {oss_object_key}")
-        result = bucket.put_object_from_file(oss_object_key, local_image_path)
+        acquire_rate_limit("oss")
+        attributes = {"oss.bucket": bucket_name, "oss.key": oss_object_key, "file.size": os.path.getsize(local_image_path)}
+        with task_stage("upload"), start_span("oss.upload", attributes, kind="CLIENT") as span:
+            result = bucket.put_object_from_file(oss_object_key, local_image_path)
+            span.set_attribute("http.status_code", result.status)
         
         # 检查上传结果
         if result.status == 200:
@@ -173,10 +174,13 @@ def upload_image_to_oss(
             raise Exception(f"上传失败，状态码: {result.status}")
             
     except oss2.exceptions.AccessDenied:
+        count_upstream_error("oss", 403)
         raise Exception("OSS 访问被拒绝，请检查 AccessKey 权限")
     except oss2.exceptions.NoSuchBucket:
+        count_upstream_error("oss", 404)
         raise Exception(f"OSS Bucket 不存在: {bucket_name}")
     except oss2.exceptions.OssError as e:
+        count_upstream_error("oss", e.status or "connection")
         raise Exception(f"OSS 错误: {str(e)}")
     except Exception as e:
         raise Exception(f"上传图片到 OSS 失败: {str(e)}")
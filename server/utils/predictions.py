@@ -0,0 +1,133 @@
+"""
+上游异步预测（WaveSpeed prediction）记录
+
+生成请求提交到 WaveSpeed 后立即得到 prediction ID，结果需要轮询获取。执行任务时通过
+track_predictions() 登记回调，各提交点调用 record_prediction() 把 prediction ID 和轮询地址
+交给回调（写入任务文件）。进程在轮询期间退出时，之后的执行者据此直接取回已付费生成的结果，
+而不是重新提交。
+
+回调保存在 ContextVar 中，asyncio.to_thread 会复制上下文，线程中的同步提交代码同样可以记录。
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from .metrics import upstream_session
+from .settings import get_settings
+from .tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# 恢复轮询时的间隔和最长等待时间（秒）
+RESUME_POLL_INTERVAL = 2.0
+RESUME_MAX_WAIT = 1800
+
+PredictionListener = Callable[[Dict[str, Any]], None]
+
+_listener: ContextVar[Optional[PredictionListener]] = ContextVar("prediction_listener", default=None)
+
+
+class PredictionError(Exception):
+    """预测失败、过期或轮询超时"""
+    pass
+
+
+def prediction_result_url(request_id: str) -> str:
+    """prediction 结果的轮询地址（upstreams.wavespeed_base_url）"""
+    return get_settings().upstreams.wavespeed_url(f"predictions/{request_id}/result")
+
+
+@contextmanager
+def track_predictions(listener: PredictionListener):
+    """在当前上下文中登记 prediction 提交回调"""
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def record_prediction(request_id: str, poll_url: Optional[str] = None):
+    """记录已提交的 prediction（没有登记回调时不做任何事）"""
+    listener = _listener.get()
+    if listener is None:
+        return
+    prediction = {
+        "id": request_id,
+        "poll_url": poll_url or prediction_result_url(request_id),
+        "submitted_at": datetime.now().isoformat(),
+    }
+    try:
+        listener(prediction)
+    except Exception as e:
+        # 记录失败不影响生成本身
+        logger.warning(f"记录 prediction 失败: {request_id}, {e}")
+
+
+def fetch_prediction(prediction: Dict[str, Any], api_key: str) -> Dict[str, Any]:
+    """
+    查询一次 prediction 状态
+
+    Returns:
+        WaveSpeed 返回的 data 字段（包含 status、outputs 等）
+
+    Raises:
+        PredictionError: 查询失败
+    """
+    try:
+        response = upstream_session.get(
+            prediction["poll_url"],
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=30,
+        )
+    except requests.exceptions.RequestException as e:
+        raise PredictionError(f"查询 prediction 失败: {e}")
+    if response.status_code != 200:
+        raise PredictionError(f"查询 prediction 失败: {response.status_code}, {response.text}")
+    return response.json().get("data", {})
+
+
+def wait_for_prediction(
+    prediction: Dict[str, Any],
+    api_key: str,
+    poll_interval: float = RESUME_POLL_INTERVAL,
+    max_wait: float = RESUME_MAX_WAIT,
+) -> Dict[str, Any]:
+    """
+    轮询 prediction 直到完成
+
+    Raises:
+        PredictionError: 预测失败或超过 max_wait
+    """
+    deadline = time.monotonic() + max_wait
+    failures = 0
+    iteration = 0
+    while True:
+        iteration += 1
+        # 每次轮询一个 span（包含之后的等待间隔）
+        with start_span("wavespeed.poll", {"prediction.id": prediction["id"], "poll.iteration": iteration}) as span:
+            try:
+                data = fetch_prediction(prediction, api_key)
+                failures = 0
+            except PredictionError as e:
+                # 网络抖动时继续重试，连续失败多次才放弃
+                failures += 1
+                if failures >= 5:
+                    raise
+                span.add_event("retry", {"error": str(e)})
+                data = {}
+            status = data.get("status")
+            span.set_attribute("prediction.status", status)
+            if status == "completed":
+                return data
+            if status == "failed":
+                raise PredictionError(f"Task failed: {data.get('error', 'Unknown error')}")
+            if time.monotonic() > deadline:
+                raise PredictionError(f"等待 prediction {prediction['id']} 超过 {max_wait} 秒")
+            time.sleep(poll_interval)
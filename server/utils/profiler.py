@@ -0,0 +1,322 @@
+"""
+按需采样分析（sampling profiler）
+
+不依赖第三方分析器：采样线程每隔 interval 秒通过 sys._current_frames() 读取进程中所有线程的调用栈，
+按调用栈计数，输出火焰图常用的两种格式：
+- speedscope JSON（https://www.speedscope.app 直接打开，一个文件可包含多个进程的 profile）
+- collapsed stack（每行 "线程;外层函数;...;内层函数 次数"，flamegraph.pl / speedscope 均可读取）
+
+空闲的线程（等待事件循环 select、线程池队列、锁和条件变量）默认不计入，结果只包含真正在执行的代码。
+采样期间所有线程都会被记录，并发的其他请求也会出现在结果中（以线程名为最外层帧区分事件循环和线程池）。
+
+两种触发方式：
+- 单个请求：请求头 X-Profile-Token（或查询参数 _profile）等于 profiling.token 时，main.py 的中间件在采样下
+  处理该请求，火焰图保存到 profiling.dir（响应头 X-Profile-Path）；请求头 X-Profile-Output: speedscope /
+  collapsed（或查询参数 _profile_output）时直接返回火焰图代替原响应
+- 运行中的进程：POST /api/admin/profile 在 profiling.dir/requests 中写入采样请求，同一台机器上的 API 进程和
+  worker 进程（start_profile_watcher()）各自采样 seconds 秒后把结果写入 profiling.dir/results，接口合并后返回
+"""
+
+import hmac
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .settings import SERVER_DIR, get_settings
+
+logger = logging.getLogger(__name__)
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# 帧：(函数名, 文件, 函数起始行)
+Frame = Tuple[str, str, int]
+
+# 最内层帧位于这些文件时视为空闲（等待 I/O、队列、锁）
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+def check_token(value: Optional[str]) -> bool:
+    """value 是否等于 profiling.token（未配置 token 时始终为 False）"""
+    token = get_settings().profiling.token
+    return bool(token and value) and hmac.compare_digest(value.encode("utf-8"), token.encode("utf-8"))
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(_IDLE_FILES)
+
+
+def _short_path(filename: str) -> str:
+    """本项目文件显示为相对 server 目录的路径，依赖库显示为 site-packages 之后的路径"""
+    if filename.startswith(SERVER_DIR + os.sep):
+        return os.path.relpath(filename, SERVER_DIR)
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+class Profile:
+    """一个进程一段时间内的采样结果"""
+
+    def __init__(self, name: str, interval: float, counts: Optional[Dict[Tuple[Frame, ...], int]] = None,
+                 duration: float = 0.0, pid: Optional[int] = None):
+        self.name = name
+        self.interval = interval
+        self.counts: Counter = Counter(counts or {})
+        self.duration = duration
+        self.pid = pid or os.getpid()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.counts.values())
+
+    def to_collapsed(self) -> str:
+        lines = []
+        for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+            names = [stack[0][0]] + [f"{name} ({file}:{line})" for name, file, line in stack[1:]]
+            lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "pid": self.pid,
+            "interval": self.interval,
+            "duration": self.duration,
+            "stacks": [[list(frame) for frame in stack] + [count] for stack, count in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Profile":
+        counts = {tuple(tuple(frame) for frame in item[:-1]): item[-1] for item in data["stacks"]}
+        return cls(data["name"], data["interval"], counts, data["duration"], data["pid"])
+
+
+def speedscope(profiles: List[Profile], name: str) -> Dict[str, Any]:
+    """speedscope 文件格式，每个 Profile 为一个 sampled profile（权重单位为秒）"""
+    frames: List[Dict[str, Any]] = []
+    index: Dict[Frame, int] = {}
+    documents = []
+    for profile in profiles:
+        samples, weights = [], []
+        for stack, count in profile.counts.items():
+            indices = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]} if frame[1]
+                                  else {"name": frame[0]})
+                indices.append(index[frame])
+            samples.append(indices)
+            weights.append(count * profile.interval)
+        documents.append({
+            "type": "sampled",
+            "name": profile.name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        })
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": name,
+        "exporter": "comicmaker",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": documents,
+    }
+
+
+class SamplingProfiler:
+    """在后台线程中采样当前进程所有线程的调用栈"""
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._duration = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, name: str = "") -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._duration = time.perf_counter() - self._started
+        return Profile(name or f"pid {os.getpid()}", self.interval, self.counts, self._duration)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not self.include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, _short_path(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append((names.get(ident, str(ident)), "", 0))
+                self.counts[tuple(reversed(stack))] += 1
+
+
+def profile_dir() -> str:
+    """火焰图和进程采样请求的目录：profiling.dir，默认为 server/logs/profiles"""
+    return get_settings().profiling.dir or os.path.join(SERVER_DIR, "logs", "profiles")
+
+
+def save_profile(profile: Profile, label: str, output: str = "speedscope") -> str:
+    """把单个请求的火焰图保存到 profiling.dir，返回文件路径"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label).strip("_")[:80]
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}.{int(time.time() * 1000) % 1000:03d}-{os.getpid()}-{safe_label}"
+    if output == "collapsed":
+        path = os.path.join(directory, f"{stem}.collapsed.txt")
+        content = profile.to_collapsed()
+    else:
+        path = os.path.join(directory, f"{stem}.speedscope.json")
+        content = json.dumps(speedscope([profile], label), ensure_ascii=False)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+# ==================== 进程采样请求 ====================
+
+def _requests_dir() -> str:
+    return os.path.join(profile_dir(), "requests")
+
+
+def _results_dir(request_id: str) -> str:
+    return os.path.join(profile_dir(), "results", request_id)
+
+
+def request_process_profiles(request_id: str, seconds: float, pid: Optional[int] = None) -> str:
+    """写入采样请求，同一台机器上运行 start_profile_watcher() 的进程（pid 为空时全部）各自采样 seconds 秒"""
+    directory = _requests_dir()
+    os.makedirs(directory, exist_ok=True)
+    os.makedirs(_results_dir(request_id), exist_ok=True)
+    path = os.path.join(directory, f"{request_id}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"id": request_id, "seconds": seconds, "pid": pid, "created_at": time.time()}, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def collect_process_profiles(request_id: str) -> List[Profile]:
+    """读取并删除采样请求的结果"""
+    results = _results_dir(request_id)
+    profiles = []
+    try:
+        filenames = sorted(os.listdir(results))
+    except FileNotFoundError:
+        filenames = []
+    for filename in filenames:
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(results, filename), "r", encoding="utf-8") as f:
+                profiles.append(Profile.from_dict(json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取采样结果失败: {filename}, {e}")
+    try:
+        os.remove(os.path.join(_requests_dir(), f"{request_id}.json"))
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(results, ignore_errors=True)
+    return profiles
+
+
+class ProfileWatcher:
+    """定期检查采样请求，对本进程采样并写入结果"""
+
+    def __init__(self, name: str, poll_seconds: float = 1.0):
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self._handled: set = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except OSError as e:
+                logger.warning(f"检查采样请求失败: {e}")
+
+    def check(self):
+        directory = _requests_dir()
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                    request = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if request["id"] in self._handled:
+                continue
+            if request.get("pid") not in (None, os.getpid()) or time.time() - request["created_at"] > request["seconds"]:
+                continue
+            self._handled.add(request["id"])
+            self._profile(request)
+
+    def _profile(self, request: Dict[str, Any]):
+        settings = get_settings().profiling
+        profiler = SamplingProfiler(settings.interval).start()
+        self._stop.wait(request["seconds"])
+        profile = profiler.stop(f"{self.name} (pid {os.getpid()})")
+        results = _results_dir(request["id"])
+        if not os.path.isdir(results):
+            # 请求方已经放弃等待
+            return
+        path = os.path.join(results, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(), f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        logger.info(f"已完成采样 {request['id']}: {profile.samples} 个样本")
+
+
+_watcher: Optional[ProfileWatcher] = None
+
+
+def start_profile_watcher(name: str) -> Optional[ProfileWatcher]:
+    """响应 POST /api/admin/profile 的采样请求（API 进程和 worker 进程启动时调用，未配置 profiling.token 时不启动）"""
+    global _watcher
+    if _watcher is None and get_settings().profiling.token:
+        _watcher = ProfileWatcher(name)
+        _watcher.start()
+    return _watcher
+
+
+def stop_profile_watcher():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
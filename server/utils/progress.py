@@ -0,0 +1,157 @@
+"""
+任务进度和剩余时间估算
+
+任务执行时在任务记录中写入当前阶段（phase）及其开始时间（phase_at）：
+- waiting：已创建，等待执行者领取
+- preparing：开始执行，上传输入、提交生成请求
+- queued / processing：上游 prediction 排队中 / 生成中（由轮询到的状态切换，见 utils.metrics.TaskTimer）
+- finishing：上游已完成，下载和保存结果
+
+每个阶段的历史耗时来自用量台账（utils.usage）中同一工具类型和模型最近的成功记录。剩余时间 =
+当前阶段已耗时 t 时的剩余耗时（历史上超过 t 的记录的剩余耗时中位数）+ 之后各阶段的耗时中位数；
+进度 = 已耗时 /（已耗时 + 剩余时间）。排队比平时久的任务剩余时间随之增加，而不是停在 99%。
+没有足够历史记录时只按阶段给出粗略进度，剩余时间为 None。
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .settings import get_settings
+from .usage import percentile, read_entries
+
+PHASES = ("waiting", "preparing", "queued", "processing", "finishing")
+
+# 上游阶段（utils.metrics.TaskTimer.on_upstream_stage）-> 任务阶段
+UPSTREAM_PHASES = {"queue": "queued", "run": "processing", None: "finishing"}
+
+# 没有历史记录时各阶段的进度
+FALLBACK_PROGRESS = {"waiting": 0, "preparing": 5, "queued": 10, "processing": 40, "finishing": 90}
+
+# 历史耗时的缓存时间（秒）
+HISTORY_REFRESH_SECONDS = 60.0
+
+
+def phase_durations(entry: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """台账记录中各阶段的耗时；下载计入 finishing，其余非上游时间计入 preparing"""
+    queued = entry.get("queue_seconds") or 0.0
+    processing = entry.get("run_seconds") or 0.0
+    finishing = (entry.get("stages") or {}).get("download", 0.0)
+    return {
+        "waiting": entry.get("wait_seconds"),
+        "preparing": max(0.0, (entry.get("elapsed_seconds") or 0.0) - queued - processing - finishing),
+        "queued": queued,
+        "processing": processing,
+        "finishing": finishing,
+    }
+
+
+class LatencyHistory:
+    """一组成功任务的各阶段耗时分布"""
+
+    def __init__(self):
+        self.count = 0
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, entry: Dict[str, Any]):
+        self.count += 1
+        for phase, seconds in phase_durations(entry).items():
+            if seconds is not None:
+                self._samples[phase].append(seconds)
+        # 提交到上游完成的时间（utils.routing 的截止时间）
+        stages = entry.get("stages") or {}
+        self._samples["upstream"].append(stages.get("submit", 0.0) + stages.get("queue", 0.0) + stages.get("run", 0.0))
+
+    def freeze(self):
+        for samples in self._samples.values():
+            samples.sort()
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """阶段（或 upstream）耗时的分位数，没有记录时为 None"""
+        return percentile(self._samples.get(name, []), q)
+
+    def remaining(self, phase: str, spent: float = 0.0) -> float:
+        """阶段已耗时 spent 秒时的剩余耗时（该阶段没有记录时为 0）"""
+        samples = self._samples.get(phase)
+        if not samples:
+            return 0.0
+        if spent <= 0:
+            return percentile(samples, 0.5)
+        longer = [seconds - spent for seconds in samples if seconds > spent]
+        if not longer:
+            # 比所有历史记录都慢：认为即将结束，剩余时间随已耗时缓慢增加
+            return spent * 0.1
+        return percentile(longer, 0.5)
+
+
+_history: Dict[Tuple[str, Optional[str]], LatencyHistory] = {}
+_history_loaded_at: Optional[float] = None
+_history_lock = threading.Lock()
+
+
+def _load_history() -> Dict[Tuple[str, Optional[str]], LatencyHistory]:
+    hours = get_settings().usage.eta_history_hours
+    history: Dict[Tuple[str, Optional[str]], LatencyHistory] = defaultdict(LatencyHistory)
+    for entry in read_entries(time.time() - hours * 3600):
+        # 接手中断任务的记录只包含后半段，对冲过的任务包含等待截止时间，都不计入
+        if entry.get("status") != "success" or entry.get("resumed") or entry.get("hedged"):
+            continue
+        history[(entry.get("tool_type"), entry.get("model"))].add(entry)
+        history[(entry.get("tool_type"), None)].add(entry)
+    for item in history.values():
+        item.freeze()
+    return dict(history)
+
+
+def get_history(tool_type: str, model: Optional[str]) -> Optional[LatencyHistory]:
+    """模型的历史耗时，记录不足时使用同一工具类型的全部模型，仍不足时返回 None"""
+    global _history, _history_loaded_at
+    with _history_lock:
+        if _history_loaded_at is None or time.time() - _history_loaded_at > HISTORY_REFRESH_SECONDS:
+            _history = _load_history()
+            _history_loaded_at = time.time()
+        history = _history
+    min_samples = get_settings().usage.eta_min_samples
+    for key in ((tool_type, model), (tool_type, None)):
+        item = history.get(key)
+        if item is not None and item.count >= min_samples:
+            return item
+    return None
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_progress(task: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    估算任务的进度（0-100）和剩余时间（秒）
+
+    Returns:
+        {"phase": 当前阶段, "progress": 进度, "eta_seconds": 剩余秒数（无法估算时为 None）}
+    """
+    status = task.get("status")
+    if status == "success":
+        return {"phase": None, "progress": 100, "eta_seconds": 0}
+    if status != "pending":
+        return {"phase": None, "progress": task.get("progress", 0), "eta_seconds": None}
+
+    now = now or time.time()
+    phase = task.get("phase") or "waiting"
+    created_at = _timestamp(task.get("created_at")) or now
+    phase_at = task.get("phase_at") or created_at
+    history = get_history(task.get("tool_type"), (task.get("input") or {}).get("model") or "default")
+    if history is None or phase not in PHASES:
+        return {"phase": phase, "progress": FALLBACK_PROGRESS.get(phase, 0), "eta_seconds": None}
+
+    remaining = history.remaining(phase, now - phase_at)
+    for later in PHASES[PHASES.index(phase) + 1:]:
+        remaining += history.remaining(later)
+    spent = max(0.0, now - created_at)
+    progress = int(100 * spent / (spent + remaining)) if spent + remaining > 0 else 0
+    return {"phase": phase, "progress": min(99, progress), "eta_seconds": round(remaining)}
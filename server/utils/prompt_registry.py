@@ -0,0 +1,250 @@
+"""
+提示词模板注册表
+
+prompts/ 目录下的 .txt 模板在启动时一次性加载并预解析，之后：
+- 渲染时按预解析的片段拼接，不再每次读取文件、也不再混用 str.format 和字符串替换
+- 每隔 RELOAD_CHECK_INTERVAL 秒检查模板文件修改时间，修改后自动重新加载
+- 记录每个模板渲染结果的 token 数（安装了 tiktoken 时精确计数，否则按字符估算）
+
+模板语法与 str.format 的简单形式一致：{name} 为变量，{{ 和 }} 为字面量花括号；
+其他花括号（例如 JSON 示例）原样保留。模板名为相对 prompts/ 的路径去掉扩展名，
+例如 "generation/shot_prompts"。
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+TEMPLATE_EXTENSION = ".txt"
+RELOAD_CHECK_INTERVAL = 1.0
+# 计数使用的 tiktoken 编码
+TOKEN_ENCODING = "o200k_base"
+
+_TOKEN_PATTERN = re.compile(r"\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}")
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+class PromptTemplate:
+    """
+    预解析的提示词模板
+
+    文本被切分为字面量片段和变量占位符，渲染时只需按顺序拼接。
+    """
+
+    def __init__(self, text: str, name: str = "<inline>", path: Optional[str] = None, mtime_ns: int = 0):
+        self.name = name
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.text = text
+        # 偶数下标为字面量，奇数下标为变量名
+        parts: List[str] = []
+        literal: List[str] = []
+        position = 0
+        for match in _TOKEN_PATTERN.finditer(text):
+            literal.append(text[position:match.start()])
+            token = match.group(0)
+            if match.group(1) is None:
+                literal.append(token[0])
+            else:
+                parts.append("".join(literal))
+                parts.append(match.group(1))
+                literal = []
+            position = match.end()
+        literal.append(text[position:])
+        parts.append("".join(literal))
+        self._parts: Tuple[str, ...] = tuple(parts)
+        self.variables: FrozenSet[str] = frozenset(parts[1::2])
+
+    def render(self, strict: bool = True, **variables: Any) -> str:
+        """
+        渲染模板
+
+        Args:
+            strict: 为 True 时缺少变量抛出 KeyError，否则保留原占位符
+            **variables: 变量名和值的映射
+
+        Raises:
+            KeyError: strict 模式下缺少模板变量
+        """
+        if strict:
+            missing = self.variables.difference(variables)
+            if missing:
+                raise KeyError(f"提示词模板 {self.name} 缺少变量: {', '.join(sorted(missing))}")
+        parts = list(self._parts)
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            parts[index] = str(variables[name]) if name in variables else f"{{{name}}}"
+        return "".join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> PromptTemplate:
+    """解析内联模板字符串（结果按文本缓存）"""
+    return PromptTemplate(text)
+
+
+_encoder = None
+_encoder_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的 token 数
+
+    安装了 tiktoken 时使用 TOKEN_ENCODING 精确计数；否则估算：
+    中日韩字符每字约 1 个 token，其他字符约 4 个字符 1 个 token。
+    """
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception:
+            _encoder = None
+        _encoder_loaded = True
+    if _encoder is not None:
+        return len(_encoder.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class PromptRegistry:
+    """
+    提示词模板注册表
+
+    Args:
+        root: 模板根目录
+    """
+
+    def __init__(self, root: str = PROMPTS_DIR):
+        self.root = root
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._checked: Dict[str, float] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _path_for(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/")) + TEMPLATE_EXTENSION
+
+    def _load(self, name: str, path: str) -> PromptTemplate:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"提示词模板文件不存在: {path}")
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            template = PromptTemplate(f.read(), name=name, path=path, mtime_ns=mtime_ns)
+        with self._lock:
+            previous = self._templates.get(name)
+            self._templates[name] = template
+            self._checked[name] = time.monotonic()
+        if previous is not None:
+            logger.info(f"提示词模板已重新加载: {name}")
+        return template
+
+    def load_all(self) -> int:
+        """加载 root 下的全部模板，返回模板数量"""
+        count = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                if not filename.endswith(TEMPLATE_EXTENSION):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root)[:-len(TEMPLATE_EXTENSION)].replace(os.sep, "/")
+                self._load(name, path)
+                count += 1
+        return count
+
+    def get(self, name: str) -> PromptTemplate:
+        """
+        获取模板（文件修改后自动重新加载）
+
+        Raises:
+            FileNotFoundError: 模板文件不存在
+        """
+        template = self._templates.get(name)
+        if template is None:
+            return self._load(name, self._path_for(name))
+        now = time.monotonic()
+        if now - self._checked.get(name, 0.0) < RELOAD_CHECK_INTERVAL:
+            return template
+        self._checked[name] = now
+        try:
+            mtime_ns = os.stat(template.path).st_mtime_ns
+        except FileNotFoundError:
+            # 文件被删除时继续使用已加载的版本
+            return template
+        if mtime_ns != template.mtime_ns:
+            return self._load(name, template.path)
+        return template
+
+    def get_path(self, path: str) -> PromptTemplate:
+        """按文件路径获取模板（兼容旧的按路径加载方式）"""
+        abs_path = os.path.abspath(path)
+        relative = os.path.relpath(abs_path, self.root)
+        if relative.startswith("..") or not abs_path.endswith(TEMPLATE_EXTENSION):
+            name = abs_path
+            template = self._templates.get(name)
+            if template is None or os.stat(abs_path).st_mtime_ns != template.mtime_ns:
+                template = self._load(name, abs_path)
+            return template
+        return self.get(relative[:-len(TEMPLATE_EXTENSION)].replace(os.sep, "/"))
+
+    def render(self, name: str, **variables: Any) -> str:
+        """渲染模板并记录 token 数"""
+        prompt = self.get(name).render(**variables)
+        tokens = count_tokens(prompt)
+        with self._lock:
+            stats = self._stats.setdefault(name, {"renders": 0, "last_tokens": 0, "max_tokens": 0})
+            stats["renders"] += 1
+            stats["last_tokens"] = tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        logger.info(f"提示词 {name} 渲染完成: {len(prompt)} 字符, {tokens} tokens")
+        return prompt
+
+    def names(self) -> List[str]:
+        return sorted(self._templates)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各模板的渲染次数和 token 数统计"""
+        with self._lock:
+            return {name: dict(values) for name, values in self._stats.items()}
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """获取进程级共享的模板注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+        return _registry
+
+
+def render_prompt(name: str, **variables: Any) -> str:
+    """
+    渲染注册表中的模板
+
+    Raises:
+        FileNotFoundError: 模板文件不存在
+        KeyError: 缺少模板变量
+    """
+    return get_prompt_registry().render(name, **variables)
+
+
+def prompt_text(name: str) -> str:
+    """
+    获取注册表中模板的原始文本（不做变量替换，用于整段作为指令的提示词）
+
+    Raises:
+        FileNotFoundError: 模板文件不存在
+    """
+    return get_prompt_registry().get(name).text
@@ -5,41 +5,29 @@ LLM 查询工具函数 - 使用 WavespeedClient 实现
 所有函数保持向后兼容的签名。
 """
 
-import os
 import requests
-# from decord import VideoReader, cpu
 import base64
-import cv2
-from typing import List, Optional, Tuple, Union, Dict
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union, Dict
 import json
-import numpy as np
 from utils.text_process import extract_dict
 
 from .wavespeed_client import WavespeedClient, create_client_from_config
+from .metrics import upstream_session
+from .settings import get_settings
+from .prompt_registry import prompt_text
+from .media_encoding import encode_data_uri
+
+# cv2 / numpy 以及依赖它们的抽帧模块在首次处理视频时才导入，避免拖慢服务启动
+if TYPE_CHECKING:
+    import numpy as np
 
 
-# 延迟加载配置，避免导入时失败
-# 配置路径已更新为正确的路径
-_config = None
-_llm_config = None
 _client = None
 
 def _load_config():
-    """延迟加载配置"""
-    global _config, _llm_config
-    if _config is None:
-        server_dir = os.path.dirname(os.path.dirname(__file__))
-        config_path = os.path.join(server_dir, "config", "config.yaml")
-        if os.path.exists(config_path):
-            import yaml
-            with open(config_path, 'r') as f:
-                _config = yaml.safe_load(f)
-            _llm_config = _config.get('llm', {}) if _config else {}
-        else:
-            # 如果配置文件不存在，使用空配置
-            _config = {}
-            _llm_config = {}
-    return _config, _llm_config
+    """读取配置（由 settings 统一缓存，配置文件修改后自动重新加载）"""
+    settings = get_settings()
+    return settings.raw, settings.raw.get('llm') or {}
 
 
 def _get_client(api_key: Optional[str] = None) -> WavespeedClient:
@@ -47,7 +35,8 @@ def _get_client(api_key: Optional[str] = None) -> WavespeedClient:
     global _client
     if api_key:
         return WavespeedClient(api_key=api_key)
-    if _client is None:
+    # 配置中的 API key 变化（热加载）时重新创建客户端
+    if _client is None or _client.api_key != get_settings().wavespeed_api_key:
         _client = create_client_from_config()
     return _client
 
@@ -68,44 +57,12 @@ class _LlmConfigProxy:
 llm_config = _LlmConfigProxy()
 
 
-def _get_api_key() -> str:
-    """获取 API key（优先使用新的统一 key）"""
-    config, llm_cfg = _load_config()
-
-    # 优先使用新的统一 key
-    api_key = config.get('wavespeed_api_key')
-    if api_key:
-        return api_key
-
-    # 向后兼容：尝试从旧位置读取
-    api_key = (
-        config.get('image_gen', {}).get('wavespeed_api')
-        or config.get('video_gen', {}).get('wavespeed_api')
-        or llm_cfg.get('openai_api_key')
-    )
-    return api_key
-
-
 def _encode_image_to_base64(image_path: str) -> str:
     """
-    encode image file to base64 data URI
+    encode image file to base64 data URI (chunked, cached by path/mtime/size)
     """
     try:
-        ext = os.path.splitext(image_path)[1].lower()
-        mime_types = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-        }
-        mime_type = mime_types.get(ext)
-        if not mime_type:
-            raise ValueError(f"not support: {ext}")
-
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        return f"data:{mime_type};base64,{encoded_string}"
+        return encode_data_uri(image_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"image file not found: {image_path}")
     except Exception as e:
@@ -118,7 +75,8 @@ def _extract_and_encode_video_frames(
     maintain_aspect_ratio: bool = True
 ) -> List[str]:
     """    
-    use decord for video processing for better performance
+    extract uniformly sampled frames with the shared frame sampler in the media process pool
+    (one sequential decode pass, encoded JPEG frames cached per video hash, see utils.frame_sampler)
     
     Args:
         video_path: video path
@@ -132,78 +90,80 @@ def _extract_and_encode_video_frames(
     Returns:
         List of base64 encoded frames
     """
+    from .frame_sampler import sample_in_pool, sample_video_frames, to_data_uri
+
     try:
-        vr = VideoReader(video_path, ctx=cpu(0))
-        total_frames = len(vr)
-        if total_frames <= 0:
+        # decoded and JPEG-encoded in the media process pool
+        frames = sample_in_pool(
+            sample_video_frames,
+            video_path,
+            count=frames_to_extract,
+            target_resolution=target_resolution,
+            maintain_aspect_ratio=maintain_aspect_ratio
+        )
+        if not frames:
             raise ValueError("Video has no frames")
-        
-        num_frames = min(frames_to_extract, total_frames)
-        base64_frames = []
-        
-        if num_frames == 1:
-            indices = [0]
-        else:
-            indices = np.linspace(0, total_frames - 1, num_frames, dtype=int).tolist()
-        
-        frames = vr.get_batch(indices).asnumpy()
-        
-        for frame in frames:
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            if target_resolution is not None:
-                frame_bgr = _resize_frame(frame_bgr, target_resolution, maintain_aspect_ratio)
-            
-            _, buffer = cv2.imencode(".jpg", frame_bgr)
-            encoded_string = base64.b64encode(buffer).decode("utf-8")
-            base64_frames.append(f"data:image/jpeg;base64,{encoded_string}")
-        
-        return base64_frames
-        
+        return [to_data_uri(frame) for frame in frames]
+    except Exception as e:
+        raise RuntimeError(f"process video failed {video_path}: {e}")
+
+
+# default payload budget of adaptively selected video frames (JPEG bytes, before base64)
+ADAPTIVE_FRAMES_MAX_BYTES = 4 * 1024 * 1024
+
+
+def _extract_adaptive_video_frames(
+    video_path: str,
+    max_frames: int = 32,
+    max_bytes: Optional[int] = ADAPTIVE_FRAMES_MAX_BYTES,
+    target_resolution: Optional[Union[Tuple[int, int], int]] = (360, 420),
+    maintain_aspect_ratio: bool = True,
+    threshold: Optional[float] = None
+) -> List[str]:
+    """
+    select frames by scene change and motion instead of uniform spacing
+
+    candidate frames are decoded once, compared by color histogram and downscaled
+    grayscale difference, and near-duplicates are dropped; the result stays within
+    max_frames and max_bytes (see utils.frame_sampler.sample_scene_frames)
+
+    Returns:
+        List of base64 encoded frames in temporal order
+    """
+    from .frame_sampler import sample_in_pool, sample_scene_frames, to_data_uri
+
+    kwargs = {}
+    if threshold is not None:
+        kwargs["threshold"] = threshold
+    try:
+        # decoded, scored and JPEG-encoded in the media process pool
+        frames = sample_in_pool(
+            sample_scene_frames,
+            video_path,
+            max_frames=max_frames,
+            max_bytes=max_bytes,
+            target_resolution=target_resolution,
+            maintain_aspect_ratio=maintain_aspect_ratio,
+            **kwargs
+        )
+        if not frames:
+            raise ValueError("Video has no frames")
+        return [to_data_uri(frame) for frame in frames]
     except Exception as e:
         raise RuntimeError(f"process video failed {video_path}: {e}")
 
 
 def _resize_frame(
-    frame: np.ndarray, 
+    frame: "np.ndarray", 
     target_resolution: Union[Tuple[int, int], int], 
     maintain_aspect_ratio: bool = True
-) -> np.ndarray:
+) -> "np.ndarray":
     """
     resize frame to target resolution
     """
-    if isinstance(target_resolution, int):
-        h, w = frame.shape[:2]
-        if w < h:
-            new_w = target_resolution
-            new_h = int(h * target_resolution / w)
-        else:
-            new_h = target_resolution
-            new_w = int(w * target_resolution / h)
-        return cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
-    
-    elif isinstance(target_resolution, tuple):
-        target_w, target_h = target_resolution
-        
-        if not maintain_aspect_ratio:
-            return cv2.resize(frame, (target_w, target_h), interpolation=cv2.INTER_LANCZOS4)
-        else:
-            h, w = frame.shape[:2]
-            
-            scale = min(target_w / w, target_h / h)
-            new_w = int(w * scale)
-            new_h = int(h * scale)
-            
-            resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
-            
-            result = np.zeros((target_h, target_w, 3), dtype=np.uint8)
-            
-            y_offset = (target_h - new_h) // 2
-            x_offset = (target_w - new_w) // 2
-            
-            result[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
-            
-            return result
+    from .frame_sampler import resize_frame
+
+    return resize_frame(frame, target_resolution, maintain_aspect_ratio)
 
 
 def prepare_multimodal_messages_openai_format(
@@ -212,7 +172,16 @@ def prepare_multimodal_messages_openai_format(
     video_paths: Optional[List[str]] = None,
     video_frames_to_extract: int = 10,
     existing_messages: Optional[List[Dict]] = None,
+    video_frame_selection: str = "uniform",
+    video_max_bytes: Optional[int] = ADAPTIVE_FRAMES_MAX_BYTES,
 ) -> List[Dict]:
+    """
+    build an OpenAI-format user message with text, images and video frames
+
+    video_frame_selection: "uniform" extracts video_frames_to_extract evenly spaced frames,
+    "adaptive" treats video_frames_to_extract as an upper bound and picks frames by
+    scene change within video_max_bytes
+    """
     messages = list(existing_messages) if existing_messages else []
     
     content_parts = []
@@ -229,7 +198,12 @@ def prepare_multimodal_messages_openai_format(
 
     if video_paths:
         for path in video_paths:
-            base64_frames = _extract_and_encode_video_frames(path, video_frames_to_extract, (360, 420))
+            if video_frame_selection == "adaptive":
+                base64_frames = _extract_adaptive_video_frames(
+                    path, video_frames_to_extract, video_max_bytes, (360, 420)
+                )
+            else:
+                base64_frames = _extract_and_encode_video_frames(path, video_frames_to_extract, (360, 420))
             for frame_data in base64_frames:
                 content_parts.append({
                     "type": "image_url",
@@ -251,8 +225,10 @@ def query_openrouter(
     messages: list[dict],
     max_tokens: int = 6024,
     temperature: float = 0.7,
-    base_url: str = "https://openrouter.ai/api/v1"
+    base_url: Optional[str] = None
 ) -> dict:
+    # 未指定 base_url 时使用配置中的 upstreams.openrouter_base_url
+    base_url = (base_url or get_settings().upstreams.openrouter_base_url).rstrip("/")
     url = f"{base_url}/chat/completions"
     
     headers = {
@@ -270,7 +246,7 @@ def query_openrouter(
     }
     
     try:
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = upstream_session.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         
         data = resp.json()
@@ -350,7 +326,7 @@ def query_gemini(
         }
     }
 
-    resp = requests.post(url, headers=headers, json=payload)
+    resp = upstream_session.post(url, headers=headers, json=payload)
     resp.raise_for_status()
     res = resp.json()
     res = res['candidates'][0]['content']['parts'][0]['text']
@@ -361,15 +337,20 @@ def prepare_video_messages(
     text_prompt: str,
     fps: float = 1.0
 ) -> List[Dict]:
+    import cv2
+    from .frame_sampler import sample_video_frames
+
     try:
-        vr = VideoReader(video_path)
-        frame_indices = range(0, len(vr), int(vr.get_avg_fps() / fps))
-        frames = vr.get_batch(frame_indices).asnumpy()
+        cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        avg_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+        cap.release()
+        step = max(int(avg_fps / fps), 1)
+        frames = sample_video_frames(video_path, count=len(range(0, total_frames, step)))
 
         content = []
         for frame in frames:
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_b64 = base64.b64encode(buffer).decode('utf-8')
+            frame_b64 = base64.b64encode(frame).decode('utf-8')
             
             content.append({
                 "type": "image",
@@ -398,19 +379,16 @@ def prepare_video_messages(
 def refine_gen_prompt(prompt: str, media_type: str = "image") -> str:
     """优化生成提示词 - 使用 WavespeedClient"""
     if media_type == "image":
-        with open("prompts/generation/keyframe_refine.txt", "r") as f:
-            ins_prompt = f.read()
+        ins_prompt = prompt_text("generation/keyframe_refine")
     elif media_type == "video":
-        with open("prompts/generation/t2v_refine_prompt.txt", "r") as f:
-            ins_prompt = f.read()
+        ins_prompt = prompt_text("generation/t2v_refine_prompt")
     elif media_type == "character":
-        with open("prompts/generation/character_prompt_refine.txt", "r") as f:
-            ins_prompt = f.read()
+        ins_prompt = prompt_text("generation/character_prompt_refine")
     text = f"{ins_prompt}\n\n{prompt}"
     message = prepare_multimodal_messages_openai_format(text)
 
     _, llm_cfg = _load_config()
-    api_key = _get_api_key()
+    api_key = get_settings().wavespeed_api_key
 
     if not api_key:
         raise ValueError("No API key found. Please set wavespeed_api_key in config.")
@@ -444,10 +422,11 @@ def refine_gen_prompt(prompt: str, media_type: str = "image") -> str:
 
 
 def audio_prompt_gen(video_path: str) -> str:
-    with open("prompts/generation/audio_prompt.txt", "r") as f:
-        ins_prompt = f.read()
+    ins_prompt = prompt_text("generation/audio_prompt")
     
-    message = prepare_multimodal_messages_openai_format(ins_prompt, video_paths=[video_path], video_frames_to_extract=64)
+    message = prepare_multimodal_messages_openai_format(
+        ins_prompt, video_paths=[video_path], video_frames_to_extract=64, video_frame_selection="adaptive"
+    )
     _, llm_cfg = _load_config()
     response = query_openai(
         api_key=llm_cfg.get('openai_api_key', None),
@@ -465,10 +444,11 @@ def audio_prompt_gen(video_path: str) -> str:
 
 def speech_prompt_gen(video_path: str) -> str:
     """Generate speech content for video narration/dubbing based on video content."""
-    with open("prompts/generation/speech_prompt.txt", "r") as f:
-        ins_prompt = f.read()
+    ins_prompt = prompt_text("generation/speech_prompt")
     
-    message = prepare_multimodal_messages_openai_format(ins_prompt, video_paths=[video_path], video_frames_to_extract=64)
+    message = prepare_multimodal_messages_openai_format(
+        ins_prompt, video_paths=[video_path], video_frames_to_extract=64, video_frame_selection="adaptive"
+    )
     _, llm_cfg = _load_config()
     response = query_openai(
         api_key=llm_cfg.get('openai_api_key', None),
@@ -484,16 +464,25 @@ def speech_prompt_gen(video_path: str) -> str:
     return speech_text
 
 
-def multimodal_query(prompt: str, image_path: str=None , video_path: str=None, video_frames_to_extract: int=256):
-    """多模态查询 - 使用 WavespeedClient"""
+def multimodal_query(prompt: str, image_path: str=None , video_path: str=None, video_frames_to_extract: int=256,
+                     video_frame_selection: str = "adaptive",
+                     video_max_bytes: Optional[int] = ADAPTIVE_FRAMES_MAX_BYTES):
+    """
+    多模态查询 - 使用 WavespeedClient
+
+    视频默认按场景变化自适应选帧：video_frames_to_extract 为帧数上限，
+    video_max_bytes 为帧总字节数上限，近似重复的帧不会发送。
+    """
     multimodal_messages = prepare_multimodal_messages_openai_format(
                             prompt_text=prompt,
                             image_paths=[image_path] if image_path else None,
                             video_paths=[video_path] if video_path else None,
                             video_frames_to_extract=video_frames_to_extract if video_path else None,
+                            video_frame_selection=video_frame_selection,
+                            video_max_bytes=video_max_bytes,
                         )
 
-    api_key = _get_api_key()
+    api_key = get_settings().wavespeed_api_key
     if not api_key:
         raise ValueError("No API key found. Please set wavespeed_api_key in config.")
 
@@ -0,0 +1,41 @@
+"""
+上游服务限流
+
+每个上游服务（wavespeed、oss 等）一个令牌桶，速率取自配置 performance.rate_limits
+（每分钟最大请求数），每次获取令牌时读取当前配置，修改配置后立即生效。
+未配置或配置为 0 的服务不限流。进程内共享，线程安全。
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+
+from .settings import get_settings
+
+# 令牌桶容量相当于多少秒的配额（允许的突发量）
+BURST_SECONDS = 5.0
+
+_buckets: Dict[str, Tuple[float, float]] = {}
+_lock = threading.Lock()
+
+
+def _reserve(name: str, per_minute: float) -> float:
+    """预占一个令牌，返回需要等待的秒数"""
+    rate = per_minute / 60.0
+    capacity = max(1.0, rate * BURST_SECONDS)
+    now = time.monotonic()
+    with _lock:
+        tokens, updated = _buckets.get(name, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate) - 1.0
+        _buckets[name] = (tokens, now)
+    return 0.0 if tokens >= 0 else -tokens / rate
+
+
+def acquire(name: str):
+    """获取上游服务 name 的一个请求配额，超出速率时阻塞等待"""
+    per_minute = get_settings().performance.rate_limits.get(name)
+    if not per_minute:
+        return
+    wait = _reserve(name, per_minute)
+    if wait > 0:
+        time.sleep(wait)
@@ -0,0 +1,159 @@
+"""
+生成任务的模型路由：截止时间、对冲请求和故障转移
+
+按 routing.<工具类型>.<优先级> 的策略（utils.settings.RoutePolicy）执行一次生成：
+- 截止时间：该模型最近成功任务从提交到上游完成的耗时 p95 × deadline_factor（历史记录来自用量台账，
+  见 utils.progress），限制在 min_deadline ~ max_deadline 之间，没有历史记录时为 max_deadline
+- 对冲：超过截止时间仍未完成时，把同一请求提交到 hedge 中配置的等价模型，两个同时等待，先成功的结果生效
+- 故障转移：截止时间之前失败时，立即提交到等价模型
+- 落败的一方通过 utils.metrics.bind_cancel_event 取消，之后的轮询抛出 UpstreamCancelled 而退出
+  （WaveSpeed 已提交的 prediction 不会撤回，只是不再等待）
+
+没有配置策略的工具类型和优先级直接执行，行为与之前相同。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import TASK_HEDGES, bind_cancel_event, current_task
+from .progress import get_history
+from .settings import RoutePolicy, get_settings
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY = "normal"
+
+# 一次生成：参数为模型名，返回包含 success 的结果字典
+Attempt = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+def get_policy(tool_type: str, priority: Optional[str] = None) -> Optional[RoutePolicy]:
+    """工具类型和优先级对应的策略，未配置该优先级时使用 normal，均未配置时返回 None"""
+    policies = get_settings().routing.get(tool_type) or {}
+    return policies.get(priority or DEFAULT_PRIORITY) or policies.get(DEFAULT_PRIORITY)
+
+
+def deadline_seconds(policy: RoutePolicy, tool_type: str, model: str) -> float:
+    """按历史耗时 p95 计算截止时间（秒）"""
+    history = get_history(tool_type, model)
+    p95 = history.percentile("upstream", 0.95) if history is not None else None
+    if not p95:
+        return policy.max_deadline
+    return min(policy.max_deadline, max(policy.min_deadline, p95 * policy.deadline_factor))
+
+
+async def _run_attempt(attempt: Attempt, model: str, cancel: threading.Event) -> Dict[str, Any]:
+    # 每个 asyncio 任务有自己的上下文副本，取消标记只作用于这一次尝试（包括其中的线程）
+    bind_cancel_event(cancel)
+    try:
+        return await attempt(model)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+async def run_with_policy(tool_type: str, model: str, attempt: Attempt,
+                          priority: Optional[str] = None) -> Dict[str, Any]:
+    """
+    按路由策略执行生成
+
+    Args:
+        tool_type: 工具类型
+        model: 请求的模型（未指定模型的工具为 default）
+        attempt: 以模型名调用的生成函数
+        priority: 任务优先级（默认 normal）
+
+    Returns:
+        先成功的一次生成的结果（都失败时为最后一次失败的结果），配置了策略时附带
+        routing: {"model": 生成结果的模型, "hedged": 是否提交过等价模型, "deadline": 截止时间}
+    """
+    policy = get_policy(tool_type, priority)
+    if policy is None:
+        return await attempt(model)
+
+    deadline = await asyncio.to_thread(deadline_seconds, policy, tool_type, model)
+    hedge_model = policy.hedge.get(model)
+    hedge_reason: Optional[str] = None
+    started = time.monotonic()
+    # asyncio 任务 -> (模型, 取消标记)
+    attempts: Dict[asyncio.Task, Tuple[str, threading.Event]] = {}
+
+    def submit(target: str) -> asyncio.Task:
+        cancel = threading.Event()
+        task = asyncio.create_task(_run_attempt(attempt, target, cancel))
+        attempts[task] = (target, cancel)
+        return task
+
+    def cancel_pending():
+        for task, (_, cancel) in attempts.items():
+            if not task.done():
+                cancel.set()
+                task.cancel()
+
+    def finish(result: Dict[str, Any], winner: Optional[asyncio.Task]) -> Dict[str, Any]:
+        cancel_pending()
+        if hedge_reason is not None:
+            outcome = "none" if winner is None else ("primary" if winner is primary else "hedge")
+            TASK_HEDGES.labels(tool_type, model, hedge_reason, outcome).inc()
+        result["routing"] = {
+            "model": attempts[winner][0] if winner is not None else None,
+            "hedged": hedge_reason is not None,
+            "deadline": round(deadline, 1),
+        }
+        return result
+
+    def hedge(reason: str):
+        nonlocal hedge_reason
+        hedge_reason = reason
+        cause = f"超过截止时间 {deadline:.0f} 秒" if reason == "deadline" else "生成失败"
+        logger.warning(f"{tool_type} 模型 {model} {cause}，提交到等价模型 {hedge_model}")
+        timer = current_task()
+        if timer is not None:
+            timer.hedged = True
+        span = current_span()
+        if span is not None:
+            span.add_event("hedge", {"reason": reason, "model": model, "hedge_model": hedge_model})
+        submit(hedge_model)
+
+    primary = submit(model)
+    last_result: Dict[str, Any] = {"success": False, "error": "生成失败"}
+    try:
+        while True:
+            pending = [task for task in attempts if not task.done()]
+            if not pending:
+                if hedge_model and hedge_reason is None:
+                    hedge("failover")
+                    continue
+                return finish(last_result, None)
+
+            now = time.monotonic()
+            waits = []
+            if hedge_model and hedge_reason is None:
+                waits.append(started + deadline - now)
+            if policy.timeout:
+                waits.append(started + policy.timeout - now)
+            timeout = max(0.0, min(waits)) if waits else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                result = task.result()
+                if result.get("success"):
+                    return finish(result, task)
+                last_result = result
+                logger.warning(f"{tool_type} 模型 {attempts[task][0]} 生成失败: {result.get('error')}")
+            if done:
+                continue
+
+            now = time.monotonic()
+            if policy.timeout and now >= started + policy.timeout:
+                return finish({"success": False, "error": f"超过 {policy.timeout:g} 秒仍未生成完成"}, None)
+            if hedge_model and hedge_reason is None and now >= started + deadline:
+                hedge("deadline")
+    except asyncio.CancelledError:
+        cancel_pending()
+        raise
@@ -0,0 +1,56 @@
+# 统一配置服务
+# 加载、热更新和 Settings 汇总在 loader.py，各配置段的类型和解析按功能分在同目录的模块中；
+# 这里统一导出，保持 `from utils.settings import get_settings` 等用法不变
+
+from .base import SettingsError
+from .loader import (
+    CONFIG_PATH,
+    RELOAD_CHECK_INTERVAL,
+    SERVER_DIR,
+    Settings,
+    add_reload_listener,
+    get_settings,
+    install_reload_signal,
+    load_settings,
+    parse_settings,
+    reload_settings,
+)
+from .observability import LoopWatchdogSettings, MetricsSettings, ProfilingSettings, TracingSettings
+from .performance import PerformanceSettings
+from .storage import StorageSettings, TaskSettings
+from .upstreams import (
+    DEFAULT_OPENROUTER_BASE_URL,
+    DEFAULT_WAVESPEED_BASE_URL,
+    LLMSettings,
+    OSSSettings,
+    UpstreamSettings,
+)
+from .usage import RoutePolicy, UsageSettings
+
+__all__ = [
+    'CONFIG_PATH',
+    'RELOAD_CHECK_INTERVAL',
+    'SERVER_DIR',
+    'Settings',
+    'SettingsError',
+    'add_reload_listener',
+    'get_settings',
+    'install_reload_signal',
+    'load_settings',
+    'parse_settings',
+    'reload_settings',
+    'LLMSettings',
+    'OSSSettings',
+    'UpstreamSettings',
+    'DEFAULT_WAVESPEED_BASE_URL',
+    'DEFAULT_OPENROUTER_BASE_URL',
+    'StorageSettings',
+    'TaskSettings',
+    'MetricsSettings',
+    'TracingSettings',
+    'LoopWatchdogSettings',
+    'ProfilingSettings',
+    'UsageSettings',
+    'RoutePolicy',
+    'PerformanceSettings',
+]
@@ -0,0 +1,40 @@
+"""
+配置解析的公共部分：错误类型和按类型读取配置项
+"""
+
+from typing import Any, Dict
+
+
+class SettingsError(ValueError):
+    """配置文件无法解析或配置项类型错误"""
+    pass
+
+
+def section(raw: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """读取字典类型的配置段，未设置时返回空字典"""
+    value = raw.get(name)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise SettingsError(f"配置项 '{name}' 应为字典，实际为 {type(value).__name__}")
+    return value
+
+
+def number(values: Dict[str, Any], name: str, kind: type, prefix: str, minimum: float = 0):
+    """读取数字配置项，未设置时返回 None"""
+    value = values.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise SettingsError(f"配置项 '{prefix}.{name}' 应为数字，实际为 {value!r}")
+    if value < minimum:
+        raise SettingsError(f"配置项 '{prefix}.{name}' 不能小于 {minimum}，实际为 {value!r}")
+    return kind(value)
+
+
+def flag(values: Dict[str, Any], name: str, default: bool, prefix: str) -> bool:
+    """读取布尔配置项，未设置时返回 default"""
+    value = values.get(name, default)
+    if not isinstance(value, bool):
+        raise SettingsError(f"配置项 '{prefix}.{name}' 应为 true 或 false，实际为 {value!r}")
+    return value
@@ -0,0 +1,236 @@
+"""
+配置加载和热更新
+
+config/config.yaml 只在进程内加载一次并解析为类型化的 Settings 对象：
+- get_settings() 返回缓存的配置；每隔 RELOAD_CHECK_INTERVAL 秒检查一次文件修改时间，变化时自动重新加载
+- 收到 SIGHUP 时立即重新加载（install_reload_signal()，在应用启动时调用）
+- 重新加载失败（YAML 语法错误、类型错误）时保留上一份有效配置并记录错误
+- performance 段包含进程池大小、缓存大小和上游限流，修改后无需重启服务即可生效：
+  各模块通过 add_reload_listener() 注册回调，在配置加载或变化时应用新值
+
+配置文件路径可通过环境变量 COMICMAKER_CONFIG 覆盖。
+"""
+
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from .base import SettingsError, section
+from .observability import (
+    LoopWatchdogSettings, MetricsSettings, ProfilingSettings, TracingSettings,
+    parse_loop_watchdog, parse_metrics, parse_profiling, parse_tracing,
+)
+from .performance import PerformanceSettings, parse_performance
+from .storage import StorageSettings, TaskSettings, parse_storage, parse_tasks
+from .upstreams import LLMSettings, OSSSettings, UpstreamSettings, parse_llm, parse_oss, parse_upstreams
+from .usage import RoutePolicy, UsageSettings, parse_routing, parse_usage
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_PATH = os.environ.get("COMICMAKER_CONFIG", os.path.join(SERVER_DIR, "config", "config.yaml"))
+# 两次检查配置文件修改时间的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    类型化配置
+
+    raw 保留原始配置字典，供仍按字典读取的旧代码使用，不应修改。
+    """
+    path: str
+    exists: bool
+    mtime_ns: int
+    raw: Dict[str, Any]
+    llm: LLMSettings
+    oss: OSSSettings
+    upstreams: UpstreamSettings
+    storage: StorageSettings
+    tasks: TaskSettings
+    metrics: MetricsSettings
+    tracing: TracingSettings
+    loop_watchdog: LoopWatchdogSettings
+    profiling: ProfilingSettings
+    usage: UsageSettings
+    routing: Dict[str, Dict[str, RoutePolicy]]
+    performance: PerformanceSettings
+    image_gen: Dict[str, Any]
+    video_gen: Dict[str, Any]
+
+    @property
+    def wavespeed_api_key(self) -> Optional[str]:
+        """统一的 WaveSpeed API Key（兼容旧配置位置）"""
+        return (
+            self.raw.get("wavespeed_api_key")
+            or self.image_gen.get("wavespeed_api")
+            or self.video_gen.get("wavespeed_api")
+            or self.llm.openai_api_key
+        )
+
+    def warnings(self) -> List[str]:
+        """不影响启动但值得提示的配置问题"""
+        problems = []
+        if not self.exists:
+            problems.append(f"配置文件不存在: {self.path}")
+            return problems
+        if not self.wavespeed_api_key:
+            problems.append("未配置 wavespeed_api_key，生成类接口将不可用")
+        if not self.llm.model:
+            problems.append("未配置 llm.model")
+        return problems
+
+
+def parse_settings(raw: Any, path: str = CONFIG_PATH, exists: bool = True, mtime_ns: int = 0) -> Settings:
+    """
+    把配置字典解析为 Settings
+
+    Raises:
+        SettingsError: 配置结构或类型错误
+    """
+    if raw is None:
+        raw = {}
+    if not isinstance(raw, dict):
+        raise SettingsError(f"配置文件顶层应为字典: {path}")
+
+    return Settings(
+        path=path,
+        exists=exists,
+        mtime_ns=mtime_ns,
+        raw=raw,
+        llm=parse_llm(raw),
+        oss=parse_oss(raw),
+        upstreams=parse_upstreams(raw),
+        storage=parse_storage(raw),
+        tasks=parse_tasks(raw),
+        metrics=parse_metrics(raw),
+        tracing=parse_tracing(raw),
+        loop_watchdog=parse_loop_watchdog(raw),
+        profiling=parse_profiling(raw),
+        usage=parse_usage(raw),
+        routing=parse_routing(raw),
+        performance=parse_performance(raw),
+        image_gen=section(raw, "image_gen"),
+        video_gen=section(raw, "video_gen"),
+    )
+
+
+def load_settings(path: str = CONFIG_PATH) -> Settings:
+    """
+    从文件加载配置（不使用缓存）
+
+    文件不存在时返回空配置（exists=False）。
+
+    Raises:
+        SettingsError: YAML 语法错误或配置类型错误
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return parse_settings({}, path=path, exists=False)
+
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            raw = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise SettingsError(f"配置文件解析失败: {path}: {e}")
+    return parse_settings(raw, path=path, mtime_ns=mtime_ns)
+
+
+_settings: Optional[Settings] = None
+_last_check = 0.0
+# 加载失败的配置文件修改时间，避免对同一份错误配置反复重试和记录日志
+_failed_mtime_ns: Optional[int] = None
+_lock = threading.RLock()
+_listeners: List[Callable[[Settings], None]] = []
+
+
+def _current_mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _notify_one(listener: Callable[[Settings], None], settings: Settings):
+    try:
+        listener(settings)
+    except Exception as e:
+        logger.error(f"应用配置失败: {getattr(listener, '__qualname__', listener)}: {e}")
+
+
+def _notify(settings: Settings):
+    for listener in list(_listeners):
+        _notify_one(listener, settings)
+
+
+def reload_settings() -> Settings:
+    """
+    立即重新加载配置文件
+
+    首次加载失败时抛出 SettingsError；之后的重新加载失败只记录错误并保留当前配置。
+    """
+    global _settings, _last_check, _failed_mtime_ns
+    with _lock:
+        _last_check = time.monotonic()
+        try:
+            settings = load_settings(CONFIG_PATH)
+        except (SettingsError, OSError) as e:
+            if _settings is None:
+                raise
+            _failed_mtime_ns = _current_mtime_ns(CONFIG_PATH)
+            logger.error(f"重新加载配置失败，继续使用当前配置: {e}")
+            return _settings
+        first_load = _settings is None
+        _settings = settings
+        if not first_load:
+            logger.info(f"配置已重新加载: {CONFIG_PATH}")
+    _notify(settings)
+    return settings
+
+
+def get_settings() -> Settings:
+    """获取当前配置（配置文件修改后自动重新加载）"""
+    global _last_check
+    settings = _settings
+    if settings is None:
+        return reload_settings()
+    if time.monotonic() - _last_check < RELOAD_CHECK_INTERVAL:
+        return settings
+    with _lock:
+        _last_check = time.monotonic()
+        mtime_ns = _current_mtime_ns(CONFIG_PATH)
+        changed = mtime_ns != _settings.mtime_ns and mtime_ns != _failed_mtime_ns
+    return reload_settings() if changed else _settings
+
+
+def add_reload_listener(listener: Callable[[Settings], None]):
+    """
+    注册配置变化回调
+
+    回调在每次加载配置后调用；注册时如果配置已加载，会立即以当前配置调用一次。
+    """
+    with _lock:
+        _listeners.append(listener)
+        settings = _settings
+    if settings is not None:
+        _notify_one(listener, settings)
+
+
+def install_reload_signal():
+    """收到 SIGHUP 时重新加载配置（须在主线程调用）"""
+    if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+        return
+
+    def _handle(signum, frame):
+        # 信号处理函数中不做文件 IO，交给后台线程
+        threading.Thread(target=reload_settings, name="settings-reload", daemon=True).start()
+
+    signal.signal(signal.SIGHUP, _handle)
@@ -0,0 +1,109 @@
+"""
+运行观测配置：指标、任务追踪、事件循环阻塞监控和采样分析（metrics、tracing、loop_watchdog、profiling 段）
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .base import SettingsError, flag, number, section
+
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    """
+    运行指标（GET /metrics，进程启动时生效，修改后需重启）
+
+    Attributes:
+        dir: 同一台机器上各进程写入指标的目录，默认为临时目录下按数据目录区分的子目录
+        flush_seconds: 每个进程写入指标的间隔（秒），/metrics 中其他进程的值最多滞后这么久
+    """
+    dir: Optional[str] = None
+    flush_seconds: float = 5.0
+
+
+@dataclass(frozen=True)
+class TracingSettings:
+    """
+    任务追踪（进程启动后首次记录 span 时生效，修改后需重启）
+
+    Attributes:
+        exporter: file（按天写入 JSON Lines 文件）、console（写入日志）或 none（不导出）
+        dir: file 导出器的目录，默认为 server/logs/traces
+        keep_days: file 导出器保留的天数，0 表示不删除
+    """
+    exporter: str = "file"
+    dir: Optional[str] = None
+    keep_days: int = 7
+
+
+@dataclass(frozen=True)
+class LoopWatchdogSettings:
+    """
+    事件循环阻塞监控（进程启动时生效，修改后需重启）
+
+    Attributes:
+        enabled: 是否启用
+        interval: 心跳间隔（秒），也是延迟的测量精度
+        threshold: 事件循环阻塞超过这么久（秒）时抓取调用栈并写入日志
+    """
+    enabled: bool = True
+    interval: float = 0.1
+    threshold: float = 0.5
+
+
+@dataclass(frozen=True)
+class ProfilingSettings:
+    """
+    按需采样分析（修改后自动生效；API 进程和 worker 进程是否响应 /api/admin/profile 在启动时决定）
+
+    Attributes:
+        token: 请求头 X-Profile-Token / 查询参数 _profile 以及 /api/admin/profile 需要提供的令牌，未设置时关闭
+        dir: 火焰图和进程采样请求的目录，默认为 server/logs/profiles
+        interval: 采样间隔（秒）
+        max_seconds: /api/admin/profile 单次采样的最长时间（秒）
+    """
+    token: Optional[str] = None
+    dir: Optional[str] = None
+    interval: float = 0.005
+    max_seconds: float = 120.0
+
+
+def parse_metrics(raw: Dict[str, Any]) -> MetricsSettings:
+    metrics = section(raw, "metrics")
+    flush_seconds = number(metrics, "flush_seconds", float, "metrics", 0.1)
+    return MetricsSettings(
+        dir=metrics.get("dir") or None,
+        flush_seconds=MetricsSettings.flush_seconds if flush_seconds is None else flush_seconds,
+    )
+
+
+def parse_tracing(raw: Dict[str, Any]) -> TracingSettings:
+    tracing = section(raw, "tracing")
+    exporter = tracing.get("exporter") or TracingSettings.exporter
+    if exporter not in ("file", "console", "none"):
+        raise SettingsError(f"配置项 'tracing.exporter' 应为 file、console 或 none，实际为 {exporter!r}")
+    keep_days = number(tracing, "keep_days", int, "tracing")
+    return TracingSettings(
+        exporter=exporter,
+        dir=tracing.get("dir") or None,
+        keep_days=TracingSettings.keep_days if keep_days is None else keep_days,
+    )
+
+
+def parse_loop_watchdog(raw: Dict[str, Any]) -> LoopWatchdogSettings:
+    loop_watchdog = section(raw, "loop_watchdog")
+    return LoopWatchdogSettings(
+        enabled=flag(loop_watchdog, "enabled", LoopWatchdogSettings.enabled, "loop_watchdog"),
+        interval=number(loop_watchdog, "interval", float, "loop_watchdog", 0.01) or LoopWatchdogSettings.interval,
+        threshold=number(loop_watchdog, "threshold", float, "loop_watchdog", 0.01) or LoopWatchdogSettings.threshold,
+    )
+
+
+def parse_profiling(raw: Dict[str, Any]) -> ProfilingSettings:
+    profiling = section(raw, "profiling")
+    return ProfilingSettings(
+        token=str(profiling["token"]) if profiling.get("token") else None,
+        dir=profiling.get("dir") or None,
+        interval=number(profiling, "interval", float, "profiling", 0.001) or ProfilingSettings.interval,
+        max_seconds=number(profiling, "max_seconds", float, "profiling", 1) or ProfilingSettings.max_seconds,
+    )
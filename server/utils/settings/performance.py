@@ -0,0 +1,50 @@
+"""
+性能参数配置（performance 段，修改后自动生效）
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .base import number, section
+
+
+@dataclass(frozen=True)
+class PerformanceSettings:
+    """
+    性能相关配置，未设置的项（None）使用各模块内置的默认值
+
+    Attributes:
+        media_pool_workers: 媒体进程池工作进程数
+        media_pool_max_tasks_per_child: 每个媒体工作进程最多执行的任务数
+        media_job_timeout: 媒体任务默认超时（秒）
+        frame_cache_mb: 视频抽帧内存缓存上限（MB）
+        frame_disk_cache_mb: 视频抽帧磁盘缓存上限（MB），0 表示不限制
+        frame_disk_cache_days: 视频抽帧磁盘缓存保留天数（按最近使用时间），0 表示不限制
+        encoding_cache_mb: base64 编码内存缓存上限（MB）
+        rate_limits: 上游服务名 -> 每分钟最大请求数（0 表示不限制）
+    """
+    media_pool_workers: Optional[int] = None
+    media_pool_max_tasks_per_child: Optional[int] = None
+    media_job_timeout: Optional[float] = None
+    frame_cache_mb: Optional[int] = None
+    frame_disk_cache_mb: Optional[int] = None
+    frame_disk_cache_days: Optional[float] = None
+    encoding_cache_mb: Optional[int] = None
+    rate_limits: Dict[str, float] = field(default_factory=dict)
+
+
+def parse_performance(raw: Dict[str, Any]) -> PerformanceSettings:
+    performance = section(raw, "performance")
+    rate_limits = section(performance, "rate_limits")
+    for name in rate_limits:
+        number(rate_limits, name, float, "performance.rate_limits")
+    return PerformanceSettings(
+        media_pool_workers=number(performance, "media_pool_workers", int, "performance", 1),
+        media_pool_max_tasks_per_child=number(performance, "media_pool_max_tasks_per_child", int, "performance"),
+        media_job_timeout=number(performance, "media_job_timeout", float, "performance"),
+        frame_cache_mb=number(performance, "frame_cache_mb", int, "performance"),
+        frame_disk_cache_mb=number(performance, "frame_disk_cache_mb", int, "performance"),
+        frame_disk_cache_days=number(performance, "frame_disk_cache_days", float, "performance"),
+        encoding_cache_mb=number(performance, "encoding_cache_mb", int, "performance"),
+        rate_limits={name: float(value) for name, value in rate_limits.items()},
+    )
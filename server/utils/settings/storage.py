@@ -0,0 +1,106 @@
+"""
+数据存储后端和任务队列配置（storage、tasks 段，进程启动时生效）
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .base import SettingsError, number, section
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """
+    数据存储后端配置（进程启动时生效，修改后需重启）
+
+    Attributes:
+        backend: local（本地目录）或 s3（S3 兼容对象存储，包括 MinIO、阿里云 OSS 的 S3 接口）
+        bucket: 对象存储 Bucket
+        endpoint_url: 对象存储地址，例如 http://127.0.0.1:9000
+        region: 区域
+        access_key_id / access_key_secret: 访问密钥
+        prefix: 对象键前缀
+        url_expires: 媒体签名 URL 有效期（秒）
+        public_base_url: 设置后媒体直接重定向到 public_base_url/<key>，不再签名
+        cache_validate_seconds: 本地缓存文件与对象存储比对的最小间隔（秒）
+    """
+    backend: str = "local"
+    bucket: Optional[str] = None
+    endpoint_url: Optional[str] = None
+    region: Optional[str] = None
+    access_key_id: Optional[str] = None
+    access_key_secret: Optional[str] = None
+    prefix: str = ""
+    url_expires: int = 3600
+    public_base_url: Optional[str] = None
+    cache_validate_seconds: float = 5.0
+
+
+@dataclass(frozen=True)
+class TaskSettings:
+    """
+    任务队列配置（进程启动时生效，修改后需重启）
+
+    Attributes:
+        broker: memory（API 进程内队列）、sqlite（同机多进程共享）或 redis（跨机器共享，兼容 Redis 协议的服务均可）
+        url: sqlite 为数据库文件路径（默认 data/tasks/queue.db），redis 为连接地址，例如 redis://127.0.0.1:6379/0
+        queue: 队列名
+        inline_workers: API 进程内执行任务的并发数；None 时 memory 队列为 32，其他为 0（全部交给 python -m worker）
+        worker_concurrency: 每个 python -m worker 进程同时执行的任务数
+        lease_seconds: 任务租约时长（秒），执行者在此期间未续约（例如进程崩溃）时任务重新入队
+        max_attempts: 任务最多被领取的次数，超过后标记为失败
+        drain_seconds: 进程退出时等待执行中任务完成的最长时间（秒），超时的任务交回队列，
+            已提交的上游 prediction 由接手的进程继续轮询并取回结果
+    """
+    broker: str = "memory"
+    url: Optional[str] = None
+    queue: str = "comicmaker:tasks"
+    inline_workers: Optional[int] = None
+    worker_concurrency: int = 4
+    lease_seconds: float = 300.0
+    max_attempts: int = 3
+    drain_seconds: float = 20.0
+
+
+def parse_storage(raw: Dict[str, Any]) -> StorageSettings:
+    storage = section(raw, "storage")
+    backend = storage.get("backend") or "local"
+    if backend not in ("local", "s3"):
+        raise SettingsError(f"配置项 'storage.backend' 应为 local 或 s3，实际为 {backend!r}")
+    if backend == "s3" and not storage.get("bucket"):
+        raise SettingsError("配置项 'storage.bucket' 在 s3 存储后端下必需")
+    url_expires = number(storage, "url_expires", int, "storage", 1)
+    cache_validate_seconds = number(storage, "cache_validate_seconds", float, "storage")
+    return StorageSettings(
+        backend=backend,
+        bucket=storage.get("bucket"),
+        endpoint_url=storage.get("endpoint_url"),
+        region=storage.get("region"),
+        access_key_id=storage.get("access_key_id"),
+        access_key_secret=storage.get("access_key_secret"),
+        prefix=(storage.get("prefix") or "").strip("/"),
+        url_expires=StorageSettings.url_expires if url_expires is None else url_expires,
+        public_base_url=storage.get("public_base_url"),
+        cache_validate_seconds=StorageSettings.cache_validate_seconds
+        if cache_validate_seconds is None else cache_validate_seconds,
+    )
+
+
+def parse_tasks(raw: Dict[str, Any]) -> TaskSettings:
+    tasks = section(raw, "tasks")
+    broker = tasks.get("broker") or "memory"
+    if broker not in ("memory", "sqlite", "redis"):
+        raise SettingsError(f"配置项 'tasks.broker' 应为 memory、sqlite 或 redis，实际为 {broker!r}")
+    if broker == "redis" and not tasks.get("url"):
+        raise SettingsError("配置项 'tasks.url' 在 redis 任务队列下必需")
+    drain_seconds = number(tasks, "drain_seconds", float, "tasks")
+    return TaskSettings(
+        broker=broker,
+        url=tasks.get("url") or None,
+        queue=tasks.get("queue") or TaskSettings.queue,
+        inline_workers=number(tasks, "inline_workers", int, "tasks"),
+        worker_concurrency=number(tasks, "worker_concurrency", int, "tasks", 1) or TaskSettings.worker_concurrency,
+        lease_seconds=number(tasks, "lease_seconds", float, "tasks", 10) or TaskSettings.lease_seconds,
+        max_attempts=number(tasks, "max_attempts", int, "tasks", 1) or TaskSettings.max_attempts,
+        drain_seconds=TaskSettings.drain_seconds if drain_seconds is None else drain_seconds,
+    )
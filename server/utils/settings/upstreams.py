@@ -0,0 +1,78 @@
+"""
+上游服务配置：LLM、OSS 和服务地址（llm、oss、upstreams 段）
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .base import section
+
+DEFAULT_WAVESPEED_BASE_URL = "https://api.wavespeed.ai/api/v3"
+DEFAULT_OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+@dataclass(frozen=True)
+class LLMSettings:
+    model: Optional[str] = None
+    openai_api_key: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class OSSSettings:
+    access_key_id: Optional[str] = None
+    access_key_secret: Optional[str] = None
+    endpoint: Optional[str] = None
+    bucket_name: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class UpstreamSettings:
+    """
+    上游服务地址（修改后自动生效）
+
+    压测或离线开发时可全部指向 scripts/mock_upstream.py 启动的本地模拟服务。
+
+    Attributes:
+        wavespeed_base_url: WaveSpeed API 地址（生成提交、prediction 轮询和 LLM）
+        openrouter_base_url: OpenRouter API 地址
+        oss_endpoint: 覆盖 oss.endpoint，例如 http://127.0.0.1:8900
+    """
+    wavespeed_base_url: str = DEFAULT_WAVESPEED_BASE_URL
+    openrouter_base_url: str = DEFAULT_OPENROUTER_BASE_URL
+    oss_endpoint: Optional[str] = None
+
+    def wavespeed_url(self, path: str) -> str:
+        """WaveSpeed 接口地址，path 如 bytedance/seedream-v4.5"""
+        return f"{self.wavespeed_base_url}/{path.lstrip('/')}"
+
+    def openrouter_url(self, path: str) -> str:
+        """OpenRouter 接口地址，path 如 chat/completions"""
+        return f"{self.openrouter_base_url}/{path.lstrip('/')}"
+
+
+def parse_llm(raw: Dict[str, Any]) -> LLMSettings:
+    llm = section(raw, "llm")
+    return LLMSettings(
+        model=llm.get("model"),
+        openai_api_key=llm.get("openai_api_key"),
+    )
+
+
+def parse_oss(raw: Dict[str, Any]) -> OSSSettings:
+    oss = section(raw, "oss")
+    upstreams = section(raw, "upstreams")
+    return OSSSettings(
+        access_key_id=oss.get("access_key_id"),
+        access_key_secret=oss.get("access_key_secret"),
+        endpoint=upstreams.get("oss_endpoint") or oss.get("endpoint"),
+        bucket_name=oss.get("bucket_name"),
+    )
+
+
+def parse_upstreams(raw: Dict[str, Any]) -> UpstreamSettings:
+    upstreams = section(raw, "upstreams")
+    return UpstreamSettings(
+        wavespeed_base_url=(upstreams.get("wavespeed_base_url") or DEFAULT_WAVESPEED_BASE_URL).rstrip("/"),
+        openrouter_base_url=(upstreams.get("openrouter_base_url") or DEFAULT_OPENROUTER_BASE_URL).rstrip("/"),
+        oss_endpoint=upstreams.get("oss_endpoint") or None,
+    )
@@ -0,0 +1,89 @@
+"""
+上游用量台账和模型路由配置（usage、routing 段，修改后自动生效）
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from .base import SettingsError, flag, number, section
+
+
+@dataclass(frozen=True)
+class UsageSettings:
+    """
+    上游用量台账（修改后自动生效）
+
+    Attributes:
+        enabled: 是否在任务结束时记录用量
+        prices: 模型 -> 价格，{"per_request": 每次, "per_second": 每秒输出时长}，
+            价格为数字或按分辨率区分的字典（default 为未列出的分辨率），用于估算费用
+        eta_history_hours: 估算任务进度和剩余时间时使用最近多少小时的记录
+        eta_min_samples: 模型的成功记录少于这么多条时按同一工具类型的全部模型估算，仍不足时不估算剩余时间
+    """
+    enabled: bool = True
+    prices: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    eta_history_hours: float = 168.0
+    eta_min_samples: int = 5
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """
+    生成任务的路由策略（routing.<工具类型>.<优先级>，修改后自动生效）
+
+    Attributes:
+        hedge: 模型 -> 等价模型，超过截止时间或失败时再提交到等价模型，先成功的结果生效
+            （未指定模型的工具模型名为 default，对冲到自身即重新提交一次）
+        deadline_factor: 截止时间 = 该模型最近成功任务的上游耗时 p95 × deadline_factor
+        min_deadline: 截止时间下限（秒）
+        max_deadline: 截止时间上限（秒），没有历史记录时使用
+        timeout: 等待生成结果的总时间上限（秒），0 表示不限制
+    """
+    hedge: Dict[str, str] = field(default_factory=dict)
+    deadline_factor: float = 1.5
+    min_deadline: float = 60.0
+    max_deadline: float = 900.0
+    timeout: float = 0.0
+
+
+def parse_usage(raw: Dict[str, Any]) -> UsageSettings:
+    usage = section(raw, "usage")
+    prices = section(usage, "prices")
+    for model in prices:
+        price = section(prices, model)
+        for key in ("per_request", "per_second"):
+            value = price.get(key)
+            by_resolution = value if isinstance(value, dict) else {"default": value}
+            for resolution in by_resolution:
+                number(by_resolution, resolution, float, f"usage.prices.{model}.{key}")
+    return UsageSettings(
+        enabled=flag(usage, "enabled", UsageSettings.enabled, "usage"),
+        prices={str(model): dict(price) for model, price in prices.items()},
+        eta_history_hours=number(usage, "eta_history_hours", float, "usage", 1) or UsageSettings.eta_history_hours,
+        eta_min_samples=number(usage, "eta_min_samples", int, "usage", 1) or UsageSettings.eta_min_samples,
+    )
+
+
+def parse_routing(raw: Dict[str, Any]) -> Dict[str, Dict[str, RoutePolicy]]:
+    """routing 段：工具类型 -> 优先级 -> 策略"""
+    routing = section(raw, "routing")
+    policies: Dict[str, Dict[str, RoutePolicy]] = {}
+    for tool_type in routing:
+        by_priority = section(routing, tool_type)
+        for priority in by_priority:
+            policy = section(by_priority, priority)
+            prefix = f"routing.{tool_type}.{priority}"
+            hedge = section(policy, "hedge")
+            for model, equivalent in hedge.items():
+                if not isinstance(equivalent, str):
+                    raise SettingsError(f"配置项 '{prefix}.hedge.{model}' 应为模型名，实际为 {equivalent!r}")
+            min_deadline = number(policy, "min_deadline", float, prefix, 1)
+            max_deadline = number(policy, "max_deadline", float, prefix, 1)
+            policies.setdefault(str(tool_type), {})[str(priority)] = RoutePolicy(
+                hedge={str(model): equivalent for model, equivalent in hedge.items()},
+                deadline_factor=number(policy, "deadline_factor", float, prefix, 0.1) or RoutePolicy.deadline_factor,
+                min_deadline=RoutePolicy.min_deadline if min_deadline is None else min_deadline,
+                max_deadline=RoutePolicy.max_deadline if max_deadline is None else max_deadline,
+                timeout=number(policy, "timeout", float, prefix) or RoutePolicy.timeout,
+            )
+    return policies
@@ -1,13 +1,18 @@
 import os
-import librosa
-import soundfile as sf
-import numpy as np
-import tempfile
-from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+
+# librosa, soundfile, numpy and moviepy are imported inside the functions that use them,
+# so importing this module (e.g. for the ffmpeg backend) stays cheap
+
+# Loudness target used by the ffmpeg backend in auto volume balance mode
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+MERGED_AUDIO_SAMPLE_RATE = 44100
 
 def calculate_rms_volume_from_file(audio_file_path):
     """
-    Calculate RMS volume directly from an audio file.
+    Calculate RMS volume directly from an audio (or video) file.
+
+    The file is decoded through an ffmpeg pipe into a NumPy buffer in bounded chunks
+    (see utils.loudness); results are cached per file content hash.
     
     Args:
         audio_file_path: Path to the audio file
@@ -15,13 +20,10 @@ def calculate_rms_volume_from_file(audio_file_path):
     Returns:
         float: RMS volume value
     """
+    from utils.loudness import analyze_loudness
+
     try:
-        # Load audio using librosa
-        y, sr = librosa.load(audio_file_path, sr=None)
-        
-        # Calculate RMS
-        rms = np.sqrt(np.mean(y**2))
-        return rms
+        return analyze_loudness(audio_file_path)["rms"]
     except Exception as e:
         print(f"Error calculating audio RMS: {e}")
         return 0.1  # Return default value
@@ -36,6 +38,8 @@ def calculate_rms_volume_safe(audio_clip):
     Returns:
         float: RMS volume value
     """
+    import numpy as np
+
     try:
         # Try using MoviePy's method
         audio_array = audio_clip.to_soundarray()
@@ -49,31 +53,164 @@ def calculate_rms_volume_safe(audio_clip):
         return rms
     except Exception as e:
         print(f"MoviePy volume calculation failed, trying fallback method: {e}")
-        
-        # Fallback method: save as temporary file and analyze with librosa
-        try:
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            # Write to temporary file
-            audio_clip.write_audiofile(temp_path, verbose=False, logger=None)
-            
-            # Calculate RMS using librosa
-            rms = calculate_rms_volume_from_file(temp_path)
-            
-            # Clean up temporary file
-            os.remove(temp_path)
-            
-            return rms
-        except Exception as e2:
-            print(f"Fallback volume calculation method also failed: {e2}")
+
+        # Fallback method: analyze the clip's source file in memory instead of
+        # re-encoding it to a temporary WAV
+        source_path = getattr(audio_clip, "filename", None)
+        if not source_path or not os.path.exists(source_path):
+            print("Fallback volume calculation unavailable: audio clip has no source file")
             return 0.1  # Return default value
+        return calculate_rms_volume_from_file(source_path)
+
+def _atempo_chain(rate: float) -> str:
+    """
+    Build an atempo filter chain for the given tempo rate.
+
+    A single atempo instance only accepts factors in [0.5, 2.0] on older ffmpeg builds,
+    so larger or smaller rates are split into several chained instances.
+    """
+    filters = []
+    while rate > 2.0:
+        filters.append("atempo=2.0")
+        rate /= 2.0
+    while rate < 0.5:
+        filters.append("atempo=0.5")
+        rate /= 0.5
+    filters.append(f"atempo={rate:.6f}")
+    return ",".join(filters)
+
+
+def build_merge_filter_graph(stretch_rate: float,
+                             has_original_audio: bool,
+                             volume_balance_mode: str = "auto",
+                             new_audio_volume: float = 1.0,
+                             original_audio_volume: float = 1.0,
+                             stretch_filter: str = "atempo") -> str:
+    """
+    Build the ffmpeg filter_complex used by the ffmpeg backend of align_and_merge_audio.
+
+    Input 0 is the video, input 1 is the new audio. The graph stretches the new audio
+    to the video duration, balances loudness and mixes it with the original audio track.
+    The mixed result is exposed as the [aout] label.
+
+    Args:
+        stretch_rate (float): audio_duration / video_duration.
+        has_original_audio (bool): Whether the video has its own audio track.
+        volume_balance_mode (str): "auto" (loudnorm both tracks to the same target; used by
+            align_and_merge_audio_ffmpeg only when loudness analysis is unavailable),
+            "manual" (apply the given volume multipliers) or "none".
+        new_audio_volume (float): Volume multiplier for the new audio (manual mode only).
+        original_audio_volume (float): Volume multiplier for the original audio (manual mode only).
+        stretch_filter (str): "atempo" or "rubberband" (requires ffmpeg built with librubberband).
+
+    Returns:
+        str: The filter_complex expression.
+    """
+    if stretch_filter == "rubberband":
+        stretch = f"rubberband=tempo={stretch_rate:.6f}"
+    else:
+        stretch = _atempo_chain(stretch_rate)
+
+    new_chain = [stretch]
+    original_chain = []
+    if volume_balance_mode == "auto" and has_original_audio:
+        # Bring both tracks to the same integrated loudness instead of comparing RMS in Python
+        new_chain.append(LOUDNORM_FILTER)
+        original_chain.append(LOUDNORM_FILTER)
+    elif volume_balance_mode == "manual":
+        new_chain.append(f"volume={new_audio_volume}")
+        original_chain.append(f"volume={original_audio_volume}")
+
+    if not has_original_audio:
+        return f"[1:a]{','.join(new_chain)}[aout]"
+
+    original = ",".join(original_chain) or "anull"
+    return (
+        f"[1:a]{','.join(new_chain)}[new];"
+        f"[0:a]{original}[orig];"
+        # normalize=0 keeps CompositeAudioClip semantics (tracks are summed, not averaged)
+        f"[new][orig]amix=inputs=2:duration=longest:dropout_transition=0:normalize=0[aout]"
+    )
+
+
+def align_and_merge_audio_ffmpeg(audio_path: str, video_path: str, output_path: str,
+                                 volume_balance_mode: str = "auto",
+                                 new_audio_volume: float = 1.0,
+                                 original_audio_volume: float = 1.0,
+                                 stretch_filter: str = "atempo") -> str:
+    """
+    ffmpeg backend of align_and_merge_audio.
+
+    Stretch, loudness balance and mixing are done by one ffmpeg invocation with a filter graph,
+    and the video stream is copied (-c:v copy) instead of being re-encoded. No temporary files
+    are written. In auto mode both tracks are measured with utils.loudness and balanced with
+    static volume gains, using the same 20% tolerance rule as the moviepy backend.
+
+    Args and return value are the same as align_and_merge_audio, plus:
+        stretch_filter (str): "atempo" (default) or "rubberband".
+    """
+    from utils.ffmpeg_utils import FFMPEG_BIN, run_ffmpeg, probe_duration, has_audio_stream
+
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    audio_duration = probe_duration(audio_path)
+    video_duration = probe_duration(video_path)
+    if audio_duration <= 0 or video_duration <= 0:
+        raise ValueError(f"Invalid duration: audio={audio_duration}, video={video_duration}")
+
+    has_original_audio = has_audio_stream(video_path)
+    if volume_balance_mode == "auto" and has_original_audio:
+        # Measure both tracks once (cached per file hash) and apply static gains;
+        # the loudnorm filter graph remains as the fallback when analysis fails
+        from utils.loudness import analyze_loudness, balance_gains
+        try:
+            gains = balance_gains(analyze_loudness(audio_path), analyze_loudness(video_path))
+            volume_balance_mode = "manual"
+            new_audio_volume = gains["new"]
+            original_audio_volume = gains["original"]
+        except Exception as e:
+            print(f"Loudness analysis failed, falling back to loudnorm: {e}")
+
+    filter_graph = build_merge_filter_graph(
+        stretch_rate=audio_duration / video_duration,
+        has_original_audio=has_original_audio,
+        volume_balance_mode=volume_balance_mode,
+        new_audio_volume=new_audio_volume,
+        original_audio_volume=original_audio_volume,
+        stretch_filter=stretch_filter
+    )
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    run_ffmpeg([
+        FFMPEG_BIN, "-v", "error", "-y",
+        "-i", video_path,
+        "-i", audio_path,
+        "-filter_complex", filter_graph,
+        "-map", "0:v:0",
+        "-map", "[aout]",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-b:a", "192k",
+        "-ar", str(MERGED_AUDIO_SAMPLE_RATE),
+        "-t", f"{video_duration:.3f}",
+        "-movflags", "+faststart",
+        output_path
+    ])
+    return output_path
+
 
 def align_and_merge_audio(audio_path: str, video_path: str, output_path: str, 
                          volume_balance_mode: str = "auto", 
                          new_audio_volume: float = 1.0, 
-                         original_audio_volume: float = 1.0) -> str:
+                         original_audio_volume: float = 1.0,
+                         backend: str = "moviepy",
+                         stretch_filter: str = "atempo") -> str:
     """
     Align the duration of an audio file to a video file's duration, then merge the new audio
     with the original video's audio track, and finally generate a new video file.
@@ -96,6 +233,10 @@ def align_and_merge_audio(audio_path: str, video_path: str, output_path: str,
             - "none": Do not adjust volume
         new_audio_volume (float): Volume multiplier for the new audio (only effective in manual mode)
         original_audio_volume (float): Volume multiplier for the original video's audio track (only effective in manual mode)
+        backend (str): Processing backend.
+            - "moviepy": librosa time stretch + moviepy mixing, re-encodes the whole video
+            - "ffmpeg": single ffmpeg filter graph with video stream copy (see align_and_merge_audio_ffmpeg)
+        stretch_filter (str): Stretch filter of the ffmpeg backend ("atempo" or "rubberband")
 
     Returns:
         str: Path to the successfully generated output video file.
@@ -104,6 +245,15 @@ def align_and_merge_audio(audio_path: str, video_path: str, output_path: str,
         FileNotFoundError: If the input audio or video file does not exist.
         Exception: If other errors occur during processing.
     """
+    if backend == "ffmpeg":
+        return align_and_merge_audio_ffmpeg(
+            audio_path, video_path, output_path,
+            volume_balance_mode=volume_balance_mode,
+            new_audio_volume=new_audio_volume,
+            original_audio_volume=original_audio_volume,
+            stretch_filter=stretch_filter
+        )
+
     # --- 1. Verify that input files exist ---
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
@@ -115,6 +265,10 @@ def align_and_merge_audio(audio_path: str, video_path: str, output_path: str,
     print(f"Video input: {video_path}")
     print(f"Volume balance mode: {volume_balance_mode}")
 
+    import librosa
+    import soundfile as sf
+    from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+
     temp_audio_path = None  # Initialize temporary file path variable
 
     try:
@@ -165,8 +319,8 @@ def align_and_merge_audio(audio_path: str, video_path: str, output_path: str,
                 # For new audio, we calculate directly from the stretched file
                 new_audio_rms = calculate_rms_volume_from_file(temp_audio_path)
                 
-                # For original audio, use the safe method
-                original_audio_rms = calculate_rms_volume_safe(original_audio)
+                # For original audio, decode the video's audio track directly
+                original_audio_rms = calculate_rms_volume_from_file(video_path)
                 
                 print(f"New audio RMS volume: {new_audio_rms:.6f}")
                 print(f"Original audio RMS volume: {original_audio_rms:.6f}")
@@ -288,6 +442,15 @@ if __name__ == '__main__':
             #     volume_balance_mode="none"
             # )
             
+            # Example 4: Single-pass ffmpeg backend (video stream copy, no re-encode)
+            # generated_file = align_and_merge_audio(
+            #     audio_path=input_audio,
+            #     video_path=input_video,
+            #     output_path=final_output_video,
+            #     volume_balance_mode="auto",
+            #     backend="ffmpeg"
+            # )
+            
             print(f"\nTask completed! The video with merged audio tracks has been saved to: {generated_file}")
         else:
             print("\nExample file path not found. Please modify the paths of `input_audio` and `input_video` in the `if __name__ == '__main__':` code block.")
@@ -0,0 +1,442 @@
+"""
+数据存储后端
+
+作品、剧集、素材、风格、任务和工具输出都保存在 DATA_ROOT 下。为了让多个 API 节点
+共享同一份数据，这里把 DATA_ROOT 下的相对路径映射为存储键，并提供可切换的后端：
+- local：直接读写本地目录（默认，单机部署，行为与之前一致）
+- s3：S3 兼容对象存储（MinIO、阿里云 OSS 的 S3 接口等），本地 DATA_ROOT 作为读穿缓存
+
+使用方式仍以本地路径为中心：
+- JSON 元数据（load_json / save_json）直接读写后端，保证各节点看到一致的数据
+- 媒体文件先写到本地路径，再 publish() 上传；读取前 fetch() 确保本地缓存存在且与后端一致
+  （按 ETag 比对，每个文件至多每 cache_validate_seconds 秒比对一次）
+- /data/ 下的媒体在对象存储后端下重定向到签名 URL（或 public_base_url），不经 API 节点转发
+
+后端在进程内首次使用时按配置 storage 段创建，修改配置后需重启生效。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .common import DATA_ROOT
+from .settings import StorageSettings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(Exception):
+    """存储后端操作失败"""
+    pass
+
+
+class StorageBackend:
+    """存储后端接口，键为 DATA_ROOT 下以 / 分隔的相对路径"""
+
+    is_local = True
+
+    def read(self, key: str) -> Optional[bytes]:
+        """读取对象，不存在时返回 None"""
+        raise NotImplementedError
+
+    def write(self, key: str, data: bytes) -> Optional[str]:
+        """写入对象，返回版本标识（ETag）"""
+        raise NotImplementedError
+
+    def upload(self, key: str, local_path: str) -> Optional[str]:
+        """上传本地文件，返回版本标识（ETag）"""
+        raise NotImplementedError
+
+    def download(self, key: str, local_path: str) -> bool:
+        """下载对象到本地文件，不存在时返回 False"""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[str]:
+        """返回对象的版本标识，不存在时返回 None"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        """对象或“目录”（键前缀）是否存在"""
+        raise NotImplementedError
+
+    def listdir(self, key: str) -> Tuple[List[str], List[str]]:
+        """列出“目录”下的子目录名和文件名"""
+        raise NotImplementedError
+
+    def delete_tree(self, key: str):
+        """删除对象及其下的所有对象"""
+        raise NotImplementedError
+
+    def url(self, key: str) -> Optional[str]:
+        """媒体访问地址，本地后端返回 None（由 /data 静态文件服务提供）"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """本地目录存储"""
+
+    def __init__(self, root: str = DATA_ROOT):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/")) if key else self.root
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, key: str, data: bytes) -> Optional[str]:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return self.stat(key)
+
+    def upload(self, key: str, local_path: str) -> Optional[str]:
+        path = self._path(key)
+        if os.path.abspath(path) != os.path.abspath(local_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(local_path, path)
+        return self.stat(key)
+
+    def download(self, key: str, local_path: str) -> bool:
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return False
+        if os.path.abspath(path) != os.path.abspath(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            shutil.copyfile(path, local_path)
+        return True
+
+    def stat(self, key: str) -> Optional[str]:
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def listdir(self, key: str) -> Tuple[List[str], List[str]]:
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return [], []
+        dirs, files = [], []
+        for name in os.listdir(path):
+            (dirs if os.path.isdir(os.path.join(path, name)) else files).append(name)
+        return dirs, files
+
+    def delete_tree(self, key: str):
+        path = self._path(key)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class S3Storage(StorageBackend):
+    """
+    S3 兼容对象存储
+
+    需要安装 boto3。使用 path-style 寻址，兼容 MinIO 等本地替身。
+    """
+
+    is_local = False
+    DELETE_BATCH = 1000
+
+    def __init__(self, settings: StorageSettings):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise StorageError("使用 s3 存储后端需要安装 boto3: pip install boto3")
+
+        self.bucket = settings.bucket
+        self.prefix = settings.prefix
+        self.url_expires = settings.url_expires
+        self.public_base_url = (settings.public_base_url or "").rstrip("/") or None
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.endpoint_url,
+            region_name=settings.region,
+            aws_access_key_id=settings.access_key_id,
+            aws_secret_access_key=settings.access_key_secret,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"},
+                          retries={"max_attempts": 3, "mode": "standard"}),
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _dir_prefix(self, key: str) -> str:
+        full = self._key(key)
+        return f"{full}/" if full else ""
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def read(self, key: str) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise StorageError(f"读取对象失败 {key}: {e}")
+        return response["Body"].read()
+
+    def write(self, key: str, data: bytes) -> Optional[str]:
+        response = self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        return response.get("ETag")
+
+    def upload(self, key: str, local_path: str) -> Optional[str]:
+        with open(local_path, "rb") as f:
+            response = self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f)
+        return response.get("ETag")
+
+    def download(self, key: str, local_path: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.download"
+        try:
+            self.client.download_file(self.bucket, self._key(key), tmp_path)
+        except ClientError as e:
+            if self._is_missing(e):
+                return False
+            raise StorageError(f"下载对象失败 {key}: {e}")
+        os.replace(tmp_path, local_path)
+        return True
+
+    def stat(self, key: str) -> Optional[str]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise StorageError(f"查询对象失败 {key}: {e}")
+        return response.get("ETag")
+
+    def exists(self, key: str) -> bool:
+        if self.stat(key) is not None:
+            return True
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._dir_prefix(key), MaxKeys=1)
+        return response.get("KeyCount", 0) > 0
+
+    def listdir(self, key: str) -> Tuple[List[str], List[str]]:
+        prefix = self._dir_prefix(key)
+        dirs, files = [], []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            for item in page.get("CommonPrefixes", []):
+                dirs.append(item["Prefix"][len(prefix):].rstrip("/"))
+            for item in page.get("Contents", []):
+                name = item["Key"][len(prefix):]
+                if name:
+                    files.append(name)
+        return dirs, files
+
+    def delete_tree(self, key: str):
+        keys = [self._key(key)]
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._dir_prefix(key)):
+            keys.extend(item["Key"] for item in page.get("Contents", []))
+        for start in range(0, len(keys), self.DELETE_BATCH):
+            batch = keys[start:start + self.DELETE_BATCH]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+            )
+
+    def url(self, key: str) -> Optional[str]:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{self._key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=self.url_expires,
+        )
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+# 本地缓存文件的比对记录：键 -> (比对时间, 版本标识)
+_validated: Dict[str, Tuple[float, Optional[str]]] = {}
+_validated_lock = threading.Lock()
+
+
+def create_storage(settings: StorageSettings) -> StorageBackend:
+    if settings.backend == "s3":
+        return S3Storage(settings)
+    return LocalStorage()
+
+
+def get_storage() -> StorageBackend:
+    """获取进程级共享的存储后端（首次使用时按配置创建）"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            storage_settings = get_settings().storage
+            _backend = create_storage(storage_settings)
+            logger.info(f"数据存储后端: {storage_settings.backend}")
+        return _backend
+
+
+def storage_key(path: str) -> Optional[str]:
+    """本地路径对应的存储键，不在 DATA_ROOT 下时返回 None"""
+    relative = os.path.relpath(os.path.abspath(path), DATA_ROOT)
+    if relative == ".":
+        return ""
+    if relative.startswith(".."):
+        return None
+    return relative.replace(os.sep, "/")
+
+
+def is_remote() -> bool:
+    return not get_storage().is_local
+
+
+def _remote_key(path: str) -> Optional[str]:
+    """对象存储后端下返回存储键，本地后端或 DATA_ROOT 之外的路径返回 None"""
+    if get_storage().is_local:
+        return None
+    return storage_key(path)
+
+
+def _remember(key: str, version: Optional[str]):
+    with _validated_lock:
+        _validated[key] = (time.monotonic(), version)
+
+
+def publish(path: str):
+    """把本地写入的文件（或目录下的全部文件）上传到存储后端"""
+    key = _remote_key(path)
+    if key is None or not os.path.exists(path):
+        return
+    backend = get_storage()
+    if os.path.isdir(path):
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                publish(os.path.join(directory, filename))
+        return
+    _remember(key, backend.upload(key, path))
+
+
+def fetch(path: str) -> bool:
+    """
+    确保本地缓存中有最新的文件副本
+
+    Returns:
+        bool: 文件是否存在（本地或后端）
+    """
+    key = _remote_key(path)
+    if key is None:
+        return os.path.exists(path)
+    ttl = get_settings().storage.cache_validate_seconds
+    with _validated_lock:
+        entry = _validated.get(key)
+    local_exists = os.path.isfile(path)
+    if entry is not None and time.monotonic() - entry[0] < ttl:
+        # 有效期内不再比对；后端不存在的文件同样缓存比对结果
+        if entry[1] is None or local_exists:
+            return local_exists
+
+    backend = get_storage()
+    version = backend.stat(key)
+    if version is None:
+        _remember(key, None)
+        return local_exists
+    if not local_exists or entry is None or entry[1] != version:
+        if not backend.download(key, path):
+            return local_exists
+    _remember(key, version)
+    return True
+
+
+def path_exists(path: str) -> bool:
+    """文件或目录是否存在（对象存储后端下同时检查后端）"""
+    if os.path.exists(path):
+        return True
+    key = _remote_key(path)
+    return key is not None and get_storage().exists(key)
+
+
+def list_entries(path: str) -> Tuple[List[str], List[str]]:
+    """列出目录下的子目录名和文件名"""
+    key = _remote_key(path)
+    if key is None:
+        return LocalStorage(os.path.dirname(path)).listdir(os.path.basename(path))
+    return get_storage().listdir(key)
+
+
+def remove(path: str):
+    """删除文件或目录（本地缓存和后端）"""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    key = _remote_key(path)
+    if key is not None:
+        get_storage().delete_tree(key)
+        with _validated_lock:
+            for cached in [k for k in _validated if k == key or k.startswith(f"{key}/")]:
+                _validated.pop(cached, None)
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    """读取 JSON（对象存储后端下直接读取后端，不使用本地缓存）"""
+    key = _remote_key(path)
+    if key is None:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    data = get_storage().read(key)
+    return None if data is None else json.loads(data.decode("utf-8"))
+
+
+def write_json(path: str, data: Any):
+    """写入 JSON（本地文件 + 后端）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    content = json.dumps(data, ensure_ascii=False, indent=2)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    key = _remote_key(path)
+    if key is not None:
+        _remember(key, get_storage().write(key, content.encode("utf-8")))
+
+
+def media_url(path: str) -> Optional[str]:
+    """媒体文件的直接访问地址（签名 URL），本地后端返回 None"""
+    key = _remote_key(path)
+    return None if key is None else get_storage().url(key)
+
+
+async def publish_async(*paths: str):
+    """publish() 的异步版本，对象存储后端下在线程中上传，不阻塞事件循环"""
+    if get_storage().is_local:
+        return
+    for path in paths:
+        if path:
+            await asyncio.to_thread(publish, path)
+
+
+async def fetch_async(path: str) -> bool:
+    """fetch() 的异步版本"""
+    if get_storage().is_local:
+        return os.path.exists(path)
+    return await asyncio.to_thread(fetch, path)
@@ -0,0 +1,676 @@
+"""
+任务队列
+
+create_tool_task 只负责把任务放入队列，任务由消费者（TaskWorker）领取并执行。消费者可以运行在
+API 进程内（memory 队列的默认方式，与之前的行为一致），也可以运行在独立的 python -m worker 进程中，
+使 API 进程数和生成进程数可以分别伸缩、部署在不同机器上。
+
+队列后端：
+- MemoryBroker：进程内队列，只能由同一进程内的消费者领取
+- SQLiteBroker：SQLite 数据库文件，同一台机器（或共享文件系统）上的多个进程共享
+- RedisBroker：Redis 协议兼容的服务，跨机器共享（需要安装 redis）
+
+领取任务时附带租约，执行期间消费者定期续约；消费者崩溃、租约过期后任务重新入队，
+被领取超过 max_attempts 次的任务不再执行并标记为失败。任务状态和结果仍通过 api.tasks 的
+任务文件记录，跨机器部署时需要同时使用共享的数据存储后端（storage.backend: s3）。
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .common import get_data_path
+from .metrics import InstrumentedThreadPool
+from .settings import TaskSettings, get_settings
+
+logger = logging.getLogger(__name__)
+
+# 消费者领取任务时单次等待的最长时间（秒），用于及时响应停止请求
+CLAIM_WAIT_SECONDS = 1.0
+
+
+class BrokerError(Exception):
+    """任务队列不可用"""
+    pass
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def make_job(task_id: str, tool_type: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """构造队列中的任务消息"""
+    return {"task_id": task_id, "tool_type": tool_type, "input": input_data}
+
+
+class TaskBroker:
+    """
+    任务队列接口
+
+    任务消息为可 JSON 序列化的字典，task_id 唯一；claim 返回的消息额外带有 attempts（第几次被领取）。
+    """
+
+    # 是否只能由同一进程内的消费者领取
+    in_process = False
+
+    def __init__(self, lease_seconds: float = 300.0):
+        self.lease_seconds = lease_seconds
+
+    def enqueue(self, job: Dict[str, Any]):
+        raise NotImplementedError
+
+    def claim(self, timeout: float = CLAIM_WAIT_SECONDS) -> Optional[Dict[str, Any]]:
+        """领取一个任务，timeout 秒内没有任务时返回 None"""
+        raise NotImplementedError
+
+    async def claim_async(self, timeout: float = CLAIM_WAIT_SECONDS,
+                          executor: Optional[Executor] = None) -> Optional[Dict[str, Any]]:
+        """claim() 的异步版本，默认在 executor 线程中等待"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.claim, timeout)
+
+    def touch(self, task_id: str):
+        """续约正在执行的任务"""
+        raise NotImplementedError
+
+    def ack(self, task_id: str):
+        """任务执行结束（无论成功失败），从队列中移除"""
+        raise NotImplementedError
+
+    def release(self, task_id: str):
+        """放弃执行中的任务（例如进程退出），任务立即回到队首，本次领取不计入次数"""
+        raise NotImplementedError
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """取出所有等待中的任务，只有进程内队列需要实现"""
+        return []
+
+    def queued(self) -> List[str]:
+        """等待领取的任务 ID（不取出），只有进程内队列需要实现"""
+        return []
+
+    def pending(self) -> int:
+        """等待领取的任务数"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBroker(TaskBroker):
+    """进程内任务队列"""
+
+    in_process = True
+
+    def __init__(self, lease_seconds: float = 300.0):
+        super().__init__(lease_seconds)
+        self._queue: Deque[Dict[str, Any]] = collections.deque()
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        # 在事件循环中等待任务的消费者，不占用线程
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = collections.deque()
+
+    def enqueue(self, job: Dict[str, Any]):
+        with self._condition:
+            self._queue.append(dict(job))
+            self._condition.notify()
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if not waiter.done():
+                    loop.call_soon_threadsafe(_wake, waiter)
+                    break
+
+    def claim(self, timeout: float = CLAIM_WAIT_SECONDS) -> Optional[Dict[str, Any]]:
+        with self._condition:
+            if not self._queue:
+                self._condition.wait(timeout)
+            if not self._queue:
+                return None
+            job = self._queue.popleft()
+            job["attempts"] = job.get("attempts", 0) + 1
+            self._running[job["task_id"]] = job
+            return dict(job)
+
+    async def claim_async(self, timeout: float = CLAIM_WAIT_SECONDS,
+                          executor: Optional[Executor] = None) -> Optional[Dict[str, Any]]:
+        job = self.claim(0)
+        if job is not None:
+            return job
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        with self._condition:
+            self._waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                if (loop, waiter) in self._waiters:
+                    self._waiters.remove((loop, waiter))
+        return self.claim(0)
+
+    def touch(self, task_id: str):
+        pass
+
+    def ack(self, task_id: str):
+        with self._condition:
+            self._running.pop(task_id, None)
+
+    def release(self, task_id: str):
+        with self._condition:
+            job = self._running.pop(task_id, None)
+            if job is not None:
+                job["attempts"] -= 1
+                self._queue.appendleft(job)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        with self._condition:
+            jobs = list(self._queue)
+            self._queue.clear()
+            return jobs
+
+    def queued(self) -> List[str]:
+        with self._condition:
+            return [job["task_id"] for job in self._queue]
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+
+class SQLiteBroker(TaskBroker):
+    """
+    基于 SQLite 的任务队列
+
+    表中只保存等待中和执行中的任务：lease_until 为空表示等待中，否则为执行中且租约到期时间为 lease_until。
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, path: str, queue: str = "comicmaker:tasks", lease_seconds: float = 300.0):
+        super().__init__(lease_seconds)
+        self.path = path
+        self.queue = queue
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " queue TEXT NOT NULL,"
+                " task_id TEXT NOT NULL UNIQUE,"
+                " payload TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_until REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (queue, lease_until, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作使用独立连接，可在多个线程中安全调用；isolation_level=None 以便显式控制事务
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, job: Dict[str, Any]):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (queue, task_id, payload) VALUES (?, ?, ?)",
+                (self.queue, job["task_id"], json.dumps(job, ensure_ascii=False))
+            )
+
+    def _claim_once(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT seq, payload, attempts FROM jobs"
+                " WHERE queue = ? AND (lease_until IS NULL OR lease_until < ?)"
+                " ORDER BY seq LIMIT 1",
+                (self.queue, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            seq, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET attempts = ?, lease_until = ? WHERE seq = ?",
+                (attempts + 1, now + self.lease_seconds, seq)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        job = json.loads(payload)
+        job["attempts"] = attempts + 1
+        return job
+
+    def claim(self, timeout: float = CLAIM_WAIT_SECONDS) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._claim_once()
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def touch(self, task_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE queue = ? AND task_id = ? AND lease_until IS NOT NULL",
+                (time.time() + self.lease_seconds, self.queue, task_id)
+            )
+
+    def ack(self, task_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE queue = ? AND task_id = ?", (self.queue, task_id))
+
+    def release(self, task_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = NULL, attempts = MAX(attempts - 1, 0),"
+                " seq = (SELECT MIN(seq) - 1 FROM jobs)"
+                " WHERE queue = ? AND task_id = ?",
+                (self.queue, task_id)
+            )
+
+    def pending(self) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (self.queue, time.time())
+            ).fetchone()
+        return row[0]
+
+
+class RedisBroker(TaskBroker):
+    """
+    基于 Redis 的任务队列（需要安装 redis，兼容 Redis 协议的服务均可）
+
+    键：
+    - {queue}:jobs       哈希，task_id -> 任务消息
+    - {queue}:pending    列表，等待领取的 task_id
+    - {queue}:running    列表，执行中的 task_id
+    - {queue}:leases     有序集合，执行中的 task_id -> 租约到期时间
+    - {queue}:attempts   哈希，task_id -> 已领取次数
+
+    领取（移入 running 并设置租约）和租约过期后放回等待队列都在一个 Lua 脚本中完成，
+    进程在中途崩溃时不会留下没有租约、永远不会被放回的任务。
+    """
+
+    POLL_INTERVAL = 0.2
+
+    # KEYS: pending, running, leases, attempts, jobs；ARGV: 租约到期时间
+    CLAIM_SCRIPT = """
+local task_id = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+if not task_id then
+    return false
+end
+redis.call('ZADD', KEYS[3], ARGV[1], task_id)
+local attempts = redis.call('HINCRBY', KEYS[4], task_id, 1)
+local payload = redis.call('HGET', KEYS[5], task_id)
+return {task_id, attempts, payload}
+"""
+
+    # KEYS: leases, running, pending；ARGV: 当前时间
+    REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, task_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], task_id)
+    if redis.call('LREM', KEYS[2], 1, task_id) > 0 then
+        redis.call('RPUSH', KEYS[3], task_id)
+    end
+end
+return #expired
+"""
+
+    def __init__(self, url: str, queue: str = "comicmaker:tasks", lease_seconds: float = 300.0):
+        super().__init__(lease_seconds)
+        try:
+            import redis
+        except ImportError:
+            raise BrokerError("使用 redis 任务队列需要安装 redis: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.queue = queue
+        self._claim_script = self.client.register_script(self.CLAIM_SCRIPT)
+        self._requeue_script = self.client.register_script(self.REQUEUE_SCRIPT)
+
+    def _key(self, name: str) -> str:
+        return f"{self.queue}:{name}"
+
+    def enqueue(self, job: Dict[str, Any]):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("jobs"), job["task_id"], json.dumps(job, ensure_ascii=False))
+        pipe.lpush(self._key("pending"), job["task_id"])
+        pipe.execute()
+
+    def requeue_expired(self):
+        """把租约已过期的任务放回等待队列队首"""
+        self._requeue_script(
+            keys=[self._key("leases"), self._key("running"), self._key("pending")], args=[time.time()])
+
+    def _claim_once(self) -> Optional[Dict[str, Any]]:
+        claimed = self._claim_script(
+            keys=[self._key("pending"), self._key("running"), self._key("leases"),
+                  self._key("attempts"), self._key("jobs")],
+            args=[time.time() + self.lease_seconds],
+        )
+        if not claimed:
+            return None
+        raw_id, attempts, payload = claimed
+        if payload is None:
+            # 任务消息已被删除（例如重复 ack），丢弃
+            self.ack(raw_id.decode() if isinstance(raw_id, bytes) else raw_id)
+            return None
+        job = json.loads(payload)
+        job["attempts"] = int(attempts)
+        return job
+
+    def claim(self, timeout: float = CLAIM_WAIT_SECONDS) -> Optional[Dict[str, Any]]:
+        # Lua 脚本中不能阻塞等待，与 SQLiteBroker 相同按间隔轮询
+        self.requeue_expired()
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._claim_once()
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0:
+                return job
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def touch(self, task_id: str):
+        self.client.zadd(self._key("leases"), {task_id: time.time() + self.lease_seconds}, xx=True)
+
+    def ack(self, task_id: str):
+        pipe = self.client.pipeline()
+        pipe.lrem(self._key("running"), 0, task_id)
+        pipe.zrem(self._key("leases"), task_id)
+        pipe.hdel(self._key("jobs"), task_id)
+        pipe.hdel(self._key("attempts"), task_id)
+        pipe.execute()
+
+    def release(self, task_id: str):
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key("leases"), task_id)
+        pipe.lrem(self._key("running"), 0, task_id)
+        pipe.hincrby(self._key("attempts"), task_id, -1)
+        pipe.rpush(self._key("pending"), task_id)
+        pipe.execute()
+
+    def pending(self) -> int:
+        return self.client.llen(self._key("pending"))
+
+    def close(self):
+        self.client.close()
+
+
+def create_broker(settings: TaskSettings) -> TaskBroker:
+    if settings.broker == "sqlite":
+        path = settings.url or get_data_path("tasks", "queue.db")
+        return SQLiteBroker(path, queue=settings.queue, lease_seconds=settings.lease_seconds)
+    if settings.broker == "redis":
+        return RedisBroker(settings.url, queue=settings.queue, lease_seconds=settings.lease_seconds)
+    return MemoryBroker(lease_seconds=settings.lease_seconds)
+
+
+def inline_worker_count(settings: TaskSettings) -> int:
+    """API 进程内执行任务的并发数"""
+    if settings.inline_workers is not None:
+        return settings.inline_workers
+    return 32 if settings.broker == "memory" else 0
+
+
+_broker: Optional[TaskBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_task_broker() -> TaskBroker:
+    """获取进程级共享的任务队列（首次使用时按配置创建）"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            task_settings = get_settings().tasks
+            _broker = create_broker(task_settings)
+            logger.info(f"任务队列: {task_settings.broker}")
+        return _broker
+
+
+_accepting = True
+
+
+def stop_accepting():
+    """进程准备退出，不再接收新任务"""
+    global _accepting
+    _accepting = False
+
+
+async def submit_job(job: Dict[str, Any]):
+    """
+    把任务放入队列
+
+    Raises:
+        BrokerError: 进程正在退出
+    """
+    if not _accepting:
+        raise BrokerError("服务正在重启，暂不接收新任务")
+    broker = get_task_broker()
+    if broker.in_process:
+        broker.enqueue(job)
+    else:
+        await asyncio.to_thread(broker.enqueue, job)
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class TaskWorker:
+    """
+    任务消费者：在当前事件循环中以 concurrency 个协程并发领取并执行任务
+
+    Args:
+        broker: 任务队列
+        handler: 执行任务的协程函数，参数为任务消息；异常会被记录，不会中断消费
+        concurrency: 并发数
+        max_attempts: 任务最多被领取的次数
+        on_abandoned: 任务超过 max_attempts 时调用（例如把任务标记为失败）
+        on_heartbeat: 任务开始执行及每次续约时调用，参数为 task_id（在线程中执行）
+        on_interrupted: 停止时未执行完（或尚未领取的进程内任务）调用，参数为任务消息
+    """
+
+    def __init__(
+        self,
+        broker: TaskBroker,
+        handler: JobHandler,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        on_abandoned: Optional[JobHandler] = None,
+        on_heartbeat: Optional[Callable[[str], None]] = None,
+        on_interrupted: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.broker = broker
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.on_abandoned = on_abandoned
+        self.on_heartbeat = on_heartbeat
+        self.on_interrupted = on_interrupted
+        self.active: Set[str] = set()
+        self.completed = 0
+        self._stopping = asyncio.Event()
+        self._consumers: List[asyncio.Task] = []
+        # 领取线程已取出、尚未被消费协程接手的任务；停止后（_closed）领取线程取到的任务直接交回
+        self._claim_lock = threading.Lock()
+        self._claimed: Dict[str, Dict[str, Any]] = {}
+        self._closed = False
+        # 队列操作使用独立线程池，不占用生成请求所用的默认线程池
+        self._executor = InstrumentedThreadPool("task-broker", max_workers=concurrency + 1)
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _heartbeat(self, task_id: str, renew: bool):
+        if renew:
+            self.broker.touch(task_id)
+        if self.on_heartbeat is not None:
+            self.on_heartbeat(task_id)
+
+    async def _keep_lease(self, task_id: str):
+        interval = max(1.0, self.broker.lease_seconds / 3)
+        renew = False
+        while True:
+            try:
+                await self._call(self._heartbeat, task_id, renew)
+            except Exception as e:
+                logger.warning(f"任务续约失败: {task_id}, {e}")
+            renew = True
+            await asyncio.sleep(interval)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        task_id = job["task_id"]
+        if job.get("attempts", 1) > self.max_attempts:
+            logger.error(f"任务已被领取 {job['attempts']} 次，不再执行: {task_id}")
+            if self.on_abandoned is not None:
+                await self.on_abandoned(job)
+            return
+        self.active.add(task_id)
+        lease = asyncio.create_task(self._keep_lease(task_id))
+        try:
+            await self.handler(job)
+        except Exception:
+            logger.exception(f"任务执行异常: {task_id}")
+        finally:
+            lease.cancel()
+            self.active.discard(task_id)
+            self.completed += 1
+
+    def _interrupt(self, job: Dict[str, Any]):
+        """任务未执行完时交回队列，并通知其他执行者可以接手"""
+        if not self.broker.in_process:
+            # 进程内队列随进程退出而消失，不必交回
+            try:
+                self.broker.release(job["task_id"])
+            except Exception as e:
+                logger.warning(f"交回任务失败: {job['task_id']}, {e}")
+        if self.on_interrupted is not None:
+            try:
+                self.on_interrupted(job)
+            except Exception as e:
+                logger.warning(f"标记任务中断失败: {job['task_id']}, {e}")
+        logger.info(f"任务未执行完，已交回队列: {job['task_id']}")
+
+    def _claim_job(self) -> Optional[Dict[str, Any]]:
+        """在领取线程中执行：停止后才取到的任务立即交回，不会因消费协程已退出而一直占用租约"""
+        job = self.broker.claim(CLAIM_WAIT_SECONDS)
+        if job is None:
+            return None
+        with self._claim_lock:
+            if not self._closed:
+                self._claimed[job["task_id"]] = job
+                return job
+        self._release_unstarted(job)
+        return None
+
+    def _release_unstarted(self, job: Dict[str, Any]):
+        try:
+            self.broker.release(job["task_id"])
+        except Exception as e:
+            logger.warning(f"交回任务失败: {job['task_id']}, {e}")
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """领取一个任务；停止时立即返回 None，不等待领取超时"""
+        if self.broker.in_process:
+            # 进程内队列在事件循环中等待，取消是安全的（任务仍留在队列中）
+            claim = asyncio.ensure_future(self.broker.claim_async(CLAIM_WAIT_SECONDS, self._executor))
+        else:
+            loop = asyncio.get_running_loop()
+            claim = loop.run_in_executor(self._executor, self._claim_job)
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({claim, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+        if not claim.done():
+            # 领取线程中的任务由 _claim_job / stop() 交回
+            claim.cancel()
+            return None
+        job = claim.result()
+        if job is None or self.broker.in_process:
+            if job is not None and self._stopping.is_set():
+                self.broker.release(job["task_id"])
+                return None
+            return job
+        with self._claim_lock:
+            if self._claimed.pop(job["task_id"], None) is None:
+                # stop() 已交回
+                return None
+        if self._stopping.is_set():
+            await self._call(self._release_unstarted, job)
+            return None
+        return job
+
+    async def _consume(self):
+        while not self._stopping.is_set():
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning(f"领取任务失败: {e}")
+                await asyncio.sleep(CLAIM_WAIT_SECONDS)
+                continue
+            if job is None:
+                continue
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                self._interrupt(job)
+                raise
+            try:
+                await self._call(self.broker.ack, job["task_id"])
+            except Exception as e:
+                logger.warning(f"确认任务失败: {job['task_id']}, {e}")
+
+    def start(self):
+        """在当前事件循环中启动消费协程"""
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        停止领取新任务，等待执行中的任务结束
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待；超时后取消剩余任务并交回队列
+        """
+        self._stopping.set()
+        consumers = [consumer for consumer in self._consumers if not consumer.done()]
+        if consumers:
+            _, pending = await asyncio.wait(consumers, timeout=timeout)
+            for consumer in pending:
+                consumer.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        with self._claim_lock:
+            self._closed = True
+            unstarted = list(self._claimed.values())
+            self._claimed.clear()
+        for job in unstarted:
+            await asyncio.to_thread(self._release_unstarted, job)
+        if self.broker.in_process:
+            # 进程内队列中尚未领取的任务随进程退出而丢失，标记后由下次启动的进程接手
+            for job in self.broker.drain():
+                if self.on_interrupted is not None:
+                    self.on_interrupted(job)
+        self._executor.shutdown(wait=False)
+
+    async def run(self):
+        """启动并运行到 stop() 被调用"""
+        self.start()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._executor.shutdown(wait=False)
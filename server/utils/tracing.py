@@ -0,0 +1,295 @@
+"""
+任务追踪（与 OpenTelemetry 兼容的 span 模型）
+
+一个生成任务从 create_tool_task 接收请求开始，经过 execute_task、各次上游请求、_poll_result 轮询、
+OSS 上传和结果下载，组成一条 trace，用于分解单个慢任务的耗时：
+- span 字段与 OpenTelemetry 一致：trace_id（32 位十六进制）、span_id（16 位）、parent_span_id、name、kind、
+  start_time_unix_nano / end_time_unix_nano、attributes、events、status
+- 当前 span 保存在 ContextVar 中（与 utils.metrics 相同），asyncio.to_thread 中的同步代码自动成为子 span
+- 任务记录保存 trace_id 和 traceparent（W3C Trace Context 格式），任务由其他进程（python -m worker）执行
+  或被接手时，以 traceparent 为父 span 继续同一条 trace
+- span 结束时交给导出器（tracing.exporter）：file 按天追加写入 JSON Lines 文件（同一台机器上的进程共用）、
+  console 写入日志、none 不导出
+
+查看单个任务的耗时分解（在 server 目录下）：python scripts/trace_report.py <task_id 或 trace_id>
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .settings import SERVER_DIR, get_settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "comicmaker"
+FILE_PREFIX = "spans-"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """一个计时区间"""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str] = None,
+        kind: str = "INTERNAL",
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status_code = "UNSET"
+        self.status_message: Optional[str] = None
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent，用于在其他进程中继续本条 trace"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": dict(attributes or {})})
+
+    def set_status(self, code: str, message: Optional[str] = None):
+        """code 为 OK / ERROR / UNSET"""
+        self.status_code = code
+        self.status_message = message
+
+    def record_exception(self, error: BaseException):
+        self.add_event("exception", {"exception.type": type(error).__name__, "exception.message": str(error)})
+        self.set_status("ERROR", str(error) or type(error).__name__)
+
+    def end(self):
+        if self.end_time_unix_nano is None:
+            self.end_time_unix_nano = time.time_ns()
+
+    @property
+    def duration_seconds(self) -> float:
+        end = self.end_time_unix_nano or time.time_ns()
+        return (end - self.start_time_unix_nano) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status_code, "message": self.status_message},
+            "resource": {"service.name": SERVICE_NAME, "host.name": socket.gethostname(), "process.pid": os.getpid()},
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """解析 W3C traceparent，返回 (trace_id, span_id)，格式不对时返回 None"""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    kind: str = "INTERNAL",
+    parent: Optional[str] = None,
+) -> Iterator[Span]:
+    """
+    在当前上下文中开始一个 span，代码块结束时结束并导出
+
+    Args:
+        name: span 名称
+        attributes: span 属性
+        kind: INTERNAL / SERVER / CLIENT
+        parent: 父 span 的 traceparent（任务记录中保存的值）；为空时以当前 span 为父 span，
+            没有当前 span 时开始新的 trace
+    """
+    remote = parse_traceparent(parent)
+    if remote is not None:
+        trace_id, parent_span_id = remote
+    else:
+        current = _current_span.get()
+        if current is not None:
+            trace_id, parent_span_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_span_id = secrets.token_hex(16), None
+    span = Span(name, trace_id, parent_span_id, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except asyncio.CancelledError:
+        span.set_status("ERROR", "cancelled")
+        raise
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        _export(span)
+
+
+def traced(name: str, kind: str = "INTERNAL"):
+    """把整个异步函数包在一个 span 中（保留函数签名，可用于 FastAPI 路由函数）"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(name, kind=kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== 导出 ====================
+
+def trace_dir() -> str:
+    """file 导出器的目录：tracing.dir，默认为 server/logs/traces"""
+    return get_settings().tracing.dir or os.path.join(SERVER_DIR, "logs", "traces")
+
+
+class FileExporter:
+    """
+    按天把 span 追加写入 <dir>/spans-YYYYMMDD.jsonl
+
+    每个 span 一行，以 O_APPEND 一次写入，同一台机器上的多个进程可以写同一个文件；
+    超过 keep_days 天的文件在创建导出器时删除。
+    """
+
+    def __init__(self, directory: str, keep_days: int = 7):
+        self.directory = directory
+        self.keep_days = keep_days
+        os.makedirs(directory, exist_ok=True)
+        self.cleanup()
+
+    def path_for(self, unix_nano: int) -> str:
+        return os.path.join(self.directory, f"{FILE_PREFIX}{time.strftime('%Y%m%d', time.localtime(unix_nano / 1e9))}.jsonl")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        fd = os.open(self.path_for(span.start_time_unix_nano), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def cleanup(self):
+        if self.keep_days <= 0:
+            return
+        cutoff = time.time() - self.keep_days * 86400
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                if filename.startswith(FILE_PREFIX) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class ConsoleExporter:
+    """把 span 写入日志（开发时查看）"""
+
+    def export(self, span: Span):
+        parent = span.parent_span_id or "-"
+        logger.info(
+            f"span {span.name} {span.duration_seconds * 1000:.1f}ms trace={span.trace_id} span={span.span_id} "
+            f"parent={parent} status={span.status_code} {json.dumps(span.attributes, ensure_ascii=False, default=str)}"
+        )
+
+
+_exporter: Any = None
+_exporter_lock = threading.Lock()
+_UNSET = object()
+
+
+def get_exporter():
+    """按 tracing 配置创建的导出器（首次使用时创建，修改配置后需重启），exporter 为 none 时返回 None"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                settings = get_settings().tracing
+                if settings.exporter == "file":
+                    try:
+                        _exporter = FileExporter(trace_dir(), settings.keep_days)
+                    except OSError as e:
+                        logger.warning(f"无法创建追踪目录，不导出 span: {e}")
+                        _exporter = _UNSET
+                elif settings.exporter == "console":
+                    _exporter = ConsoleExporter()
+                else:
+                    _exporter = _UNSET
+    return None if _exporter is _UNSET else _exporter
+
+
+def set_exporter(exporter):
+    """替换导出器（None 时下次使用按配置重新创建）"""
+    global _exporter
+    _exporter = exporter
+
+
+def _export(span: Span):
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    try:
+        exporter.export(span)
+    except Exception as e:
+        # 导出失败不影响业务
+        logger.warning(f"导出 span 失败: {span.name}, {e}")
+
+
+def read_trace(trace_id: str, directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """从 file 导出器的目录读取一条 trace 的全部 span（按开始时间排序）"""
+    directory = directory or trace_dir()
+    spans = []
+    try:
+        filenames = sorted(name for name in os.listdir(directory) if name.startswith(FILE_PREFIX))
+    except FileNotFoundError:
+        return spans
+    for filename in filenames:
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+            for line in f:
+                if trace_id not in line:
+                    continue
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if span.get("trace_id") == trace_id:
+                    spans.append(span)
+    spans.sort(key=lambda span: span["start_time_unix_nano"])
+    return spans
@@ -0,0 +1,276 @@
+"""
+上游用量台账
+
+每个生成任务结束时（api.tools.run_task_job）追加一条记录：模型、上游接口（provider）、分辨率、时长、
+总耗时及各阶段耗时（本地排队 wait、上游排队 queue、上游生成 run）、输出文件大小和估算费用。
+记录只追加不修改，按小时分段写入 data/usage/<YYYYMMDD>/<HH>-<主机>-<pid>.jsonl（每个进程只写自己的分段，
+对象存储后端下写入后上传，多个节点共享），查询时读取时间窗口内的分段：
+- summarize_models()：按模型统计次数、成功率、吞吐量、耗时 p50 / p95、输出大小和费用（模型排行）
+- timeseries()：按时间分桶统计，用于发现上游变慢
+
+费用按 usage.prices 配置估算（未配置价格的模型为 None），只计入成功的任务。
+"""
+
+import json
+import logging
+import os
+import re
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from .common import get_data_path
+from .settings import get_settings
+from .storage import fetch, list_entries, publish
+
+logger = logging.getLogger(__name__)
+
+_WINDOW = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(value: str) -> float:
+    """时间窗口（30m、24h、7d 等）转换为秒
+
+    Raises:
+        ValueError: 格式错误
+    """
+    match = _WINDOW.match(value.strip().lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"无效的时间窗口: {value}（示例：30m、24h、7d）")
+    return float(match.group(1)) * _WINDOW_UNITS[match.group(2)]
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """线性插值分位数，sorted_values 须已排序，为空时返回 None"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+# ==================== 记录 ====================
+
+def _duration_seconds(value: Any) -> Optional[float]:
+    """请求的视频 / 音频时长（"5"、"5s"、5），无法解析时返回 None"""
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip().rstrip("sS"))
+    except ValueError:
+        return None
+
+
+def _price(spec: Any, resolution: Optional[str]) -> float:
+    """价格可以是数字，或按分辨率区分的字典（default 为未列出的分辨率）"""
+    if isinstance(spec, dict):
+        spec = spec.get(resolution or "default", spec.get("default", 0))
+    return float(spec or 0)
+
+
+def estimate_cost(model: str, resolution: Optional[str], duration: Optional[float]) -> Optional[float]:
+    """
+    按 usage.prices 估算一次生成的费用
+
+    价格配置：per_request（每次）+ per_second（每秒输出时长），均可按分辨率区分；模型未配置价格时返回 None
+    """
+    prices = get_settings().usage.prices.get(model)
+    if prices is None:
+        return None
+    cost = _price(prices.get("per_request"), resolution)
+    if duration:
+        cost += _price(prices.get("per_second"), resolution) * duration
+    return round(cost, 6)
+
+
+def _output_bytes(directory: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _wait_seconds(task: Dict[str, Any], started: float) -> Optional[float]:
+    """任务创建到开始执行的时间（本地任务队列中的等待）"""
+    try:
+        created = datetime.fromisoformat(task["created_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return max(0.0, round(started - created, 3))
+
+
+def build_entry(task: Dict[str, Any], timer, output_dir: str, resumed: bool = False) -> Dict[str, Any]:
+    """
+    由任务记录和任务计时（utils.metrics.TaskTimer）构造一条台账记录
+
+    Args:
+        task: 结束后的任务记录
+        timer: 任务计时，提供阶段耗时和提交的上游接口
+        output_dir: 任务输出目录（统计输出文件大小）
+        resumed: 是否为接手中断任务后取回的结果
+    """
+    input_data = task.get("input") or {}
+    endpoint = timer.endpoints[0] if timer.endpoints else None
+    provider = endpoint.split("/", 1)[0] if endpoint else None
+    model = input_data.get("model") or (get_settings().llm.model if provider == "openrouter" else None) or "default"
+    resolution = input_data.get("resolution")
+    duration = _duration_seconds(input_data.get("duration"))
+    status = task.get("status")
+    elapsed = timer.elapsed or 0.0
+    now = time.time()
+    return {
+        "ts": now,
+        "time": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+        "task_id": task.get("task_id"),
+        "tool_type": task.get("tool_type"),
+        "model": model,
+        "provider": provider,
+        "endpoint": endpoint,
+        "resolution": resolution,
+        "aspect_ratio": input_data.get("aspect_ratio"),
+        "duration": duration,
+        "status": status,
+        "resumed": resumed,
+        "hedged": timer.hedged,
+        "elapsed_seconds": round(elapsed, 3),
+        "wait_seconds": _wait_seconds(task, now - elapsed),
+        "queue_seconds": round(timer.stages.get("queue", 0.0), 3),
+        "run_seconds": round(timer.stages.get("run", 0.0), 3),
+        "stages": {stage: round(seconds, 3) for stage, seconds in timer.stages.items()},
+        "output_bytes": _output_bytes(output_dir) if status == "success" else 0,
+        "cost": estimate_cost(model, resolution, duration) if status == "success" else None,
+    }
+
+
+def _segment_path(ts: float) -> str:
+    moment = datetime.fromtimestamp(ts)
+    filename = f"{moment:%H}-{socket.gethostname()}-{os.getpid()}.jsonl"
+    return get_data_path("usage", f"{moment:%Y%m%d}", filename)
+
+
+def append_entry(entry: Dict[str, Any]):
+    """追加一条记录到本进程当前小时的分段（对象存储后端下随后上传整个分段）"""
+    path = _segment_path(entry["ts"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+    publish(path)
+
+
+def record_task_usage(task: Dict[str, Any], timer, output_dir: str, resumed: bool = False):
+    """记录已结束任务的用量（未启用 usage.enabled 时不记录）；失败只记录日志，不影响任务"""
+    if not get_settings().usage.enabled:
+        return
+    try:
+        append_entry(build_entry(task, timer, output_dir, resumed))
+    except Exception as e:
+        logger.warning(f"记录任务用量失败: {task.get('task_id')}, {e}")
+
+
+# ==================== 查询 ====================
+
+def read_entries(since: float, until: Optional[float] = None) -> List[Dict[str, Any]]:
+    """读取 [since, until) 内的全部记录（按时间排序）"""
+    until = until or time.time()
+    entries = []
+    day = datetime.fromtimestamp(since).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.timestamp() < until:
+        directory = get_data_path("usage", f"{day:%Y%m%d}")
+        first_hour = datetime.fromtimestamp(since).hour if day.date() == datetime.fromtimestamp(since).date() else 0
+        for filename in sorted(list_entries(directory)[1]):
+            # 分段文件名以小时开头，跳过窗口开始之前的分段
+            if not filename.endswith(".jsonl") or not filename[:2].isdigit() or int(filename[:2]) < first_hour:
+                continue
+            path = os.path.join(directory, filename)
+            if not fetch(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since <= entry.get("ts", 0) < until:
+                        entries.append(entry)
+        day += timedelta(days=1)
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+def _latency(entries: List[Dict[str, Any]], field: str) -> Dict[str, Optional[float]]:
+    values = sorted(entry[field] for entry in entries if entry.get(field) is not None)
+    p50, p95 = percentile(values, 0.50), percentile(values, 0.95)
+    return {
+        "p50": None if p50 is None else round(p50, 3),
+        "p95": None if p95 is None else round(p95, 3),
+    }
+
+
+def _stats(entries: List[Dict[str, Any]], window_seconds: float) -> Dict[str, Any]:
+    """一组记录的统计；耗时分位数只统计成功的任务"""
+    succeeded = [entry for entry in entries if entry.get("status") == "success"]
+    costs = [entry["cost"] for entry in succeeded if entry.get("cost") is not None]
+    return {
+        "tasks": len(entries),
+        "succeeded": len(succeeded),
+        "failed": sum(1 for entry in entries if entry.get("status") == "failed"),
+        "success_rate": round(len(succeeded) / len(entries), 4) if entries else None,
+        "throughput_per_hour": round(len(succeeded) / window_seconds * 3600, 3),
+        "elapsed_seconds": _latency(succeeded, "elapsed_seconds"),
+        "wait_seconds": _latency(succeeded, "wait_seconds"),
+        "queue_seconds": _latency(succeeded, "queue_seconds"),
+        "run_seconds": _latency(succeeded, "run_seconds"),
+        "output_bytes": sum(entry.get("output_bytes") or 0 for entry in succeeded),
+        "cost": round(sum(costs), 6) if costs else None,
+    }
+
+
+def _matches(entry: Dict[str, Any], filters: Dict[str, Optional[str]]) -> bool:
+    return all(value is None or entry.get(key) == value for key, value in filters.items())
+
+
+def summarize_models(entries: List[Dict[str, Any]], window_seconds: float, **filters: Optional[str]) -> List[Dict[str, Any]]:
+    """按模型统计，按成功任务的耗时 p50 从快到慢排序（没有成功任务的模型排在最后）"""
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in entries:
+        if _matches(entry, filters):
+            groups[entry.get("model") or "default"].append(entry)
+    models = []
+    for model, group in groups.items():
+        stats = _stats(group, window_seconds)
+        stats["model"] = model
+        stats["providers"] = sorted({entry["provider"] for entry in group if entry.get("provider")})
+        stats["tool_types"] = sorted({entry["tool_type"] for entry in group if entry.get("tool_type")})
+        models.append(stats)
+    models.sort(key=lambda stats: (stats["elapsed_seconds"]["p50"] is None, stats["elapsed_seconds"]["p50"] or 0))
+    return models
+
+
+def timeseries(entries: List[Dict[str, Any]], since: float, until: float, bucket_seconds: float,
+               **filters: Optional[str]) -> List[Dict[str, Any]]:
+    """按 bucket_seconds 分桶统计（包含没有任务的桶）"""
+    count = max(1, int((until - since + bucket_seconds - 1e-9) // bucket_seconds))
+    buckets: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+    for entry in entries:
+        if _matches(entry, filters):
+            index = min(count - 1, int((entry["ts"] - since) // bucket_seconds))
+            buckets[index].append(entry)
+    series = []
+    for index, group in enumerate(buckets):
+        start = since + index * bucket_seconds
+        stats = _stats(group, bucket_seconds)
+        stats["start"] = datetime.fromtimestamp(start).isoformat(timespec="seconds")
+        series.append(stats)
+    return series
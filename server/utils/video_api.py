@@ -12,9 +12,10 @@ import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-import requests
-
-from .wavespeed_client import WavespeedClient, create_client_from_config
+from .wavespeed_client import WavespeedClient, create_client_from_config, wavespeed_url
+from .settings import get_settings
+from .metrics import upstream_session
+from .predictions import prediction_result_url, record_prediction
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -28,7 +29,8 @@ def _get_client(api_key: Optional[str] = None) -> WavespeedClient:
     global _client
     if api_key:
         return WavespeedClient(api_key=api_key)
-    if _client is None:
+    # 配置中的 API key 变化（热加载）时重新创建客户端
+    if _client is None or _client.api_key != get_settings().wavespeed_api_key:
         _client = create_client_from_config()
     return _client
 
@@ -48,7 +50,7 @@ def text_to_video_generate(api_key, prompt, save_path: str = None, model="seedan
         if result.get('success'):
             video_url = result['url']
             if save_path:
-                resp = requests.get(video_url, stream=True)
+                resp = upstream_session.get(video_url, stream=True)
                 resp.raise_for_status()
                 with open(save_path, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -62,7 +64,7 @@ def text_to_video_generate(api_key, prompt, save_path: str = None, model="seedan
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = video_url.split("/")[-1]
                 output_filename = f"{time_ft}_{url_name}"
-                resp = requests.get(video_url, stream=True)
+                resp = upstream_session.get(video_url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -94,7 +96,7 @@ def image_to_video_generate(api_key, prompt, image, save_path: str = None, model
         if result.get('success'):
             video_url = result['url']
             if save_path:
-                resp = requests.get(video_url, stream=True)
+                resp = upstream_session.get(video_url, stream=True)
                 resp.raise_for_status()
                 with open(save_path, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -108,7 +110,7 @@ def image_to_video_generate(api_key, prompt, image, save_path: str = None, model
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = video_url.split("/")[-1]
                 output_filename = f"{time_ft}_{url_name}"
-                resp = requests.get(video_url, stream=True)
+                resp = upstream_session.get(video_url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -128,7 +130,7 @@ def frame_to_frame_video(api_key, prompt, images, save_path: str = None, model="
     logger.info("Hello from WaveSpeedAI!")
     
 
-    url = f"https://api.wavespeed.ai/api/v3/{provider}/{model}"
+    url = wavespeed_url(f"{provider}/{model}")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -154,10 +156,11 @@ def frame_to_frame_video(api_key, prompt, images, save_path: str = None, model="
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -172,12 +175,12 @@ def frame_to_frame_video(api_key, prompt, images, save_path: str = None, model="
             'error': f"Error: {response.status_code}, {error_text}"
         }
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -190,7 +193,7 @@ def frame_to_frame_video(api_key, prompt, images, save_path: str = None, model="
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = url.split("/")[-1]
                 output_filename = save_path if save_path else f"{time_ft}_{url_name}"
-                resp = requests.get(url, stream=True)
+                resp = upstream_session.get(url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -233,7 +236,7 @@ def audio_gen(api_key, prompt, video_url, model="mmaudio-v2", save_path=None, pr
         # Assume it's a URL
         video_data_uri = video_url
 
-    url = f"https://api.wavespeed.ai/api/v3/{provider}/{model}"
+    url = wavespeed_url(f"{provider}/{model}")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -249,10 +252,11 @@ def audio_gen(api_key, prompt, video_url, model="mmaudio-v2", save_path=None, pr
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -267,12 +271,12 @@ def audio_gen(api_key, prompt, video_url, model="mmaudio-v2", save_path=None, pr
             'error': f"Error: {response.status_code}, {error_text}"
         }
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -285,7 +289,7 @@ def audio_gen(api_key, prompt, video_url, model="mmaudio-v2", save_path=None, pr
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = url.split("/")[-1]
                 output_filename = save_path if save_path else f"{time_ft}_{url_name}"
-                resp = requests.get(url, stream=True)
+                resp = upstream_session.get(url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -314,7 +318,7 @@ def audio_gen(api_key, prompt, video_url, model="mmaudio-v2", save_path=None, pr
 
 
 def runway_video_editing(api_key, prompt, video_url, aspect_ratio="16:9", save_path: str = None):
-    url = "https://api.wavespeed.ai/api/v3/runwayml/gen4-aleph"
+    url = wavespeed_url("runwayml/gen4-aleph")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -335,21 +339,22 @@ def runway_video_editing(api_key, prompt, video_url, aspect_ratio="16:9", save_p
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         logger.info(f"Error: {response.status_code}, {response.text}")
         return
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -362,7 +367,7 @@ def runway_video_editing(api_key, prompt, video_url, aspect_ratio="16:9", save_p
                 url_name = url.split("/")[-1]
                 os.makedirs("results", exist_ok=True)
                 output_filename = save_path if save_path else f"results/{time_ft}_{url_name}"
-                resp = requests.get(url, stream=True)
+                resp = upstream_session.get(url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -402,7 +407,7 @@ def vace_api(
     size: str="1280*720",
     save_path: str=None
 ):
-    url = "https://api.wavespeed.ai/api/v3/wavespeed-ai/wan-2.1-14b-vace"
+    url = wavespeed_url("wavespeed-ai/wan-2.1-14b-vace")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -445,21 +450,22 @@ def vace_api(
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         logger.info(f"Error: {response.status_code}, {response.text}")
         return
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -471,7 +477,7 @@ def vace_api(
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = url.split("/")[-1]
                 output_filename = save_path if save_path else f"{time_ft}_{url_name}"
-                resp = requests.get(url, stream=True)
+                resp = upstream_session.get(url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -499,7 +505,7 @@ def vace_api(
 
 def speech_gen(api_key: str, prompt: str, voice_id: str = "Wise_Woman", emotion: str = "surprised", english_normalization: bool = False, pitch: int = 0, speed: float = 1.0, volume: float = 1, save_path=None, provider="minimax", model="speech-2.5-turbo-preview"):
 
-    url = f"https://api.wavespeed.ai/api/v3/{provider}/{model}"
+    url = wavespeed_url(f"{provider}/{model}")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -515,21 +521,22 @@ def speech_gen(api_key: str, prompt: str, voice_id: str = "Wise_Woman", emotion:
     }
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         logger.info(f"Error: {response.status_code}, {response.text}")
         return
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -542,7 +549,7 @@ def speech_gen(api_key: str, prompt: str, voice_id: str = "Wise_Woman", emotion:
                 time_ft = datetime.now().strftime("%m%d%H%M%S")
                 url_name = url.split("/")[-1]
                 output_filename = save_path if save_path else f"{time_ft}_{url_name}"
-                resp = requests.get(url, stream=True)
+                resp = upstream_session.get(url, stream=True)
                 resp.raise_for_status()
                 with open(output_filename, "wb") as f:
                     for chunk in resp.iter_content(8192):
@@ -613,7 +620,7 @@ def hailuo_i2v_pro(api_key: str, prompt: str, image: str, end_image: str = None,
             # Assume it's a URL
             end_image_data = end_image
     
-    url = "https://api.wavespeed.ai/api/v3/minimax/hailuo-02/i2v-standard"
+    url = wavespeed_url("minimax/hailuo-02/i2v-standard")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -629,10 +636,11 @@ def hailuo_i2v_pro(api_key: str, prompt: str, image: str, end_image: str = None,
         payload["end_image"] = end_image_data
 
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -647,12 +655,12 @@ def hailuo_i2v_pro(api_key: str, prompt: str, image: str, end_image: str = None,
             'error': f"Error: {response.status_code}, {error_text}"
         }
 
-    url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    url = prediction_result_url(request_id)
     headers = {"Authorization": f"Bearer {api_key}"}
 
     # Poll for results
     while True:
-        response = requests.get(url, headers=headers)
+        response = upstream_session.get(url, headers=headers)
         if response.status_code == 200:
             result = response.json()["data"]
             status = result["status"]
@@ -665,7 +673,7 @@ def hailuo_i2v_pro(api_key: str, prompt: str, image: str, end_image: str = None,
                 
                 # Download video if save_path is provided
                 if save_path:
-                    resp = requests.get(output_url, stream=True)
+                    resp = upstream_session.get(output_url, stream=True)
                     resp.raise_for_status()
                     with open(save_path, "wb") as f:
                         for chunk in resp.iter_content(8192):
@@ -725,7 +733,7 @@ def vidu_reference_to_video_q2(
     Returns:
         dict: 包含 success, output_url, api_request, api_response, error 的字典
     """
-    url = "https://api.wavespeed.ai/api/v3/vidu/reference-to-video-q2"
+    url = wavespeed_url("vidu/reference-to-video-q2")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -766,11 +774,12 @@ def vidu_reference_to_video_q2(
     }
     
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -788,12 +797,12 @@ def vidu_reference_to_video_q2(
         }
     
     # 轮询结果
-    poll_url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    poll_url = prediction_result_url(request_id)
     poll_headers = {"Authorization": f"Bearer {api_key}"}
     full_response = None
     
     while True:
-        poll_response = requests.get(poll_url, headers=poll_headers)
+        poll_response = upstream_session.get(poll_url, headers=poll_headers)
         if poll_response.status_code == 200:
             result = poll_response.json()["data"]
             status = result["status"]
@@ -852,7 +861,7 @@ def sora_2_image_to_video(
     Returns:
         dict: 包含 success, output_url, api_request, api_response, error 的字典
     """
-    url = "https://api.wavespeed.ai/api/v3/openai/sora-2/image-to-video-pro"
+    url = wavespeed_url("openai/sora-2/image-to-video-pro")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -880,11 +889,12 @@ def sora_2_image_to_video(
     }
     
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -902,12 +912,12 @@ def sora_2_image_to_video(
         }
     
     # 轮询结果
-    poll_url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    poll_url = prediction_result_url(request_id)
     poll_headers = {"Authorization": f"Bearer {api_key}"}
     full_response = None
     
     while True:
-        poll_response = requests.get(poll_url, headers=poll_headers)
+        poll_response = upstream_session.get(poll_url, headers=poll_headers)
         if poll_response.status_code == 200:
             result = poll_response.json()["data"]
             status = result["status"]
@@ -972,7 +982,7 @@ def wan_2_5_image_to_video(
     Returns:
         dict: 包含 success, output_url, api_request, api_response, error 的字典
     """
-    url = "https://api.wavespeed.ai/api/v3/alibaba/wan-2.5/image-to-video"
+    url = wavespeed_url("alibaba/wan-2.5/image-to-video")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -1006,11 +1016,12 @@ def wan_2_5_image_to_video(
     }
     
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -1028,12 +1039,12 @@ def wan_2_5_image_to_video(
         }
     
     # 轮询结果
-    poll_url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    poll_url = prediction_result_url(request_id)
     poll_headers = {"Authorization": f"Bearer {api_key}"}
     full_response = None
     
     while True:
-        poll_response = requests.get(poll_url, headers=poll_headers)
+        poll_response = upstream_session.get(poll_url, headers=poll_headers)
         if poll_response.status_code == 200:
             result = poll_response.json()["data"]
             status = result["status"]
@@ -1102,7 +1113,7 @@ def wan_2_6_image_to_video(
     Returns:
         dict: 包含 success, output_url, api_request, api_response, error 的字典
     """
-    url = "https://api.wavespeed.ai/api/v3/alibaba/wan-2.6/image-to-video"
+    url = wavespeed_url("alibaba/wan-2.6/image-to-video")
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}",
@@ -1134,11 +1145,12 @@ def wan_2_6_image_to_video(
     }
     
     begin = time.time()
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = upstream_session.post(url, headers=headers, data=json.dumps(payload))
     
     if response.status_code == 200:
         result = response.json()["data"]
         request_id = result["id"]
+        record_prediction(request_id)
         logger.info(f"Task submitted successfully. Request ID: {request_id}")
     else:
         error_text = response.text
@@ -1156,12 +1168,12 @@ def wan_2_6_image_to_video(
         }
     
     # 轮询结果
-    poll_url = f"https://api.wavespeed.ai/api/v3/predictions/{request_id}/result"
+    poll_url = prediction_result_url(request_id)
     poll_headers = {"Authorization": f"Bearer {api_key}"}
     full_response = None
     
     while True:
-        poll_response = requests.get(poll_url, headers=poll_headers)
+        poll_response = upstream_session.get(poll_url, headers=poll_headers)
         if poll_response.status_code == 200:
             result = poll_response.json()["data"]
             status = result["status"]
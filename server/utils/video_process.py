@@ -2,10 +2,8 @@ import os
 import subprocess
 import base64
 import io
-import numpy as np
-from PIL import Image
-import imageio
 from utils.query_llm import query_openai, query_openrouter
+from utils.prompt_registry import prompt_text
 import logging
 import json
 import math
@@ -414,6 +412,8 @@ def stitch_frames_to_video(image_folder: str, output_video_path: str, fps: int =
 
     print(f"start concat {len(file_paths)} ")
 
+    import imageio
+
     with imageio.get_writer(output_video_path, fps=fps) as writer:
         for file_path in file_paths:
             try:
@@ -547,11 +547,9 @@ async def storyboard_generate(user_prompt: str, gentype: str=None) -> dict:
               - 'style' (str): A concise description of the overall visual style.
     """
     if gentype == "entity2video":
-        with open("prompts/generation/storyboard_gen/entity2video.txt", "r") as f:
-            refine_prompt = f.read()
+        refine_prompt = prompt_text("generation/storyboard_gen/entity2video")
     else:
-        with open("prompts/generation/storyboard_gen/storyboard_gen.txt", "r") as f:
-            refine_prompt = f.read()
+        refine_prompt = prompt_text("generation/storyboard_gen/storyboard_gen")
     
     query_content = f"{refine_prompt}\n\n{user_prompt}"
 
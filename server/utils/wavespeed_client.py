@@ -29,10 +29,22 @@ from typing import Any, Dict, List, Optional, Union
 
 import requests
 
+from .media_encoding import MediaRef, encode_data_uri, json_body
+from .metrics import UpstreamSession
+from .predictions import record_prediction
+from .rate_limit import acquire as acquire_rate_limit
+from .settings import get_settings, load_settings
+from .tracing import start_span
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 
+def wavespeed_url(path: str) -> str:
+    """WaveSpeed 接口地址（config.yaml 的 upstreams.wavespeed_base_url，修改后自动生效）"""
+    return get_settings().upstreams.wavespeed_url(path)
+
+
 class WavespeedAPIError(Exception):
     """WaveSpeed API 调用错误"""
 
@@ -54,24 +66,29 @@ class WavespeedClient:
     封装所有 WaveSpeed API 的调用，提供统一的接口和错误处理。
     """
 
-    BASE_URL = "https://api.wavespeed.ai/api/v3"
-
-    def __init__(self, api_key: str, timeout: int = 300):
+    def __init__(self, api_key: str, timeout: int = 300, base_url: Optional[str] = None):
         """
         初始化 WaveSpeed 客户端
 
         Args:
             api_key: WaveSpeed API 密钥
             timeout: 请求超时时间（秒），默认 300 秒
+            base_url: API 地址，默认使用配置中的 upstreams.wavespeed_base_url
         """
         self.api_key = api_key
         self.timeout = timeout
-        self.session = requests.Session()
+        self._base_url = base_url.rstrip("/") if base_url else None
+        self.session = UpstreamSession()
         self.session.headers.update({
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
         })
 
+    @property
+    def base_url(self) -> str:
+        """API 地址"""
+        return self._base_url or get_settings().upstreams.wavespeed_base_url
+
     def _request(
         self,
         method: str,
@@ -84,7 +101,7 @@ class WavespeedClient:
 
         Args:
             method: HTTP 方法 (GET, POST, etc.)
-            endpoint: API 端点路径（不包含 BASE_URL）
+            endpoint: API 端点路径（不包含 base_url）
             payload: 请求体数据
             headers: 额外的请求头
 
@@ -95,7 +112,8 @@ class WavespeedClient:
             WavespeedAPIError: API 调用失败
             WavespeedTimeoutError: 请求超时
         """
-        url = f"{self.BASE_URL}/{endpoint}"
+        url = f"{self.base_url}/{endpoint}"
+        acquire_rate_limit("wavespeed")
         request_headers = dict(self.session.headers)
         if headers:
             request_headers.update(headers)
@@ -108,7 +126,7 @@ class WavespeedClient:
                     method,
                     url,
                     headers=request_headers,
-                    data=json.dumps(payload) if payload else None,
+                    data=json_body(payload) if payload else None,
                     timeout=30
                 )
 
@@ -156,26 +174,31 @@ class WavespeedClient:
         endpoint = f"predictions/{request_id}/result"
         start_time = time.time()
 
+        iteration = 0
         while True:
             if time.time() - start_time > max_wait:
                 raise WavespeedTimeoutError(f"Polling exceeded max wait time of {max_wait}s")
 
-            result = self._request("GET", endpoint)
-            data = result.get("data", {})
-            status = data.get("status")
-
-            if status == "completed":
-                return data
-            elif status == "failed":
-                error_msg = data.get("error", "Unknown error")
-                raise WavespeedAPIError(f"Task failed: {error_msg}")
-            else:
-                logger.info(f"Task still processing. Status: {status}")
-                time.sleep(poll_interval)
+            iteration += 1
+            # 每次轮询一个 span（包含之后的等待间隔）
+            with start_span("wavespeed.poll", {"prediction.id": request_id, "poll.iteration": iteration}) as span:
+                result = self._request("GET", endpoint)
+                data = result.get("data", {})
+                status = data.get("status")
+                span.set_attribute("prediction.status", status)
+
+                if status == "completed":
+                    return data
+                elif status == "failed":
+                    error_msg = data.get("error", "Unknown error")
+                    raise WavespeedAPIError(f"Task failed: {error_msg}")
+                else:
+                    logger.info(f"Task still processing. Status: {status}")
+                    time.sleep(poll_interval)
 
     def _encode_image_to_base64(self, image_path: str) -> str:
         """
-        将图片文件编码为 base64 data URI
+        将图片文件编码为 base64 data URI（分块编码，按路径/修改时间/大小缓存）
 
         Args:
             image_path: 图片文件路径
@@ -183,21 +206,7 @@ class WavespeedClient:
         Returns:
             base64 data URI 字符串
         """
-        import base64
-
-        ext = os.path.splitext(image_path)[1].lower()
-        mime_types = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-        }
-        mime_type = mime_types.get(ext, "image/jpeg")
-
-        with open(image_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode("utf-8")
-        return f"data:{mime_type};base64,{encoded}"
+        return encode_data_uri(image_path, default_mime="image/jpeg")
 
     def _encode_video_to_base64(self, video_path: str) -> str:
         """
@@ -209,30 +218,26 @@ class WavespeedClient:
         Returns:
             base64 data URI 字符串
         """
-        import base64
-
-        ext = os.path.splitext(video_path)[1].lower()
-        mime_type = "video/mp4" if ext in [".mp4", ".mov", ".avi", ".mkv"] else "video/mp4"
-
-        with open(video_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode("utf-8")
-        return f"data:{mime_type};base64,{encoded}"
+        return encode_data_uri(video_path, mime_type="video/mp4")
 
-    def _prepare_image_input(self, image: str) -> str:
+    def _prepare_image_input(self, image: str, stream: bool = False) -> Union[str, MediaRef]:
         """
         准备图片输入（支持 URL、本地路径、base64）
 
         Args:
             image: 图片 URL、本地路径或 base64 字符串
+            stream: 本地文件是否返回 MediaRef（仅用于交给 _request 的 payload，发送时流式编码）
 
         Returns:
-            处理后的图片 data URI 或 URL
+            处理后的图片 data URI、URL 或 MediaRef
         """
         if image.startswith("data:image/"):
             return image
         elif image.startswith("http://") or image.startswith("https://"):
             return image
         elif os.path.exists(image):
+            if stream:
+                return MediaRef(image, default_mime="image/jpeg")
             return self._encode_image_to_base64(image)
         else:
             raise ValueError(f"Invalid image input: {image}")
@@ -298,6 +303,7 @@ class WavespeedClient:
         begin = time.time()
         result = self._request("POST", endpoint, payload)
         request_id = result["data"]["id"]
+        record_prediction(request_id, f"{self.base_url}/predictions/{request_id}/result")
         logger.info(f"Image task submitted. Request ID: {request_id}")
 
         data = self._poll_result(request_id)
@@ -355,7 +361,7 @@ class WavespeedClient:
             elif img.startswith("data:image/"):
                 image_list.append(img)
             elif os.path.exists(img):
-                image_list.append(self._encode_image_to_base64(img))
+                image_list.append(MediaRef(img, default_mime="image/jpeg"))
             elif img:  # 非空字符串但不是有效路径
                 image_list.append(img)
 
@@ -391,6 +397,7 @@ class WavespeedClient:
         begin = time.time()
         result = self._request("POST", endpoint, payload)
         request_id = result["data"]["id"]
+        record_prediction(request_id, f"{self.base_url}/predictions/{request_id}/result")
         logger.info(f"Image edit task submitted. Request ID: {request_id}")
 
         data = self._poll_result(request_id)
@@ -444,6 +451,7 @@ class WavespeedClient:
         begin = time.time()
         result = self._request("POST", endpoint, payload)
         request_id = result["data"]["id"]
+        record_prediction(request_id, f"{self.base_url}/predictions/{request_id}/result")
         logger.info(f"Video task submitted. Request ID: {request_id}")
 
         data = self._poll_result(request_id)
@@ -486,7 +494,7 @@ class WavespeedClient:
         if seed is None:
             seed = int(datetime.now().timestamp())
 
-        image_data = self._prepare_image_input(image)
+        image_data = self._prepare_image_input(image, stream=True)
 
         endpoint = f"{provider}/{model}"
         payload = {
@@ -500,6 +508,7 @@ class WavespeedClient:
         begin = time.time()
         result = self._request("POST", endpoint, payload)
         request_id = result["data"]["id"]
+        record_prediction(request_id, f"{self.base_url}/predictions/{request_id}/result")
         logger.info(f"Image-to-video task submitted. Request ID: {request_id}")
 
         data = self._poll_result(request_id)
@@ -543,7 +552,8 @@ class WavespeedClient:
         if video.startswith("http://") or video.startswith("https://"):
             video_data = video
         elif os.path.exists(video):
-            video_data = self._encode_video_to_base64(video)
+            # 视频可能很大，发送时再分块编码写入请求体
+            video_data = MediaRef(video, mime_type="video/mp4")
         else:
             video_data = video
 
@@ -555,13 +565,14 @@ class WavespeedClient:
         }
 
         if image:
-            payload["images"] = [self._prepare_image_input(image)]
+            payload["images"] = [self._prepare_image_input(image, stream=True)]
 
         payload.update(kwargs)
 
         begin = time.time()
         result = self._request("POST", endpoint, payload)
         request_id = result["data"]["id"]
+        record_prediction(request_id, f"{self.base_url}/predictions/{request_id}/result")
         logger.info(f"Video edit task submitted. Request ID: {request_id}")
 
         data = self._poll_result(request_id)
@@ -690,30 +701,17 @@ class WavespeedClient:
             base64 编码的帧列表
         """
         try:
-            import cv2
-            import numpy as np
-
-            cap = cv2.VideoCapture(video_path)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-            if total_frames <= 0:
-                raise ValueError("Video has no frames")
-
-            indices = np.linspace(0, total_frames - 1, min(num_frames, total_frames), dtype=int)
-            frames = []
-
-            for idx in indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    # 调整大小
-                    frame = cv2.resize(frame, target_size)
-                    _, buffer = cv2.imencode(".jpg", frame)
-                    encoded = base64.b64encode(buffer).decode("utf-8")
-                    frames.append(f"data:image/jpeg;base64,{encoded}")
-
-            cap.release()
-            return frames
+            from .frame_sampler import sample_in_pool, sample_video_frames, to_data_uri
+
+            # 在媒体进程池中顺序解码一次并按视频哈希缓存，同一视频重复分析不再解码
+            frames = sample_in_pool(
+                sample_video_frames,
+                video_path,
+                count=num_frames,
+                target_resolution=tuple(target_size),
+                maintain_aspect_ratio=False
+            )
+            return [to_data_uri(frame) for frame in frames]
 
         except Exception as e:
             logger.warning(f"Failed to extract video frames: {e}")
@@ -731,25 +729,9 @@ def create_client_from_config(config_path: Optional[str] = None) -> WavespeedCli
     Returns:
         配置好的 WavespeedClient 实例
     """
-    import yaml
-
-    if config_path is None:
-        server_dir = os.path.dirname(os.path.dirname(__file__))
-        config_path = os.path.join(server_dir, "config", "config.yaml")
-
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-
-    # 优先使用新的统一 key
-    api_key = config.get('wavespeed_api_key')
-
-    # 向后兼容：尝试从旧位置读取
-    if not api_key:
-        api_key = (
-            config.get('image_gen', {}).get('wavespeed_api')
-            or config.get('video_gen', {}).get('wavespeed_api')
-            or config.get('llm', {}).get('openai_api_key')
-        )
+    settings = get_settings() if config_path is None else load_settings(config_path)
+    # 优先使用新的统一 key，兼容旧位置
+    api_key = settings.wavespeed_api_key
 
     if not api_key:
         raise ValueError("No API key found in config. Please set wavespeed_api_key.")
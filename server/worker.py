@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+生成任务执行进程
+
+从任务队列（config.yaml 的 tasks 段，broker 需为 sqlite 或 redis）领取 create_tool_task
+创建的任务并执行。可以在多台机器上启动任意数量的 worker，与 API 进程分别伸缩；
+API 进程可设置 tasks.inline_workers: 0，只负责接收请求。
+
+用法（在 server 目录下）：
+    python -m worker [--concurrency 4]
+
+收到 SIGINT / SIGTERM 后停止领取新任务，最多等待 tasks.drain_seconds 秒让执行中的任务结束；
+超时（或再次收到信号）时未完成的任务立即交回队列。已提交上游 prediction 的任务由接手的 worker
+继续轮询并取回结果，不会重新提交。
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+from utils.loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from utils.media_pool import shutdown_media_pool
+from utils.metrics import InstrumentedThreadPool, start_metrics, stop_metrics
+from utils.profiler import start_profile_watcher, stop_profile_watcher
+from utils.prompt_registry import get_prompt_registry
+from utils.settings import get_settings, install_reload_signal, reload_settings
+
+logger = logging.getLogger("worker")
+
+
+async def run_worker(concurrency: int):
+    from api.tools import create_task_worker
+
+    count = get_prompt_registry().load_all()
+    logger.info(f"已加载 {count} 个提示词模板")
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(InstrumentedThreadPool("default"))
+    # 指标写入本机指标目录，由 API 进程的 /metrics 一并输出
+    start_metrics()
+    start_loop_watchdog()
+    start_profile_watcher("worker")
+    worker = create_task_worker(concurrency)
+    stop_requests = []
+
+    def request_stop():
+        stop_requests.append(True)
+        if len(stop_requests) == 1:
+            drain_seconds = get_settings().tasks.drain_seconds
+            logger.info(f"正在停止，最多等待 {drain_seconds} 秒让执行中的任务结束")
+            asyncio.ensure_future(worker.stop(timeout=drain_seconds))
+        else:
+            logger.info("立即停止，未完成的任务交回队列")
+            asyncio.ensure_future(worker.stop(timeout=0))
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, request_stop)
+
+    logger.info(f"worker 已启动，并发数 {concurrency}")
+    try:
+        await worker.run()
+    finally:
+        shutdown_media_pool(wait=True)
+        stop_loop_watchdog()
+        stop_profile_watcher()
+        stop_metrics()
+    logger.info(f"worker 已停止，共执行 {worker.completed} 个任务")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成任务执行进程")
+    parser.add_argument("--concurrency", type=int, default=None, help="同时执行的任务数（默认 tasks.worker_concurrency）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    settings = reload_settings()
+    for problem in settings.warnings():
+        logger.warning(f"配置检查: {problem}")
+    if settings.tasks.broker == "memory":
+        logger.error("tasks.broker 为 memory 时任务只能在 API 进程内执行，请配置 sqlite 或 redis 任务队列")
+        sys.exit(2)
+    install_reload_signal()
+
+    asyncio.run(run_worker(args.concurrency or settings.tasks.worker_concurrency))
+
+
+if __name__ == "__main__":
+    main()